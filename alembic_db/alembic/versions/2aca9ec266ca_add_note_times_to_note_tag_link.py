@@ -0,0 +1,54 @@
+"""Add note times to note_tag_link
+
+Revision ID: 2aca9ec266ca
+Revises: 97abc02db323
+Create Date: 2026-10-18 14:31:07.284615
+
+"""
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../..")))
+
+from alembic_db.alembic_post_utils import write_revision_post_alembic
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2aca9ec266ca'
+down_revision = '97abc02db323'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # write_revision_post_alembic(revision)
+
+    # The column may already have been created by the web interface's create_all()
+    inspector = sa.inspect(op.get_bind())
+    if 'date_time' not in [c['name'] for c in inspector.get_columns('note_tag_link')]:
+        with op.batch_alter_table("note_tag_link") as batch_op:
+            batch_op.add_column(sa.Column('date_time', sa.DateTime))
+
+    op.execute(
+        '''
+        UPDATE note_tag_link
+        SET date_time=(SELECT date_time FROM notes WHERE notes.id = note_tag_link.note_id)
+        '''
+    )
+
+    # Index the notes of each tag by time, which also serves lookups by tag alone
+    indexes = [i['name'] for i in inspector.get_indexes('note_tag_link')]
+    if 'ix_note_tag_link_tag' in indexes:
+        op.drop_index('ix_note_tag_link_tag', 'note_tag_link')
+    if 'ix_note_tag_link_tag_time' not in indexes:
+        op.create_index('ix_note_tag_link_tag_time', 'note_tag_link', ['tag_unique_id', 'date_time', 'note_id'])
+
+
+def downgrade():
+    op.drop_index('ix_note_tag_link_tag_time', 'note_tag_link')
+    op.create_index('ix_note_tag_link_tag', 'note_tag_link', ['tag_unique_id', 'note_id'])
+    with op.batch_alter_table("note_tag_link") as batch_op:
+        batch_op.drop_column('date_time')
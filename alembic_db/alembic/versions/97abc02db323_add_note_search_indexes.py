@@ -0,0 +1,103 @@
+"""Add note search indexes
+
+Revision ID: 97abc02db323
+Revises: a854d79d98b2
+Create Date: 2026-10-18 10:12:41.503118
+
+"""
+import sqlite3
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../../..")))
+
+from alembic_db.alembic_post_utils import write_revision_post_alembic
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '97abc02db323'
+down_revision = 'a854d79d98b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # write_revision_post_alembic(revision)
+
+    # The table may already have been created by the web interface's create_all()
+    inspector = sa.inspect(op.get_bind())
+    if 'note_tag_link' not in inspector.get_table_names():
+        op.create_table(
+            'note_tag_link',
+            sa.Column('note_id', sa.Integer, sa.ForeignKey('notes.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('tag_unique_id', sa.String(36), nullable=False),
+            sa.PrimaryKeyConstraint('note_id', 'tag_unique_id'))
+    if 'ix_note_tag_link_tag' not in [i['name'] for i in inspector.get_indexes('note_tag_link')]:
+        op.create_index('ix_note_tag_link_tag', 'note_tag_link', ['tag_unique_id', 'note_id'])
+    if 'ix_notes_date_time' not in [i['name'] for i in inspector.get_indexes('notes')]:
+        op.create_index('ix_notes_date_time', 'notes', ['date_time'])
+
+    # Fill the tag links from the comma-separated tags of each note
+    op.execute('DELETE FROM note_tag_link')
+    conn = op.get_bind()
+    links = []
+    for note_id, tags in conn.execute(sa.text('SELECT id, tags FROM notes')):
+        for tag_unique_id in set(each_tag.strip() for each_tag in (tags or '').split(',')):
+            if tag_unique_id:
+                links.append({'note_id': note_id, 'tag_unique_id': tag_unique_id})
+        if len(links) >= 10000:
+            conn.execute(sa.text('INSERT INTO note_tag_link (note_id, tag_unique_id) '
+                                 'VALUES (:note_id, :tag_unique_id)'), links)
+            links = []
+    if links:
+        conn.execute(sa.text('INSERT INTO note_tag_link (note_id, tag_unique_id) '
+                             'VALUES (:note_id, :tag_unique_id)'), links)
+
+    # Full-text index of note names and bodies, kept in sync by triggers.
+    # The trigram tokenizer needs SQLite 3.34+, otherwise notes are searched with LIKE.
+    if (conn.dialect.name != 'sqlite' or
+            sqlite3.sqlite_version_info < (3, 34) or
+            not conn.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar()):
+        return
+    op.execute(
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            name, note, content='notes', content_rowid='id', tokenize='trigram')
+        '''
+    )
+    op.execute(
+        '''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts(rowid, name, note) VALUES (new.id, new.name, new.note);
+        END
+        '''
+    )
+    op.execute(
+        '''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+            INSERT INTO notes_fts(notes_fts, rowid, name, note) VALUES ('delete', old.id, old.name, old.note);
+        END
+        '''
+    )
+    op.execute(
+        '''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF name, note ON notes BEGIN
+            INSERT INTO notes_fts(notes_fts, rowid, name, note) VALUES ('delete', old.id, old.name, old.note);
+            INSERT INTO notes_fts(rowid, name, note) VALUES (new.id, new.name, new.note);
+        END
+        '''
+    )
+    op.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS notes_fts_update')
+        op.execute('DROP TRIGGER IF EXISTS notes_fts_delete')
+        op.execute('DROP TRIGGER IF EXISTS notes_fts_insert')
+        op.execute('DROP TABLE IF EXISTS notes_fts')
+    op.drop_index('ix_notes_date_time', 'notes')
+    op.drop_table('note_tag_link')
@@ -29,6 +29,7 @@ from looperget.databases.models import OutputChannel
 from looperget.databases.utils import session_scope
 from looperget.utils.database import db_retrieve_table_daemon
 from looperget.utils.influx import get_last_measurement
+from looperget.utils.influx import get_past_measurement_stats
 from looperget.utils.influx import get_past_measurements
 
 
@@ -536,6 +537,10 @@ class AbstractBaseController(object):
     def get_past_measurements(device_id, measurement_id, max_age=None):
         return get_past_measurements(device_id, measurement_id, max_age=max_age)
 
+    @staticmethod
+    def get_past_measurement_stats(device_id, measurement_id, max_age, median=False):
+        return get_past_measurement_stats(device_id, measurement_id, max_age, median=median)
+
     @staticmethod
     def get_output_channel_from_channel_id(channel_id):
         """Return channel number from channel ID."""
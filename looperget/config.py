@@ -15,7 +15,7 @@ from config_translations import TRANSLATIONS as T
 
 LOOPERGET_VERSION = '8.16.0'
 MYCODO_VERSION = '8.16.0'
-ALEMBIC_VERSION = '435f35958689'
+ALEMBIC_VERSION = '2aca9ec266ca'
 
 # FORCE UPGRADE MASTER
 # Set True to enable upgrading to the master branch of the Looperget repository.
@@ -43,6 +43,14 @@ ALEMBIC_UPGRADE_POST = os.path.join(ALEMBIC_PATH, 'alembic_post_upgrade_versions
 SQL_DATABASE_LOOPERGET = os.path.join(DATABASE_PATH, DATABASE_NAME)
 LOOPERGET_DB_PATH = f'sqlite:///{SQL_DATABASE_LOOPERGET}'
 KMA_PATH = os.path.join(DATABASE_PATH, 'kma')
+MODULE_INDEX_PATH = os.path.join(DATABASE_PATH, 'module_index.db')  # Parsed *_INFORMATION of module files
+
+# Connection pool of each database engine. Most controllers only hold a connection for the
+# length of a query, so a few connections are kept open, and any overflow (e.g. query objects
+# held by controllers) opens and closes its own without ever blocking.
+ENGINE_POOL_SIZE = 10  # Connections kept open
+ENGINE_MAX_OVERFLOW = -1  # Connections opened beyond the pool (-1: no limit)
+SQLITE_BUSY_TIMEOUT_MS = 5000  # How long SQLite waits on a locked database before raising
 
 try:
     import config_override
@@ -108,12 +116,25 @@ DAEMON_PID_FILE = os.path.join(RUN_PATH, 'looperget.pid')
 # Remote admin
 STORED_SSL_CERTIFICATE_PATH = os.path.join(
     INSTALL_DIRECTORY, 'looperget/looperget_flask/ssl_certs/remote_admin')
+REMOTE_HOST_TIMEOUT_SEC = 5  # Deadline of a remote host's page, including logging in
+REMOTE_HOST_CONNECT_TIMEOUT_SEC = 2  # Give up connecting to a remote host after this long
+REMOTE_FLEET_WORKERS = 16  # Remote hosts requested at once
+REMOTE_FLEET_CACHE_SEC = 30  # Reuse a remote host's page for this long before requesting it again
+REMOTE_FLEET_STALE_SEC = 600  # Show an older page of a host that misses its deadline, while it's refreshed
+REMOTE_FLEET_REFRESH_SEC = 30  # Deadline of a request that continues to refresh the cache after its page's deadline
 
 # Cameras
 PATH_CAMERAS = os.path.join(INSTALL_DIRECTORY, 'cameras')
+TIMELAPSE_INDEX_PATH = os.path.join(DATABASE_PATH, 'timelapse_index.db')  # Time-lapse images of each camera
+CAMERA_STREAM_IDLE_SEC = 10  # A camera stream is closed after it's had no viewers this long
 
 # Notes
 PATH_NOTE_ATTACHMENTS = os.path.join(INSTALL_DIRECTORY, 'note_attachments')
+NOTES_PAGE_SIZE = 100  # Notes shown on each page of a search
+NOTE_OVERLAY_MAX = 500  # Most notes of a tag shown on a graph, more are clustered into counts
+
+# Dashboard
+CATALOG_MAX_AGE_SEC = 300  # Rebuild the measurement catalog at least this often, in case the daemon changed a table
 
 # Determine if running in a Docker container
 DOCKER_CONTAINER = os.environ.get('DOCKER_CONTAINER', False) == 'TRUE'
@@ -123,6 +144,55 @@ if DOCKER_CONTAINER:
     PYRO_URI = 'PYRO:looperget.pyro_server@looperget_daemon:9080'
 else:
     PYRO_URI = 'PYRO:looperget.pyro_server@127.0.0.1:9080'
+PYRO_THREADPOOL_SIZE = 256  # Daemon threads serving clients, one per open client connection
+PYRO_PROXY_IDLE_SEC = 300  # Close the connections of pooled client proxies left idle this long
+PYRO_PROXY_POOL_MAX = 64  # Open connections to the daemon per process, each holding a daemon thread
+
+# InfluxDB write queue
+INFLUXDB_WRITE_QUEUE_SIZE = 50000  # Points held in memory before the oldest are dropped
+INFLUXDB_WRITE_BATCH_SIZE = 500  # Flush when this many points are queued
+INFLUXDB_WRITE_FLUSH_SEC = 1.0  # Flush at least this often when points are queued
+INFLUXDB_WRITE_RETRIES = 4  # Retries of a failed batch before it's dropped
+INFLUXDB_WRITE_BACKOFF_SEC = 0.5  # Delay before the first retry, doubled after each failure
+INFLUXDB_SETTINGS_CHECK_SEC = 60  # How often to check if measurement database settings changed
+INFLUXDB_SPOOL_PATH = os.path.join(DATABASE_PATH, 'measurement_spool.db')  # Points that failed to write
+INFLUXDB_SPOOL_MAX_MB = 256  # Oldest spooled points are discarded beyond this size
+INFLUXDB_SPOOL_RETRY_SEC = 10  # How often to try replaying the spool while influxdb is unavailable
+
+# Rolling windows of recent measurements, used for past average/sum/statistics
+ROLLING_WINDOW_RESYNC_SEC = 600  # Re-read a series from influxdb to include points written by other processes
+ROLLING_WINDOW_IDLE_SEC = 86400  # Stop tracking series that haven't been queried for this long
+ROLLING_WINDOW_RESUM_EVICTIONS = 10000  # Recompute running sums after this many evictions
+
+# Controller scheduler, which runs the loop() of controllers when they're due
+CONTROLLER_SCHEDULER_WORKERS = 32  # Threads running controller loops, more are started while they're blocked
+CONTROLLER_SCHEDULER_BLOCKED_SEC = 0.5  # Start another thread when a due controller has waited this long
+CONTROLLER_SCHEDULER_MAX_WAIT_SEC = 60  # Longest time a controller waits between loops
+OUTPUT_OFF_WORKERS = 4  # Threads turning off outputs when their on duration ends
+OUTPUT_OFF_SCAN_SEC = 60  # Check all output channels for missed off deadlines this often
+
+# Queue between an input's message callback (e.g. MQTT) and the worker that stores the measurements
+MEASUREMENT_INGEST_QUEUE_SIZE = 10000  # Messages waiting to be processed before new ones are dropped
+MEASUREMENT_INGEST_BATCH_SIZE = 500  # Messages processed and written together
+MEASUREMENT_INGEST_PUT_TIMEOUT_SEC = 0.5  # Time a callback waits for room in a full queue before dropping
+MEASUREMENT_INGEST_ACTIONS_SEC = 10  # Re-read the input's actions this often
+
+# Graph data (async_v2), queried for many series at once
+GRAPH_SERIES_MAX = 64  # Series per request
+GRAPH_WIDTH_MAX = 10000  # Largest graph width (points per series) that can be requested
+GRAPH_QUERY_WORKERS = 8  # Series queried from influxdb at once
+GRAPH_QUERY_TIMEOUT_MS = 60000
+
+# Rollups of all measurements into coarser buckets, for long-range aggregates and graphs
+ROLLUP_PATH = os.path.join(DATABASE_PATH, 'measurement_rollups.db')
+ROLLUP_TIERS = ((60, 14), (900, 400), (3600, 3650))  # (bucket seconds, days kept), finest first
+ROLLUP_INTERVAL_SEC = 60  # How often new points are rolled up
+ROLLUP_LAG_SEC = 120  # Points newer than this aren't rolled up yet, so late writes are included
+ROLLUP_BACKFILL_DAYS = 400  # History rolled up after the rollups are first created
+ROLLUP_STEP_SEC = 3600  # Raw points queried at once
+ROLLUP_STEPS = 24  # Most steps rolled up each interval, so backfilling is spread out
+ROLLUP_PLANNER_MIN_SEC = 21600  # Shorter aggregates are always computed from raw points
+ROLLUP_RAW_EDGE_MAX_SEC = 21600  # Use the rollups only if the raw points around them span less than this
 
 # Anonymous statistics
 STATS_INTERVAL = 86400
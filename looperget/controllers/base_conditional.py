@@ -31,6 +31,7 @@ class AbstractConditional:
         self.message = message
         self.running = True
         self.control = DaemonControl(pyro_timeout=timeout)
+        self.condition_values = {}
 
     def run_all_actions(self, message=None):
         if message is None:
@@ -63,31 +64,46 @@ class AbstractConditional:
         if return_dict and 'message' in return_dict:
             self.message = return_dict['message']
 
-    def condition(self, condition_id):
-        full_cond_id = condition_id
-        cond = None
-        if len(condition_id) < 36:
-            condition_id = condition_id.replace("{", "").replace("}", "")
-            with session_scope(LOOPERGET_DB_PATH) as new_session:
-                cond = new_session.query(ConditionalConditions).filter(
-                    ConditionalConditions.unique_id.startswith(condition_id)).first()
-                new_session.expunge_all()
+    def conditions_all(self):
+        """
+        Return the values of all conditions of this Conditional, with one request to the daemon
+
+        Until the Conditional runs again, condition() and condition_dict()
+        return these values instead of requesting each condition.
+
+        :return: dict of condition ID: value
+        :rtype: dict
+        """
+        self.condition_values = self.control.get_condition_measurements(self.function_id) or {}
+        return self.condition_values
+
+    def full_condition_id(self, condition_id):
+        """Return the full ID of a condition from its short ID."""
+        if len(condition_id) >= 36:
+            return condition_id
+        short_id = condition_id.replace("{", "").replace("}", "")
+        for each_id in self.condition_values:
+            if each_id.startswith(short_id):
+                return each_id
+        with session_scope(LOOPERGET_DB_PATH) as new_session:
+            cond = new_session.query(ConditionalConditions).filter(
+                ConditionalConditions.unique_id.startswith(short_id)).first()
+            new_session.expunge_all()
         if cond:
-            full_cond_id = cond.unique_id
+            return cond.unique_id
+        return condition_id
+
+    def condition(self, condition_id):
+        full_cond_id = self.full_condition_id(condition_id)
+        if full_cond_id in self.condition_values:
+            return self.condition_values[full_cond_id]
 
         return self.control.get_condition_measurement(full_cond_id)
 
     def condition_dict(self, condition_id):
-        full_cond_id = condition_id
-        cond = None
-        if len(condition_id) < 36:
-            condition_id = condition_id.replace("{", "").replace("}", "")
-            with session_scope(LOOPERGET_DB_PATH) as new_session:
-                cond = new_session.query(ConditionalConditions).filter(
-                    ConditionalConditions.unique_id.startswith(condition_id)).first()
-                new_session.expunge_all()
-        if cond:
-            full_cond_id = cond.unique_id
+        full_cond_id = self.full_condition_id(condition_id)
+        if full_cond_id in self.condition_values:
+            return self.condition_values[full_cond_id]
 
         list_times_values = self.control.get_condition_measurement_dict(full_cond_id)
         if list_times_values:
@@ -9,22 +9,34 @@ All Controllers should inherit from this class and overwrite methods that raise
 NotImplementedErrors
 """
 import logging
+import threading
 import time
 import timeit
 
 import Pyro5
 
 from looperget.abstract_base_controller import AbstractBaseController
+from looperget.config import CONTROLLER_SCHEDULER_MAX_WAIT_SEC
+from looperget.utils.scheduler import get_controller_scheduler
 
 
 class AbstractController(AbstractBaseController):
     """
     Base Controller class that ensures certain methods and values are present
     in controllers.
+
+    Controllers that set scheduled = True don't run in their own thread.
+    Their loop() is run by the controller scheduler at the time returned by
+    next_wakeup(), rather than every sample_rate seconds.
     """
+    scheduled = False
+
     def __init__(self, ready, unique_id=None, name=__name__):
         super().__init__(unique_id, name=__name__)
 
+        self.scheduler_started = False
+        self.scheduler_initialized = False
+        self.scheduler_stopped = threading.Event()
         self.thread_startup_timer = timeit.default_timer()
         self.running = False
         self.thread_shutdown_timer = 0
@@ -62,41 +74,116 @@ class AbstractController(AbstractBaseController):
         """Executed when the controller is instructed to stop."""
         pass
 
+    def next_wakeup(self):
+        """Return the time (epoch) loop() next needs to run, if the controller is scheduled."""
+        return time.time() + self.sample_rate
+
     #
     # End functions the user typically overwrites
     #
 
+    @property
+    def running(self):
+        return self._running
+
+    @running.setter
+    def running(self, value):
+        self._running = value
+        if not value and self.scheduler_started:
+            # Let the scheduler finish the controller without waiting for its next wakeup
+            get_controller_scheduler().wake(self)
+
     def run(self):
         try:
-            try:
-                self.initialize_variables()
-            except Exception as except_msg:
-                self.logger.exception(f"initialize_variables() Exception: {except_msg}")
+            self.run_initialize()
+            while self.running:
+                self.run_loop()
+                time.sleep(self.sample_rate)
+        except Exception:
+            self.logger.exception("Run Error")
+            self.thread_shutdown_timer = timeit.default_timer()
+        finally:
+            self.run_stop()
 
-            dur = (timeit.default_timer() - self.thread_startup_timer) * 1000
-            self.logger.info(f"Activated in {dur:.1f} ms")
+    def run_initialize(self):
+        try:
+            self.initialize_variables()
+        except Exception as except_msg:
+            self.logger.exception(f"initialize_variables() Exception: {except_msg}")
 
-            while self.running:
+        dur = (timeit.default_timer() - self.thread_startup_timer) * 1000
+        self.logger.info(f"Activated in {dur:.1f} ms")
+
+    def run_loop(self):
+        try:
+            self.loop()
+        except Pyro5.errors.TimeoutError:
+            self.logger.exception("Pyro5 TimeoutError")
+        except Exception:
+            self.logger.exception("loop() Error")
+
+    def run_stop(self):
+        self.run_finally()
+        self.running = False
+        if self.thread_shutdown_timer:
+            dur = (timeit.default_timer() - self.thread_shutdown_timer) * 1000
+            self.logger.info(f"Deactivated in {dur:.1f} ms")
+        else:
+            self.logger.error("Deactivated unexpectedly")
+
+    def scheduler_step(self):
+        """
+        Run the next loop() of a scheduled controller, initializing it first
+
+        :return: the time of the next step, or None when the controller has stopped
+        :rtype: float or None
+        """
+        try:
+            if not self.scheduler_initialized:
+                self.scheduler_initialized = True
+                self.run_initialize()
+            if self.running:
+                self.run_loop()
+            if self.running:
+                now = time.time()
                 try:
-                    self.loop()
-                except Pyro5.errors.TimeoutError:
-                    self.logger.exception("Pyro5 TimeoutError")
+                    wakeup = self.next_wakeup()
                 except Exception:
-                    self.logger.exception("loop() Error")
-                finally:
-                    time.sleep(self.sample_rate)
-
+                    self.logger.exception("next_wakeup() Error")
+                    wakeup = now + self.sample_rate
+                if wakeup is None:
+                    wakeup = now + CONTROLLER_SCHEDULER_MAX_WAIT_SEC
+                return min(wakeup, now + CONTROLLER_SCHEDULER_MAX_WAIT_SEC)
         except Exception:
             self.logger.exception("Run Error")
             self.thread_shutdown_timer = timeit.default_timer()
+
+        try:
+            self.run_stop()
         finally:
-            self.run_finally()
-            self.running = False
-            if self.thread_shutdown_timer:
-                dur = (timeit.default_timer() - self.thread_shutdown_timer) * 1000
-                self.logger.info(f"Deactivated in {dur:.1f} ms")
-            else:
-                self.logger.error("Deactivated unexpectedly")
+            self.scheduler_stopped.set()
+
+    def start(self):
+        """Start the controller thread, or add the controller to the scheduler."""
+        if not self.scheduled:
+            return super().start()
+        self.scheduler_started = True
+        get_controller_scheduler().add(self)
+
+    def join(self, timeout=None):
+        if not self.scheduler_started:
+            return super().join(timeout)
+        self.scheduler_stopped.wait(timeout)
+
+    def is_alive(self):
+        if not self.scheduler_started:
+            return super().is_alive()
+        return not self.scheduler_stopped.is_set()
+
+    def wake(self):
+        """Run loop() of a scheduled controller now, rather than at its next wakeup."""
+        if self.scheduler_started:
+            get_controller_scheduler().wake(self)
 
     def is_running(self):
         return self.running
@@ -46,6 +46,8 @@ class ConditionalController(AbstractController, threading.Thread):
     This code typically queries measurement data and causes execution of function
     actions as a result of the conditions set by the user.
     """
+    scheduled = True
+
     def __init__(self, ready, unique_id):
         threading.Thread.__init__(self)
         super().__init__(ready, unique_id=unique_id, name=__name__)
@@ -75,9 +77,9 @@ class ConditionalController(AbstractController, threading.Thread):
         # Prevents execution of conditional while variables are
         # being modified.
         if self.pause_loop:
+            # Return rather than wait, so the worker isn't held, and resume when woken by refresh_settings()
             self.verify_pause_loop = True
-            while self.pause_loop:
-                time.sleep(0.1)
+            return
 
         self.time_conditional = time.time()
         # Check if the conditional period has elapsed
@@ -89,6 +91,12 @@ class ConditionalController(AbstractController, threading.Thread):
 
             self.attempt_execute(self.check_conditionals)
 
+    def next_wakeup(self):
+        if self.pause_loop:
+            return None  # Woken when the settings have been refreshed
+        if self.is_activated and self.timer_period:
+            return self.timer_period
+
     def initialize_variables(self):
         """Define all settings."""
         cond = db_retrieve_table_daemon(
@@ -149,6 +157,7 @@ class ConditionalController(AbstractController, threading.Thread):
     def refresh_settings(self):
         """Signal to pause the main loop and wait for verification, the refresh settings."""
         self.pause_loop = True
+        self.wake()
         while not self.verify_pause_loop:
             time.sleep(0.1)
 
@@ -157,6 +166,7 @@ class ConditionalController(AbstractController, threading.Thread):
 
         self.pause_loop = False
         self.verify_pause_loop = False
+        self.wake()
         return "Conditional settings successfully refreshed"
 
     def check_conditionals(self):
@@ -179,6 +189,7 @@ class ConditionalController(AbstractController, threading.Thread):
         message += '\n[Messages]:\n'
 
         self.conditional_run.message = message
+        self.conditional_run.condition_values = {}  # Values from conditions_all() are for one run
         try:
             self.conditional_run.conditional_code_run()
         except Exception:
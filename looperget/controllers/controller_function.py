@@ -39,6 +39,8 @@ class FunctionController(AbstractController, threading.Thread):
     """
     Class for controlling the Function
     """
+    scheduled = True
+
     def __init__(self, ready, unique_id):
         threading.Thread.__init__(self)
         super().__init__(ready, unique_id=unique_id, name=__name__)
@@ -80,6 +82,12 @@ class FunctionController(AbstractController, threading.Thread):
             except Exception:
                 self.logger.exception("Exception while running loop()")
 
+    def next_wakeup(self):
+        if not self.run_function:
+            return time.time()
+        if self.has_loop:
+            return self.timer_loop
+
     def run_finally(self):
         try:
             self.run_function.stop_function()
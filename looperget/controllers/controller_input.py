@@ -64,6 +64,8 @@ class InputController(AbstractController, threading.Thread):
     """
     Class for controlling the input
     """
+    scheduled = True
+
     def __init__(self, ready, unique_id):
         threading.Thread.__init__(self)
         super().__init__(ready, unique_id=unique_id, name=__name__)
@@ -131,9 +133,9 @@ class InputController(AbstractController, threading.Thread):
         # Prevents execution of conditional while variables are
         # being modified.
         if self.pause_loop:
+            # Return rather than wait, so the worker isn't held
             self.verify_pause_loop = True
-            while self.pause_loop:
-                time.sleep(0.1)
+            return
 
         if self.has_loop:
             now = time.time()
@@ -237,6 +239,14 @@ class InputController(AbstractController, threading.Thread):
 
         self.trigger_cond = False
 
+    def next_wakeup(self):
+        if (self.pause_loop or self.get_new_measurement or
+                (self.pre_output_setup and self.pre_output_activated)):
+            # Poll while a measurement is being acquired
+            return time.time() + self.sample_rate
+        if self.has_loop:
+            return self.next_measurement
+
     def run_finally(self):
         try:
             self.measure_input.stop_input()
@@ -428,6 +438,7 @@ class InputController(AbstractController, threading.Thread):
     def force_measurements(self):
         """Signal that a measurement needs to be obtained."""
         self.next_measurement = time.time()
+        self.wake()
         return 0, "Input instructed to begin acquiring measurements"
 
     def call_module_function(self, button_id, args_dict, thread=True, return_from_function=False):
@@ -20,11 +20,14 @@
 #  along with Looperget. If not, see <http://www.gnu.org/licenses/>.
 #
 #  Contact at aot-inc.com
-import datetime
+import heapq
 import threading
 import time
 import timeit
+from concurrent.futures import ThreadPoolExecutor
 
+from looperget.config import OUTPUT_OFF_SCAN_SEC
+from looperget.config import OUTPUT_OFF_WORKERS
 from looperget.controllers.base_controller import AbstractController
 from looperget.databases.models import Misc
 from looperget.databases.models import Output
@@ -34,10 +37,21 @@ from looperget.utils.database import db_retrieve_table_daemon
 from looperget.utils.modules import load_module_from_file
 from looperget.utils.outputs import output_types
 from looperget.utils.outputs import parse_output_information
+from looperget.utils.scheduler import LatencyHistogram
 
 
 class OutputController(AbstractController, threading.Thread):
-    """Class for controlling outputs."""
+    """
+    Class for controlling outputs
+
+    Outputs turned on for a duration are turned off at their output_on_until
+    time. Those times are kept in a heap that a timer thread of the controller
+    waits on, rather than scanning every channel each tick. The timer doesn't
+    share the controller scheduler's workers, so controllers that block can't
+    delay an output turning off.
+    """
+    scheduled = True
+
     def __init__(self, ready, debug):
         threading.Thread.__init__(self)
         super().__init__(ready, unique_id=None, name=__name__)
@@ -59,6 +73,18 @@ class OutputController(AbstractController, threading.Thread):
         self.output_type = {}
         self.output_types = {}
 
+        self.off_deadlines = []  # heap of (epoch, sequence, output_id, channel)
+        self.off_pending = {}  # (output_id, channel): latest deadline added to the heap
+        self.off_deadlines_lock = threading.Lock()
+        self.off_deadlines_changed = threading.Condition(self.off_deadlines_lock)
+        self.off_sequence = 0
+        self.off_timer = None
+        self.off_timer_stopped = False
+        self.off_executor = ThreadPoolExecutor(
+            max_workers=OUTPUT_OFF_WORKERS, thread_name_prefix='output_off')
+        self.off_latency = LatencyHistogram()
+        self.time_next_scan = 0
+
     def initialize_variables(self):
         """Begin initializing output parameters."""
         self.sample_rate = db_retrieve_table_daemon(Misc, entry='first').sample_rate_controller_output
@@ -83,23 +109,42 @@ class OutputController(AbstractController, threading.Thread):
 
     def loop(self):
         """Main loop of the output controller."""
-        for output_id in self.output:
-            for each_channel in self.output_unique_id[output_id]:
-
-                # Execute if past the time the output was supposed to turn off
-                if (self.output[output_id].output_setup and
-                        each_channel in self.output[output_id].output_on_until and
-                        self.output[output_id].output_on_until[each_channel] < datetime.datetime.now() and
-                        self.output[output_id].output_on_duration[each_channel] and
-                        not self.output[output_id].output_off_triggered[each_channel]):
-
-                    # Use a thread to prevent blocking the loop
-                    self.output[output_id].output_off_triggered[each_channel] = True
-                    turn_output_off = threading.Thread(
-                        target=self.output[output_id].output_on_off,
-                        args=('off',),
-                        kwargs={'output_channel': each_channel})
-                    turn_output_off.start()
+        now = time.time()
+        if now >= self.time_next_scan:
+            # Pick up durations that weren't set through output_on_off()
+            self.time_next_scan = now + OUTPUT_OFF_SCAN_SEC
+            for output_id in list(self.output):
+                for each_channel in self.output_unique_id.get(output_id, {}):
+                    self.schedule_output_off(output_id, each_channel)
+
+    def next_wakeup(self):
+        return self.time_next_scan
+
+    def run_off_timer(self):
+        """Turn output channels off as their deadlines come due."""
+        while True:
+            due = []
+            with self.off_deadlines_changed:
+                now = time.time()
+                while not self.off_timer_stopped and (
+                        not self.off_deadlines or self.off_deadlines[0][0] > now):
+                    self.off_deadlines_changed.wait(
+                        self.off_deadlines[0][0] - now if self.off_deadlines else None)
+                    now = time.time()
+                if self.off_timer_stopped:
+                    return
+                while self.off_deadlines and self.off_deadlines[0][0] <= now:
+                    deadline, _, output_id, each_channel = heapq.heappop(self.off_deadlines)
+                    if self.off_pending.get((output_id, each_channel)) == deadline:
+                        del self.off_pending[(output_id, each_channel)]
+                    due.append((output_id, each_channel))
+
+            for output_id, each_channel in due:
+                try:
+                    self.output_off_if_due(output_id, each_channel, now)
+                except Exception:
+                    self.logger.exception(
+                        f"Could not turn off channel {each_channel} of output {output_id}")
 
     def run_finally(self):
         """Run when the controller is shutting down."""
@@ -108,6 +153,72 @@ class OutputController(AbstractController, threading.Thread):
             shutdown_timer = timeit.default_timer()
             # instruct each output to shut down
             self.output[each_output_id].shutdown(shutdown_timer)
+        with self.off_deadlines_changed:
+            self.off_timer_stopped = True
+            self.off_deadlines_changed.notify()
+        self.off_executor.shutdown(wait=False)
+
+    def schedule_output_off(self, output_id, output_channel):
+        """Add the time an output channel that's on for a duration needs to turn off to the deadline heap."""
+        try:
+            output = self.output[output_id]
+            if (not output.output_setup or
+                    not output.output_on_duration[output_channel] or
+                    output.output_off_triggered[output_channel]):
+                return
+            deadline = output.output_on_until[output_channel].timestamp()
+        except (AttributeError, KeyError):
+            return
+
+        with self.off_deadlines_changed:
+            if self.off_pending.get((output_id, output_channel)) == deadline:
+                return  # Already in the heap, e.g. rescheduled by the scan
+            self.off_pending[(output_id, output_channel)] = deadline
+            self.off_sequence += 1
+            heapq.heappush(self.off_deadlines, (deadline, self.off_sequence, output_id, output_channel))
+            if self.off_deadlines[0][1] == self.off_sequence:
+                self.off_deadlines_changed.notify()  # The new deadline is the earliest
+            if self.off_timer is None:
+                self.off_timer = threading.Thread(
+                    target=self.run_off_timer, name='output_off_timer', daemon=True)
+                self.off_timer.start()
+
+    def output_off_if_due(self, output_id, output_channel, now):
+        """Turn an output channel off if its on duration has ended."""
+        output = self.output.get(output_id)
+        if not output:
+            return
+        try:
+            # The duration may have been extended or ended since the deadline was added
+            if (not output.output_setup or
+                    not output.output_on_duration[output_channel] or
+                    output.output_off_triggered[output_channel]):
+                return
+            deadline = output.output_on_until[output_channel].timestamp()
+        except (AttributeError, KeyError):
+            return
+        if deadline > now:
+            return
+
+        # Use the executor to prevent blocking the loop
+        output.output_off_triggered[output_channel] = True
+        self.off_executor.submit(self.output_off_at_deadline, output, output_channel, deadline)
+
+    def output_off_at_deadline(self, output, output_channel, deadline):
+        try:
+            output.output_on_off('off', output_channel=output_channel)
+        except Exception:
+            self.logger.exception(f"Could not turn off channel {output_channel} of output {output.unique_id}")
+        else:
+            self.off_latency.add(time.time() - deadline)
+
+    def output_off_latency(self):
+        """
+        Return a histogram of how late outputs turned off after their on duration ended
+
+        :rtype: dict
+        """
+        return self.off_latency.status()
 
     def all_outputs_initialize(self, outputs):
         """Initialize all output variables and classes."""
@@ -296,7 +407,7 @@ class OutputController(AbstractController, threading.Thread):
         #         self.logger.warning(msg)
         #         return 1, msg
 
-        return self.output[output_id].output_on_off(
+        return_value = self.output[output_id].output_on_off(
             state,
             output_channel=output_channel,
             output_type=output_type,
@@ -304,6 +415,10 @@ class OutputController(AbstractController, threading.Thread):
             min_off=min_off,
             trigger_conditionals=trigger_conditionals)
 
+        self.schedule_output_off(output_id, output_channel)
+
+        return return_value
+
     def output_setup(self, action, output_id):
         """Add, delete, or modify a specific output."""
         if action in ['Add', 'Modify']:
@@ -48,6 +48,7 @@
 # THE SOFTWARE.
 #
 import calendar
+import collections
 import datetime
 import threading
 import time
@@ -57,7 +58,6 @@ import requests
 
 from looperget.config import LOOPERGET_DB_PATH
 from looperget.controllers.base_controller import AbstractController
-from looperget.databases.models import Conversion
 from looperget.databases.models import DeviceMeasurements
 from looperget.databases.models import Misc
 from looperget.databases.models import OutputChannel
@@ -68,17 +68,22 @@ from looperget.utils.database import db_retrieve_table_daemon
 from looperget.utils.influx import add_measurements_influxdb
 from looperget.utils.influx import read_influxdb_single
 from looperget.utils.influx import write_influxdb_value
+from looperget.utils.measurement_metadata import measurement_info
 from looperget.utils.method import load_method_handler, parse_db_time
 from looperget.utils.outputs import parse_output_information
 from looperget.utils.pid_controller_default import PIDControl
-from looperget.utils.system_pi import get_measurement
-from looperget.utils.system_pi import return_measurement_info
+
+# A channel PID values are stored in, resolved from the PID's device measurements
+PIDChannel = collections.namedtuple(
+    'PIDChannel', ['channel', 'measurement_type', 'measurement', 'unit'])
 
 
 class PIDController(AbstractController, threading.Thread):
     """
     Class to operate discrete PID controller in Looperget
     """
+    scheduled = True
+
     def __init__(self, ready, unique_id):
         threading.Thread.__init__(self)
         super().__init__(ready, unique_id=unique_id, name=__name__)
@@ -92,7 +97,7 @@ class PIDController(AbstractController, threading.Thread):
         self.PID_Controller = None
         self.setpoint = None
 
-        self.device_measurements = None
+        self.measurement_layout = []
         self.device_id = None
         self.measurement_id = None
         self.log_level_debug = None
@@ -106,6 +111,8 @@ class PIDController(AbstractController, threading.Thread):
         self.setpoint_tracking_type = None
         self.setpoint_tracking_id = None
         self.setpoint_tracking_max_age = None
+        self.setpoint_tracking_device_id = None
+        self.setpoint_tracking_measurement_id = None
         self.raise_output_id = None
         self.raise_output_channel_id = None
         self.raise_output_channel = None
@@ -140,6 +147,9 @@ class PIDController(AbstractController, threading.Thread):
                 self.timer = self.timer + self.period
             self.attempt_execute(self.check_pid)
 
+    def next_wakeup(self):
+        return self.timer
+
     def run_finally(self):
         # Turn off output used in PID when the controller is deactivated
         if self.raise_output_id and self.PID_Controller.direction in ['raise', 'both']:
@@ -155,8 +165,6 @@ class PIDController(AbstractController, threading.Thread):
 
         self.sample_rate = db_retrieve_table_daemon(Misc, entry='first').sample_rate_controller_pid
 
-        self.device_measurements = db_retrieve_table_daemon(DeviceMeasurements)
-
         pid = db_retrieve_table_daemon(PID, unique_id=self.unique_id)
 
         self.log_level_debug = pid.log_level_debug
@@ -170,6 +178,9 @@ class PIDController(AbstractController, threading.Thread):
         self.setpoint_tracking_type = pid.setpoint_tracking_type
         self.setpoint_tracking_id = pid.setpoint_tracking_id
         self.setpoint_tracking_max_age = pid.setpoint_tracking_max_age
+        if self.setpoint_tracking_type == 'input-math' and ',' in (self.setpoint_tracking_id or ''):
+            self.setpoint_tracking_device_id = self.setpoint_tracking_id.split(',')[0]
+            self.setpoint_tracking_measurement_id = self.setpoint_tracking_id.split(',')[1]
         if pid.raise_output_id and "," in pid.raise_output_id:
             self.raise_output_id = pid.raise_output_id.split(",")[0]
             self.raise_output_channel_id = pid.raise_output_id.split(",")[1]
@@ -199,6 +210,7 @@ class PIDController(AbstractController, threading.Thread):
         self.store_lower_as_negative = pid.store_lower_as_negative
         self.timer = time.time() + self.start_offset
         self.setpoint = pid.setpoint
+        self.measurement_layout = self.resolve_measurement_layout()
 
         # Initialize PID Controller
         if self.PID_Controller is None:
@@ -244,13 +256,11 @@ class PIDController(AbstractController, threading.Thread):
             if self.last_measurement_success:
                 if self.setpoint_tracking_type == 'method' and self.setpoint_tracking_id != '':
                     # Update setpoint using a method
-                    this_pid = db_retrieve_table_daemon(PID, unique_id=self.unique_id)
-
                     now = datetime.datetime.now()
 
                     method = load_method_handler(self.setpoint_tracking_id, self.logger)
-                    new_setpoint, ended = method.calculate_setpoint(now, this_pid.method_start_time)
-                    self.logger.debug(f"Method {self.setpoint_tracking_id} {method} {now} {this_pid.method_start_time}")
+                    new_setpoint, ended = method.calculate_setpoint(now, self.method_start_time)
+                    self.logger.debug(f"Method {self.setpoint_tracking_id} {method} {now} {self.method_start_time}")
 
                     if ended:
                         # point in time is out of method range
@@ -265,6 +275,8 @@ class PIDController(AbstractController, threading.Thread):
                             this_pid.method_end_time = None
                             this_pid.is_activated = False
                             db_session.commit()
+                            self.method_start_time = None
+                            self.method_end_time = None
 
                             self.is_activated = False
                             self.stop_controller()
@@ -278,20 +290,15 @@ class PIDController(AbstractController, threading.Thread):
                         self.logger.debug(f"New setpoint = default {self.setpoint} {ended}")
                         self.PID_Controller.setpoint = self.setpoint
 
-                if self.setpoint_tracking_type == 'input-math' and self.setpoint_tracking_id != '':
+                if self.setpoint_tracking_type == 'input-math' and self.setpoint_tracking_device_id:
                     # Update setpoint using an Input
-                    device_id = self.setpoint_tracking_id.split(',')[0]
-                    measurement_id = self.setpoint_tracking_id.split(',')[1]
+                    device_id = self.setpoint_tracking_device_id
+                    measurement_id = self.setpoint_tracking_measurement_id
 
-                    measurement = get_measurement(measurement_id)
-                    if not measurement:
+                    channel, unit, measurement = measurement_info(measurement_id)
+                    if unit is None:
                         return False, None
 
-                    conversion = db_retrieve_table_daemon(
-                        Conversion, unique_id=measurement.conversion_id)
-                    channel, unit, measurement = return_measurement_info(
-                        measurement, conversion)
-
                     last_measurement = read_influxdb_single(
                         device_id,
                         unit,
@@ -365,6 +372,22 @@ class PIDController(AbstractController, threading.Thread):
             "제어가 종료되었습니다. "
             "다시 시작하려면 컨트롤러를 활성화하세요.")
 
+    def resolve_measurement_layout(self):
+        """
+        Return the channels PID values are stored in, so each loop doesn't query the database
+
+        Resolved when the controller is initialized, and again by pid_mod().
+
+        :rtype: list of PIDChannel
+        """
+        measurements = db_retrieve_table_daemon(DeviceMeasurements).filter(
+            DeviceMeasurements.device_id == self.unique_id).all()
+        return [PIDChannel(each_measurement.channel,
+                           each_measurement.measurement_type,
+                           each_measurement.measurement,
+                           each_measurement.unit)
+                for each_measurement in measurements]
+
     def write_pid_values(self):
         """Write PID values to the measurement database"""
         if self.PID_Controller.band:
@@ -384,24 +407,15 @@ class PIDController(AbstractController, threading.Thread):
         ]
 
         measurement_dict = {}
-        measurements = self.device_measurements.filter(
-            DeviceMeasurements.device_id == self.unique_id).all()
-        for each_channel, each_measurement in enumerate(measurements):
+        for each_channel, each_measurement in enumerate(self.measurement_layout):
             if (each_measurement.channel not in measurement_dict and
                     each_measurement.channel < len(list_measurements)):
 
                 # If setpoint, get unit from PID measurement
                 if each_measurement.measurement_type == 'setpoint':
-                    setpoint_pid = db_retrieve_table_daemon(
-                        PID, unique_id=each_measurement.device_id)
-                    if setpoint_pid and ',' in setpoint_pid.measurement:
-                        pid_measurement = setpoint_pid.measurement.split(',')[1]
-                        setpoint_measurement = db_retrieve_table_daemon(DeviceMeasurements, unique_id=pid_measurement)
-                        if setpoint_measurement:
-                            conversion = db_retrieve_table_daemon(
-                                Conversion, unique_id=setpoint_measurement.conversion_id)
-                            _, unit, _ = return_measurement_info(
-                                setpoint_measurement, conversion)
+                    if self.measurement_id:
+                        _, unit, _ = measurement_info(self.measurement_id)
+                        if unit is not None:
                             measurement_dict[each_channel] = {
                                 'measurement': each_measurement.measurement,
                                 'unit': unit,
@@ -426,15 +440,7 @@ class PIDController(AbstractController, threading.Thread):
 
         # Get latest measurement from influxdb
         try:
-            device_measurement = get_measurement(self.measurement_id)
-
-            if device_measurement:
-                conversion = db_retrieve_table_daemon(
-                    Conversion, unique_id=device_measurement.conversion_id)
-            else:
-                conversion = None
-            channel, unit, measurement = return_measurement_info(
-                device_measurement, conversion)
+            channel, unit, measurement = measurement_info(self.measurement_id)
 
             last_measurement = read_influxdb_single(
                 self.device_id,
@@ -63,6 +63,8 @@ class TriggerController(AbstractController, threading.Thread):
     the Input and Output controllers, respectively, and the
     trigger_all_actions() function in this class will be ran.
     """
+    scheduled = True
+
     def __init__(self, ready, unique_id):
         threading.Thread.__init__(self)
         super().__init__(ready, unique_id=unique_id, name=__name__)
@@ -101,9 +103,9 @@ class TriggerController(AbstractController, threading.Thread):
         # Prevents execution of trigger while variables are
         # being modified.
         if self.pause_loop:
+            # Return rather than wait, so the worker isn't held, and resume when woken by refresh_settings()
             self.verify_pause_loop = True
-            while self.pause_loop:
-                time.sleep(0.1)
+            return
 
         elif (self.is_activated and self.timer_period and
                 self.timer_period < time.time()):
@@ -158,12 +160,19 @@ class TriggerController(AbstractController, threading.Thread):
                 self.logger.debug("Executing Trigger Actions")
                 self.attempt_execute(self.check_triggers)
 
+    def next_wakeup(self):
+        if self.pause_loop:
+            return None  # Woken when the settings have been refreshed
+        if self.is_activated and self.timer_period:
+            return self.timer_period
+
     def run_finally(self):
         pass
 
     def refresh_settings(self):
         """Signal to pause the main loop and wait for verification, the refresh settings."""
         self.pause_loop = True
+        self.wake()
         while not self.verify_pause_loop:
             time.sleep(0.1)
 
@@ -172,6 +181,7 @@ class TriggerController(AbstractController, threading.Thread):
 
         self.pause_loop = False
         self.verify_pause_loop = False
+        self.wake()
         return "Trigger settings successfully refreshed"
 
     def initialize_variables(self):
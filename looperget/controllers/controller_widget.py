@@ -28,7 +28,7 @@ from looperget.databases.models import Misc
 from looperget.databases.models import Widget
 from looperget.looperget_client import DaemonControl
 from looperget.utils.database import db_retrieve_table_daemon
-from looperget.utils.modules import load_module_from_file
+from looperget.utils.modules import load_cached_module
 from looperget.utils.widgets import parse_widget_information
 
 
@@ -87,7 +87,7 @@ class WidgetController(AbstractController, threading.Thread):
 
         try:
             timer = timeit.default_timer()
-            widget_loaded, status = load_module_from_file(
+            widget_loaded, status = load_cached_module(
                 self.dict_widgets[widget.graph_type]['file_path'], 'widgets')
             widget = db_retrieve_table_daemon(Widget, unique_id=unique_id)
 
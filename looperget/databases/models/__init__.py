@@ -52,6 +52,7 @@ from .method import Method
 from .method import MethodData
 from .misc import EnergyUsage
 from .misc import Misc
+from .notes import NoteTagLink
 from .notes import NoteTags
 from .notes import Notes
 from .output import Output
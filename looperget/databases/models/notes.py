@@ -1,6 +1,12 @@
 # coding=utf-8
 import datetime
+import sqlite3
 
+from sqlalchemy import DDL
+from sqlalchemy import column
+from sqlalchemy import event
+from sqlalchemy import inspect
+from sqlalchemy import table
 from sqlalchemy.dialects.mysql import LONGTEXT
 
 from looperget.databases import CRUDMixin
@@ -14,9 +20,9 @@ class Notes(CRUDMixin, db.Model):
 
     id = db.Column(db.Integer, unique=True, primary_key=True)
     unique_id = db.Column(db.String(36), nullable=False, unique=True, default=set_uuid)  # ID for influxdb entries
-    date_time = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    date_time = db.Column(db.DateTime, default=datetime.datetime.utcnow, index=True)
     name = db.Column(db.Text, default=None)
-    tags = db.Column(db.Text, default=None)
+    tags = db.Column(db.Text, default=None)  # Comma-separated tag unique IDs, indexed in note_tag_link
     files = db.Column(db.Text, default=None)
     note = db.Column(db.Text().with_variant(LONGTEXT, "mysql", "mariadb"), default=None)
 
@@ -34,3 +40,89 @@ class NoteTags(CRUDMixin, db.Model):
 
     def __repr__(self):
         return "<{cls}(id={s.id})>".format(s=self, cls=self.__class__.__name__)
+
+
+class NoteTagLink(db.Model):
+    """Tags and times of each note, kept in sync with Notes.tags and Notes.date_time when notes are saved"""
+    __tablename__ = "note_tag_link"
+    __table_args__ = (db.Index('ix_note_tag_link_tag_time', 'tag_unique_id', 'date_time', 'note_id'),
+                      {'extend_existing': True})
+
+    note_id = db.Column(db.Integer, db.ForeignKey('notes.id', ondelete='CASCADE'), primary_key=True)
+    tag_unique_id = db.Column(db.String(36), primary_key=True)
+    date_time = db.Column(db.DateTime, default=None)  # Time of the note, to find the notes of a tag in a time frame
+
+    def __repr__(self):
+        return "<{cls}(note_id={s.note_id}, tag_unique_id={s.tag_unique_id})>".format(
+            s=self, cls=self.__class__.__name__)
+
+
+# Full-text index of note names and bodies. The trigram tokenizer indexes
+# substrings, so LIKE '%...%' searches of 3 or more characters use the index.
+# Triggers keep the index in sync with every write to the notes table.
+NOTES_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5("
+    "name, note, content='notes', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN "
+    "INSERT INTO notes_fts(rowid, name, note) VALUES (new.id, new.name, new.note); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN "
+    "INSERT INTO notes_fts(notes_fts, rowid, name, note) VALUES ('delete', old.id, old.name, old.note); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF name, note ON notes BEGIN "
+    "INSERT INTO notes_fts(notes_fts, rowid, name, note) VALUES ('delete', old.id, old.name, old.note); "
+    "INSERT INTO notes_fts(rowid, name, note) VALUES (new.id, new.name, new.note); "
+    "END",
+]
+
+
+def fts_trigram_supported(connection):
+    """Return whether SQLite has FTS5 and its trigram tokenizer (3.34+), otherwise notes are searched with LIKE."""
+    if sqlite3.sqlite_version_info < (3, 34):
+        return False
+    return bool(connection.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar())
+
+
+for each_statement in NOTES_FTS_DDL:
+    event.listen(Notes.__table__, 'after_create', DDL(each_statement).execute_if(
+        dialect='sqlite', callable_=lambda ddl, target, bind, **kw: fts_trigram_supported(bind)))
+
+notes_fts = table('notes_fts', column('rowid'), column('name'), column('note'))  # For queries of the index
+
+
+def split_note_tags(tags):
+    """Return the unique IDs in a comma-separated tags string, without blanks or duplicates."""
+    if not tags:
+        return []
+    return sorted(set(each_tag.strip() for each_tag in tags.split(',') if each_tag.strip()))
+
+
+def link_note_tags(connection, note_id, tags, date_time=None):
+    """Replace the rows of note_tag_link of a note with the tags of its tags string."""
+    table_link = NoteTagLink.__table__
+    connection.execute(table_link.delete().where(table_link.c.note_id == note_id))
+    tag_ids = split_note_tags(tags)
+    if tag_ids:
+        connection.execute(
+            table_link.insert(),
+            [{'note_id': note_id, 'tag_unique_id': each_tag, 'date_time': date_time} for each_tag in tag_ids])
+
+
+def note_inserted(mapper, connection, target):
+    link_note_tags(connection, target.id, target.tags, target.date_time)
+
+
+def note_updated(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.tags.history.has_changes() or state.attrs.date_time.history.has_changes():
+        link_note_tags(connection, target.id, target.tags, target.date_time)
+
+
+def note_deleted(mapper, connection, target):
+    link_note_tags(connection, target.id, None)
+
+
+# Mapper events fire for notes saved from any session (web UI, API, and the daemon's actions)
+event.listen(Notes, 'after_insert', note_inserted)
+event.listen(Notes, 'after_update', note_updated)
+event.listen(Notes, 'after_delete', note_deleted)
@@ -1,32 +1,119 @@
 # coding=utf-8
 import logging
+import os
+import threading
 from contextlib import contextmanager
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from looperget.config import ENGINE_MAX_OVERFLOW
+from looperget.config import ENGINE_POOL_SIZE
+from looperget.config import SQLITE_BUSY_TIMEOUT_MS
 
 logger = logging.getLogger(__name__)
 
+_engine_lock = threading.Lock()
+_engines = {}
+
+
+class _EngineEntry:
+    """An engine and the session factories bound to it."""
+    def __init__(self, db_uri):
+        self.pid = os.getpid()
+        pool_options = {}
+        if db_uri not in ('sqlite://', 'sqlite:///:memory:'):
+            # In-memory databases use a single-connection pool that takes no sizing options
+            pool_options = {
+                'pool_size': ENGINE_POOL_SIZE,
+                'max_overflow': ENGINE_MAX_OVERFLOW
+            }
+        self.engine = create_engine(f"{db_uri}?check_same_thread=False", **pool_options)
+        if self.engine.dialect.name == 'sqlite':
+            event.listen(self.engine, "connect", _set_sqlite_pragma)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self.scoped_session = scoped_session(self.session_factory)
+
+
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    """Use WAL journaling so readers don't block the writer, and wait on locks instead of failing."""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    except Exception:
+        logger.exception("Could not set SQLite pragmas")
+    finally:
+        cursor.close()
+
+
+def get_engine_entry(db_uri):
+    """
+    Return the cached engine entry for a database URI, creating it on first use.
+
+    Engines are recreated if the process has forked since they were created,
+    because pooled connections can't be shared between processes.
+    """
+    entry = _engines.get(db_uri)
+    if entry is not None and entry.pid == os.getpid():
+        return entry
+
+    with _engine_lock:
+        entry = _engines.get(db_uri)
+        if entry is None or entry.pid != os.getpid():
+            entry = _EngineEntry(db_uri)
+            _engines[db_uri] = entry
+        return entry
+
+
+def get_engine(db_uri):
+    """Return the process-wide engine for a database URI."""
+    return get_engine_entry(db_uri).engine
+
+
+def dispose_engines():
+    """Close all pooled connections and forget all cached engines."""
+    with _engine_lock:
+        for entry in _engines.values():
+            try:
+                entry.scoped_session.remove()
+                entry.engine.dispose()
+            except Exception:
+                logger.exception("Could not dispose engine")
+        _engines.clear()
+
 
 @contextmanager
 def session_scope(db_uri):
     """Provide a transactional scope around a series of operations."""
+    session = get_engine_entry(db_uri).session_factory()
+    try:
+        yield session
+        session.commit()
+    except Exception as e:
+        logger.exception("Error raised in session_scope.  Session will be rolled back: "
+                         "db_uri='{uri}', error='{err}'".format(uri=db_uri, err=e))
+        session.rollback()
+        raise
+    finally:
+        session.close()
 
-    # configure Session class with desired options
-    Session = sessionmaker()
-
-    # later, we create the engine
-    engine = create_engine(f"{db_uri}?check_same_thread=False")
 
-    # associate it with our custom Session class
-    Session.configure(bind=engine)
+@contextmanager
+def thread_session_scope(db_uri):
+    """
+    Provide a transactional scope using the calling thread's reusable session.
 
-    session = Session()
+    Unlike session_scope(), the same Session object is handed out to every
+    call made from the same thread, so this must not be nested within itself.
+    """
+    session = get_engine_entry(db_uri).scoped_session()
     try:
         yield session
         session.commit()
     except Exception as e:
-        logger.exception("Error raised in session_scope.  Session will be rolled back: "
+        logger.exception("Error raised in thread_session_scope.  Session will be rolled back: "
                          "db_uri='{uri}', error='{err}'".format(uri=db_uri, err=e))
         session.rollback()
         raise
@@ -15,6 +15,7 @@ from looperget.utils.database import db_retrieve_table_daemon
 from looperget.utils.system_pi import assure_path_exists
 from looperget.utils.system_pi import cmd_output
 from looperget.utils.system_pi import set_user_grp
+from looperget.utils.timelapse_index import get_timelapse_index
 
 logger = logging.getLogger(__name__)
 
@@ -506,6 +507,12 @@ def camera_record(record_type, unique_id, duration_sec=None, tmp_filename=None):
                 mod_camera.timelapse_last_ts = timestamp_date.timestamp()
             new_session.commit()
 
+        if record_type == 'timelapse' and os.path.exists(path_file):
+            try:
+                get_timelapse_index().add(unique_id, path_file, timestamp_date.timestamp())
+            except Exception as err:
+                logger.exception(f"Could not add the image to the time-lapse index: {err}")
+
     if not os.path.exists(path_file):
         logger.error("No image was created. Check your settings and hardware for any issues.")
     else:
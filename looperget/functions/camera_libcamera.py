@@ -34,6 +34,7 @@ from looperget.utils.camera_functions import get_camera_function_image_info
 from looperget.utils.constraints_pass import constraints_pass_positive_value
 from looperget.utils.database import db_retrieve_table_daemon
 from looperget.utils.system_pi import assure_path_exists, cmd_output
+from looperget.utils.timelapse_index import get_timelapse_index
 
 
 def function_status(function_id):
@@ -654,6 +655,8 @@ class CustomModule(AbstractFunction):
             elif record_type == 'timelapse':
                 self.tl_last_file = self.set_custom_option("tl_last_file", filename)
                 self.tl_last_ts = self.set_custom_option("tl_last_ts", now)
+                if os.path.exists(path_file):
+                    get_timelapse_index().add(self.unique_id, path_file, now)
         except:
             self.logger.exception("libcamera")
 
@@ -158,29 +158,46 @@ class CustomModule(AbstractFunction):
             self.logger.error("Could not find Device Measurement")
             return
 
-        past_measurements = self.get_past_measurements(
+        stats = self.get_past_measurement_stats(
             self.select_measurement_device_id,
             self.select_measurement_measurement_id,
-            max_age=self.max_measure_age)
-
-        self.logger.debug("Past Measurements returned: {}".format(
-            past_measurements))
-
-        if not past_measurements:
-            self.logger.error(
-                "Could not find measurements within the set Max Age")
-            return False
-
-        measure = []
-        for each_measure in past_measurements:
-            measure.append(each_measure[1])
-
-        if len(measure) > 1:
-            stat_mean = float(sum(measure) / float(len(measure)))
-            stat_median = median(measure)
-            stat_minimum = min(measure)
-            stat_maximum = max(measure)
-            stdev_ = stdev(measure)
+            self.max_measure_age,
+            median=True)
+
+        if stats:
+            count = stats['count']
+        else:
+            past_measurements = self.get_past_measurements(
+                self.select_measurement_device_id,
+                self.select_measurement_measurement_id,
+                max_age=self.max_measure_age)
+
+            self.logger.debug("Past Measurements returned: {}".format(
+                past_measurements))
+
+            if not past_measurements:
+                self.logger.error(
+                    "Could not find measurements within the set Max Age")
+                return False
+
+            measure = []
+            for each_measure in past_measurements:
+                measure.append(each_measure[1])
+            count = len(measure)
+
+        if count > 1:
+            if stats:
+                stat_mean = stats['mean']
+                stat_median = stats['median']
+                stat_minimum = stats['min']
+                stat_maximum = stats['max']
+                stdev_ = stats['stdev']
+            else:
+                stat_mean = float(sum(measure) / float(len(measure)))
+                stat_median = median(measure)
+                stat_minimum = min(measure)
+                stat_maximum = max(measure)
+                stdev_ = stdev(measure)
             stdev_mean_upper = stat_mean + stdev_
             stdev_mean_lower = stat_mean - stdev_
 
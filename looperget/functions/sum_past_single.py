@@ -32,6 +32,7 @@ from looperget.looperget_client import DaemonControl
 from looperget.utils.constraints_pass import constraints_pass_positive_value
 from looperget.utils.database import db_retrieve_table_daemon
 from looperget.utils.influx import add_measurements_influxdb
+from looperget.utils.influx import past_seconds_stats
 from looperget.utils.influx import sum_past_seconds
 from looperget.utils.system_pi import get_measurement
 from looperget.utils.system_pi import return_measurement_info
@@ -148,12 +149,21 @@ class CustomModule(AbstractFunction):
         channel, unit, measurement = return_measurement_info(
             device_measurement, conversion)
 
-        sum_measurements = sum_past_seconds(
+        stats = past_seconds_stats(
             self.select_measurement_device_id,
             unit,
             channel,
             self.max_measure_age,
             measure=measurement)
+        if stats:
+            sum_measurements = stats['sum']
+        else:
+            sum_measurements = sum_past_seconds(
+                self.select_measurement_device_id,
+                unit,
+                channel,
+                self.max_measure_age,
+                measure=measurement)
 
         if not sum_measurements:
             self.logger.error(
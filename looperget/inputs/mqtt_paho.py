@@ -4,14 +4,13 @@ import datetime
 from flask_babel import lazy_gettext
 
 from looperget.config_translations import TRANSLATIONS
-from looperget.databases.models import Conversion
 from looperget.databases.models import InputChannel
 from looperget.inputs.base_input import AbstractInput
-from looperget.utils.actions import run_input_actions
 from looperget.utils.constraints_pass import constraints_pass_positive_value
 from looperget.utils.database import db_retrieve_table_daemon
-from looperget.utils.influx import add_measurements_influxdb
 from looperget.utils.inputs import parse_measurement
+from looperget.utils.measurement_ingest import MeasurementIngestQueue
+from looperget.utils.unit_conversion import get_conversion_cache
 from looperget.utils.utils import random_alphanumeric
 
 # Measurements
@@ -157,6 +156,8 @@ class InputModule(AbstractInput):
 
         self.log_level_debug = None
         self.client = None
+        self.topic_channels = {}
+        self.ingest = None
 
         self.mqtt_hostname = None
         self.mqtt_port = None
@@ -183,6 +184,7 @@ class InputModule(AbstractInput):
             InputChannel).filter(InputChannel.input_id == self.input_dev.unique_id).all()
         self.options_channels = self.setup_custom_channel_options_json(
             INPUT_INFORMATION['custom_channel_options'], input_channels)
+        self.setup_ingest()
 
         self.client = mqtt.Client(
             self.mqtt_clientid,
@@ -196,6 +198,22 @@ class InputModule(AbstractInput):
         if self.mqtt_use_tls:
             self.client.tls_set()
 
+    def setup_ingest(self):
+        """Map topics to channels and start the queue that parses and stores received messages."""
+        self.topic_channels = {}
+        for each_channel in self.channels_measurement:
+            self.topic_channels[self.options_channels['subscribe_topic'][each_channel]] = each_channel
+        if any(self.channels_conversion.values()):
+            get_conversion_cache().get(None)  # Build the cache before messages arrive
+
+        self.ingest = MeasurementIngestQueue(
+            self.unique_id,
+            self.parse_message,
+            input_logger=self.logger,
+            use_same_timestamp=INPUT_INFORMATION['measurements_use_same_timestamp'],
+            debug=self.log_level_debug)
+        self.ingest.start()
+
     def listener(self):
         try:
             self.callbacks_connect()
@@ -250,23 +268,22 @@ class InputModule(AbstractInput):
         self.logger.info(f"Log: {string}")
 
     def on_message(self, client, userdata, msg):
+        self.ingest.put((msg.topic, msg.payload, datetime.datetime.utcnow()))
+
+    def parse_message(self, message):
+        """Return the measurement of a received (topic, payload, timestamp) message, or None."""
+        topic, payload, datetime_utc = message
         try:
-            payload = msg.payload.decode()
-            self.logger.debug(f"Received message: topic: {msg.topic}, payload: {payload}")
+            payload = payload.decode()
+            self.logger.debug(f"Received message: topic: {topic}, payload: {payload}")
         except Exception as exc:
             self.logger.error(f"Payload could not be decoded: {exc}")
             return
 
-        datetime_utc = datetime.datetime.utcnow()
         measurement = {}
-        channel = None
-        for each_channel in self.channels_measurement:
-            if self.options_channels['subscribe_topic'][each_channel] == msg.topic:
-                self.logger.debug(f"Found channel {each_channel} with topic '{self.options_channels['subscribe_topic'][each_channel]}'")
-                channel = each_channel
-
+        channel = self.topic_channels.get(topic)
         if channel is None:
-            self.logger.error(f"Could not determine channel for topic '{msg.topic}'")
+            self.logger.error(f"Could not determine channel for topic '{topic}'")
             return
 
         try:
@@ -277,38 +294,26 @@ class InputModule(AbstractInput):
             measurement[channel]['unit'] = self.channels_measurement[channel].unit
             measurement[channel]['value'] = value
             measurement[channel]['timestamp_utc'] = datetime_utc
-            measurement = self.check_conversion(channel, measurement)
-
-            if measurement:
-                message, measurement = run_input_actions(self.unique_id, "", measurement, self.log_level_debug)
-
-                self.logger.debug(f"Adding measurement to influxdb: {measurement}")
-                add_measurements_influxdb(
-                    self.unique_id,
-                    measurement,
-                    use_same_timestamp=INPUT_INFORMATION['measurements_use_same_timestamp'])
+            return self.check_conversion(channel, measurement)
         except Exception as err:
             self.logger.error(f"Error processing message payload '{payload}': {err}")
 
     def check_conversion(self, channel, measurement):
         # Convert value/unit is conversion_id present and valid
         try:
-            if self.channels_conversion[channel]:
-                conversion = db_retrieve_table_daemon(
-                    Conversion,
-                    unique_id=self.channels_measurement[channel].conversion_id)
-                if conversion:
-                    meas = parse_measurement(
-                        self.channels_conversion[channel],
-                        self.channels_measurement[channel],
-                        measurement,
-                        channel,
-                        measurement[channel],
-                        timestamp=measurement[channel]['timestamp_utc'])
-
-                    measurement[channel]['measurement'] = meas[channel]['measurement']
-                    measurement[channel]['unit'] = meas[channel]['unit']
-                    measurement[channel]['value'] = meas[channel]['value']
+            # The Conversion was loaded when the input started
+            if self.channels_conversion.get(channel):
+                meas = parse_measurement(
+                    self.channels_conversion[channel],
+                    self.channels_measurement[channel],
+                    measurement,
+                    channel,
+                    measurement[channel],
+                    timestamp=measurement[channel]['timestamp_utc'])
+
+                measurement[channel]['measurement'] = meas[channel]['measurement']
+                measurement[channel]['unit'] = meas[channel]['unit']
+                measurement[channel]['value'] = meas[channel]['value']
         except:
             self.logger.exception("Checking conversion")
 
@@ -319,3 +324,10 @@ class InputModule(AbstractInput):
         self.running = False
         self.client.loop_stop()
         self.client.disconnect()
+        if self.ingest:
+            self.ingest.stop()
+
+    def ingest_status(self, args_dict=None):
+        """Return the counters of the queue of received messages."""
+        if self.ingest:
+            return self.ingest.status()
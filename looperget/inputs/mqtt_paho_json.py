@@ -3,15 +3,14 @@ import datetime
 import json
 
 from flask_babel import lazy_gettext
-from looperget.utils.actions import run_input_actions
 from looperget.config_translations import TRANSLATIONS
-from looperget.databases.models import Conversion
 from looperget.databases.models import InputChannel
 from looperget.inputs.base_input import AbstractInput
 from looperget.utils.constraints_pass import constraints_pass_positive_value
 from looperget.utils.database import db_retrieve_table_daemon
-from looperget.utils.influx import add_measurements_influxdb
 from looperget.utils.inputs import parse_measurement
+from looperget.utils.measurement_ingest import MeasurementIngestQueue
+from looperget.utils.unit_conversion import get_conversion_cache
 from looperget.utils.utils import random_alphanumeric
 
 # Measurements
@@ -172,6 +171,8 @@ class InputModule(AbstractInput):
         self.client = None
         self.jmespath = None
         self.options_channels = None
+        self.expressions = {}
+        self.ingest = None
 
         self.mqtt_hostname = None
         self.mqtt_port = None
@@ -200,6 +201,7 @@ class InputModule(AbstractInput):
             InputChannel).filter(InputChannel.input_id == self.input_dev.unique_id).all()
         self.options_channels = self.setup_custom_channel_options_json(
             INPUT_INFORMATION['custom_channel_options'], input_channels)
+        self.setup_ingest()
 
         self.client = mqtt.Client(
             self.mqtt_clientid,
@@ -213,6 +215,26 @@ class InputModule(AbstractInput):
         if self.mqtt_use_tls:
             self.client.tls_set()
 
+    def setup_ingest(self):
+        """Compile each channel's JMESPath expression and start the queue that parses and stores received messages."""
+        self.expressions = {}
+        for each_channel in self.channels_measurement:
+            json_name = self.options_channels['json_name'][each_channel]
+            try:
+                self.expressions[each_channel] = self.jmespath.compile(json_name)
+            except Exception as err:
+                self.logger.error(f"Invalid JMESPath expression '{json_name}' of channel {each_channel}: {err}")
+        if any(self.channels_conversion.values()):
+            get_conversion_cache().get(None)  # Build the cache before messages arrive
+
+        self.ingest = MeasurementIngestQueue(
+            self.unique_id,
+            self.parse_message,
+            input_logger=self.logger,
+            use_same_timestamp=INPUT_INFORMATION['measurements_use_same_timestamp'],
+            debug=self.log_level_debug)
+        self.ingest.start()
+
     def listener(self):
         self.callbacks_connect()
         self.connect()
@@ -268,11 +290,16 @@ class InputModule(AbstractInput):
         self.logger.info("Log: {}".format(string))
 
     def on_message(self, client, userdata, msg):
+        self.ingest.put((msg.topic, msg.payload, datetime.datetime.utcnow()))
+
+    def parse_message(self, message):
+        """Return the measurements found in a received (topic, payload, timestamp) message."""
+        topic, payload, datetime_utc = message
         try:
-            payload = msg.payload.decode()
+            payload = payload.decode()
             self.logger.debug(
                 "Received message: topic: {}, payload: {}".format(
-                    msg.topic, payload))
+                    topic, payload))
         except Exception as exc:
             self.logger.error(
                 "Payload could not be decoded: {}".format(exc))
@@ -283,18 +310,16 @@ class InputModule(AbstractInput):
         except ValueError as err:
             self.logger.error(
                 "Error parsing payload '{}' as JSON: {} ".format(
-                    msg.payload.decode(), err))
+                    payload, err))
             return
 
-        datetime_utc = datetime.datetime.utcnow()
         measurement = {}
-        for each_channel in self.channels_measurement:
-            json_name = self.options_channels['json_name'][each_channel]
+        for each_channel, expression in self.expressions.items():
+            json_name = expression.expression
             self.logger.debug("Searching JSON for {}".format(json_name))
 
             try:
-                jmesexpression = self.jmespath.compile(json_name)
-                value = float(jmesexpression.search(json_values))
+                value = float(expression.search(json_values))
                 self.logger.debug(
                     "Found key: {}, value: {}".format(json_name, value))
                 measurement[each_channel] = {}
@@ -308,36 +333,27 @@ class InputModule(AbstractInput):
                     "Error in JSON '{}' finding '{}': {}".format(
                         json_values, json_name, err))
 
-        message, measurement = run_input_actions(self.unique_id, "", measurement, self.log_level_debug)
-
-        self.logger.debug(f"Adding measurement to influxdb: {measurement}")
-        add_measurements_influxdb(
-            self.unique_id,
-            measurement,
-            use_same_timestamp=INPUT_INFORMATION['measurements_use_same_timestamp'])
+        return measurement
 
     def check_conversion(self, channel, measurement):
         # Convert value/unit is conversion_id present and valid
         try:
-            if self.channels_conversion[channel]:
-                conversion = db_retrieve_table_daemon(
-                    Conversion,
-                    unique_id=self.channels_measurement[channel].conversion_id)
-                if conversion:
-                    meas = parse_measurement(
-                        self.channels_conversion[channel],
-                        self.channels_measurement[channel],
-                        measurement,
-                        channel,
-                        measurement[channel],
-                        timestamp=measurement[channel]['timestamp_utc'])
-
-                    measurement[channel]['measurement'] = meas[channel]['measurement']
-                    measurement[channel]['unit'] = meas[channel]['unit']
-                    measurement[channel]['value'] = meas[channel]['value']
+            # The Conversion was loaded when the input started
+            if self.channels_conversion.get(channel):
+                meas = parse_measurement(
+                    self.channels_conversion[channel],
+                    self.channels_measurement[channel],
+                    measurement,
+                    channel,
+                    measurement[channel],
+                    timestamp=measurement[channel]['timestamp_utc'])
+
+                measurement[channel]['measurement'] = meas[channel]['measurement']
+                measurement[channel]['unit'] = meas[channel]['unit']
+                measurement[channel]['value'] = meas[channel]['value']
         except:
             self.logger.exception("Checking conversion")
-        
+
         return measurement
 
     def stop_input(self):
@@ -345,3 +361,10 @@ class InputModule(AbstractInput):
         self.running = False
         self.client.loop_stop()
         self.client.disconnect()
+        if self.ingest:
+            self.ingest.stop()
+
+    def ingest_status(self, args_dict=None):
+        """Return the counters of the queue of received messages."""
+        if self.ingest:
+            return self.ingest.status()
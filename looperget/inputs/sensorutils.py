@@ -8,8 +8,9 @@ import logging
 import math
 import os
 
-from looperget.databases.models import Conversion
-from looperget.utils.database import db_retrieve_table_daemon
+from looperget.utils.unit_conversion import convert_value
+from looperget.utils.unit_conversion import get_conversion_cache
+from looperget.utils.unit_conversion import round_converted
 
 logger = logging.getLogger(__name__)
 
@@ -35,16 +36,10 @@ def convert_units(conversion_id, measure_value):
     See UNIT_CONVERSIONS in config_devices_units.py for available conversions.
 
     :param conversion_id: conversion ID
-    :param measure_value: The value to convert
+    :param measure_value: The value (or list/array of values) to convert
     :return: converted value
     """
-    conversion = db_retrieve_table_daemon(Conversion, unique_id=conversion_id)
-    if conversion:
-        replaced_str = conversion.equation.replace('x', str(measure_value))
-        return float('{0:.5f}'.format(eval(replaced_str)))
-    else:
-        logger.error("Conversion not found, not converting.")
-        return measure_value
+    return convert_value(conversion_id, measure_value)
 
 
 def convert_from_x_to_y_unit(unit_from, unit_to, in_value):
@@ -57,12 +52,9 @@ def convert_from_x_to_y_unit(unit_from, unit_to, in_value):
     """
     if unit_from == unit_to:  # Units are the same, no conversion
         return in_value
-    conversion = db_retrieve_table_daemon(Conversion)
-    conversion = conversion.filter(Conversion.convert_unit_from == unit_from)
-    conversion = conversion.filter(Conversion.convert_unit_to == unit_to).first()
-    if conversion:
-        replaced_str = conversion.equation.replace('x', str(in_value))
-        return float('{0:.5f}'.format(eval(replaced_str)))
+    conversion, compiled = get_conversion_cache().get_units(unit_from, unit_to)
+    if compiled:
+        return round_converted(compiled(float(in_value)))
     else:
         logger.error("Conversion not found for '{uf}' to '{ut}'.".format(
             uf=unit_to, ut=unit_from))
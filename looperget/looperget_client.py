@@ -25,15 +25,20 @@ import argparse
 import datetime
 import logging
 import os
+import select
+import socket
 import sys
+import threading
+import time
 import traceback
+import weakref
 
 import Pyro5.errors
-from Pyro5.api import Proxy
+from Pyro5.api import BatchProxy, Proxy
 
 sys.path.append(os.path.abspath(os.path.join(os.path.realpath(__file__), '../..')))
 
-from looperget.config import PYRO_URI
+from looperget.config import PYRO_PROXY_IDLE_SEC, PYRO_PROXY_POOL_MAX, PYRO_URI
 from looperget.databases.models import SMTP, Misc
 from looperget.utils.database import db_retrieve_table_daemon
 from looperget.utils.send_data import send_email as send_email_notification
@@ -47,6 +52,142 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# Daemon calls that can safely run twice, so they're retried if the connection was closed during the call
+IDEMPOTENT_CALLS = frozenset([
+    'check_daemon', 'controller_is_active', 'controller_scheduler_status', 'daemon_status',
+    'function_status', 'get_condition_measurement', 'get_condition_measurement_dict',
+    'get_condition_measurements', 'influxdb_writer_status', 'is_in_virtualenv',
+    'latest_measurement', 'latest_measurement_cache_status', 'latest_measurements_update',
+    'measurement_metadata_status', 'output_off_latency', 'output_sec_currently_on', 'output_state',
+    'output_states_all',
+    'pid_get', 'ram_use', 'refresh_daemon_conditional_settings', 'refresh_daemon_misc_settings',
+    'refresh_daemon_trigger_settings', 'refresh_measurement_metadata', 'refresh_methods',
+    'rollup_status'
+])
+
+connected_proxies = weakref.WeakSet()  # PooledProxy of every thread with an open connection
+connected_proxies_lock = threading.Lock()
+
+
+def connection_closed(connection):
+    """Return whether the daemon closed a connection that has nothing to read (e.g. it restarted)."""
+    try:
+        readable, _, _ = select.select([connection.sock], [], [], 0)
+        return bool(readable) and not connection.sock.recv(1, socket.MSG_PEEK)
+    except (OSError, ValueError):
+        return True
+
+
+class PooledProxy:
+    """
+    A thread's reusable Pyro5 proxy
+
+    The connection stays open between calls. A connection the daemon closed
+    (e.g. it restarted) is replaced before a call is sent. If it's closed
+    during a call, only idempotent calls are retried on a new connection,
+    since the daemon may already have run the call.
+    """
+    def __init__(self, proxy):
+        object.__setattr__(self, '_proxy', proxy)
+        object.__setattr__(self, '_lock', threading.Lock())  # Held while the connection is used
+        object.__setattr__(self, '_closed', False)  # Connection closed by another thread
+        object.__setattr__(self, '_last_used', time.time())
+
+    def __getattr__(self, name):
+        if name.startswith('_pyro'):
+            return getattr(self._proxy, name)
+
+        def call(*args, **kwargs):
+            return self._call(lambda: getattr(self._proxy, name)(*args, **kwargs), name in IDEMPOTENT_CALLS)
+        return call
+
+    def __setattr__(self, name, value):
+        setattr(self._proxy, name, value)
+
+    def _call(self, function, idempotent):
+        """Run a function using the proxy, on a new connection if the daemon closed the last one."""
+        with self._lock:
+            if self._closed or (self._proxy._pyroConnection is not None and
+                                connection_closed(self._proxy._pyroConnection)):
+                self._proxy._pyroRelease()
+                object.__setattr__(self, '_closed', False)
+            reused = self._proxy._pyroConnection is not None
+            try:
+                return function()
+            except Pyro5.errors.ConnectionClosedError:
+                if not reused or not idempotent:
+                    raise
+                self._proxy._pyroRelease()
+                return function()
+            finally:
+                object.__setattr__(self, '_last_used', time.time())
+                with connected_proxies_lock:
+                    if self._proxy._pyroConnection is not None:
+                        connected_proxies.add(self)
+                    else:
+                        connected_proxies.discard(self)
+
+    def _close(self):
+        """Close the connection from any thread, unless it's being used. Return whether it's closed."""
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if self._proxy._pyroConnection is not None:
+                self._proxy._pyroConnection.close()
+                object.__setattr__(self, '_closed', True)
+            with connected_proxies_lock:
+                connected_proxies.discard(self)
+            return True
+        finally:
+            self._lock.release()
+
+
+def close_idle_proxies(current=None):
+    """
+    Close the connections of proxies left idle, and the least recently used beyond PYRO_PROXY_POOL_MAX
+
+    Each open connection holds one of the daemon's threads, so threads that
+    stopped calling the daemon don't keep them.
+    """
+    now = time.time()
+    with connected_proxies_lock:
+        proxies = sorted(connected_proxies, key=lambda each_proxy: each_proxy._last_used)
+    excess = len(proxies) + (current not in proxies) - PYRO_PROXY_POOL_MAX
+    for each_proxy in proxies:
+        if each_proxy is current:
+            continue
+        if (excess > 0 or now - each_proxy._last_used > PYRO_PROXY_IDLE_SEC) and each_proxy._close():
+            excess -= 1
+
+
+class ProxyPool(threading.local):
+    """
+    Per-thread Pyro5 proxies, keyed by URI
+
+    Pyro5 proxies can only be used by the thread that owns them, so each
+    thread keeps its own. A proxy of a thread that ends is closed when it's
+    garbage collected, and the connections of idle proxies, or of too many,
+    are closed when a proxy is taken from the pool.
+    """
+    def __init__(self):
+        self.proxies = {}
+        self.pid = os.getpid()
+
+    def get(self, uri):
+        if self.pid != os.getpid():
+            # Don't share a connection with the parent of a forked process
+            self.proxies = {}
+            self.pid = os.getpid()
+        proxy = self.proxies.get(uri)
+        if proxy is None:
+            proxy = self.proxies[uri] = PooledProxy(Proxy(uri))
+        close_idle_proxies(current=proxy)
+        return proxy
+
+
+proxy_pool = ProxyPool()
+
+
 class DaemonControl:
     """Communicate with the daemon to execute commands or retrieve information."""
     def __init__(self, pyro_uri=PYRO_URI, pyro_timeout=None):
@@ -64,7 +205,7 @@ class DaemonControl:
 
     def proxy(self, timeout=None):
         try:
-            proxy = Proxy(self.uri)
+            proxy = proxy_pool.get(self.uri)
             if timeout:
                 proxy._pyroTimeout = timeout
             else:
@@ -73,6 +214,35 @@ class DaemonControl:
         except Exception as e:
             logger.error(f"Pyro5 proxy error: {e}")
 
+    def call_many(self, calls, timeout=None):
+        """
+        Call several daemon methods in one round trip
+
+        example:
+            call_many([('output_states_all',), ('pid_get', (pid_id, 'setpoint'))])
+
+        :param calls: tuples of method name, and optionally args and kwargs
+        :type calls: list
+        :return: the return value of each call, in order
+        :rtype: list
+        """
+        proxy = self.proxy(timeout=timeout)
+        if proxy is None:
+            # The error creating the proxy was logged by proxy()
+            raise Pyro5.errors.CommunicationError("Could not create a proxy to the daemon")
+
+        calls = [(each_call,) if isinstance(each_call, str) else each_call for each_call in calls]
+
+        def run_batch():
+            batch = BatchProxy(proxy._proxy)
+            for each_call in calls:
+                args = each_call[1] if len(each_call) > 1 else ()
+                kwargs = each_call[2] if len(each_call) > 2 else {}
+                getattr(batch, each_call[0])(*args, **kwargs)
+            return list(batch())
+
+        return proxy._call(run_batch, all(each_call[0] in IDEMPOTENT_CALLS for each_call in calls))
+
     #
     # Status functions
     #
@@ -118,6 +288,34 @@ class DaemonControl:
     def ram_use(self):
         return self.proxy().ram_use()
 
+    def influxdb_writer_status(self):
+        return self.proxy().influxdb_writer_status()
+
+    def latest_measurement(self, unique_id, unit, channel, measure=None, max_age=None):
+        return self.proxy().latest_measurement(
+            unique_id, unit, channel, measure=measure, max_age=max_age)
+
+    def latest_measurement_cache_status(self):
+        return self.proxy().latest_measurement_cache_status()
+
+    def latest_measurements_update(self, updates):
+        return self.proxy().latest_measurements_update(updates)
+
+    def refresh_measurement_metadata(self):
+        return self.proxy().refresh_measurement_metadata()
+
+    def measurement_metadata_status(self):
+        return self.proxy().measurement_metadata_status()
+
+    def refresh_methods(self):
+        return self.proxy().refresh_methods()
+
+    def controller_scheduler_status(self):
+        return self.proxy().controller_scheduler_status()
+
+    def rollup_status(self):
+        return self.proxy().rollup_status()
+
     #
     # Daemon
     #
@@ -192,6 +390,9 @@ class DaemonControl:
     def get_condition_measurement_dict(self, condition_id):
         return self.proxy().get_condition_measurement_dict(condition_id)
 
+    def get_condition_measurements(self, conditional_id):
+        return self.proxy().get_condition_measurements(conditional_id)
+
     #
     # Output Controller
     #
@@ -225,6 +426,9 @@ class DaemonControl:
         """Return the amount of seconds an on/off output channel has been on."""
         return self.proxy().output_sec_currently_on(output_id, output_channel)
 
+    def output_off_latency(self):
+        return self.proxy().output_off_latency()
+
     def output_setup(self, action, output_id):
         return self.proxy().output_setup(action, output_id)
 
@@ -38,10 +38,13 @@ import timeit
 import traceback
 from logging import handlers
 
+from Pyro5 import config as pyro_config
 from Pyro5.api import Proxy, expose, serve
 
-from looperget.config import (DAEMON_LOG_FILE, DOCKER_CONTAINER, LOOPERGET_DB_PATH,
-                           LOOPERGET_VERSION, STATS_CSV, STATS_INTERVAL,
+from looperget.config import (DAEMON_LOG_FILE, DOCKER_CONTAINER,
+                           INFLUXDB_SPOOL_MAX_MB, INFLUXDB_SPOOL_PATH,
+                           LOOPERGET_DB_PATH, LOOPERGET_VERSION,
+                           PYRO_THREADPOOL_SIZE, STATS_CSV, STATS_INTERVAL,
                            UPGRADE_CHECK_INTERVAL)
 from looperget.controllers.controller_conditional import ConditionalController
 from looperget.controllers.controller_function import FunctionController
@@ -56,13 +59,21 @@ from looperget.databases.utils import session_scope
 from looperget.devices.camera import camera_record
 from looperget.utils.actions import (get_condition_value,
                                   get_condition_value_dict,
+                                  get_condition_values,
                                   parse_action_information, trigger_action,
                                   trigger_controller_actions)
 from looperget.utils.database import db_retrieve_table_daemon
 from looperget.utils.github_release_info import LoopergetRelease
+from looperget.utils.influx import get_influxdb_writer, read_raw_points
+from looperget.utils.latest_values import get_latest_value_cache
+from looperget.utils.measurement_metadata import get_measurement_metadata
+from looperget.utils.method import get_method_cache
+from looperget.utils.rollups import RollupJob, get_rollup_store
+from looperget.utils.scheduler import get_controller_scheduler
 from looperget.utils.stats import (add_update_csv, recreate_stat_file,
                                 return_stat_file_dict, send_anonymous_stats)
 from looperget.utils.tools import generate_output_usage_report, next_schedule
+from looperget.utils.unit_conversion import get_conversion_cache
 
 
 formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
@@ -90,6 +101,16 @@ class DaemonController:
         self.daemon_run = True
         self.terminated = False
 
+        # Save measurements to disk while the measurement database is unavailable
+        get_influxdb_writer().enable_spool(
+            INFLUXDB_SPOOL_PATH, INFLUXDB_SPOOL_MAX_MB * 1024 * 1024)
+
+        # Answer the latest value of series this process writes without querying influxdb
+        get_latest_value_cache().enable()
+
+        # Roll up measurements into coarser buckets for long-range queries
+        self.rollup_job = RollupJob(get_rollup_store(), read_raw_points)
+
         # Actions
         self.actions = {}
 
@@ -144,6 +165,8 @@ class DaemonController:
         except Exception:
             self.logger.exception("Could not start all controllers")
 
+        self.rollup_job.start()
+
         self.startup_time = timeit.default_timer() - self.startup_timer
         self.logger.info(
             f"Looperget daemon started in {self.startup_time:.3f} seconds")
@@ -208,6 +231,10 @@ class DaemonController:
     def get_condition_measurement_dict(condition_id):
         return get_condition_value_dict(condition_id)
 
+    @staticmethod
+    def get_condition_measurements(conditional_id):
+        return get_condition_values(conditional_id)
+
     @staticmethod
     def determine_controller_type(unique_id):
         db_tables = {
@@ -341,6 +368,7 @@ class DaemonController:
                     return 1,
                 finally:
                     self.controller[cont_type].pop(cont_id, None)
+                    get_latest_value_cache().remove_device(cont_id)
 
             else:
                 message = f"Could not deactivate {cont_type} controller with ID " \
@@ -696,6 +724,7 @@ class DaemonController:
 
     def refresh_daemon_conditional_settings(self, unique_id):
         try:
+            get_measurement_metadata().invalidate()
             return self.controller['Conditional'][unique_id].refresh_settings()
         except Exception as except_msg:
             message = f"Could not refresh conditional settings: {except_msg}"
@@ -711,11 +740,16 @@ class DaemonController:
             self.output_usage_report_span = misc.output_usage_report_span
             self.output_usage_report_day = misc.output_usage_report_day
             self.output_usage_report_hour = misc.output_usage_report_hour
+            get_influxdb_writer().invalidate()
+            get_measurement_metadata().invalidate()
+            get_conversion_cache().invalidate()
+            get_method_cache().invalidate()
         except Exception:
             self.logger.exception("Could not refresh misc settings")
 
     def refresh_daemon_trigger_settings(self, unique_id):
         try:
+            get_measurement_metadata().invalidate()
             return self.controller['Trigger'][unique_id].refresh_settings()
         except Exception:
             self.logger.exception("Could not refresh trigger settings")
@@ -796,6 +830,8 @@ class DaemonController:
         :type output_id: str
         """
         try:
+            if action == 'Delete':
+                get_latest_value_cache().remove_device(output_id)
             return self.controller['Output'].output_setup(action, output_id)
         except Exception as except_msg:
             message = f"Could not set up output: {except_msg}"
@@ -824,6 +860,68 @@ class DaemonController:
         except Exception:
             self.logger.exception(f"Could not query all output state")
 
+    @staticmethod
+    def influxdb_writer_status():
+        """Return the counters of the influxdb write queue."""
+        return get_influxdb_writer().status()
+
+    @staticmethod
+    def latest_measurement(unique_id, unit, channel, measure=None, max_age=None):
+        """
+        Return the latest [epoch, value] the daemon wrote for a series
+
+        :return: list of time and value, or None if not cached within max_age
+        :rtype: list or None
+        """
+        cached = get_latest_value_cache().get(
+            unique_id, unit, channel, measure, max_age=max_age)
+        if cached:
+            return list(cached)
+
+    @staticmethod
+    def latest_measurement_cache_status():
+        """Return the hit/miss counters of the latest value cache."""
+        return get_latest_value_cache().status()
+
+    @staticmethod
+    def latest_measurements_update(updates):
+        """
+        Store values another process wrote to influxdb as the latest of their series
+
+        :param updates: [unique_id, unit, channel, measure, epoch, value] of each value written
+        :type updates: list
+        """
+        cache = get_latest_value_cache()
+        for unique_id, unit, channel, measure, epoch, value in updates:
+            cache.update(unique_id, unit, channel, measure, epoch, value)
+
+    @staticmethod
+    def refresh_measurement_metadata():
+        """Rebuild the measurement metadata and conversion caches on their next lookup."""
+        get_measurement_metadata().invalidate()
+        get_conversion_cache().invalidate()
+        return "Success"
+
+    @staticmethod
+    def refresh_methods():
+        """Recompile method handlers on their next use, after methods change."""
+        get_method_cache().invalidate()
+        return "Success"
+
+    @staticmethod
+    def measurement_metadata_status():
+        """Return the size and hit/miss counters of the measurement metadata cache."""
+        return get_measurement_metadata().status()
+
+    @staticmethod
+    def controller_scheduler_status():
+        """Return the wakeup and dispatch counters of the controller scheduler, and the thread count."""
+        return get_controller_scheduler().status()
+
+    def rollup_status(self):
+        """Return the period covered by the rollups and the counters of the rollup job."""
+        return self.rollup_job.status()
+
     def startup_stats(self):
         """Ensure existence of statistics file and save daemon startup time."""
         # if statistics file doesn't exist, create it
@@ -938,6 +1036,12 @@ class DaemonController:
         except Exception as err:
             self.logger.info(f"Widget controller had an issue stopping: {err}")
 
+        self.rollup_job.stop()
+
+        if not get_influxdb_writer().flush(timeout=10):
+            self.logger.error("Measurements still queued for influxdb at shutdown: "
+                              f"{get_influxdb_writer().status()}")
+
     def trigger_action(self, action_id, value={}, debug=False):
         try:
             return trigger_action(
@@ -1114,6 +1218,10 @@ class PyroServer(object):
     def get_condition_measurement_dict(self, condition_id):
         return self.looperget.get_condition_measurement_dict(condition_id)
 
+    def get_condition_measurements(self, conditional_id):
+        """Return the values of all conditions of a Conditional."""
+        return self.looperget.get_condition_measurements(conditional_id)
+
     def module_function(self, controller_type, unique_id, button_id, args_dict, thread=True, return_from_function=False):
         """execute custom button function."""
         return self.looperget.module_function(
@@ -1227,11 +1335,48 @@ class PyroServer(object):
         return self.looperget.output_off(
             output_id, output_channel=output_channel, trigger_conditionals=trigger_conditionals)
 
+    def influxdb_writer_status(self):
+        """Return the counters of the influxdb write queue."""
+        return self.looperget.influxdb_writer_status()
+
+    def latest_measurement(self, unique_id, unit, channel, measure=None, max_age=None):
+        """Return the latest cached measurement of a series."""
+        return self.looperget.latest_measurement(
+            unique_id, unit, channel, measure=measure, max_age=max_age)
+
+    def latest_measurement_cache_status(self):
+        """Return the hit/miss counters of the latest value cache."""
+        return self.looperget.latest_measurement_cache_status()
+
+    def refresh_measurement_metadata(self):
+        """Rebuild the measurement metadata cache after measurements change."""
+        return self.looperget.refresh_measurement_metadata()
+
+    def refresh_methods(self):
+        """Recompile the method handlers after methods change."""
+        return self.looperget.refresh_methods()
+
+    def measurement_metadata_status(self):
+        """Return the counters of the measurement metadata cache."""
+        return self.looperget.measurement_metadata_status()
+
+    def controller_scheduler_status(self):
+        """Return the counters of the controller scheduler."""
+        return self.looperget.controller_scheduler_status()
+
+    def rollup_status(self):
+        """Return the coverage and counters of the measurement rollups."""
+        return self.looperget.rollup_status()
+
     def output_sec_currently_on(self, output_id, output_channel=None):
         """Turns the amount of time a output has already been on."""
         return self.looperget.controller['Output'].output_sec_currently_on(
             output_id, output_channel=output_channel)
 
+    def output_off_latency(self):
+        """Return a histogram of how late outputs turned off after their on duration ended."""
+        return self.looperget.controller['Output'].output_off_latency()
+
     def output_setup(self, action, output_id):
         """Add, delete, or modify a output in the running output controller."""
         return self.looperget.output_setup(action, output_id)
@@ -1303,6 +1448,8 @@ class PyroDaemon(threading.Thread):
     def run(self):
         try:
             self.logger.info("Starting Pyro5 daemon")
+            # Clients keep their connections open, each occupying a server thread
+            pyro_config.THREADPOOL_SIZE = PYRO_THREADPOOL_SIZE
             serve({
                 PyroServer(self.looperget): 'looperget.pyro_server',
             }, host="0.0.0.0", port=9080, use_ns=False)
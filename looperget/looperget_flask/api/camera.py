@@ -113,14 +113,10 @@ class CameraGetLastImage(Resource):
         else:
             abort(422, custom=f'Unknown image type: {img_type}')
 
-        if path and os.path.isdir(path):
-            files = (files for files in os.listdir(path)
-                     if os.path.isfile(os.path.join(path, files)))
-        else:
-            files = []
-
         try:
-            if filename and filename in files:
+            # Check only the latest file, rather than listing the directory of every image
+            if (path and filename and filename == os.path.basename(filename) and
+                    os.path.isfile(os.path.join(path, filename))):
                 path_file = os.path.join(path, filename)
                 if os.path.abspath(path_file).startswith(path):
                     return send_file(path_file, mimetype='image/jpeg')
@@ -86,7 +86,7 @@ class MeasurementsCreate(Resource):
 
         try:
             return_ = write_influxdb_value(
-                unique_id, unit, value, channel=channel, timestamp=timestamp)
+                unique_id, unit, value, channel=channel, timestamp=timestamp, block=True)
 
             if return_:
                 abort(500)
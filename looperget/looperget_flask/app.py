@@ -5,19 +5,24 @@
 import base64
 import logging
 import os
+import threading
 
 import flask_login
-from flask import Flask, flash, redirect, request, url_for
+from flask import (Flask, current_app, flash, has_app_context, redirect,
+                   request, url_for)
 from flask_babel import Babel, gettext
 from flask_compress import Compress
 from flask_limiter import Limiter
 from flask_login import current_user
 from flask_session import Session
+from flask_sqlalchemy.session import Session as FlaskSession
 from flask_talisman import Talisman
+from sqlalchemy import event
 
 from looperget.config import INSTALL_DIRECTORY, LANGUAGES, ProdConfig
 from looperget.databases.models import Misc, User, Widget, populate_db
 from looperget.databases.utils import session_scope
+from looperget.looperget_client import DaemonControl
 from looperget.looperget_flask import (routes_admin, routes_authentication,
                                  routes_dashboard, routes_function,
                                  routes_general, routes_input, routes_method,
@@ -27,7 +32,13 @@ from looperget.looperget_flask import (routes_admin, routes_authentication,
 from looperget.looperget_flask.api import api_blueprint, init_api
 from looperget.looperget_flask.extensions import db
 from looperget.looperget_flask.utils.utils_general import get_ip_address
+from looperget.looperget_flask.utils.utils_measurement_catalog import (
+    get_measurement_catalog, session_changes_catalog)
 from looperget.utils.layouts import update_layout
+from looperget.utils.measurement_metadata import (get_measurement_metadata,
+                                                  session_changes_metadata)
+from looperget.utils.method import session_changes_methods
+from looperget.utils.unit_conversion import get_conversion_cache
 from looperget.utils.widgets import parse_widget_information
 
 logger = logging.getLogger(__name__)
@@ -64,6 +75,12 @@ def register_extensions(app):
     app = extension_limiter(app)  # Limit authentication blueprint requests to 200 per minute
     app = extension_login_manager(app)  # User login management
     app = extension_session(app)  # Server side session
+    # Invalidate cached measurement metadata on save
+    register_cache_invalidation(session_changes_metadata, 'measurement_metadata_changed', invalidate_metadata)
+    # Recompile the daemon's method handlers on save
+    register_cache_invalidation(session_changes_methods, 'methods_changed', refresh_methods)
+    # Rebuild the dashboard's measurement catalog on save
+    register_cache_invalidation(session_changes_catalog, 'measurement_catalog_changed', invalidate_catalog)
 
     # Create and populate database if it doesn't exist
     with app.app_context():
@@ -88,6 +105,71 @@ def register_extensions(app):
                     Talisman(app, content_security_policy=csp)
 
 
+cache_invalidation_listeners = {}
+
+
+def register_cache_invalidation(predicate, info_key, on_commit):
+    """
+    Call on_commit() when a session commits changes for which predicate(session) is true
+
+    Flushes that change something are noted in session.info[info_key], so
+    on_commit() is only called once they're committed, and not on rollback.
+    Registering the same info_key again (e.g. another app) is ignored.
+    """
+    listeners = cache_invalidation_listeners.get(info_key)
+    if listeners is None:
+        def check_changes(session, flush_context):
+            if predicate(session):
+                session.info[info_key] = True
+
+        def commit_changes(session):
+            if session.info.pop(info_key, False):
+                on_commit()
+
+        def discard_changes(session):
+            session.info.pop(info_key, None)
+
+        listeners = cache_invalidation_listeners[info_key] = (('after_flush', check_changes),
+                                                              ('after_commit', commit_changes),
+                                                              ('after_rollback', discard_changes))
+    for identifier, listener in listeners:
+        if not event.contains(FlaskSession, identifier, listener):
+            event.listen(FlaskSession, identifier, listener)
+
+
+def refresh_daemon_in_background(refresh):
+    if has_app_context() and not current_app.config['TESTING']:
+        threading.Thread(target=refresh, daemon=True).start()
+
+
+def invalidate_metadata():
+    get_measurement_metadata().invalidate()
+    get_conversion_cache().invalidate()
+    refresh_daemon_in_background(refresh_daemon_metadata)
+
+
+def refresh_daemon_metadata():
+    try:
+        DaemonControl().refresh_measurement_metadata()
+    except Exception as err:
+        logger.debug(f"Could not refresh daemon measurement metadata: {err}")
+
+
+def refresh_methods():
+    refresh_daemon_in_background(refresh_daemon_methods)
+
+
+def refresh_daemon_methods():
+    try:
+        DaemonControl().refresh_methods()
+    except Exception as err:
+        logger.debug(f"Could not refresh daemon methods: {err}")
+
+
+def invalidate_catalog():
+    get_measurement_catalog().invalidate()
+
+
 def register_blueprints(app):
     """register blueprints to the app."""
     app.register_blueprint(routes_admin.blueprint)  # register admin views
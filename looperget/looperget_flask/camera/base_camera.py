@@ -1,134 +1,192 @@
 # -*- coding: utf-8 -*-
-# From https://github.com/miguelgrinberg/flask-video-streaming
+# Based on https://github.com/miguelgrinberg/flask-video-streaming
+"""
+Camera streams, shared by every viewer of a camera
+
+Each camera has one frame hub: one thread captures frames from the camera
+while it has viewers, and each new frame is broadcast to the viewers with a
+condition variable. Viewers are sent the same frame bytes, and a viewer
+that's slower than the camera (or capped to a lower frame rate) is sent the
+latest frame when it's ready for one, skipping the frames in between.
+"""
 import logging
 import threading
 import time
 
-try:
-    from greenlet import getcurrent as get_ident
-except ImportError:
-    try:
-        from thread import get_ident
-    except ImportError:
-        from _thread import get_ident
+from looperget.config import CAMERA_STREAM_IDLE_SEC
 
 logger = logging.getLogger(__name__)
 
+FRAME_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+FRAME_FOOTER = b'\r\n'
 
-class CameraEvent(object):
-    """An Event-like class that signals all active clients when a new frame is
-    available.
-    """
-    def __init__(self):
-        self.events = {}
-
-    def wait(self):
-        """Invoked from each client's thread to wait for the next frame."""
-        ident = get_ident()
-        if ident not in self.events:
-            # this is a new client
-            # add an entry for it in the self.events dict
-            # each entry has two elements, a threading.Event() and a timestamp
-            self.events[ident] = [threading.Event(), time.time()]
-        return self.events[ident][0].wait()
-
-    def set(self):
-        """Invoked by the camera thread when a new frame is available."""
-        now = time.time()
-        remove = None
-        for ident, event in self.events.items():
-            if not event[0].isSet():
-                # if this client's event is not set, then set it
-                # also update the last set timestamp to now
-                event[0].set()
-                event[1] = now
-            else:
-                # if the client's event is already set, it means the client
-                # did not process a previous frame
-                # if the event stays set for more than 5 seconds, then assume
-                # the client is gone and remove it
-                if now - event[1] > 5:
-                    remove = ident
-        if remove:
-            del self.events[remove]
-
-    def clear(self):
-        """Invoked from each client's thread after a frame was processed."""
-        self.events[get_ident()][0].clear()
 
+class FrameHub:
+    """
+    Latest frame of a camera, captured by one thread while the camera has viewers
 
-class BaseCamera(object):
-    thread = {}  # background thread that reads frames from camera
-    frame = {}  # current frame is stored here by background thread
-    last_access = {}  # time of last client access to the camera
-    event = {}
-    running = {}
+    Viewers are counted with open() and close(), and the capture thread
+    stops (closing the camera) once the camera has had no viewers for
+    idle_sec.
 
-    def __init__(self, unique_id=None):
-        """Start the background camera thread if it isn't running yet."""
+    :param unique_id: unique ID of the camera
+    :param frames: function that returns a generator of frames from the camera
+    :param idle_sec: seconds the camera is kept open without viewers
+    """
+    def __init__(self, unique_id, frames, idle_sec=CAMERA_STREAM_IDLE_SEC):
         self.unique_id = unique_id
-        BaseCamera.event[self.unique_id] = CameraEvent()
-        BaseCamera.running[self.unique_id] = True
+        self.frames = frames
+        self.idle_sec = idle_sec
+        self.condition = threading.Condition()
+        self.frame = None
+        self.sequence = 0
+        self.viewers = 0
+        self.last_viewer = time.monotonic()
+        self.running = False
+        self.generation = 0  # Incremented for each capture thread, so a stopped one exits
+        self.thread = None
+
+    def open(self):
+        """Add a viewer, starting the capture thread if it isn't running."""
+        with self.condition:
+            self.viewers += 1
+            if not self.running:
+                self.running = True
+                self.generation += 1
+                self.frame = None
+                self.thread = threading.Thread(
+                    target=self._thread, args=(self.generation, self.thread),
+                    name=f'camera_{self.unique_id}', daemon=True)
+                self.thread.start()
+
+    def close(self):
+        """Remove a viewer."""
+        with self.condition:
+            self.viewers -= 1
+            self.last_viewer = time.monotonic()
+
+    def stop(self):
+        """Stop the capture thread after the next frame, ending the streams."""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def wait_frame(self, sequence, timeout=None):
+        """
+        Return the latest frame, waiting for one newer than sequence
+
+        :param sequence: sequence number of the last frame the viewer was sent (0 for none)
+        :param timeout: seconds to wait for a new frame
+        :return: sequence number and frame, with frame None if the capture stopped
+            or no new frame was captured before the timeout
+        :rtype: (int, bytes)
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: (self.sequence > sequence and self.frame is not None) or not self.running,
+                timeout)
+            if not self.running or self.frame is None or self.sequence <= sequence:
+                return sequence, None
+            return self.sequence, self.frame
+
+    def _thread(self, generation, previous_thread):
+        if previous_thread is not None:
+            previous_thread.join()  # Wait for a stopped thread to close the camera
+        logger.info(f'[{self.unique_id}] Starting camera thread')
+        frames_iterator = None
+        try:
+            frames_iterator = self.frames()
+            for frame in frames_iterator:
+                with self.condition:
+                    if not self.running or self.generation != generation:
+                        logger.info(f'[{self.unique_id}] Camera thread instructed to shut down')
+                        break
+                    self.frame = frame
+                    self.sequence += 1
+                    self.condition.notify_all()  # Send the frame to the viewers
+
+                    if not self.viewers and time.monotonic() - self.last_viewer > self.idle_sec:
+                        logger.info(f'[{self.unique_id}] Stopping camera thread due to inactivity')
+                        # Stopped while holding the lock, so a viewer opening from now on starts a new thread
+                        self.running = False
+                        self.frame = None
+                        self.condition.notify_all()
+                        break
+        except Exception:
+            logger.exception(f'[{self.unique_id}] Camera thread error')
+        finally:
+            with self.condition:
+                if self.generation == generation:
+                    self.running = False
+                    self.frame = None
+                self.condition.notify_all()
+            if frames_iterator is not None:
+                frames_iterator.close()  # Close the camera
+
+    def stream(self, max_fps=None, timeout=10):
+        """
+        Generator of multipart JPEG chunks of a viewer, for /video_feed
+
+        :param max_fps: most frames per second sent to this viewer (default: every frame)
+        :param timeout: seconds without a frame before the stream ends
+        """
+        min_period = 1 / max_fps if max_fps else 0
+        self.open()
+        try:
+            sequence = 0
+            while True:
+                sent = time.monotonic()
+                sequence, frame = self.wait_frame(sequence, timeout)
+                if frame is None:
+                    break
+                # The same frame is sent to every viewer, without copying it into a multipart chunk
+                yield FRAME_HEADER
+                yield frame
+                yield FRAME_FOOTER
+                if min_period:
+                    time.sleep(max(0.0, sent + min_period - time.monotonic()))
+        finally:
+            self.close()
 
-        if self.unique_id not in BaseCamera.thread:
-            BaseCamera.thread[self.unique_id] = None
 
-        if BaseCamera.thread[self.unique_id] is None:
-            BaseCamera.last_access[self.unique_id] = time.time()
+class BaseCamera(object):
+    hubs = {}  # Frame hub of each camera
+    hubs_lock = threading.Lock()
 
-            # start background frame thread
-            BaseCamera.thread[self.unique_id] = threading.Thread(
-                target=self._thread, args=(self.unique_id,))
-            BaseCamera.thread[self.unique_id].start()
+    def __init__(self, unique_id=None):
+        """Get the frame hub of the camera. The camera is opened when it's streamed."""
+        self.unique_id = unique_id
+        with BaseCamera.hubs_lock:
+            hub = BaseCamera.hubs.get(unique_id)
+            if hub is None or (hub.frames != self.frames and not hub.running):
+                hub = FrameHub(unique_id, self.frames)
+                BaseCamera.hubs[unique_id] = hub
+        self.hub = hub
 
-            # wait until frames are available
-            while self.get_frame() is None:
-                time.sleep(0)
+    def stream(self, max_fps=None):
+        """Return a generator of multipart JPEG chunks, for a viewer of /video_feed."""
+        return self.hub.stream(max_fps=max_fps)
 
     def get_frame(self):
-        """Return the current camera frame."""
-        BaseCamera.last_access[self.unique_id] = time.time()
-
-        # wait for a signal from the camera thread
-        BaseCamera.event[self.unique_id].wait()
-        BaseCamera.event[self.unique_id].clear()
-
-        return BaseCamera.frame[self.unique_id]
+        """Return the next camera frame."""
+        self.hub.open()
+        try:
+            return self.hub.wait_frame(self.hub.sequence)[1]
+        finally:
+            self.hub.close()
 
     @staticmethod
     def frames():
         """"Generator that returns frames from the camera."""
         raise RuntimeError('Must be implemented by subclasses')
 
-    @classmethod
-    def _thread(cls, unique_id):
-        """Camera background thread."""
-        logger.info('[{id}] Starting camera thread'.format(id=unique_id))
-        frames_iterator = cls.frames()
-        for frame in frames_iterator:
-            BaseCamera.frame[unique_id] = frame
-            BaseCamera.event[unique_id].set()  # send signal to clients
-            time.sleep(0)
-
-            # if there haven't been any clients asking for frames in
-            # the last 10 seconds then stop the thread
-            if time.time() - BaseCamera.last_access[unique_id] > 10:
-                frames_iterator.close()
-                logger.info('[{id}] Stopping camera thread due to '
-                            'inactivity'.format(id=unique_id))
-                break
-            if not BaseCamera.running[unique_id]:
-                frames_iterator.close()
-                logger.info('[{id}] Camera thread instructed to '
-                            'shut down'.format(id=unique_id))
-                break
-        BaseCamera.thread[unique_id] = None
-        BaseCamera.running[unique_id] = False
-
     @staticmethod
     def stop(unique_id):
-        BaseCamera.running[unique_id] = False
+        hub = BaseCamera.hubs.get(unique_id)
+        if hub:
+            hub.stop()
 
     @staticmethod
     def is_running(unique_id):
-        return BaseCamera.running[unique_id]
+        hub = BaseCamera.hubs.get(unique_id)
+        return bool(hub and hub.running)
@@ -29,10 +29,13 @@ class Camera(BaseCamera):
 
         wait_period = float(1 / settings.stream_fps)
 
-        while True:
-            # read current frame
-            _, img = camera.read()
-
-            # encode as a jpeg image and return it
-            time.sleep(wait_period)
-            yield cv2.imencode('.jpg', img)[1].tobytes()
+        try:
+            while True:
+                # read current frame
+                _, img = camera.read()
+
+                # encode as a jpeg image and return it
+                time.sleep(wait_period)
+                yield cv2.imencode('.jpg', img)[1].tobytes()
+        finally:
+            camera.release()  # The stream has no more viewers
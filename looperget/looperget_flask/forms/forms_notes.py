@@ -75,6 +75,8 @@ class NotesShow(FlaskForm):
     sort_by = SelectField('정렬 기준', choices=sort_by_choices)
     sort_direction = SelectField('정렬 방향', choices=sort_direction_choices)
     notes_show = SubmitField('노트 표시')
+    notes_next = SubmitField('다음 페이지')
+    cursor = StringField(widget=widgets.HiddenInput())  # Position of the next page of notes
     notes_export = SubmitField('노트 내보내기')
     notes_import_file = FileField('노트 ZIP 파일')
     notes_import_upload = SubmitField('노트 가져오기')
@@ -2,27 +2,26 @@
 """collection of Page endpoints."""
 import flask_login
 import logging
-import os
 import subprocess
+import time
 from flask import redirect, render_template, request, url_for
 from flask.blueprints import Blueprint
 from sqlalchemy import and_
 
 from looperget.config import INSTALL_DIRECTORY
-from looperget.config import PATH_TEMPLATE_USER
 from looperget.databases.models import (PID, Camera, Conditional, Conversion,
                                      CustomController, Dashboard,
-                                     DeviceMeasurements, Input, Measurement,
-                                     Method, Misc, NoteTags, Output,
-                                     OutputChannel, Trigger, Unit, Widget)
+                                     DeviceMeasurements, Input, Misc, NoteTags,
+                                     Output, OutputChannel, Trigger, Widget)
 from looperget.looperget_flask.extensions import db
 from looperget.looperget_flask.forms import forms_dashboard
 from looperget.looperget_flask.routes_static import inject_variables
-from looperget.looperget_flask.utils import utils_dashboard, utils_general
+from looperget.looperget_flask.utils import (utils_dashboard, utils_general,
+                                             utils_measurement_catalog)
 from looperget.utils.outputs import output_types, parse_output_information
 from looperget.utils.system_pi import (
-    add_custom_measurements, add_custom_units, parse_custom_option_values_json,
-    parse_custom_option_values_output_channels_json, return_measurement_info)
+    parse_custom_option_values_json,
+    parse_custom_option_values_output_channels_json)
 from looperget.utils.widgets import parse_widget_information
 
 logger = logging.getLogger('looperget.looperget_flask.routes_dashboard')
@@ -83,6 +82,8 @@ def page_dashboard_add():
 @flask_login.login_required
 def page_dashboard(dashboard_id):
     """Generate custom dashboard with various data."""
+    timer = time.perf_counter()
+
     # Retrieve tables from SQL database
     this_dashboard = Dashboard.query.filter(
         Dashboard.unique_id == dashboard_id).first()
@@ -95,7 +96,6 @@ def page_dashboard(dashboard_id):
     widget = Widget.query.all()
     input_dev = Input.query.all()
     device_measurements = DeviceMeasurements.query.all()
-    method = Method.query.all()
     misc = Misc.query.first()
     output = Output.query.all()
     output_channel = OutputChannel.query.all()
@@ -143,35 +143,8 @@ def page_dashboard(dashboard_id):
         return redirect(url_for(
             'routes_dashboard.page_dashboard', dashboard_id=this_dashboard.unique_id))
 
-    # Generate all measurement and units used
-    dict_measurements = add_custom_measurements(Measurement.query.all())
-    dict_units = add_custom_units(Unit.query.all())
-
-    # Generate dictionary of each measurement ID with the correct measurement/unit used with it
-    dict_measure_measurements = {}
-    dict_measure_units = {}
-
-    for each_measurement in device_measurements:
-        # If the measurement is a PID setpoint, set unit to PID measurement.
-        measurement = None
-        unit = None
-        if each_measurement.measurement_type == 'setpoint':
-            setpoint_pid = PID.query.filter(PID.unique_id == each_measurement.device_id).first()
-            if setpoint_pid and ',' in setpoint_pid.measurement:
-                pid_measurement = setpoint_pid.measurement.split(',')[1]
-                setpoint_measurement = DeviceMeasurements.query.filter(
-                    DeviceMeasurements.unique_id == pid_measurement).first()
-                if setpoint_measurement:
-                    conversion = Conversion.query.filter(
-                        Conversion.unique_id == setpoint_measurement.conversion_id).first()
-                    _, unit, measurement = return_measurement_info(setpoint_measurement, conversion)
-        else:
-            conversion = Conversion.query.filter(
-                Conversion.unique_id == each_measurement.conversion_id).first()
-            _, unit, measurement = return_measurement_info(each_measurement, conversion)
-        if unit:
-            dict_measure_measurements[each_measurement.unique_id] = measurement
-            dict_measure_units[each_measurement.unique_id] = unit
+    # Measurements, units, and form choices, rebuilt only after they're saved
+    catalog = utils_measurement_catalog.get_measurement_catalog().get()
 
     dict_outputs = parse_output_information()
     dict_widgets = parse_widget_information()
@@ -196,77 +169,13 @@ def page_dashboard(dashboard_id):
                 each_dash_widget.unique_id, custom_options_values_widgets[each_dash_widget.unique_id])
 
     # generate lists of html files to include in dashboard template
-    list_html_files_body = {}
-    list_html_files_title_bar = {}
-    list_html_files_head = {}
-    list_html_files_configure_options = {}
-    list_html_files_js = {}
-    list_html_files_js_ready = {}
-    list_html_files_js_ready_end = {}
-
-    for each_widget_type in widget_types_on_dashboard:
-        file_html_head = "widget_template_{}_head.html".format(each_widget_type)
-        path_html_head = os.path.join(PATH_TEMPLATE_USER, file_html_head)
-        if os.path.exists(path_html_head):
-            list_html_files_head[each_widget_type] = file_html_head
-
-        file_html_title_bar = "widget_template_{}_title_bar.html".format(each_widget_type)
-        path_html_title_bar = os.path.join(PATH_TEMPLATE_USER, file_html_title_bar)
-        if os.path.exists(path_html_title_bar):
-            list_html_files_title_bar[each_widget_type] = file_html_title_bar
-
-        file_html_body = "widget_template_{}_body.html".format(each_widget_type)
-        path_html_body = os.path.join(PATH_TEMPLATE_USER, file_html_body)
-        if os.path.exists(path_html_body):
-            list_html_files_body[each_widget_type] = file_html_body
-
-        file_html_configure_options = "widget_template_{}_configure_options.html".format(each_widget_type)
-        path_html_configure_options = os.path.join(PATH_TEMPLATE_USER, file_html_configure_options)
-        if os.path.exists(path_html_configure_options):
-            list_html_files_configure_options[each_widget_type] = file_html_configure_options
-
-        file_html_js = "widget_template_{}_js.html".format(each_widget_type)
-        path_html_js = os.path.join(PATH_TEMPLATE_USER, file_html_js)
-        if os.path.exists(path_html_js):
-            list_html_files_js[each_widget_type] = file_html_js
-
-        file_html_js_ready = "widget_template_{}_js_ready.html".format(each_widget_type)
-        path_html_js_ready = os.path.join(PATH_TEMPLATE_USER, file_html_js_ready)
-        if os.path.exists(path_html_js_ready):
-            list_html_files_js_ready[each_widget_type] = file_html_js_ready
-
-        file_html_js_ready_end = "widget_template_{}_js_ready_end.html".format(each_widget_type)
-        path_html_js_ready_end = os.path.join(PATH_TEMPLATE_USER, file_html_js_ready_end)
-        if os.path.exists(path_html_js_ready_end):
-            list_html_files_js_ready_end[each_widget_type] = file_html_js_ready_end
-
-    # Retrieve all choices to populate form drop-down menu
-    choices_camera = utils_general.choices_id_name(camera)
-    choices_function = utils_general.choices_functions(
-        function, dict_units, dict_measurements)
-    choices_input = utils_general.choices_inputs(
-        input_dev, dict_units, dict_measurements)
-    choices_method = utils_general.choices_methods(method)
-    choices_output = utils_general.choices_outputs(
-        output, OutputChannel, dict_outputs, dict_units, dict_measurements)
-    choices_output_channels = utils_general.choices_outputs_channels(
-        output, output_channel, dict_outputs)
-    choices_output_channels_measurements = utils_general.choices_outputs_channels_measurements(
-        output, OutputChannel, dict_outputs, dict_units, dict_measurements)
-    choices_output_pwm = utils_general.choices_outputs_pwm(
-        output, OutputChannel, dict_outputs, dict_units, dict_measurements)
-    choices_pid = utils_general.choices_pids(
-        pid, dict_units, dict_measurements)
-    choices_pid_devices = utils_general.choices_pids_devices(pid)
-    choices_tag = utils_general.choices_tags(tags)
+    widget_templates = utils_measurement_catalog.widget_template_files(widget_types_on_dashboard)
 
     device_measurements_dict = {}
     for meas in device_measurements:
         device_measurements_dict[meas.unique_id] = meas
 
-    # Get what each measurement uses for a unit
-    use_unit = utils_general.use_unit_generate(
-        device_measurements, input_dev, output, function)
+    load_ms = (time.perf_counter() - timer) * 1000
 
     return render_template('pages/dashboard.html',
                            and_=and_,
@@ -285,32 +194,33 @@ def page_dashboard(dashboard_id):
                            table_camera=Camera,
                            table_conditional=Conditional,
                            table_trigger=Trigger,
-                           choices_camera=choices_camera,
-                           choices_function=choices_function,
-                           choices_input=choices_input,
-                           choices_method=choices_method,
-                           choices_output=choices_output,
-                           choices_output_channels=choices_output_channels,
-                           choices_output_channels_measurements=choices_output_channels_measurements,
-                           choices_output_pwm=choices_output_pwm,
-                           choices_pid=choices_pid,
-                           choices_pid_devices=choices_pid_devices,
-                           choices_tag=choices_tag,
+                           choices_camera=catalog['choices_camera'],
+                           choices_function=catalog['choices_function'],
+                           choices_input=catalog['choices_input'],
+                           choices_method=catalog['choices_method'],
+                           choices_output=catalog['choices_output'],
+                           choices_output_channels=catalog['choices_output_channels'],
+                           choices_output_channels_measurements=catalog['choices_output_channels_measurements'],
+                           choices_output_pwm=catalog['choices_output_pwm'],
+                           choices_pid=catalog['choices_pid'],
+                           choices_pid_devices=catalog['choices_pid_devices'],
+                           choices_tag=catalog['choices_tag'],
                            dashboard_id=this_dashboard.unique_id,
                            device_measurements_dict=device_measurements_dict,
-                           dict_measure_measurements=dict_measure_measurements,
-                           dict_measure_units=dict_measure_units,
-                           dict_measurements=dict_measurements,
+                           dict_measure_measurements=catalog['dict_measure_measurements'],
+                           dict_measure_units=catalog['dict_measure_units'],
+                           dict_measurements=catalog['dict_measurements'],
                            dict_outputs=dict_outputs,
-                           dict_units=dict_units,
+                           dict_units=catalog['dict_units'],
                            dict_widgets=dict_widgets,
-                           list_html_files_head=list_html_files_head,
-                           list_html_files_title_bar=list_html_files_title_bar,
-                           list_html_files_body=list_html_files_body,
-                           list_html_files_configure_options=list_html_files_configure_options,
-                           list_html_files_js=list_html_files_js,
-                           list_html_files_js_ready=list_html_files_js_ready,
-                           list_html_files_js_ready_end=list_html_files_js_ready_end,
+                           list_html_files_head=widget_templates['head'],
+                           list_html_files_title_bar=widget_templates['title_bar'],
+                           list_html_files_body=widget_templates['body'],
+                           list_html_files_configure_options=widget_templates['configure_options'],
+                           list_html_files_js=widget_templates['js'],
+                           list_html_files_js_ready=widget_templates['js_ready'],
+                           list_html_files_js_ready_end=widget_templates['js_ready_end'],
+                           load_ms=load_ms,
                            camera=camera,
                            function=function,
                            misc=misc,
@@ -320,7 +230,7 @@ def page_dashboard(dashboard_id):
                            input=input_dev,
                            tags=tags,
                            this_dashboard=this_dashboard,
-                           use_unit=use_unit,
+                           use_unit=catalog['use_unit'],
                            form_base=form_base,
                            form_dashboard=form_dashboard,
                            widget=widget)
@@ -9,24 +9,26 @@ from importlib import import_module
 from io import StringIO
 
 import flask_login
-from flask import (Response, flash, jsonify, redirect, send_file,
-                   send_from_directory, url_for)
+from flask import (Response, flash, jsonify, redirect, request, send_file,
+                   send_from_directory, stream_with_context, url_for)
 from flask.blueprints import Blueprint
 from flask_babel import gettext
 from flask_limiter import Limiter
-from sqlalchemy import and_
 
-from looperget.config import (DOCKER_CONTAINER, INSTALL_DIRECTORY, LOG_PATH,
+from looperget.config import (DOCKER_CONTAINER, GRAPH_SERIES_MAX,
+                           GRAPH_WIDTH_MAX, INSTALL_DIRECTORY, LOG_PATH,
                            PATH_CAMERAS, PATH_NOTE_ATTACHMENTS)
 from looperget.databases.models import (PID, Camera, Conversion, CustomController,
-                                     DeviceMeasurements, Input, Misc, Notes,
-                                     NoteTags, Output, OutputChannel)
+                                     DeviceMeasurements, Input, Misc, Output,
+                                     OutputChannel)
 from looperget.looperget_client import DaemonControl
 from looperget.looperget_flask.routes_authentication import clear_cookie_auth
-from looperget.looperget_flask.utils import utils_general
+from looperget.looperget_flask.utils import utils_general, utils_notes
 from looperget.looperget_flask.utils.utils_general import get_ip_address
 from looperget.looperget_flask.utils.utils_output import get_all_output_states
 from looperget.utils.database import db_retrieve_table
+from looperget.utils.graph_data import (GraphQuery, encode_binary, encode_json,
+                                     resolve_series)
 from looperget.utils.influx import (influx_to_list, influxdb_get_count_points,
                                  influxdb_get_first_point, query_string)
 from looperget.utils.system_pi import (assure_path_exists, is_int,
@@ -237,22 +239,22 @@ def camera_img_return_path(unique_id, img_type, filename):
     return "Image not found"
 
 
-def gen(camera):
-    """Video streaming generator function."""
-    while True:
-        frame = camera.get_frame()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-
-
 @blueprint.route('/video_feed/<unique_id>')
 @flask_login.login_required
 def video_feed(unique_id):
-    """Video streaming route. Put this in the src attribute of an img tag."""
+    """
+    Video streaming route. Put this in the src attribute of an img tag.
+
+    The optional fps query argument caps the frame rate sent to this viewer,
+    e.g. /video_feed/<unique_id>?fps=1 for a thumbnail.
+    """
     camera_options = Camera.query.filter(Camera.unique_id == unique_id).first()
     camera_stream = import_module('looperget.looperget_flask.camera.camera_' + camera_options.library).Camera
     camera_stream.set_camera_options(camera_options)
-    return Response(gen(camera_stream(unique_id=unique_id)),
+    max_fps = request.args.get('fps', default=None, type=float)
+    if max_fps is not None and max_fps <= 0:
+        max_fps = None
+    return Response(camera_stream(unique_id=unique_id).stream(max_fps=max_fps),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
@@ -332,6 +334,16 @@ def last_data(unique_id, measure_type, measurement_id, period):
                     Conversion.unique_id == setpoint_measurement.conversion_id).first()
                 _, unit, measurement = return_measurement_info(setpoint_measurement, conversion)
 
+    try:
+        # The daemon keeps the latest value of each series it writes
+        cached = DaemonControl().latest_measurement(
+            unique_id, unit, channel, measure=measurement,
+            max_age=float(period) if period != '0' else None)
+        if cached:
+            return Response(f"[{cached[0]},{cached[1]}]", mimetype='text/json')
+    except Exception as err:
+        logger.debug(f"Could not get latest measurement from the daemon: {err}")
+
     try:
         if period != '0':
             data = query_string(
@@ -443,21 +455,17 @@ def async_data(device_id, device_type, measurement_id, start_seconds, end_second
     settings = Misc.query.first()
 
     if device_type == 'tag':
-        notes_list = []
-        tag = NoteTags.query.filter(NoteTags.unique_id == device_id).first()
-
         start = datetime.datetime.utcfromtimestamp(float(start_seconds))
         if end_seconds == '0':
             end = datetime.datetime.utcnow()
         else:
             end = datetime.datetime.utcfromtimestamp(float(end_seconds))
 
-        notes = Notes.query.filter(
-            and_(Notes.date_time >= start, Notes.date_time <= end)).all()
-        for each_note in notes:
-            if tag.unique_id in each_note.tags.split(','):
-                notes_list.append(
-                    [each_note.date_time.strftime("%Y-%m-%dT%H:%M:%S.000000000Z"), each_note.name, each_note.note])
+        # Notes of the tag, clustered into counts if there are more than ?points=<n>
+        notes_list = [
+            [date_time.replace(tzinfo=datetime.timezone.utc).timestamp(), title, text]
+            for date_time, title, text in utils_notes.tag_overlay(
+                device_id, start, end, points=request.args.get('points', type=int))]
 
         if notes_list:
             return jsonify(notes_list)
@@ -643,6 +651,59 @@ def async_data(device_id, device_type, measurement_id, start_seconds, end_second
             return '', 204
 
 
+@blueprint.route('/async_v2/<start_seconds>/<end_seconds>/<width>')
+@flask_login.login_required
+def async_data_v2(start_seconds, end_seconds, width):
+    """
+    Return the data of many measurements from start_seconds to end_seconds from influxdb.
+    Each series is averaged by influxdb to about one point per pixel of width,
+    with one query per series, queried concurrently and streamed as each completes.
+
+    Series are given by measurement ID, as ?series=<measurement_id>&series=...
+    A start of 0 starts at the first point of any series, and an end of 0 is now.
+    ?downsample=minmax returns the minimum and maximum of each window instead of its average.
+    ?format=binary returns float arrays (see encode_binary()) instead of columnar JSON.
+    """
+    measurement_ids = request.args.getlist('series')
+    if not measurement_ids or len(measurement_ids) > GRAPH_SERIES_MAX:
+        return f"Between 1 and {GRAPH_SERIES_MAX} series are required", 400
+    if not str_is_float(start_seconds) or not str_is_float(end_seconds) or not is_int(width):
+        return "Start, end and width must be numbers", 400
+    width = min(max(int(width), 1), GRAPH_WIDTH_MAX)
+
+    settings = Misc.query.first()
+    if settings.measurement_db_name != 'influxdb':
+        return '', 204
+
+    end = float(end_seconds) if float(end_seconds) else datetime.datetime.now(datetime.timezone.utc).timestamp()
+    method = 'minmax' if request.args.get('downsample') == 'minmax' else 'mean'
+    graph_query = GraphQuery(
+        settings, resolve_series(measurement_ids), float(start_seconds), end, width, method=method)
+    try:
+        if not graph_query.open():
+            return '', 204
+    except Exception as err:
+        logger.error(f"URL for 'async_data_v2' raised and error: {err}")
+        graph_query.close()
+        return '', 204
+
+    def generate(binary):
+        try:
+            if binary:
+                yield from encode_binary(graph_query.results())
+            else:
+                yield from encode_json(graph_query, graph_query.results())
+        finally:
+            graph_query.close()
+
+    if request.args.get('format') == 'binary':
+        return Response(stream_with_context(generate(True)),
+                        mimetype='application/octet-stream',
+                        headers={'X-Window-Ms': str(graph_query.window_ms),
+                                 'X-Start-Ms': str(int(graph_query.start * 1000))})
+    return Response(stream_with_context(generate(False)), mimetype='application/json')
+
+
 @blueprint.route('/async_usage/<device_id>/<unit>/<channel>/<start_seconds>/<end_seconds>')
 @flask_login.login_required
 def async_usage_data(device_id, unit, channel, start_seconds, end_seconds):
@@ -14,8 +14,8 @@ from collections import OrderedDict
 from importlib import import_module
 
 import flask_login
-from flask import (current_app, flash, jsonify, redirect, render_template,
-                   request, send_file, url_for)
+from flask import (Response, current_app, flash, jsonify, redirect,
+                   render_template, request, stream_with_context, url_for)
 from flask.blueprints import Blueprint
 from flask_babel import gettext
 from sqlalchemy import and_
@@ -309,8 +309,10 @@ def page_notes():
 
     total_notes = Notes.query.count()
 
-    notes = Notes.query.order_by(Notes.id.desc()).limit(10)
+    notes = Notes.query.order_by(Notes.id.desc()).limit(10).all()
+    note_count = len(notes)
     tags = NoteTags.query.all()
+    tag_names = {each_tag.unique_id: each_tag.name for each_tag in tags}
 
     current_date_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
@@ -318,22 +320,23 @@ def page_notes():
         if not utils_general.user_has_permission('edit_settings'):
             return redirect(url_for('routes_page.page_notes'))
 
-        if form_note_show.notes_show.data:
-            notes = utils_notes.show_notes(form_note_show)
+        if form_note_show.notes_show.data or form_note_show.notes_next.data:
+            cursor = form_note_show.cursor.data if form_note_show.notes_next.data else None
+            notes, note_count, form_note_show.cursor.data = utils_notes.show_notes(
+                form_note_show, cursor=cursor)
         elif form_note_show.notes_export.data:
             notes, data = utils_notes.export_notes(form_note_show)
             if data:
-                # Send zip file to user
-                return send_file(
-                    data,
+                # Stream zip file to user
+                return Response(
+                    stream_with_context(data),
                     mimetype='application/zip',
-                    as_attachment=True,
-                    download_name=
-                    'Looperget_Notes_{mv}_{host}_{dt}.zip'.format(
-                        mv=LOOPERGET_VERSION,
-                        host=socket.gethostname().replace(' ', ''),
-                        dt=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
-                )
+                    headers={'Content-Disposition': 'attachment; filename={}'.format(
+                        'Looperget_Notes_{mv}_{host}_{dt}.zip'.format(
+                            mv=LOOPERGET_VERSION,
+                            host=socket.gethostname().replace(' ', ''),
+                            dt=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")))})
+            notes, note_count = None, 0
         elif form_note_show.notes_import_upload.data:
             utils_notes.import_notes(form_note_show)
         else:
@@ -355,12 +358,6 @@ def page_notes():
 
             return redirect(url_for('routes_page.page_notes'))
 
-    if notes:
-        note_count = notes.count()
-        notes_all = notes.all()
-    else:
-        note_count = 0
-        notes_all = None
     number_displayed_notes = (note_count, total_notes)
 
     return render_template('tools/notes.html',
@@ -370,8 +367,9 @@ def page_notes():
                            form_tag_add=form_tag_add,
                            form_tag_options=form_tag_options,
                            form_note_show=form_note_show,
-                           notes=notes_all,
+                           notes=notes,
                            tags=tags,
+                           tag_names=tag_names,
                            current_date_time=current_date_time,
                            number_displayed_notes=number_displayed_notes)
 
@@ -698,10 +696,17 @@ def page_info():
     else:
         daemon_up = False
 
+    measurement_writer = None
+    measurement_cache = None
     if daemon_up is True:
         control = DaemonControl()
-        ram_use_daemon = control.ram_use()
-        virtualenv_daemon = control.is_in_virtualenv()
+        ram_use_daemon, virtualenv_daemon = control.call_many(
+            ['ram_use', 'is_in_virtualenv'])
+        try:
+            measurement_writer, measurement_cache = control.call_many(
+                ['influxdb_writer_status', 'latest_measurement_cache_status'])
+        except Exception:
+            logger.exception("Getting measurement writer status")
     else:
         ram_use_daemon = 0
 
@@ -729,6 +734,8 @@ def page_info():
                            frontend_pid=frontend_pid,
                            i2c_devices_sorted=i2c_devices_sorted,
                            ifconfig=ifconfig_output,
+                           measurement_cache=measurement_cache,
+                           measurement_writer=measurement_writer,
                            pstree_frontend=pstree_frontend_output,
                            python_version=python_version,
                            ram_use_daemon=ram_use_daemon,
@@ -1286,11 +1293,3 @@ def dict_custom_colors():
             logger.exception("Exception")
 
     return color_count
-
-
-def gen(camera):
-    """Video streaming generator function."""
-    while True:
-        frame = camera.get_frame()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
@@ -18,8 +18,7 @@ from looperget.looperget_flask.forms import forms_authentication
 from looperget.looperget_flask.routes_static import inject_variables
 from looperget.looperget_flask.utils import utils_general
 from looperget.looperget_flask.utils import utils_remote_host
-from looperget.looperget_flask.utils.utils_remote_host import remote_host_page
-from looperget.looperget_flask.utils.utils_remote_host import remote_log_in
+from looperget.looperget_flask.utils.utils_remote_fleet import get_remote_fleet
 
 blueprint = Blueprint(
     'routes_remote_admin',
@@ -53,15 +52,14 @@ def remote_input():
 
     host_auth = {}
     host_inputs = {}
-    for each_host in remote_hosts:
-        # Return input information about each host
-        headers = remote_log_in(
-            each_host.host, each_host.username, each_host.password_hash)
-
-        _, host_inputs[each_host.host] = remote_host_page(
-            each_host.host, headers, 'remote_get_inputs')
-
-        host_inputs[each_host.host] = json.loads(host_inputs[each_host.host])
+    # Return input information about each host, requested concurrently
+    for host, (status, page) in get_remote_fleet().fetch(remote_hosts, 'remote_get_inputs').items():
+        host_inputs[host] = None
+        if not status:
+            try:
+                host_inputs[host] = json.loads(page)
+            except ValueError:
+                logger.error(f"Remote host {host}: Could not parse inputs")
 
     return render_template('remote/input.html',
                            display_order=display_order,
@@ -94,13 +92,8 @@ def remote_setup():
             utils_remote_host.remote_host_del(form_setup)
         return redirect('/remote/setup')
 
-    host_auth = {}
-    for each_host in remote_hosts:
-        headers = remote_log_in(
-            each_host.host, each_host.username, each_host.password_hash)
-
-        _, host_auth[each_host.host] = remote_host_page(
-            each_host.host, headers, 'auth')
+    host_auth = {
+        host: page for host, (_, page) in get_remote_fleet().fetch(remote_hosts, 'auth').items()}
 
     return render_template('remote/setup.html',
                            form_setup=form_setup,
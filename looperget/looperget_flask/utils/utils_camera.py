@@ -18,6 +18,7 @@ from looperget.looperget_flask.utils.utils_general import flash_success_errors
 from looperget.looperget_flask.utils.utils_general import return_dependencies
 from looperget.utils.database import db_retrieve_table
 from looperget.utils.system_pi import assure_path_exists
+from looperget.utils.timelapse_index import get_timelapse_index
 
 logger = logging.getLogger(__name__)
 
@@ -243,6 +244,7 @@ def camera_del(form_camera):
         try:
             delete_entry_with_id(
                 Camera, form_camera.camera_id.data)
+            get_timelapse_index().forget(form_camera.camera_id.data)
             messages["success"].append("Camera deleted")
         except Exception as except_msg:
             messages["error"].append(except_msg)
@@ -12,7 +12,6 @@ import sqlalchemy
 from flask import flash, redirect, request
 from flask_babel import gettext
 from importlib_metadata import version
-from sqlalchemy import and_
 
 from looperget.config import (CAMERA_INFO, DEPENDENCIES_GENERAL, FUNCTION_INFO,
                            METHOD_INFO, PATH_CAMERAS)
@@ -32,6 +31,7 @@ from looperget.utils.system_pi import (add_custom_measurements, add_custom_units
                                     assure_path_exists, dpkg_package_exists,
                                     is_int, return_measurement_info,
                                     str_is_float)
+from looperget.utils.timelapse_index import timelapse_sets
 from looperget.utils.widgets import parse_widget_information
 
 logger = logging.getLogger(__name__)
@@ -625,12 +625,45 @@ def choices_custom_functions():
     return choices
 
 
+def measurements_with_conversions(device_ids):
+    """
+    Return the measurements of devices with their conversions, from one joined query
+
+    :param device_ids: unique IDs of the devices
+    :return: dict of device ID: list of (DeviceMeasurements, Conversion or None)
+    :rtype: dict
+    """
+    measurements = {device_id: [] for device_id in device_ids}
+    if measurements:
+        rows = db.session.query(DeviceMeasurements, Conversion).outerjoin(
+            Conversion, Conversion.unique_id == DeviceMeasurements.conversion_id).filter(
+            DeviceMeasurements.device_id.in_(list(measurements))).order_by(
+            DeviceMeasurements.id).all()
+        for each_measure, conversion in rows:
+            measurements[each_measure.device_id].append((each_measure, conversion))
+    return measurements
+
+
+def channels_by_output(table_output_channel, outputs):
+    """Return the channels of each Output, from one query."""
+    channels = {each_output.unique_id: [] for each_output in outputs}
+    if channels:
+        for each_channel in table_output_channel.query.filter(
+                table_output_channel.output_id.in_(list(channels))).order_by(
+                table_output_channel.id).all():
+            channels[each_channel.output_id].append(each_channel)
+    return channels
+
+
 def choices_inputs(inputs, dict_units, dict_measurements):
     """populate form multi-select choices from Input entries."""
     choices = []
+    measurements = measurements_with_conversions(
+        [each_input.unique_id for each_input in inputs])
     for each_input in inputs:
         choices = form_input_choices(
-            choices, each_input, dict_units, dict_measurements)
+            choices, each_input, dict_units, dict_measurements,
+            measurements[each_input.unique_id])
     return choices
 
 
@@ -644,19 +677,18 @@ def choices_input_devices(input_dev):
 
 def choices_actions(actions, dict_units, dict_measurements):
     """populate form multi-select choices from Action entries."""
-    choices = []
-    for each_function in actions:
-        choices = form_function_choices(
-            choices, each_function, dict_units, dict_measurements)
-    return choices
+    return choices_functions(actions, dict_units, dict_measurements)
 
 
 def choices_functions(functions, dict_units, dict_measurements):
     """populate form multi-select choices from Function entries."""
     choices = []
+    measurements = measurements_with_conversions(
+        [each_function.unique_id for each_function in functions])
     for each_function in functions:
         choices = form_function_choices(
-            choices, each_function, dict_units, dict_measurements)
+            choices, each_function, dict_units, dict_measurements,
+            measurements[each_function.unique_id])
     return choices
 
 
@@ -715,11 +747,12 @@ def choices_measurements_units(measurements, units):
 def choices_outputs(output, table_output_channel, dict_outputs, dict_units, dict_measurements):
     """populate form multi-select choices from Output entries."""
     choices = []
+    channels = channels_by_output(table_output_channel, output)
+    measurements = measurements_with_conversions(channels)
     for each_output in output:
-        output_channels = table_output_channel.query.filter(
-            table_output_channel.output_id == each_output.unique_id).all()
         choices = form_output_choices(
-            choices, each_output, output_channels, dict_outputs, dict_units, dict_measurements)
+            choices, each_output, channels[each_output.unique_id], dict_outputs, dict_units,
+            dict_measurements, measurements[each_output.unique_id])
     return choices
 
 
@@ -727,11 +760,12 @@ def choices_outputs_channels_measurements(
         output, table_output_channel, dict_outputs, dict_units, dict_measurements):
     """populate form multi-select choices from Output entries."""
     choices = []
+    channels = channels_by_output(table_output_channel, output)
+    measurements = measurements_with_conversions(channels)
     for each_output in output:
-        output_channels = table_output_channel.query.filter(
-            table_output_channel.output_id == each_output.unique_id).all()
         choices = form_output_channel_measurement_choices(
-            choices, each_output, output_channels, dict_outputs, dict_units, dict_measurements)
+            choices, each_output, channels[each_output.unique_id], dict_outputs, dict_units,
+            dict_measurements, measurements[each_output.unique_id])
     return choices
 
 
@@ -757,22 +791,28 @@ def choices_output_devices(output):
 def choices_outputs_pwm(output, table_output_channel, dict_outputs, dict_units, dict_measurements):
     """populate form multi-select choices from Output entries."""
     choices = []
-    for each_output in output:
+    output_pwm = [
+        each_output for each_output in output
         if ('output_types' in dict_outputs[each_output.output_type] and
-                'pwm' in dict_outputs[each_output.output_type]['output_types']):
-            output_channels = table_output_channel.query.filter(
-                table_output_channel.output_id == each_output.unique_id).all()
-            choices = form_output_choices(
-                choices, each_output, output_channels, dict_outputs, dict_units, dict_measurements)
+            'pwm' in dict_outputs[each_output.output_type]['output_types'])]
+    channels = channels_by_output(table_output_channel, output_pwm)
+    measurements = measurements_with_conversions(channels)
+    for each_output in output_pwm:
+        choices = form_output_choices(
+            choices, each_output, channels[each_output.unique_id], dict_outputs, dict_units,
+            dict_measurements, measurements[each_output.unique_id])
     return choices
 
 
 def choices_pids(pid, dict_units, dict_measurements):
     """populate form multi-select choices from PID entries."""
     choices = []
+    measurements = measurements_with_conversions(
+        [each_pid.unique_id for each_pid in pid])
     for each_pid in pid:
         choices = form_pid_choices(
-            choices, each_pid, dict_units, dict_measurements)
+            choices, each_pid, dict_units, dict_measurements,
+            measurements[each_pid.unique_id])
     return choices
 
 
@@ -827,13 +867,8 @@ def choices_units(units):
     return choices
 
 
-def form_input_choices(choices, each_input, dict_units, dict_measurements):
-    device_measurements = DeviceMeasurements.query.filter(
-        DeviceMeasurements.device_id == each_input.unique_id).all()
-
-    for each_measure in device_measurements:
-        conversion = Conversion.query.filter(
-            Conversion.unique_id == each_measure.conversion_id).first()
+def form_input_choices(choices, each_input, dict_units, dict_measurements, measurements):
+    for each_measure, conversion in measurements:
         channel, unit, measurement = return_measurement_info(
             each_measure, conversion)
 
@@ -887,13 +922,8 @@ def form_input_choices_devices(choices, each_input):
     return choices
 
 
-def form_function_choices(choices, each_function, dict_units, dict_measurements):
-    device_measurements = DeviceMeasurements.query.filter(
-        DeviceMeasurements.device_id == each_function.unique_id).all()
-
-    for each_measure in device_measurements:
-        conversion = Conversion.query.filter(
-            Conversion.unique_id == each_measure.conversion_id).first()
+def form_function_choices(choices, each_function, dict_units, dict_measurements, measurements):
+    for each_measure, conversion in measurements:
         channel, unit, measurement = return_measurement_info(
             each_measure, conversion)
 
@@ -932,24 +962,29 @@ def form_function_choices(choices, each_function, dict_units, dict_measurements)
     return choices
 
 
-def form_output_choices(choices, each_output, output_channels, dict_outputs, dict_units, dict_measurements):
+def form_output_choices(choices, each_output, output_channels, dict_outputs, dict_units, dict_measurements,
+                        measurements):
     return form_output_channel_measurement_choices(
-        choices, each_output, output_channels, dict_outputs, dict_units, dict_measurements, include_channel_id_in_value=False)
+        choices, each_output, output_channels, dict_outputs, dict_units, dict_measurements, measurements,
+        include_channel_id_in_value=False)
 
 
 def form_output_channel_measurement_choices(
-        choices, each_output, output_channels, dict_outputs, dict_units, dict_measurements, include_channel_id_in_value=True):
+        choices, each_output, output_channels, dict_outputs, dict_units, dict_measurements, measurements,
+        include_channel_id_in_value=True):
+    # The first measurement of each channel, as the measurements are listed in order
+    measurements_by_channel = {}
+    for each_measure, conversion in measurements:
+        measurements_by_channel.setdefault(each_measure.channel, (each_measure, conversion))
+
     for each_channel in output_channels:
         measurement_channels = dict_outputs[each_output.output_type]['channels_dict'][each_channel.channel]['measurements']
         for measurement_channel in measurement_channels:
-            device_measurement = DeviceMeasurements.query.filter(
-                and_(DeviceMeasurements.device_id == each_output.unique_id,
-                     DeviceMeasurements.channel == measurement_channel)).first()
+            device_measurement, conversion = measurements_by_channel.get(
+                measurement_channel, (None, None))
             if not device_measurement:
                 continue
 
-            conversion = Conversion.query.filter(
-                Conversion.unique_id == device_measurement.conversion_id).first()
             channel, unit, measurement = return_measurement_info(
                 device_measurement, conversion)
 
@@ -1035,13 +1070,8 @@ def form_output_choices_devices(choices, each_output):
     return choices
 
 
-def form_pid_choices(choices, each_pid, dict_units, dict_measurements):
-    device_measurements = DeviceMeasurements.query.filter(
-        DeviceMeasurements.device_id == each_pid.unique_id).all()
-
-    for each_measure in device_measurements:
-        conversion = Conversion.query.filter(
-            Conversion.unique_id == each_measure.conversion_id).first()
+def form_pid_choices(choices, each_pid, dict_units, dict_measurements, measurements):
+    for each_measure, conversion in measurements:
         channel, unit, measurement = return_measurement_info(
             each_measure, conversion)
 
@@ -1486,16 +1516,8 @@ def get_camera_image_info():
         else:
             latest_img_still[each_camera.unique_id] = None
 
-        try:
-            # Get list of timelapse filename sets for generating a video from images
-            time_lapse_imgs[each_camera.unique_id] = []
-            for i in os.listdir(tl_path):
-                if (os.path.isfile(os.path.join(tl_path, i)) and
-                        i[:-10] not in time_lapse_imgs[each_camera.unique_id]):
-                    time_lapse_imgs[each_camera.unique_id].append(i[:-10])
-            time_lapse_imgs[each_camera.unique_id].sort()
-        except Exception:
-            pass
+        # Timelapse image sets for generating a video from images
+        time_lapse_imgs[each_camera.unique_id] = timelapse_sets(each_camera.unique_id, tl_path)
 
         if each_camera.timelapse_last_file:
             latest_img_tl_ts[each_camera.unique_id] = datetime.fromtimestamp(
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Catalog of device measurements and the choices of the dashboard widget forms
+
+The dashboard needs the measurement and unit of every device measurement
+and a drop-down of choices for each kind of device. Both are built with a
+few joined queries, cached, and rebuilt after the tables they're built from
+are saved, rather than assembled with queries for every measurement on
+every page load.
+"""
+import collections
+import itertools
+import logging
+import os
+import threading
+import time
+
+from looperget.config import CATALOG_MAX_AGE_SEC
+from looperget.config import PATH_TEMPLATE_USER
+from looperget.databases.models import (PID, Camera, Conversion,
+                                        CustomController, DeviceMeasurements,
+                                        Input, Measurement, Method, NoteTags,
+                                        Output, OutputChannel, Unit)
+from looperget.looperget_flask.extensions import db
+from looperget.looperget_flask.utils import utils_general
+from looperget.utils.outputs import parse_output_information
+from looperget.utils.system_pi import (add_custom_measurements,
+                                       add_custom_units,
+                                       return_measurement_info)
+
+logger = logging.getLogger("looperget.measurement_catalog")
+
+# Tables the catalog is built from: saving any of them rebuilds it
+CATALOG_TABLES = (Camera, Conversion, CustomController, DeviceMeasurements, Input,
+                  Measurement, Method, NoteTags, Output, OutputChannel, PID, Unit)
+
+# Widget templates the dashboard includes, by the name of the template list
+WIDGET_TEMPLATES = ('head', 'title_bar', 'body', 'configure_options', 'js', 'js_ready', 'js_ready_end')
+
+CatalogMeasure = collections.namedtuple('CatalogMeasure', ['measurement', 'unit', 'name'])
+
+
+class MeasurementCatalog:
+    """
+    The measurement, unit, and name of every device measurement, and the dashboard choices
+
+    The catalog is a dict of plain values (no database rows), so it can be
+    shared by every request, and is rebuilt on the next request after
+    invalidate().
+    """
+    def __init__(self, max_age=CATALOG_MAX_AGE_SEC):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.catalog = None
+        self.built = 0
+        self.build_ms = 0
+        self.builds = 0
+        self.hits = 0
+
+    def get(self):
+        """
+        Return the catalog, building it if it's been invalidated or is too old
+
+        :rtype: dict
+        """
+        with self.lock:
+            if self.catalog is None or time.time() - self.built > self.max_age:
+                timer = time.perf_counter()
+                self.catalog = build_catalog()
+                self.built = time.time()
+                self.build_ms = (time.perf_counter() - timer) * 1000
+                self.builds += 1
+                logger.debug(f"Built the catalog of {len(self.catalog['measures'])} "
+                             f"measurements in {self.build_ms:.1f} ms")
+            else:
+                self.hits += 1
+            return self.catalog
+
+    def invalidate(self):
+        """Rebuild the catalog on the next request."""
+        with self.lock:
+            self.catalog = None
+
+    def status(self):
+        with self.lock:
+            return {
+                'measurements': len(self.catalog['measures']) if self.catalog is not None else 0,
+                'build_ms': round(self.build_ms, 1),
+                'builds': self.builds,
+                'hits': self.hits
+            }
+
+
+def build_measures(measurements, pids):
+    """
+    Return the measurement, unit, and name of each measurement ID
+
+    A PID setpoint has the measurement and unit of the measurement the PID
+    controls, and measurements without a unit are left out, as they can't
+    be displayed.
+
+    :param measurements: list of (DeviceMeasurements, Conversion or None)
+    :param pids: dict of PID ID: measurement the PID controls ("device_id,measurement_id")
+    :rtype: dict
+    """
+    measures = {}
+    setpoints = []
+    for each_measure, conversion in measurements:
+        if each_measure.measurement_type == 'setpoint':
+            setpoints.append(each_measure)
+            continue
+        _, unit, measurement = return_measurement_info(each_measure, conversion)
+        if unit:
+            measures[each_measure.unique_id] = CatalogMeasure(measurement, unit, each_measure.name)
+
+    for each_measure in setpoints:
+        pid_measurement = pids.get(each_measure.device_id)
+        if pid_measurement and ',' in pid_measurement:
+            controlled = measures.get(pid_measurement.split(',')[1])
+            if controlled:
+                measures[each_measure.unique_id] = CatalogMeasure(
+                    controlled.measurement, controlled.unit, each_measure.name)
+    return measures
+
+
+def build_catalog():
+    """Build the catalog from the database, with one query per table."""
+    dict_measurements = add_custom_measurements(Measurement.query.all())
+    dict_units = add_custom_units(Unit.query.all())
+    dict_outputs = parse_output_information()
+
+    camera = Camera.query.all()
+    function = CustomController.query.all()
+    input_dev = Input.query.all()
+    method = Method.query.all()
+    output = Output.query.all()
+    output_channel = OutputChannel.query.all()
+    pid = PID.query.all()
+    tags = NoteTags.query.all()
+
+    measurements = db.session.query(DeviceMeasurements, Conversion).outerjoin(
+        Conversion, Conversion.unique_id == DeviceMeasurements.conversion_id).order_by(
+        DeviceMeasurements.id).all()
+    measures = build_measures(
+        measurements, {each_pid.unique_id: each_pid.measurement for each_pid in pid})
+
+    return {
+        'measures': measures,
+        'dict_measure_measurements': {
+            measure_id: measure.measurement for measure_id, measure in measures.items()},
+        'dict_measure_units': {
+            measure_id: measure.unit for measure_id, measure in measures.items()},
+        'dict_measurements': dict_measurements,
+        'dict_units': dict_units,
+        'choices_camera': utils_general.choices_id_name(camera),
+        'choices_function': utils_general.choices_functions(
+            function, dict_units, dict_measurements),
+        'choices_input': utils_general.choices_inputs(
+            input_dev, dict_units, dict_measurements),
+        'choices_method': utils_general.choices_methods(method),
+        'choices_output': utils_general.choices_outputs(
+            output, OutputChannel, dict_outputs, dict_units, dict_measurements),
+        'choices_output_channels': utils_general.choices_outputs_channels(
+            output, output_channel, dict_outputs),
+        'choices_output_channels_measurements': utils_general.choices_outputs_channels_measurements(
+            output, OutputChannel, dict_outputs, dict_units, dict_measurements),
+        'choices_output_pwm': utils_general.choices_outputs_pwm(
+            output, OutputChannel, dict_outputs, dict_units, dict_measurements),
+        'choices_pid': utils_general.choices_pids(
+            pid, dict_units, dict_measurements),
+        'choices_pid_devices': utils_general.choices_pids_devices(pid),
+        'choices_tag': utils_general.choices_tags(tags),
+        'use_unit': utils_general.use_unit_generate(
+            [each_measure for each_measure, _ in measurements], input_dev, output, function)
+    }
+
+
+measurement_catalog_lock = threading.Lock()
+measurement_catalog = None
+
+
+def get_measurement_catalog():
+    """Return the process-wide measurement catalog."""
+    global measurement_catalog
+    if measurement_catalog is None:
+        with measurement_catalog_lock:
+            if measurement_catalog is None:
+                measurement_catalog = MeasurementCatalog()
+    return measurement_catalog
+
+
+def session_changes_catalog(session):
+    """Return True if a session has pending changes to a table the catalog is built from."""
+    return any(isinstance(each_obj, CATALOG_TABLES)
+               for each_obj in itertools.chain(session.new, session.dirty, session.deleted))
+
+
+widget_templates_lock = threading.Lock()
+widget_templates_listing = (None, frozenset())
+
+
+def widget_template_files(widget_types, path=PATH_TEMPLATE_USER):
+    """
+    Return the widget templates of each widget type, by the name of the template list
+
+    The template directory is listed again only after it changes, rather
+    than checking whether each template exists on every page load.
+
+    :param widget_types: the widget types on the dashboard
+    :return: dict of template (e.g. 'js_ready'): dict of widget type: template file name
+    :rtype: dict
+    """
+    global widget_templates_listing
+    try:
+        modified = os.stat(path).st_mtime_ns
+    except OSError:
+        modified = None
+    with widget_templates_lock:
+        if modified is None:
+            files = frozenset()
+        elif widget_templates_listing[0] == (path, modified):
+            files = widget_templates_listing[1]
+        else:
+            files = frozenset(os.listdir(path))
+            widget_templates_listing = ((path, modified), files)
+
+    templates = {each_template: {} for each_template in WIDGET_TEMPLATES}
+    for each_widget_type in widget_types:
+        for each_template in WIDGET_TEMPLATES:
+            file_name = f"widget_template_{each_widget_type}_{each_template}.html"
+            if file_name in files:
+                templates[each_template][each_widget_type] = file_name
+    return templates
@@ -1,27 +1,45 @@
 # -*- coding: utf-8 -*-
+import base64
 import csv
 import glob
 import io
+import json
 import logging
 import os
+import re
 import shutil
 import socket
 import time
 import uuid
 import zipfile
 from datetime import datetime
+from datetime import timezone
 
 from flask import flash
 from flask import url_for
 from flask_babel import gettext
+from sqlalchemy import Integer
+from sqlalchemy import and_
+from sqlalchemy import case
+from sqlalchemy import cast
+from sqlalchemy import func
+from sqlalchemy import literal_column
+from sqlalchemy import or_
+from sqlalchemy import select
+from sqlalchemy import text
+from sqlalchemy import tuple_
 from werkzeug.utils import secure_filename
 
 from looperget.config import INSTALL_DIRECTORY
+from looperget.config import NOTES_PAGE_SIZE
+from looperget.config import NOTE_OVERLAY_MAX
 from looperget.config import PATH_NOTE_ATTACHMENTS
 from looperget.config_translations import TRANSLATIONS
 from looperget.databases import set_uuid
+from looperget.databases.models import NoteTagLink
 from looperget.databases.models import NoteTags
 from looperget.databases.models import Notes
+from looperget.databases.models.notes import notes_fts
 from looperget.looperget_flask.extensions import db
 from looperget.looperget_flask.utils.utils_general import delete_entry_with_id
 from looperget.looperget_flask.utils.utils_general import flash_success_errors
@@ -88,7 +106,7 @@ def tag_del(form):
         controller=TRANSLATIONS['tag']['title'])
     error = []
 
-    if Notes.query.filter(Notes.tags.ilike("%{0}%".format(form.tag_unique_id.data))).first():
+    if NoteTagLink.query.filter(NoteTagLink.tag_unique_id == form.tag_unique_id.data).first():
         error.append("Cannot delete tag because it's currently assicuated with at least one note")
 
     if not error:
@@ -311,134 +329,336 @@ def note_del(form):
     flash_success_errors(error, action, url_for('routes_page.page_notes'))
 
 
+def notes_fts_exists():
+    """Return whether the database has the full-text index of notes, which is added by an alembic upgrade."""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    return db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'")).first() is not None
+
+
+def like_pattern(search):
+    """Convert a search with the wildcards '*' and '?' to a LIKE pattern, or match it anywhere."""
+    if '*' in search or '_' in search:
+        return search.replace('_', '__').replace('*', '%').replace('?', '_')
+    return '%{0}%'.format(search)
+
+
+def filter_text(notes, column_name, search, use_fts):
+    """
+    Filter notes by a name or note search
+
+    The full-text index is used for patterns with at least 3 characters
+    between wildcards, since it indexes trigrams.
+    """
+    looking_for = like_pattern(search)
+    if use_fts and re.search(r'[^%_]{3}', looking_for):
+        return notes.filter(Notes.id.in_(
+            select(notes_fts.c.rowid).where(notes_fts.c[column_name].like(looking_for))))
+    return notes.filter(getattr(Notes, column_name).like(looking_for))
+
+
+def notes_sort_by(form):
+    """Return the column selected to sort notes by, or 'id' if none is."""
+    if form.sort_by.data in ['name', 'date', 'tag', 'file', 'note']:
+        return form.sort_by.data
+    return 'id'
+
+
+def notes_sort_key(form):
+    """Return the column the notes are sorted by, and whether they're sorted in descending order."""
+    sort_columns = {
+        'id': Notes.id,
+        'name': func.coalesce(Notes.name, ''),
+        'date': Notes.date_time,
+        'tag': func.coalesce(Notes.tags, ''),
+        'file': func.coalesce(Notes.files, ''),
+        'note': func.coalesce(Notes.note, '')
+    }
+    return sort_columns[notes_sort_by(form)], form.sort_direction.data != 'asc'
+
+
 def notes_filter(error, form):
     notes = Notes.query
+    use_fts = notes_fts_exists()
+
     if form.filter_names.data:
-        if '*' in form.filter_names.data or '_' in form.filter_names.data:
-            looking_for = form.filter_names.data.replace('_', '__') \
-                .replace('*', '%') \
-                .replace('?', '_')
-        else:
-            looking_for = '%{0}%'.format(form.filter_names.data)
-        notes = notes.filter(Notes.note.like(looking_for))
+        notes = filter_text(notes, 'name', form.filter_names.data, use_fts)
 
     if form.filter_tags.data:
-        unique_ids_of_tags = []
-        for each_tag in form.filter_tags.data.split(','):
-            tag = NoteTags.query.filter(NoteTags.name == each_tag).first()
-            if tag:
-                unique_ids_of_tags.append(tag.unique_id)
-
-        for each_tag_unique_id in unique_ids_of_tags:
-            notes = notes.filter(Notes.tags.like('%{0}%'.format(each_tag_unique_id)))
+        tag_names = [each_tag.strip() for each_tag in form.filter_tags.data.split(',')]
+        for each_tag in NoteTags.query.filter(NoteTags.name.in_(tag_names)).all():
+            notes = notes.filter(Notes.id.in_(
+                select(NoteTagLink.note_id).where(NoteTagLink.tag_unique_id == each_tag.unique_id)))
 
     if form.filter_files.data:
-        notes = notes.filter(Notes.tags.in_(form.filter_files.data.split(',')))
+        for each_file in form.filter_files.data.split(','):
+            notes = notes.filter(Notes.files.like('%{0}%'.format(each_file.strip())))
 
     if form.filter_notes.data:
-        if '*' in form.filter_notes.data or '_' in form.filter_notes.data:
-            looking_for = form.filter_notes.data.replace('_', '__') \
-                .replace('*', '%') \
-                .replace('?', '_')
-        else:
-            looking_for = '%{0}%'.format(form.filter_notes.data)
-        notes = notes.filter(Notes.note.like(looking_for))
-
-    if form.sort_direction.data == 'desc':
-        if form.sort_by.data == 'id':
-            notes = notes.order_by(Notes.id.desc())
-        elif form.sort_by.data == 'name':
-            notes = notes.order_by(Notes.name.desc())
-        elif form.sort_by.data == 'date':
-            notes = notes.order_by(Notes.date_time.desc())
-        elif form.sort_by.data == 'tag':
-            notes = notes.order_by(Notes.tags.desc())
-        elif form.sort_by.data == 'file':
-            notes = notes.order_by(Notes.files.desc())
-        elif form.sort_by.data == 'note':
-            notes = notes.order_by(Notes.note.desc())
-    elif form.sort_direction.data == 'asc':
-        if form.sort_by.data == 'id':
-            notes = notes.order_by(Notes.id.asc())
-        elif form.sort_by.data == 'name':
-            notes = notes.order_by(Notes.name.asc())
-        elif form.sort_by.data == 'date':
-            notes = notes.order_by(Notes.date_time.asc())
-        elif form.sort_by.data == 'tag':
-            notes = notes.order_by(Notes.tags.asc())
-        elif form.sort_by.data == 'file':
-            notes = notes.order_by(Notes.files.asc())
-        elif form.sort_by.data == 'note':
-            notes = notes.order_by(Notes.note.asc())
+        notes = filter_text(notes, 'note', form.filter_notes.data, use_fts)
+
+    # Sort by the selected column, then by ID, so each note has a unique position for page cursors
+    sort_key, descending = notes_sort_key(form)
+    if sort_key is Notes.id:
+        notes = notes.order_by(Notes.id.desc() if descending else Notes.id.asc())
+    else:
+        order = [sort_key.desc(), Notes.id.desc()] if descending else [sort_key.asc(), Notes.id.asc()]
+        if sort_key is Notes.date_time:
+            # Notes without a time are last in either direction (NULLS LAST isn't in MySQL)
+            order.insert(0, Notes.date_time.is_(None))
+        notes = notes.order_by(*order)
 
     return error, notes
 
 
-def show_notes(form):
+def encode_notes_cursor(form, note):
+    """Return the cursor of the page after a note, the last note of a page."""
+    sort_by = notes_sort_by(form)
+    value = {
+        'id': note.id,
+        'name': note.name or '',
+        'date': note.date_time.isoformat() if note.date_time else None,
+        'tag': note.tags or '',
+        'file': note.files or '',
+        'note': note.note or ''
+    }[sort_by]
+    return base64.urlsafe_b64encode(json.dumps([sort_by, value, note.id]).encode()).decode()
+
+
+def notes_after_cursor(error, notes, form, cursor):
+    """Filter notes sorted by notes_filter() to those after a page cursor."""
+    sort_key, descending = notes_sort_key(form)
+    try:
+        sort_by, value, note_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort_by != notes_sort_by(form):
+            raise ValueError("the sort column changed")
+        if sort_by == 'date' and value is not None:
+            value = datetime.fromisoformat(value)
+    except Exception as msg:
+        error.append("Invalid page cursor: {}".format(msg))
+        return error, notes
+
+    after_id = Notes.id < note_id if descending else Notes.id > note_id
+    if sort_key is Notes.id:
+        return error, notes.filter(after_id)
+    if sort_key is Notes.date_time and value is None:
+        # Only notes without a time are after one without a time
+        return error, notes.filter(Notes.date_time.is_(None), after_id)
+
+    if descending:
+        after = tuple_(sort_key, Notes.id) < tuple_(value, note_id)
+    else:
+        after = tuple_(sort_key, Notes.id) > tuple_(value, note_id)
+    if sort_key is Notes.date_time:
+        after = or_(after, Notes.date_time.is_(None))
+    return error, notes.filter(after)
+
+
+def show_notes(form, cursor=None):
+    """
+    Find a page of notes with the search filters of the form
+    :param form: wtforms form object
+    :param cursor: cursor of the page, returned with the previous page (None for the first page)
+    :return: notes of the page, number of notes found, and cursor of the next page (None for the last page)
+    """
     error = []
     error, notes = notes_filter(error, form)
+    note_count = notes.order_by(None).count()
+    if cursor:
+        error, notes = notes_after_cursor(error, notes, form, cursor)
 
     for each_error in error:
         flash('Error: {}'.format(each_error), 'error')
 
-    if not error:
-        return notes
+    if error:
+        return None, 0, None
+
+    page = notes.limit(NOTES_PAGE_SIZE + 1).all()
+    next_cursor = None
+    if len(page) > NOTES_PAGE_SIZE:
+        page = page[:NOTES_PAGE_SIZE]
+        next_cursor = encode_notes_cursor(form, page[-1])
+    return page, note_count, next_cursor
+
+
+def epoch_seconds(column):
+    """Return an SQL expression of the seconds from the epoch to a (UTC) DateTime column."""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        return (func.julianday(column) - 2440587.5) * 86400
+    if dialect == 'postgresql':
+        return func.extract('epoch', column)
+    # MySQL/MariaDB
+    return func.timestampdiff(literal_column('SECOND'), '1970-01-01 00:00:00', column)
+
+
+def tag_overlay(tag_unique_id, start, end=None, points=None):
+    """
+    Return the notes of a tag in a time frame, as annotations of a graph
+
+    The notes are found with the tag and time index of note_tag_link. If there
+    are more notes than annotations allowed (points, at most NOTE_OVERLAY_MAX),
+    the time frame is divided into that many buckets, and the notes of each
+    bucket are collapsed into one annotation with their count.
+
+    :param tag_unique_id: unique ID of the tag
+    :param start: start of the time frame (UTC datetime)
+    :param end: end of the time frame (UTC datetime, default: now)
+    :param points: most annotations to return, such as the width of the graph
+    :return: list of (date_time, title, text) of each annotation, sorted by time
+    :rtype: list
+    """
+    if end is None:
+        end = datetime.utcnow()
+    max_annotations = min(points, NOTE_OVERLAY_MAX) if points and points > 0 else NOTE_OVERLAY_MAX
+    in_time_frame = and_(NoteTagLink.tag_unique_id == tag_unique_id,
+                         NoteTagLink.date_time >= start,
+                         NoteTagLink.date_time <= end)
+
+    count_notes = db.session.execute(
+        select(func.count()).select_from(NoteTagLink).where(in_time_frame)).scalar()
+    if not count_notes:
+        return []
+
+    if count_notes <= max_annotations:
+        notes = db.session.execute(
+            select(Notes.date_time, Notes.name, Notes.note)
+            .join(NoteTagLink, NoteTagLink.note_id == Notes.id)
+            .where(in_time_frame)
+            .order_by(NoteTagLink.date_time)).all()
+        return [(each_note.date_time, each_note.name, each_note.note) for each_note in notes]
+
+    # Count the notes in each bucket and find the time of the earliest
+    bucket_seconds = max((end - start).total_seconds() / max_annotations, 1)
+    start_epoch = start.replace(tzinfo=timezone.utc).timestamp()
+    offset = (epoch_seconds(NoteTagLink.date_time) - start_epoch) / bucket_seconds
+    if db.engine.dialect.name != 'sqlite':
+        # Elsewhere casting rounds. SQLite truncates, which is floor() as notes in the time frame aren't before start.
+        offset = func.floor(offset)
+    bucket_index = cast(offset, Integer)
+    bucket = case((bucket_index >= max_annotations - 1, max_annotations - 1), else_=bucket_index).label('bucket')
+    buckets = select(bucket,
+                     func.count().label('count_notes'),
+                     func.min(NoteTagLink.date_time).label('date_time')) \
+        .where(in_time_frame) \
+        .group_by(bucket) \
+        .subquery()
+
+    # The earliest note of each bucket, joined on its time
+    buckets = db.session.execute(
+        select(buckets.c.bucket,
+               buckets.c.count_notes,
+               buckets.c.date_time,
+               func.min(NoteTagLink.note_id).label('note_id'))
+        .join(NoteTagLink, and_(NoteTagLink.tag_unique_id == tag_unique_id,
+                                NoteTagLink.date_time == buckets.c.date_time))
+        .group_by(buckets.c.bucket, buckets.c.count_notes, buckets.c.date_time)
+        .order_by(buckets.c.bucket)).all()
+
+    note_ids = [each_bucket.note_id for each_bucket in buckets]
+    notes = {}
+    for index in range(0, len(note_ids), 500):
+        for each_note in db.session.execute(
+                select(Notes.id, Notes.name, Notes.note).where(Notes.id.in_(note_ids[index:index + 500]))):
+            notes[each_note.id] = each_note
+
+    annotations = []
+    for each_bucket in buckets:
+        note = notes.get(each_bucket.note_id)
+        name = note.name if note else ''
+        if each_bucket.count_notes == 1:
+            annotations.append((each_bucket.date_time, name, note.note if note else ''))
+        else:
+            annotations.append((
+                each_bucket.date_time,
+                '{} notes'.format(each_bucket.count_notes),
+                '{}\n... and {} more notes'.format(name, each_bucket.count_notes - 1)))
+    return annotations
+
+
+class ZipStream:
+    """Write-only file for ZipFile, which collects the written bytes to be streamed"""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def read_written(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def export_notes_zip(notes, file_name, rows_per_chunk=500):
+    """
+    Generator of a zip file of the notes as a CSV file and their attachments
+    :param notes: query of the notes to export
+    :param file_name: name of the CSV file in the zip file
+    :param rows_per_chunk: notes written between each chunk of the zip file that's sent
+    """
+    tag_names = {tag.unique_id: tag.name for tag in NoteTags.query.all()}
+    attach_files = []
+    stream = ZipStream()
+
+    with zipfile.ZipFile(stream, mode='w') as z:
+        with z.open(file_name, mode='w', force_zip64=True) as csv_binary:
+            csv_file = io.TextIOWrapper(csv_binary, encoding='utf-8', newline='')
+            cw = csv.writer(csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+            cw.writerow(['ID', 'UUID', 'Time', 'Name', 'Note', 'Tags', 'Files'])
+            for row, each_note in enumerate(notes.yield_per(rows_per_chunk), start=1):
+                list_tag_id_names = []
+                for each_tag_id in (each_note.tags or '').split(','):
+                    list_tag_id_names.append('{},{}'.format(each_tag_id, tag_names.get(each_tag_id, '')))
+
+                cw.writerow([each_note.id,
+                             each_note.unique_id,
+                             each_note.date_time.strftime("%Y-%m-%d %H:%M:%S"),
+                             each_note.name,
+                             each_note.note,
+                             ';'.join(list_tag_id_names),
+                             each_note.files])
+                if each_note.files:
+                    attach_files.extend(each_note.files.split(','))
+                if row % rows_per_chunk == 0:
+                    csv_file.flush()
+                    yield stream.read_written()
+            csv_file.flush()
+            csv_file.detach()
+
+        for each_file in attach_files:
+            path_attachment = os.path.join(PATH_NOTE_ATTACHMENTS, each_file)
+            if not os.path.isfile(path_attachment):
+                logger.error("Cannot export note attachment, file not found: {}".format(path_attachment))
+                continue
+            z.write(path_attachment, os.path.join('/attachments', each_file))
+            yield stream.read_written()
+
+    yield stream.read_written()
 
 
 def export_notes(form):
     """
-    Convert note table entries to CSV file, then zip CSV file and note attachments
+    Export the notes found with the search filters as a zip file of a CSV file and the note attachments
     :param form: wtforms form object
-    :return:
+    :return: query of the notes, and a generator of the zip file (None if there are no notes to export)
     """
     error = []
-    attach_files = []
 
     error, notes = notes_filter(error, form)
 
-    if notes.count() == 0:
+    if notes.first() is None:
         error.append("Cannot Export Notes: No notes were found with the current search filters.")
 
-    date_time_now = datetime.now().strftime("%Y-%m-%d--%H-%M-%S")
-    file_name = '{time}_{host}_notes_exported.csv'.format(time=date_time_now, host=socket.gethostname())
-    full_path_csv = os.path.join('/var/tmp/', file_name)
-
-    with open(full_path_csv, mode='w') as csv_file:
-        cw = csv.writer(csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        cw.writerow(['ID', 'UUID', 'Time', 'Name', 'Note', 'Tags', 'Files'])
-        for each_note in notes:
-            tags = {}
-            list_tag_id_names = []
-            for each_tag_id in each_note.tags.split(','):
-                tag_name = NoteTags.query.filter(
-                    NoteTags.unique_id == each_tag_id).first().name
-                tags[each_tag_id] = tag_name
-                list_tag_id_names.append('{},{}'.format(each_tag_id, tag_name))
-
-            cw.writerow([each_note.id,
-                         each_note.unique_id,
-                         each_note.date_time.strftime("%Y-%m-%d %H:%M:%S"),
-                         each_note.name,
-                         each_note.note,
-                         ';'.join(list_tag_id_names),
-                         each_note.files])
-            if each_note.files:
-                attach_files.append(each_note.files.split(','))
-
-    # Zip csv file and attachments
-    data = io.BytesIO()
-    with zipfile.ZipFile(data, mode='w') as z:
-        z.write(full_path_csv, file_name)
-        for each_file_set in attach_files:
-            for each_file in each_file_set:
-                path_attachment = os.path.join(PATH_NOTE_ATTACHMENTS, each_file)
-                z.write(path_attachment, os.path.join('/attachments', each_file))
-    data.seek(0)
-
-    os.remove(full_path_csv)
-
     if not error:
-        return notes, data
+        date_time_now = datetime.now().strftime("%Y-%m-%d--%H-%M-%S")
+        file_name = '{time}_{host}_notes_exported.csv'.format(time=date_time_now, host=socket.gethostname())
+        return notes, export_notes_zip(notes, file_name)
     else:
         for each_error in error:
             flash('{}'.format(each_error), 'error')
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Client for the remote Looperget hosts shown on the Remote Admin pages
+
+Each host keeps a connection pool, verified with its stored certificate, and
+the session cookie of its last log in, so its pages are requested without
+logging in again or opening a new connection each time. The pages of all
+hosts are requested concurrently, each with its own deadline, so a host that
+is down doesn't hold up the others. Pages are cached briefly, and a host that
+misses its deadline is shown with its last page while it's refreshed in the
+background.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+import urllib3
+
+from looperget.config import REMOTE_FLEET_CACHE_SEC
+from looperget.config import REMOTE_FLEET_REFRESH_SEC
+from looperget.config import REMOTE_FLEET_STALE_SEC
+from looperget.config import REMOTE_FLEET_WORKERS
+from looperget.config import REMOTE_HOST_CONNECT_TIMEOUT_SEC
+from looperget.config import REMOTE_HOST_TIMEOUT_SEC
+from looperget.config import STORED_SSL_CERTIFICATE_PATH
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteHostError(Exception):
+    """A remote host couldn't be logged in to or didn't return a page."""
+    pass
+
+
+class RemoteHost:
+    """
+    Connection pool and logged in session of one remote Looperget
+
+    :param address: host name or IP address of the remote Looperget
+    :param username: user name of an admin on the remote Looperget
+    :param password_hash: hash of the admin's password
+    :param ca_certs: certificate of the remote Looperget (default: the one stored when it was added)
+    :param base_url: URL of the remote Looperget (default: https://address)
+    """
+    def __init__(self, address, username, password_hash, ca_certs=None, base_url=None):
+        self.address = address
+        self.username = username
+        self.password_hash = password_hash
+        self.base_url = base_url or f'https://{address}'
+        if ca_certs is None:
+            ca_certs = os.path.join(STORED_SSL_CERTIFICATE_PATH, f'{address}_cert.pem')
+        # Require the certificate matches the stored certificate, except the hostname
+        self.http = urllib3.PoolManager(
+            num_pools=1, maxsize=2, cert_reqs='CERT_REQUIRED', ca_certs=ca_certs,
+            assert_hostname=False, retries=False)
+        self.lock = threading.Lock()
+        self.headers = None
+        self.logins = 0
+
+    @staticmethod
+    def timeout(deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise RemoteHostError("Deadline exceeded")
+        return urllib3.Timeout(connect=min(REMOTE_HOST_CONNECT_TIMEOUT_SEC, remaining), read=remaining)
+
+    def log_in(self, deadline):
+        """Log in and keep the session cookie for the following requests."""
+        response = self.http.request(
+            'POST', f'{self.base_url}/remote_login',
+            fields={"username": self.username, "password_hash": self.password_hash},
+            timeout=self.timeout(deadline), redirect=False)
+        cookie = response.headers.get('set-cookie')
+        if response.status != 200 or response.data != b"Logged in via Remote Admin" or not cookie:
+            raise RemoteHostError(f"Could not log in (HTTP {response.status})")
+        self.headers = {'cookie': cookie}
+        self.logins += 1
+
+    def get_page(self, page, deadline):
+        """
+        Return a page that requires being logged in, logging in again if the session expired
+
+        :param page: the page to request (e.g. 'auth')
+        :param deadline: time.monotonic() by which the page must be returned
+        :rtype: str
+        """
+        with self.lock:
+            for attempt in range(2):
+                if self.headers is None:
+                    self.log_in(deadline)
+                response = self.http.request(
+                    'GET', f'{self.base_url}/{page}/', headers=self.headers,
+                    timeout=self.timeout(deadline), redirect=False)
+                if response.status == 200:
+                    return response.data.decode('utf-8')
+                if response.status in (301, 302, 303, 401):
+                    # Redirected to the login page, the session has expired
+                    self.headers = None
+                    continue
+                break
+            raise RemoteHostError(f"Could not get page {page} (HTTP {response.status})")
+
+    def close(self):
+        self.http.clear()
+
+
+class RemoteFleet:
+    """
+    Remote hosts, requested concurrently, with a short-lived cache of their pages
+
+    Pages are returned as (status, data), as remote_host_page(): (0, page) on
+    success and (1, None) on error.
+    """
+    def __init__(self, workers=REMOTE_FLEET_WORKERS, cache_sec=REMOTE_FLEET_CACHE_SEC,
+                 stale_sec=REMOTE_FLEET_STALE_SEC, refresh_sec=REMOTE_FLEET_REFRESH_SEC):
+        self.cache_sec = cache_sec
+        self.stale_sec = stale_sec
+        self.refresh_sec = refresh_sec
+        self.lock = threading.Lock()
+        self.hosts = {}
+        self.cache = {}
+        self.last_good = {}
+        self.in_flight = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='remote_fleet')
+
+    def host(self, address, username, password_hash, **kwargs):
+        """Return the client of a host, replacing it if its credentials changed."""
+        with self.lock:
+            remote_host = self.hosts.get(address)
+            if (remote_host is None or remote_host.username != username or
+                    remote_host.password_hash != password_hash):
+                if remote_host:
+                    remote_host.close()
+                remote_host = RemoteHost(address, username, password_hash, **kwargs)
+                self.hosts[address] = remote_host
+            return remote_host
+
+    def forget(self, address):
+        """Close the connections of a host and discard its cached pages, after it's deleted."""
+        with self.lock:
+            remote_host = self.hosts.pop(address, None)
+            for cache in (self.cache, self.last_good):
+                for key in [key for key in cache if key[0] == address]:
+                    del cache[key]
+        if remote_host:
+            remote_host.close()
+
+    def fetch(self, remote_hosts, page, timeout=REMOTE_HOST_TIMEOUT_SEC, max_age=None):
+        """
+        Return a page of each host, requesting the hosts whose cached page is too old concurrently
+
+        Waits at most timeout seconds. A host that hasn't responded by then
+        is returned with its last good page if it's younger than stale_sec, or as
+        an error, and its request continues in the background for up to
+        refresh_sec to refresh the cache.
+
+        :param remote_hosts: Remote rows (host, username and password_hash)
+        :param page: the page to request of each host
+        :param max_age: seconds a cached page is used for (default: cache_sec)
+        :return: dict of host address: (status, data)
+        :rtype: dict
+        """
+        max_age = self.cache_sec if max_age is None else max_age
+        now = time.monotonic()
+        results = {}
+        futures = {}
+        for each_host in remote_hosts:
+            key = (each_host.host, page)
+            with self.lock:
+                cached = self.cache.get(key)
+            if cached and now - cached[0] < max_age:
+                results[each_host.host] = cached[1]
+                continue
+            remote_host = self.host(each_host.host, each_host.username, each_host.password_hash)
+            futures[each_host.host] = self._submit(remote_host, page, now + max(timeout, self.refresh_sec))
+
+        if futures:
+            wait(futures.values(), timeout=max(0, now + timeout - time.monotonic()))
+        for address, future in futures.items():
+            if future.done():
+                results[address] = future.result()
+                continue
+            with self.lock:
+                cached = self.last_good.get((address, page))
+            if cached and now - cached[0] < self.stale_sec:
+                results[address] = cached[1]
+            else:
+                results[address] = (1, None)
+        return results
+
+    def _submit(self, remote_host, page, deadline):
+        """Request a page in the background, sharing a request already in flight."""
+        key = (remote_host.address, page)
+        with self.lock:
+            future = self.in_flight.get(key)
+            if future is None:
+                future = self.executor.submit(self._request, remote_host, page, deadline)
+                self.in_flight[key] = future
+        return future
+
+    def _request(self, remote_host, page, deadline):
+        key = (remote_host.address, page)
+        try:
+            result = (0, remote_host.get_page(page, deadline))
+        except Exception as err:
+            logger.error(f"Remote host {remote_host.address}: {err}")
+            result = (1, None)
+        with self.lock:
+            if self.hosts.get(remote_host.address) is remote_host:
+                # Errors are cached too, so a host that's down isn't requested on every page load
+                self.cache[key] = (time.monotonic(), result)
+                if result[0] == 0:
+                    self.last_good[key] = self.cache[key]
+            self.in_flight.pop(key, None)
+        return result
+
+
+remote_fleet_lock = threading.Lock()
+remote_fleet = None
+
+
+def get_remote_fleet():
+    """Return the process-wide remote fleet client."""
+    global remote_fleet
+    if remote_fleet is None:
+        with remote_fleet_lock:
+            if remote_fleet is None:
+                remote_fleet = RemoteFleet()
+    return remote_fleet
@@ -17,6 +17,7 @@ from looperget.looperget_flask.utils import utils_general
 from looperget.looperget_flask.utils.utils_general import add_display_order
 from looperget.looperget_flask.utils.utils_general import delete_entry_with_id
 from looperget.looperget_flask.utils.utils_general import flash_form_errors
+from looperget.looperget_flask.utils.utils_remote_fleet import get_remote_fleet
 from looperget.utils.system_pi import assure_path_exists
 from looperget.utils.system_pi import csv_to_list_of_str
 from looperget.utils.system_pi import list_to_csv
@@ -175,6 +176,10 @@ def remote_host_del(form_setup):
         return redirect(url_for('routes_general.home'))
 
     try:
+        remote = Remote.query.filter(
+            Remote.unique_id == form_setup.remote_id.data).first()
+        if remote:
+            get_remote_fleet().forget(remote.host)
         delete_entry_with_id(Remote,
                              form_setup.remote_id.data)
         display_order = csv_to_list_of_str(
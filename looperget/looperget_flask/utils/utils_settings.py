@@ -65,8 +65,10 @@ from looperget.looperget_flask.utils.utils_general import flash_success_errors
 from looperget.utils.actions import parse_action_information
 from looperget.utils.database import db_retrieve_table
 from looperget.utils.functions import parse_function_information
+from looperget.utils.influx import get_influxdb_writer
 from looperget.utils.inputs import parse_input_information
 from looperget.utils.layouts import update_layout
+from looperget.utils.modules import get_information_cache
 from looperget.utils.modules import load_module_from_file
 from looperget.utils.outputs import parse_output_information
 from looperget.utils.send_data import send_email
@@ -462,6 +464,7 @@ def settings_general_mod(form):
                 mod_user.language = form.language.data
 
                 db.session.commit()
+                get_influxdb_writer().invalidate()
                 control = DaemonControl()
                 control.refresh_daemon_misc_settings()
                 messages["success"].append('{action} {controller}'.format(
@@ -571,6 +574,7 @@ def settings_function_import(form):
             # Move module from temp directory to function directory
             full_path_final = os.path.join(PATH_FUNCTIONS_CUSTOM, unique_name)
             os.rename(full_path_tmp, full_path_final)
+            get_information_cache().invalidate()
 
             # Reload frontend to refresh the controllers
             cmd = '{path}/looperget/scripts/looperget_wrapper frontend_reload 2>&1'.format(
@@ -607,6 +611,7 @@ def settings_function_delete(form):
 
     if not error:
         os.remove(full_path_file)
+        get_information_cache().invalidate()
 
         # Reload frontend to refresh the controllers
         cmd = '{path}/looperget/scripts/looperget_wrapper frontend_reload 2>&1'.format(
@@ -701,6 +706,7 @@ def settings_action_import(form):
             # Move module from temp directory to function directory
             full_path_final = os.path.join(PATH_ACTIONS_CUSTOM, unique_name)
             os.rename(full_path_tmp, full_path_final)
+            get_information_cache().invalidate()
 
             # Reload frontend to refresh the actions
             cmd = '{path}/looperget/scripts/looperget_wrapper frontend_reload 2>&1'.format(
@@ -736,6 +742,7 @@ def settings_action_delete(form):
 
     if not error:
         os.remove(full_path_file)
+        get_information_cache().invalidate()
 
         # Reload frontend to refresh the actions
         cmd = '{path}/looperget/scripts/looperget_wrapper frontend_reload 2>&1'.format(
@@ -871,6 +878,7 @@ def settings_input_import(form):
             # Move module from temp directory to custom_input directory
             full_path_final = os.path.join(PATH_INPUTS_CUSTOM, unique_name)
             os.rename(full_path_tmp, full_path_final)
+            get_information_cache().invalidate()
 
             # Reload frontend to refresh the inputs
             cmd = '{path}/looperget/scripts/looperget_wrapper frontend_reload 2>&1'.format(
@@ -905,6 +913,7 @@ def settings_input_delete(form):
 
     if not error:
         os.remove(full_path_file)
+        get_information_cache().invalidate()
 
         # Reload frontend to refresh the inputs
         cmd = '{path}/looperget/scripts/looperget_wrapper frontend_reload 2>&1'.format(
@@ -1022,6 +1031,7 @@ def settings_output_import(form):
             # Move module from temp directory to custom_output directory
             full_path_final = os.path.join(PATH_OUTPUTS_CUSTOM, unique_name)
             os.rename(full_path_tmp, full_path_final)
+            get_information_cache().invalidate()
 
             # Reload frontend to refresh the outputs
             cmd = '{path}/looperget/scripts/looperget_wrapper frontend_reload 2>&1'.format(
@@ -1055,6 +1065,7 @@ def settings_output_delete(form):
 
     if not error:
         os.remove(full_path_file)
+        get_information_cache().invalidate()
 
         # Reload frontend to refresh the outputs
         cmd = '{path}/looperget/scripts/looperget_wrapper frontend_reload 2>&1'.format(
@@ -1146,6 +1157,7 @@ def settings_widget_import(form):
             # Move module from temp directory to custom_widget directory
             full_path_final = os.path.join(PATH_WIDGETS_CUSTOM, unique_name)
             os.rename(full_path_tmp, full_path_final)
+            get_information_cache().invalidate()
 
             generate_widget_html()
 
@@ -1181,6 +1193,7 @@ def settings_widget_delete(form):
 
     if not error:
         os.remove(full_path_file)
+        get_information_cache().invalidate()
 
         # Reload frontend to refresh the widgets
         cmd = '{path}/looperget/scripts/looperget_wrapper frontend_reload 2>&1'.format(
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Rebuild the index of time-lapse images from the images on disk"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(__file__, "../../..")))
+
+from looperget.databases.models import Camera
+from looperget.databases.models import CustomController
+from looperget.looperget_flask.utils.utils_general import get_camera_paths
+from looperget.utils.camera_functions import get_camera_function_paths
+from looperget.utils.database import db_retrieve_table_daemon
+from looperget.utils.timelapse_index import get_timelapse_index
+
+logger = logging.getLogger("looperget.timelapse_index")
+
+
+def timelapse_directories():
+    """Return the time-lapse directory of each camera and camera function, by unique ID."""
+    directories = {}
+    for each_camera in db_retrieve_table_daemon(Camera, entry='all') or []:
+        directories[each_camera.unique_id] = get_camera_paths(each_camera)[1]
+    for each_function in db_retrieve_table_daemon(CustomController, entry='all') or []:
+        if each_function.device == 'CAMERA_LIBCAMERA':
+            directories[each_function.unique_id] = get_camera_function_paths(each_function.unique_id)[2]
+    return directories
+
+
+def rebuild(camera_ids=None):
+    """Reconcile the index of the cameras (default: all) with their time-lapse directories."""
+    index = get_timelapse_index()
+    for camera_id, directory in timelapse_directories().items():
+        if camera_ids and camera_id not in camera_ids:
+            continue
+        added, updated, removed = index.rebuild(camera_id, directory)
+        sets = index.sets(camera_id)
+        print(f"{camera_id}: {directory}: {sum(s.images for s in sets)} images in {len(sets)} sets "
+              f"({added} added, {updated} updated, {removed} removed)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the index of time-lapse images")
+
+    options = parser.add_argument_group('Options')
+    options.add_argument('-r', '--rebuild', action='store_true',
+                         help="Reconcile the index with the time-lapse images on disk")
+    options.add_argument('-c', '--camera', action='append',
+                         help="Unique ID of a camera or camera function (default: all)")
+
+    args = parser.parse_args()
+
+    if args.rebuild:
+        rebuild(args.camera)
+    else:
+        parser.print_help()
@@ -0,0 +1,100 @@
+# coding=utf-8
+"""
+Benchmark controller threads polling every sample_rate versus the controller scheduler.
+
+Runs controllers with a measurement period (like Inputs, PIDs and Conditionals)
+in their own threads, then in the scheduler, and reports the number of
+wakeups per second and the number of threads in the process.
+
+    python looperget/tests/benchmarks/bench_controller_scheduler.py --controllers 150 --period 10
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.realpath(__file__), '../../../..')))
+
+from looperget.controllers.base_controller import AbstractController
+from looperget.utils.scheduler import ControllerScheduler
+
+
+class PeriodController(AbstractController, threading.Thread):
+    wakeups = 0
+    executions = 0
+
+    def __init__(self, ready, period, sample_rate, scheduled):
+        threading.Thread.__init__(self)
+        super().__init__(ready, name=__name__)
+        self.scheduled = scheduled
+        self.period = period
+        self.sample_rate_setting = sample_rate
+        self.timer = None
+
+    def initialize_variables(self):
+        self.sample_rate = self.sample_rate_setting
+        self.timer = time.time() + self.period * (hash(self) % 1000) / 1000
+        self.ready.set()
+        self.running = True
+
+    def loop(self):
+        PeriodController.wakeups += 1
+        if time.time() > self.timer:
+            while self.timer < time.time():
+                self.timer += self.period
+            PeriodController.executions += 1
+
+    def next_wakeup(self):
+        return self.timer
+
+
+def run(controllers, period, sample_rate, seconds, scheduled):
+    PeriodController.wakeups = 0
+    PeriodController.executions = 0
+    scheduler = ControllerScheduler()
+    if scheduled:
+        import looperget.controllers.base_controller as base_controller
+        base_controller.get_controller_scheduler = lambda: scheduler
+
+    threads_before = threading.active_count()
+    running = []
+    for _ in range(controllers):
+        ready = threading.Event()
+        controller = PeriodController(ready, period, sample_rate, scheduled)
+        controller.daemon = True
+        controller.start()
+        ready.wait()
+        running.append(controller)
+
+    time.sleep(seconds)
+    threads = threading.active_count() - threads_before
+    wakeups = PeriodController.wakeups + (scheduler.wakeups if scheduled else 0)
+    executions = PeriodController.executions
+
+    for controller in running:
+        controller.stop_controller()
+    for controller in running:
+        controller.join(10)
+    return wakeups / seconds, executions / seconds, threads
+
+
+def main():
+    logging.disable(logging.INFO)
+    parser = argparse.ArgumentParser(description="Benchmark the controller scheduler.")
+    parser.add_argument('--controllers', type=int, default=150, help="Number of controllers")
+    parser.add_argument('--period', type=float, default=10, help="Period of each controller (seconds)")
+    parser.add_argument('--sample-rate', type=float, default=0.1, help="Polling interval of controller threads")
+    parser.add_argument('--seconds', type=float, default=20, help="Duration of each run")
+    args = parser.parse_args()
+
+    for name, scheduled in [('threads', False), ('scheduler', True)]:
+        wakeups, executions, threads = run(
+            args.controllers, args.period, args.sample_rate, args.seconds, scheduled)
+        print(f"{name:>10}: {wakeups:9.1f} wakeups/s, {executions:7.1f} executions/s, "
+              f"{threads:4d} threads ({args.controllers} controllers)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# coding=utf-8
+"""
+Benchmark daemon database lookups with a per-call engine versus the pooled engine.
+
+Simulates active Inputs, each in its own thread, looking up its Input row and
+DeviceMeasurements the way controllers do through db_retrieve_table_daemon().
+
+    python looperget/tests/benchmarks/bench_db_lookups.py --inputs 50 --seconds 5
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+sys.path.append(os.path.abspath(os.path.join(os.path.realpath(__file__), '../../../..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from looperget.databases.models import DeviceMeasurements, Input, Misc
+from looperget.databases.utils import (dispose_engines, get_engine,
+                                       session_scope, thread_session_scope)
+from looperget.looperget_flask.extensions import db
+
+
+@contextmanager
+def session_scope_per_call(db_uri):
+    """The previous session_scope(): a new engine and sessionmaker on every call."""
+    Session = sessionmaker()
+    engine = create_engine(f"{db_uri}?check_same_thread=False")
+    Session.configure(bind=engine)
+    session = Session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def populate(db_uri, number_inputs):
+    db.metadata.create_all(get_engine(db_uri))
+    input_ids = []
+    with session_scope(db_uri) as new_session:
+        new_session.add(Misc())
+        for i in range(number_inputs):
+            new_input = Input(name=f"Input {i}", is_activated=True)
+            new_session.add(new_input)
+            new_session.flush()
+            input_ids.append(new_input.unique_id)
+            for channel in range(2):
+                new_session.add(DeviceMeasurements(
+                    device_id=new_input.unique_id, channel=channel,
+                    measurement='temperature', unit='C'))
+    return input_ids
+
+
+def lookup(scope, db_uri, input_id):
+    with scope(db_uri) as new_session:
+        new_session.query(Input).filter(Input.unique_id == input_id).first()
+        new_session.query(DeviceMeasurements).filter(
+            DeviceMeasurements.device_id == input_id).all()
+        new_session.query(Misc).first()
+        new_session.expunge_all()
+
+
+def run(scope, db_uri, input_ids, seconds):
+    counts = [0] * len(input_ids)
+    stop = threading.Event()
+
+    def worker(index, input_id):
+        while not stop.is_set():
+            lookup(scope, db_uri, input_id)
+            counts[index] += 1
+
+    threads = [threading.Thread(target=worker, args=(i, each_id), daemon=True)
+               for i, each_id in enumerate(input_ids)]
+    for each_thread in threads:
+        each_thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for each_thread in threads:
+        each_thread.join()
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark daemon database lookups.")
+    parser.add_argument('--inputs', type=int, default=50, help="Number of active inputs (threads)")
+    parser.add_argument('--seconds', type=float, default=5, help="Duration of each run")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_uri = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+        input_ids = populate(db_uri, args.inputs)
+
+        results = {}
+        for name, scope in [('per-call engine', session_scope_per_call),
+                            ('pooled session_scope', session_scope),
+                            ('pooled thread_session_scope', thread_session_scope)]:
+            results[name] = run(scope, db_uri, input_ids, args.seconds)
+            print(f"{name:>28}: {results[name]:10.1f} lookups/s ({args.inputs} inputs)")
+
+        speedup = results['pooled thread_session_scope'] / results['per-call engine']
+        print(f"{'speedup':>28}: {speedup:10.1f}x")
+    finally:
+        dispose_engines()
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
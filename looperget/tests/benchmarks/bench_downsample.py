@@ -0,0 +1,94 @@
+# coding=utf-8
+"""
+Benchmark downsampling a long series before it's sent to a graph.
+
+Generates a synthetic series (a week of 0.6 second measurements is about 1M
+points) with noise and a few short spikes, then compares sending it raw,
+averaged into buckets (as aggregateWindow mean does), and downsampled with
+LTTB and min/max: time to downsample and serialize, JSON size, and how many
+spikes are still visible. numpy is used if installed.
+
+    python looperget/tests/benchmarks/bench_downsample.py --points 1000000 --width 1500
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.realpath(__file__), '../../../..')))
+
+from looperget.utils.downsample import downsample
+from looperget.utils.downsample import np
+
+
+def make_series(points, spikes):
+    random.seed(1)
+    start = time.time() - points * 0.6
+    list_data = []
+    value = 20.0
+    for i in range(points):
+        value += random.uniform(-0.05, 0.05)
+        list_data.append((start + i * 0.6, value))
+    spike_indexes = random.sample(range(1, points - 1), spikes)
+    for index in spike_indexes:
+        list_data[index] = (list_data[index][0], list_data[index][1] + 15)
+    return list_data, spike_indexes
+
+
+def bucket_mean(list_data, threshold):
+    """Average equal buckets of points, as a windowed mean query does."""
+    every = len(list_data) / threshold
+    result = []
+    for i in range(threshold):
+        bucket = list_data[int(i * every):int((i + 1) * every)]
+        if bucket:
+            result.append((bucket[-1][0], sum(each_point[1] for each_point in bucket) / len(bucket)))
+    return result
+
+
+def visible_spikes(points, list_data, spike_indexes):
+    """Count spikes whose value (within 1) still appears near their time."""
+    times = [each_point[0] for each_point in points]
+    visible = 0
+    for index in spike_indexes:
+        spike_time, spike_value = list_data[index]
+        for each_time, each_value in zip(times, (each_point[1] for each_point in points)):
+            if abs(each_time - spike_time) < 3600 and each_value > spike_value - 1:
+                visible += 1
+                break
+    return visible
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark downsampling graph series.")
+    parser.add_argument('--points', type=int, default=1000000, help="Points in the synthetic series")
+    parser.add_argument('--width', type=int, default=1500, help="Graph width (points to keep)")
+    parser.add_argument('--spikes', type=int, default=20, help="Short spikes in the series")
+    args = parser.parse_args()
+
+    list_data, spike_indexes = make_series(args.points, args.spikes)
+    print(f"{args.points} points, {args.spikes} spikes, width {args.width}, "
+          f"{'numpy' if np is not None else 'numpy not installed'}")
+
+    methods = [
+        ('raw', lambda: list_data),
+        ('mean', lambda: bucket_mean(list_data, args.width)),
+        ('lttb', lambda: downsample(list_data, args.width, 'lttb')),
+        ('minmax', lambda: downsample(list_data, args.width, 'minmax'))
+    ]
+    for name, function in methods:
+        timer = time.perf_counter()
+        points = function()
+        time_downsample = time.perf_counter() - timer
+        timer = time.perf_counter()
+        size = len(json.dumps(points))
+        time_json = time.perf_counter() - timer
+        print(f"{name:>8}: {len(points):8d} points, downsample {time_downsample * 1000:8.1f} ms, "
+              f"json {time_json * 1000:8.1f} ms, {size / 1e6:7.2f} MB, "
+              f"spikes visible {visible_spikes(points, list_data, spike_indexes)}/{args.spikes}")
+
+
+if __name__ == '__main__':
+    main()
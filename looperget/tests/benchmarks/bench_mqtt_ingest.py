@@ -0,0 +1,121 @@
+# coding=utf-8
+"""
+Benchmark storing MQTT messages from the callback versus through the ingest queue.
+
+A publisher thread stands in for the paho network loop, calling the Input's
+on_message() for each message as fast as it returns. The previous path
+parsed and wrote each message from the callback; the queued path returns
+from the callback immediately and writes batches from a worker thread.
+Writes go to a counting sink that sleeps --write-latency ms per call, in
+place of the influxdb writer.
+
+    python looperget/tests/benchmarks/bench_mqtt_ingest.py --messages 20000 --write-latency 1
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import types
+
+sys.path.append(os.path.abspath(os.path.join(os.path.realpath(__file__), '../../../..')))
+
+from looperget.inputs.mqtt_paho import InputModule
+from looperget.utils.measurement_ingest import MeasurementIngestQueue
+
+
+class CountingSink:
+    """Counts written measurements, taking a fixed time per write call."""
+    def __init__(self, latency_sec):
+        self.latency_sec = latency_sec
+        self.calls = 0
+        self.measurements = 0
+
+    def write(self, list_measurements):
+        if self.latency_sec:
+            time.sleep(self.latency_sec)
+        self.calls += 1
+        self.measurements += len(list_measurements)
+
+
+def make_input(topics):
+    input_dev = types.SimpleNamespace(unique_id='bench-mqtt', log_level_debug=False)
+    mqtt_input = InputModule(input_dev, testing=True)
+    mqtt_input.unique_id = input_dev.unique_id
+    mqtt_input.options_channels = {'subscribe_topic': {}}
+    for channel in range(topics):
+        mqtt_input.channels_measurement[channel] = types.SimpleNamespace(
+            measurement='temperature', unit='C', conversion_id='',
+            rescaled_measurement=None, rescaled_unit=None)
+        mqtt_input.options_channels['subscribe_topic'][channel] = f'bench/sensor/{channel}'
+    mqtt_input.topic_channels = {
+        topic: channel for channel, topic in mqtt_input.options_channels['subscribe_topic'].items()}
+    return mqtt_input
+
+
+def publish(mqtt_input, messages, topics, callback_times):
+    for i in range(messages):
+        msg = types.SimpleNamespace(topic=f'bench/sensor/{i % topics}', payload=f'{20 + i % 100 / 10}'.encode())
+        timer = time.perf_counter()
+        mqtt_input.on_message(None, None, msg)
+        callback_times.append(time.perf_counter() - timer)
+
+
+def run(mqtt_input, args, sink):
+    callback_times = []
+    timer = time.perf_counter()
+    publisher = threading.Thread(target=publish, args=(mqtt_input, args.messages, args.topics, callback_times))
+    publisher.start()
+    publisher.join()
+    if mqtt_input.ingest:
+        mqtt_input.ingest.stop(timeout=600)
+    elapsed = time.perf_counter() - timer
+    callback_times.sort()
+    return {
+        'rate': sink.measurements / elapsed,
+        'callback_avg_us': sum(callback_times) / len(callback_times) * 1e6,
+        'callback_p99_us': callback_times[int(len(callback_times) * 0.99)] * 1e6,
+        'writes': sink.calls
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark storing received MQTT messages.")
+    parser.add_argument('--messages', type=int, default=20000, help="Number of messages to publish")
+    parser.add_argument('--topics', type=int, default=10, help="Number of subscribed topics (channels)")
+    parser.add_argument('--write-latency', type=float, default=1.0, help="Time of each write call, in ms")
+    args = parser.parse_args()
+
+    # Previous path: parse and write each message in the callback
+    sink_inline = CountingSink(args.write_latency / 1000)
+    inline_input = make_input(args.topics)
+
+    def on_message_inline(client, userdata, msg):
+        measurement = inline_input.parse_message((msg.topic, msg.payload, None))
+        if measurement:
+            sink_inline.write([measurement])
+
+    inline_input.on_message = on_message_inline
+    inline = run(inline_input, args, sink_inline)
+
+    # Queued path: the callback only queues the message
+    sink_queued = CountingSink(args.write_latency / 1000)
+    queued_input = make_input(args.topics)
+    queued_input.ingest = MeasurementIngestQueue(
+        queued_input.unique_id, queued_input.parse_message, write=sink_queued.write)
+    queued_input.ingest.actions = []  # No actions configured, without reading the database
+    queued_input.ingest.actions_timer = float('inf')
+    queued_input.ingest.start()
+    queued = run(queued_input, args, sink_queued)
+    status = queued_input.ingest.status()
+
+    for name, result in (('inline', inline), ('queued', queued)):
+        print(f"{name:>8}: {result['rate']:10.0f} messages/s, callback avg {result['callback_avg_us']:8.1f} us, "
+              f"p99 {result['callback_p99_us']:8.1f} us, {result['writes']} writes")
+    print(f"Queued: {queued['rate'] / inline['rate']:.1f}x throughput, dropped {status['dropped']}, "
+          f"waited for room {status['waited_for_room']}, max depth {status['queue_depth_max']}, "
+          f"avg batch {status['batch_size_avg']:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+# coding=utf-8
+"""
+Benchmark rendering the pages that parse the Input, Output, Function, Action and Widget modules
+
+Renders each page with the test app (in-memory database, logged in as an
+admin, with Inputs that have --measurements measurements in total), first
+scanning the modules and building the dashboard's measurement catalog for
+every request, as before they were cached, then with the caches warm, and
+prints the mean render time of each page.
+
+    python looperget/tests/benchmarks/bench_page_render.py --repeat 10 --measurements 900
+"""
+import argparse
+import os
+import sys
+import time
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.realpath(__file__), '../../../..')))
+
+# Hardware libraries imported by the pages, as in the software tests
+patch.dict("sys.modules", RPi=MagicMock(), smbus2=MagicMock()).start()
+
+from webtest import TestApp
+
+from looperget.config import PATH_TEMPLATE_LAYOUT
+from looperget.config import TestConfig
+from looperget.databases.models import Dashboard
+from looperget.databases.models import DeviceMeasurements
+from looperget.databases.models import Input
+from looperget.databases.models import Role
+from looperget.databases.models import User
+from looperget.databases.models import populate_db
+from looperget.looperget_flask.app import create_app
+from looperget.looperget_flask.extensions import db
+from looperget.looperget_flask.utils.utils_measurement_catalog import get_measurement_catalog
+from looperget.utils.layouts import update_layout
+from looperget.utils.modules import get_information_cache
+
+PAGES = ['/input', '/output', '/function', '/dashboard']
+
+
+def log_in(test_app):
+    with test_app.app.app_context():
+        populate_db()
+        if not User.query.filter_by(name='admin').count():
+            user = User(name='admin', email='admin@example.com', language='en')
+            user.set_password('53CR3t_p4zZW0rD')
+            user.role_id = Role.query.filter_by(name='Admin').first().id
+            user.save()
+    form = test_app.get('/login_password').forms['login_form']
+    form['looperget_username'] = 'admin'
+    form['looperget_password'] = '53CR3t_p4zZW0rD'
+    with patch('looperget.looperget_flask.routes_authentication.login_log'):  # No log directory unless installed
+        form.submit()
+
+
+def add_measurements(test_app, count):
+    """Add Inputs with 10 measurements each."""
+    with test_app.app.app_context():
+        for index in range(0, count, 10):
+            input_id = f'bench_input_{index}'
+            db.session.add(Input(unique_id=input_id, name=f'Input {index}', device='DS18B20'))
+            for channel in range(min(10, count - index)):
+                db.session.add(DeviceMeasurements(
+                    device_id=input_id, measurement='temperature', unit='C', channel=channel))
+        db.session.commit()
+
+
+def render(test_app, page, repeat, cached):
+    timer = time.perf_counter()
+    for _ in range(repeat):
+        if not cached:
+            get_information_cache().invalidate()
+            get_measurement_catalog().invalidate()
+        test_app.get(page, status='*')
+    return (time.perf_counter() - timer) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rendering the module pages.")
+    parser.add_argument('--repeat', type=int, default=10, help="Renders of each page")
+    parser.add_argument('--measurements', type=int, default=900, help="Input measurements to add")
+    args = parser.parse_args()
+
+    app = create_app(config=TestConfig)
+    context = app.test_request_context()
+    context.push()
+    test_app = TestApp(app)
+    log_in(test_app)
+    add_measurements(test_app, args.measurements)
+    with app.app_context():
+        pages = PAGES + [f'/dashboard/{Dashboard.query.first().unique_id}']
+
+    # Generated at startup when installed, from the default layout
+    generated_layout = not os.path.exists(PATH_TEMPLATE_LAYOUT)
+    if generated_layout:
+        update_layout(None)
+
+    try:
+        for page in pages:
+            test_app.get(page, status='*')  # Compile the templates and index the modules
+            time_scanned = render(test_app, page, args.repeat, cached=False)
+            time_cached = render(test_app, page, args.repeat, cached=True)
+            print(f"{page:>20}: scanned {time_scanned * 1000:7.1f} ms, cached {time_cached * 1000:7.1f} ms")
+        print(f"information cache: {get_information_cache().status()}")
+        print(f"measurement catalog: {get_measurement_catalog().status()}")
+    finally:
+        if generated_layout:
+            os.remove(PATH_TEMPLATE_LAYOUT)
+
+
+if __name__ == '__main__':
+    main()
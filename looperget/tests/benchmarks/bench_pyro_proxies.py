@@ -0,0 +1,102 @@
+# coding=utf-8
+"""
+Benchmark daemon calls through a new Pyro5 proxy per call versus the pooled proxies.
+
+Serves a stand-in for the daemon's PyroServer on a local port and calls it
+from several threads, the way the web UI and controllers use DaemonControl.
+
+    python looperget/tests/benchmarks/bench_pyro_proxies.py --threads 8 --seconds 5
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.realpath(__file__), '../../../..')))
+
+from Pyro5.api import Daemon, Proxy, expose
+
+from looperget.looperget_client import DaemonControl
+
+
+@expose
+class BenchServer:
+    def output_state(self, output_id, output_channel):
+        return 'off'
+
+    def pid_get(self, pid_id, setting):
+        return 21.5
+
+    def function_status(self, function_id):
+        return {'string_status': 'OK', 'error': []}
+
+
+class PerCallProxyControl(DaemonControl):
+    """The previous DaemonControl.proxy(): a new proxy (connection and handshake) every call."""
+    def proxy(self, timeout=None):
+        proxy = Proxy(self.uri)
+        proxy._pyroTimeout = timeout or self.pyro_timeout
+        return proxy
+
+
+def dashboard_calls(control):
+    control.proxy().output_state('output', 0)
+    control.proxy().pid_get('pid', 'setpoint')
+    control.proxy().function_status('function')
+
+
+def dashboard_call_many(control):
+    control.call_many([
+        ('output_state', ('output', 0)),
+        ('pid_get', ('pid', 'setpoint')),
+        ('function_status', ('function',))])
+
+
+def run(control, refresh, threads, seconds):
+    counts = [0] * threads
+    stop = threading.Event()
+
+    def worker(index):
+        while not stop.is_set():
+            refresh(control)
+            counts[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(threads)]
+    for each_thread in workers:
+        each_thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for each_thread in workers:
+        each_thread.join()
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Pyro5 proxies used by DaemonControl.")
+    parser.add_argument('--threads', type=int, default=8, help="Number of calling threads")
+    parser.add_argument('--seconds', type=float, default=5, help="Duration of each run")
+    args = parser.parse_args()
+
+    daemon = Daemon(host='127.0.0.1', port=0)
+    uri = str(daemon.register(BenchServer(), 'looperget.pyro_server'))
+    threading.Thread(target=daemon.requestLoop, daemon=True).start()
+
+    try:
+        results = {}
+        for name, control, refresh in [
+                ('per-call proxies', PerCallProxyControl(uri, pyro_timeout=10), dashboard_calls),
+                ('pooled proxies', DaemonControl(uri, pyro_timeout=10), dashboard_calls),
+                ('pooled call_many', DaemonControl(uri, pyro_timeout=10), dashboard_call_many)]:
+            results[name] = run(control, refresh, args.threads, args.seconds)
+            print(f"{name:>18}: {results[name] * 3:10.1f} calls/s, "
+                  f"{results[name]:10.1f} refreshes/s ({args.threads} threads)")
+
+        for name in ['pooled proxies', 'pooled call_many']:
+            print(f"{name + ' speedup':>26}: {results[name] / results['per-call proxies']:6.1f}x")
+    finally:
+        daemon.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# coding=utf-8
+"""
+Benchmark long-range aggregates planned from rollups against aggregating raw points
+
+Rolls up a synthetic series (an output on duration every 5 minutes by
+default) into a temporary store, then times a year-long sum from the
+rollups (as output_sec_on() queries it) and from the raw points, which is
+what influxdb has to read for the same query.
+
+    python looperget/tests/benchmarks/bench_rollups.py --days 365 --every 300
+"""
+import argparse
+import bisect
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.realpath(__file__), '../../../..')))
+
+from looperget.utils.rollups import PIECE_RAW
+from looperget.utils.rollups import RollupStore
+from looperget.utils.rollups import floor_to
+from looperget.utils.rollups import merge_aggregate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark aggregates planned from rollups.")
+    parser.add_argument('--days', type=int, default=365, help="Days of points")
+    parser.add_argument('--every', type=int, default=300, help="Seconds between points")
+    args = parser.parse_args()
+
+    now = time.time()
+    end = floor_to(now - 120, 3600)
+    start = end - args.days * 86400
+    points = [('s', 'output_1', 0, 'duration_time', epoch, 30.0)
+              for epoch in range(start, end, args.every)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = RollupStore(os.path.join(directory, 'rollups.db'))
+        timer = time.perf_counter()
+        times = [p[4] for p in points]
+        for step_start in range(start, end, 86400):
+            store.add_range(step_start, step_start + 86400, points[
+                bisect.bisect_left(times, step_start):bisect.bisect_left(times, step_start + 86400)])
+        print(f"{len(points)} points over {args.days} days rolled up in "
+              f"{time.perf_counter() - timer:.1f} s, {os.path.getsize(store.path) / 1e6:.1f} MB")
+
+        query_start = now - args.days * 86400 + 1234
+        timer = time.perf_counter()
+        for _ in range(10):
+            pieces = store.plan(query_start, now, now=now)
+            aggregate = [0, 0.0, None, None]
+            for bucket_sec, piece_start, piece_end in pieces:
+                if bucket_sec != PIECE_RAW:
+                    merge_aggregate(aggregate, store.aggregate(
+                        bucket_sec, piece_start, piece_end, 's', 'output_1', channel=0, measure='duration_time'))
+        time_rollups = (time.perf_counter() - timer) / 10
+        raw_sec = sum(piece[2] - piece[1] for piece in pieces if piece[0] == PIECE_RAW)
+        print(f"rollups: {time_rollups * 1000:8.2f} ms, {len(pieces)} pieces, "
+              f"{raw_sec:.0f} s left to raw points")
+
+        timer = time.perf_counter()
+        total = sum(p[5] for p in points if query_start <= p[4] < now)
+        print(f"    raw: {(time.perf_counter() - timer) * 1000:8.2f} ms to sum the points in memory "
+              f"(sum {total:.0f}, rollups without the raw edges {aggregate[1]:.0f})")
+
+
+if __name__ == '__main__':
+    main()
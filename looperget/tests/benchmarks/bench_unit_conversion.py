@@ -0,0 +1,63 @@
+# coding=utf-8
+"""
+Benchmark unit conversions by string replace and eval() versus compiled equations.
+
+Converts values with the equations of the built-in unit conversions, one
+value at a time as parse_measurement() does, and as whole arrays (numpy is
+used if installed).
+
+    python looperget/tests/benchmarks/bench_unit_conversion.py --values 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.realpath(__file__), '../../../..')))
+
+from looperget.config_devices_units import UNIT_CONVERSIONS
+from looperget.utils.unit_conversion import compile_equation
+from looperget.utils.unit_conversion import np
+from looperget.utils.unit_conversion import round_converted
+
+
+def convert_eval(equation, value):
+    """The previous convert_units(), without its database query."""
+    replaced_str = equation.replace('x', str(value))
+    return float('{0:.5f}'.format(eval(replaced_str)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark unit conversion equations.")
+    parser.add_argument('--values', type=int, default=100000, help="Number of values to convert")
+    args = parser.parse_args()
+
+    # Only the equations the previous replace + eval() could evaluate
+    equations = [equation for _, _, equation in UNIT_CONVERSIONS if 'x' in equation and equation.isascii()]
+    values = [random.uniform(0.1, 1000) for _ in range(args.values)]
+
+    timer = time.perf_counter()
+    for i, value in enumerate(values):
+        convert_eval(equations[i % len(equations)], value)
+    rate_eval = args.values / (time.perf_counter() - timer)
+
+    timer = time.perf_counter()
+    for i, value in enumerate(values):
+        round_converted(compile_equation(equations[i % len(equations)])(value))
+    rate_compiled = args.values / (time.perf_counter() - timer)
+
+    timer = time.perf_counter()
+    chunk = len(values) // len(equations)
+    for i, equation in enumerate(equations):
+        round_converted(compile_equation(equation).array(values[i * chunk:(i + 1) * chunk]))
+    rate_array = chunk * len(equations) / (time.perf_counter() - timer)
+
+    print(f"{'replace + eval':>16}: {rate_eval:12.0f} conversions/s")
+    print(f"{'compiled':>16}: {rate_compiled:12.0f} conversions/s ({rate_compiled / rate_eval:.1f}x)")
+    print(f"{'compiled array':>16}: {rate_array:12.0f} conversions/s ({rate_array / rate_eval:.1f}x, "
+          f"{'numpy' if np is not None else 'numpy not installed'})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# coding=utf-8
+"""
+Benchmark the CPU use of streaming a camera to many viewers
+
+Streams a synthetic camera (--fps frames of --size bytes per second) to 1, 5
+and 20 viewers, each a thread reading /video_feed chunks as a client would,
+and prints the CPU the process used and the frames each viewer was sent.
+Viewers capped with --viewer-fps are sent the latest frame at that rate.
+
+    python looperget/tests/benchmarks/bench_video_feed.py --fps 30 --seconds 5
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.realpath(__file__), '../../../..')))
+
+from looperget.looperget_flask.camera.base_camera import FrameHub
+
+
+def synthetic_frames(fps, size):
+    def frames():
+        frame_number = 0
+        while True:
+            time.sleep(1 / fps)
+            frame_number += 1
+            yield frame_number.to_bytes(4, 'big') + bytes(size - 4)
+    return frames
+
+
+def viewer(stream, sent, index, stop):
+    for chunk in stream:
+        if len(chunk) > 64:
+            sent[index] += 1
+        if stop.is_set():
+            break
+    stream.close()
+
+
+def run(viewers, args):
+    hub = FrameHub('bench', synthetic_frames(args.fps, args.size), idle_sec=0)
+    stop = threading.Event()
+    sent = [0] * viewers
+    threads = [threading.Thread(target=viewer, args=(hub.stream(max_fps=args.viewer_fps), sent, i, stop))
+               for i in range(viewers)]
+    cpu, wall = time.process_time(), time.monotonic()
+    for each_thread in threads:
+        each_thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for each_thread in threads:
+        each_thread.join()
+    cpu, wall = time.process_time() - cpu, time.monotonic() - wall
+    hub.stop()
+    hub.thread.join()
+    return cpu / wall * 100, sum(sent) / viewers / wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming a camera to many viewers.")
+    parser.add_argument('--fps', type=float, default=30, help="Frames per second of the camera")
+    parser.add_argument('--size', type=int, default=100000, help="Bytes per frame")
+    parser.add_argument('--seconds', type=float, default=5, help="Seconds streamed to each number of viewers")
+    parser.add_argument('--viewer-fps', type=float, default=None, help="Frame rate cap of each viewer")
+    args = parser.parse_args()
+
+    for viewers in (1, 5, 20):
+        cpu_percent, viewer_fps = run(viewers, args)
+        print(f"{viewers:3d} viewers: {cpu_percent:5.1f}% CPU, {viewer_fps:5.1f} frames/s sent to each viewer")
+
+
+if __name__ == '__main__':
+    main()
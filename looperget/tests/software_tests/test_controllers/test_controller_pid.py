@@ -0,0 +1,88 @@
+# coding=utf-8
+"""Tests for the PID controller."""
+import threading
+import types
+
+from looperget.abstract_base_controller import AbstractBaseController
+from looperget.controllers import controller_pid
+from looperget.databases.models import DeviceMeasurements
+from looperget.databases.models import Misc
+from looperget.databases.models import PID
+
+
+class RowsQuery:
+    """Stands in for a DeviceMeasurements query, returning the same rows for any filter."""
+    def __init__(self, rows):
+        self.rows = rows
+
+    def filter(self, *criteria):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+def make_pid():
+    return types.SimpleNamespace(
+        log_level_debug=False, measurement='input_1,measurement_1', is_activated=True, is_held=False,
+        is_paused=False, setpoint_tracking_type='input-math', setpoint_tracking_id='input_2,measurement_2',
+        setpoint_tracking_max_age=120, raise_output_id=None, raise_output_type=None,
+        raise_min_duration=0, raise_max_duration=0, raise_min_off_duration=0, raise_always_min_pwm=False,
+        lower_output_id=None, lower_output_type=None, lower_min_duration=0, lower_max_duration=0,
+        lower_min_off_duration=0, lower_always_min_pwm=False, period=10, start_offset=0,
+        max_measure_age=120, send_lower_as_negative=False, store_lower_as_negative=False, setpoint=20.0,
+        p=1.0, i=0.0, d=0.0, direction='both', band=1.0, integrator_min=-100, integrator_max=100)
+
+
+def test_pid_tick_without_database_reads(monkeypatch):
+    """Verify the channel layout is resolved when initialized, and a loop doesn't query the database."""
+    print("\nTest: test_pid_tick_without_database_reads")
+    queries = []
+    layout = [types.SimpleNamespace(channel=channel, measurement_type=measurement_type,
+                                    measurement=measurement, unit=unit)
+              for channel, measurement_type, measurement, unit in [
+                  (0, 'setpoint', 'temperature', 'C'), (1, 'setpoint', 'temperature', 'C'),
+                  (2, 'setpoint', 'temperature', 'C'), (3, None, 'pid_p_value', 'pid_value'),
+                  (4, None, 'pid_i_value', 'pid_value'), (5, None, 'pid_d_value', 'pid_value')]]
+    tables = {
+        Misc: types.SimpleNamespace(sample_rate_controller_pid=0.1),
+        PID: make_pid(),
+        DeviceMeasurements: RowsQuery(layout)
+    }
+
+    def db_retrieve_table_daemon(table, **kwargs):
+        queries.append(table)
+        return tables[table]
+
+    units = {'measurement_1': (0, 'F', 'temperature'), 'measurement_2': (1, 'C', 'temperature')}
+    stored = {}
+    monkeypatch.setattr(AbstractBaseController, 'setup_device_measurement', lambda self, unique_id: None)
+    monkeypatch.setattr(controller_pid, 'DaemonControl', lambda: None)
+    monkeypatch.setattr(controller_pid, 'parse_output_information', lambda: {})
+    monkeypatch.setattr(controller_pid, 'db_retrieve_table_daemon', db_retrieve_table_daemon)
+    monkeypatch.setattr(controller_pid, 'measurement_info', lambda measurement_id: units[measurement_id])
+    monkeypatch.setattr(controller_pid, 'read_influxdb_single', lambda device_id, *args, **kwargs: (
+        1700000000000, 21.0 if device_id == 'input_1' else 25.0))
+    monkeypatch.setattr(controller_pid, 'add_measurements_influxdb',
+                        lambda unique_id, measurement_dict: stored.update(measurement_dict))
+
+    controller = controller_pid.PIDController(threading.Event(), 'pid_1')
+    controller.initialize_variables()
+    assert controller.measurement_layout[3] == controller_pid.PIDChannel(3, None, 'pid_p_value', 'pid_value')
+
+    del queries[:]
+    for _ in range(3):
+        controller.check_pid()
+    assert queries == []
+
+    # The setpoint tracks the other input, and is stored with the unit of the controlled measurement
+    assert stored[0] == {'measurement': 'temperature', 'unit': 'F', 'value': 25.0}
+    assert stored[2]['value'] == 26.0
+    assert (stored[3]['measurement'], stored[3]['unit']) == ('pid_p_value', 'pid_value')
+
+    # Changes to the channels are picked up when the PID is modified
+    tables[DeviceMeasurements] = RowsQuery(layout[:3])
+    controller.pid_mod()
+    stored.clear()
+    controller.check_pid()
+    assert sorted(stored) == [0, 1, 2]
@@ -0,0 +1,109 @@
+# coding=utf-8
+"""Tests for the batching influxdb writer."""
+import mock
+
+from looperget.utils import influx
+from looperget.utils.influx import InfluxDBWriter
+from looperget.utils.measurement_spool import MeasurementSpool
+
+
+class FakeWriteApi:
+    def __init__(self, fail_times=0):
+        self.batches = []
+        self.fail_times = fail_times
+
+    def write(self, bucket, record):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError("influxdb unavailable")
+        self.batches.append(list(record))
+
+
+def test_influxdb_writer_batches_queued_points():
+    """Verify queued points are written in batches of at most the batch size."""
+    print("\nTest: test_influxdb_writer_batches_queued_points")
+    write_api = FakeWriteApi()
+    writer = InfluxDBWriter()
+
+    with mock.patch.object(writer, '_get_write_api', return_value=(write_api, 'bucket')), \
+            mock.patch.object(influx, 'INFLUXDB_WRITE_BATCH_SIZE', 10):
+        writer.put(list(range(25)))
+        assert writer.flush(timeout=10)
+
+    assert [len(batch) for batch in write_api.batches] == [10, 10, 5]
+    assert sum(write_api.batches, []) == list(range(25))
+    status = writer.status()
+    assert status['points_written'] == 25
+    assert status['queue_depth'] == 0
+    assert status['points_dropped'] == 0
+
+
+def test_influxdb_writer_drops_oldest_when_full():
+    """Verify the oldest points are dropped and counted when the queue is full."""
+    print("\nTest: test_influxdb_writer_drops_oldest_when_full")
+    writer = InfluxDBWriter()
+
+    with mock.patch.object(influx, 'INFLUXDB_WRITE_QUEUE_SIZE', 5), \
+            mock.patch.object(writer, '_start_thread'):
+        writer.put(list(range(8)))
+
+    assert list(writer.queue) == [3, 4, 5, 6, 7]
+    assert writer.status()['points_dropped'] == 3
+
+
+def test_influxdb_writer_retries_failed_writes():
+    """Verify a failed write is retried before succeeding."""
+    print("\nTest: test_influxdb_writer_retries_failed_writes")
+    write_api = FakeWriteApi(fail_times=2)
+    writer = InfluxDBWriter()
+
+    with mock.patch.object(writer, '_get_write_api', return_value=(write_api, 'bucket')), \
+            mock.patch.object(influx, 'INFLUXDB_WRITE_BACKOFF_SEC', 0.01):
+        assert writer.write([1, 2, 3])
+
+    assert write_api.batches == [[1, 2, 3]]
+    status = writer.status()
+    assert status['write_retries'] == 2
+    assert status['points_written'] == 3
+
+
+class FakePoint:
+    def __init__(self, line):
+        self.line = line
+
+    def to_line_protocol(self):
+        return self.line
+
+
+def test_influxdb_writer_spools_and_replays_in_order(tmp_path):
+    """Verify failed batches are spooled to disk and replayed in order."""
+    print("\nTest: test_influxdb_writer_spools_and_replays_in_order")
+    write_api = FakeWriteApi(fail_times=1)
+    writer = InfluxDBWriter()
+    writer.enable_spool(str(tmp_path / 'spool.db'), 1024 * 1024)
+
+    with mock.patch.object(writer, '_get_write_api', return_value=(write_api, 'bucket')), \
+            mock.patch.object(influx, 'INFLUXDB_WRITE_RETRIES', 0):
+        assert not writer._write_batch([FakePoint('a'), FakePoint('b')], spool_on_fail=True)
+        writer.spool.append(['c'])
+        assert len(writer.spool) == 3
+        writer._replay_spool()
+
+    assert write_api.batches == [['a', 'b', 'c']]
+    assert len(writer.spool) == 0
+    assert writer.status()['spool']['lines_replayed'] == 3
+
+
+def test_measurement_spool_discards_oldest_over_size(tmp_path):
+    """Verify the spool discards its oldest lines when over its size limit."""
+    print("\nTest: test_measurement_spool_discards_oldest_over_size")
+    spool = MeasurementSpool(str(tmp_path / 'spool.db'), 64 * 1024)
+    for batch in range(20):
+        spool.append([f"{batch}-{i}-{'x' * 100}" for i in range(100)])
+
+    status = spool.status()
+    assert status['lines_discarded'] > 0
+    assert status['size_bytes'] <= 64 * 1024
+    _, lines = spool.peek(1)
+    assert not lines[0].startswith('0-')
+    spool.close()
@@ -0,0 +1,78 @@
+# coding=utf-8
+"""Tests for the latest measurement value cache."""
+import datetime
+import time
+
+from looperget.utils.latest_values import LatestValueCache
+
+
+def test_latest_value_cache_hit_and_miss():
+    """Verify cached values are returned within max_age and counted."""
+    print("\nTest: test_latest_value_cache_hit_and_miss")
+    cache = LatestValueCache()
+    cache.update('ID_ASDF', 'C', 0, 'temperature', None, 21.5)
+
+    assert cache.get('ID_ASDF', 'C', '0', 'temperature')[1] == 21.5
+    assert cache.get('ID_ASDF', 'C', 0, 'temperature', max_age=60)[1] == 21.5
+    assert cache.get('ID_ASDF', 'C', 1, 'temperature') is None
+    assert cache.get('ID_ASDF', 'F', 0, 'temperature') is None
+
+    status = cache.status()
+    assert status['hits'] == 2
+    assert status['misses'] == 2
+
+
+def test_latest_value_cache_respects_max_age_and_order():
+    """Verify old values miss and older timestamps don't replace newer values."""
+    print("\nTest: test_latest_value_cache_respects_max_age_and_order")
+    cache = LatestValueCache()
+    old = datetime.datetime.utcnow() - datetime.timedelta(seconds=120)
+    cache.update('ID_ASDF', 'C', 0, None, old, 10.0)
+
+    assert cache.get('ID_ASDF', 'C', 0, None, max_age=60) is None
+    assert cache.get('ID_ASDF', 'C', 0, None, max_age=300)[1] == 10.0
+
+    cache.update('ID_ASDF', 'C', 0, None, time.time(), 11.0)
+    cache.update('ID_ASDF', 'C', 0, None, old, 9.0)
+    assert cache.get('ID_ASDF', 'C', 0, None)[1] == 11.0
+
+    # Forecasts timestamped in the future aren't the latest value
+    cache.update('ID_ASDF', 'C', 0, None, time.time() + 3600, 12.0)
+    assert cache.get('ID_ASDF', 'C', 0, None)[1] == 11.0
+
+
+def test_latest_value_cache_disabled_outside_daemon():
+    """Verify a disabled cache (processes other than the daemon) doesn't store or answer values."""
+    print("\nTest: test_latest_value_cache_disabled_outside_daemon")
+    cache = LatestValueCache(enabled=False)
+    cache.update('ID_ASDF', 'C', 0, None, None, 10.0)
+    assert cache.get('ID_ASDF', 'C', 0, None) is None
+    assert cache.status()['series'] == 0
+
+    cache.enable()
+    cache.update('ID_ASDF', 'C', 0, None, None, 11.0)
+    assert cache.get('ID_ASDF', 'C', 0, None)[1] == 11.0
+
+
+def test_values_written_outside_daemon_update_daemon_cache(monkeypatch):
+    """Verify values written by another process (e.g. the API) are sent to the daemon's cache."""
+    print("\nTest: test_values_written_outside_daemon_update_daemon_cache")
+    from looperget.utils import influx
+
+    daemon_cache = LatestValueCache()
+    daemon_cache.update('ID_ASDF', 'C', 0, None, time.time() - 10, 10.0)
+
+    class FakeDaemonControl:
+        def latest_measurements_update(self, updates):
+            for each_update in updates:
+                daemon_cache.update(*each_update)
+
+    monkeypatch.setattr(influx, 'get_latest_value_cache', lambda: LatestValueCache(enabled=False))
+    monkeypatch.setattr(influx, 'DaemonControl', FakeDaemonControl)
+
+    timestamp = datetime.datetime.now(datetime.timezone.utc)
+    influx.update_latest_values([('ID_ASDF', 'C', 0, None, timestamp, 11.0)])
+    assert daemon_cache.get('ID_ASDF', 'C', 0, None) == (timestamp.timestamp(), 11.0)
+
+    daemon_cache.remove_device('ID_ASDF')
+    assert daemon_cache.get('ID_ASDF', 'C', 0, None) is None
@@ -0,0 +1,71 @@
+# coding=utf-8
+"""Tests for the rolling windows of recent measurements."""
+import statistics
+
+import mock
+
+from looperget.utils import influx
+from looperget.utils.rolling_window import RollingWindows
+
+
+def test_rolling_window_warms_once_and_tracks_writes():
+    """Verify a window is read from influxdb once, then kept current by writes."""
+    print("\nTest: test_rolling_window_warms_once_and_tracks_writes")
+    windows = RollingWindows()
+    now = 10000.0
+    history = [(now - 50 + i, float(i)) for i in range(50)]
+
+    with mock.patch.object(influx, 'read_influxdb_list', return_value=history) as read_list:
+        windows.window('dev', 'C', 0, 'temperature', 30, now=now)
+        windows.add('dev', 'C', 0, 'temperature', now + 1, 100.0)
+        stats = windows.window('dev', 'C', 0, 'temperature', 30, now=now + 1).stats()
+
+    assert read_list.call_count == 1
+    values = [v for t, v in history if t >= now + 1 - 30] + [100.0]
+    assert stats['count'] == len(values)
+    assert stats['sum'] == sum(values)
+    assert stats['min'] == min(values)
+    assert stats['max'] == 100.0
+    assert abs(stats['stdev'] - statistics.stdev(values)) < 1e-9
+
+    # Writes to untracked series are ignored
+    windows.add('other', 'C', 0, 'temperature', now, 1.0)
+    assert windows.status()['series'] == 1
+
+
+def test_rolling_window_shorter_window_uses_buffered_points():
+    """Verify a shorter window of a tracked series is served without querying influxdb."""
+    print("\nTest: test_rolling_window_shorter_window_uses_buffered_points")
+    windows = RollingWindows()
+    now = 10000.0
+    history = [(now - 100 + i, float(i)) for i in range(100)]
+
+    with mock.patch.object(influx, 'read_influxdb_list', return_value=history) as read_list:
+        windows.window('dev', 'C', 0, None, 100, now=now)
+        short = windows.window('dev', 'C', 0, None, 10, now=now)
+
+    assert read_list.call_count == 1
+    assert short.stats()['count'] == 10
+    assert short.stats()['min'] == 90.0
+    assert short.median() == 94.5
+
+
+def test_rolling_window_resync_keeps_unwritten_points():
+    """Verify a resync keeps buffered points influxdb doesn't return yet, and a failed one keeps the buffer."""
+    print("\nTest: test_rolling_window_resync_keeps_unwritten_points")
+    windows = RollingWindows()
+    now = 10000.0
+    history = [(now - 50 + i, float(i)) for i in range(50)]
+
+    with mock.patch.object(influx, 'read_influxdb_list', return_value=history):
+        windows.window('dev', 'C', 0, None, 3600, now=now)
+        windows.add('dev', 'C', 0, None, now + 1, 100.0)  # Still queued to be written
+        stats = windows.window('dev', 'C', 0, None, 3600, now=now + 700).stats()
+    assert stats['count'] == 51
+    assert stats['last'] == 100.0
+
+    with mock.patch.object(influx, 'read_influxdb_list', return_value=None) as read_list:
+        stats = windows.window('dev', 'C', 0, None, 3600, now=now + 1400).stats()
+        windows.window('dev', 'C', 0, None, 3600, now=now + 1401)
+    assert read_list.call_count == 2
+    assert stats['count'] == 51
@@ -0,0 +1,122 @@
+# coding=utf-8
+"""Tests for the pooled Pyro5 proxies of DaemonControl."""
+import socket
+import threading
+import types
+
+import Pyro5.errors
+import pytest
+from Pyro5.api import Daemon, expose
+
+from looperget import looperget_client
+from looperget.looperget_client import DaemonControl
+from looperget.looperget_client import PooledProxy
+
+
+@expose
+class FakeServer:
+    def output_state(self, output_id, output_channel):
+        return f"{output_id}-{output_channel}"
+
+    def ram_use(self):
+        return 12.5
+
+
+def test_daemon_control_reuses_proxy_and_batches_calls():
+    """Verify calls reuse the thread's proxy and call_many returns results in order."""
+    print("\nTest: test_daemon_control_reuses_proxy_and_batches_calls")
+    daemon = Daemon(host='127.0.0.1', port=0)
+    uri = str(daemon.register(FakeServer(), 'looperget.pyro_server'))
+    threading.Thread(target=daemon.requestLoop, daemon=True).start()
+
+    try:
+        control = DaemonControl(uri, pyro_timeout=5)
+        assert control.proxy().output_state('output', 1) == 'output-1'
+        assert DaemonControl(uri, pyro_timeout=5).proxy()._proxy is control.proxy()._proxy
+        connection = control.proxy()._pyroConnection
+        control.proxy().output_state('output', 2)
+        assert control.proxy()._pyroConnection is connection
+
+        assert control.call_many([
+            ('output_state', ('a', 0)),
+            'ram_use',
+            ('output_state', (), {'output_id': 'b', 'output_channel': 2})]) == ['a-0', 12.5, 'b-2']
+    finally:
+        daemon.shutdown()
+
+
+def test_daemon_control_call_many_without_proxy():
+    """Verify call_many raises a communication error when a proxy can't be created."""
+    print("\nTest: test_daemon_control_call_many_without_proxy")
+    control = DaemonControl('not a uri', pyro_timeout=5)
+    assert control.proxy() is None
+    with pytest.raises(Pyro5.errors.CommunicationError):
+        control.call_many(['ram_use'])
+
+
+class ClosingProxy:
+    """A stand-in for a Pyro5 proxy whose connection is closed during the first call."""
+    def __init__(self):
+        self._pyroConnection = types.SimpleNamespace(close=lambda: None)
+        self.calls = 0
+
+    def _pyroRelease(self):
+        self._pyroConnection = None
+
+    def __getattr__(self, name):
+        def call():
+            self.calls += 1
+            if self.calls == 1:
+                raise Pyro5.errors.ConnectionClosedError("closed")
+            return name
+        return call
+
+
+def test_pooled_proxy_retries_only_idempotent_calls(monkeypatch):
+    """Verify a call interrupted by a closed connection is only retried if it's safe to run twice."""
+    print("\nTest: test_pooled_proxy_retries_only_idempotent_calls")
+    # A connection the daemon closed while it was idle is detected before sending
+    local, remote = socket.socketpair()
+    connection = types.SimpleNamespace(sock=local)
+    assert not looperget_client.connection_closed(connection)
+    remote.close()
+    assert looperget_client.connection_closed(connection)
+    local.close()
+
+    monkeypatch.setattr(looperget_client, 'connection_closed', lambda connection: False)
+    proxy = PooledProxy(ClosingProxy())
+    assert proxy.output_state() == 'output_state'
+    assert proxy._proxy.calls == 2
+
+    proxy = PooledProxy(ClosingProxy())
+    with pytest.raises(Pyro5.errors.ConnectionClosedError):
+        proxy.output_on()
+    assert proxy._proxy.calls == 1
+
+
+def test_proxy_pool_bounds_open_connections(monkeypatch):
+    """Verify threads that keep their proxies don't hold more than PYRO_PROXY_POOL_MAX connections."""
+    print("\nTest: test_proxy_pool_bounds_open_connections")
+    monkeypatch.setattr(looperget_client, 'PYRO_PROXY_POOL_MAX', 2)
+    daemon = Daemon(host='127.0.0.1', port=0)
+    uri = str(daemon.register(FakeServer(), 'looperget.pyro_server'))
+    threading.Thread(target=daemon.requestLoop, daemon=True).start()
+
+    done = threading.Event()
+    results = []
+
+    def call_daemon(called):
+        results.append(DaemonControl(uri, pyro_timeout=5).proxy().ram_use())
+        called.set()
+        done.wait(5)  # Keep the thread, and its proxy, alive
+
+    try:
+        for _ in range(4):
+            called = threading.Event()
+            threading.Thread(target=call_daemon, args=(called,), daemon=True).start()
+            assert called.wait(5)
+        assert results == [12.5] * 4
+        assert len(looperget_client.connected_proxies) <= 2
+    finally:
+        done.set()
+        daemon.shutdown()
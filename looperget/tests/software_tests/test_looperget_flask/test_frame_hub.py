@@ -0,0 +1,109 @@
+# coding=utf-8
+"""Tests for sharing a camera's frames between the viewers of its stream."""
+import threading
+import time
+
+from looperget.looperget_flask.camera import base_camera
+from looperget.looperget_flask.camera.base_camera import FRAME_HEADER
+from looperget.looperget_flask.camera.base_camera import FrameHub
+
+
+class SyntheticCamera:
+    """Frames numbered from 1, at fps frames per second, counting opens and closes."""
+    def __init__(self, fps=100):
+        self.fps = fps
+        self.opened = 0
+        self.closed = 0
+
+    def frames(self):
+        self.opened += 1
+        try:
+            number = 0
+            while True:
+                number += 1
+                time.sleep(1 / self.fps)
+                yield b'frame %d' % number
+        finally:
+            self.closed += 1
+
+
+def test_frame_hub_shared_frames():
+    """Verify viewers are sent the same frame objects, and a capped viewer skips to the latest frame."""
+    print("\nTest: test_frame_hub_shared_frames")
+    camera = SyntheticCamera(fps=100)
+    hub = FrameHub('cam', camera.frames, idle_sec=0)
+    fast, capped = hub.stream(), hub.stream(max_fps=10)
+    assert next(fast) is FRAME_HEADER and next(capped) is FRAME_HEADER
+    assert next(fast) is next(capped)  # The same bytes object, not a copy
+    assert camera.opened == 1 and hub.viewers == 2
+
+    timer = time.monotonic()
+    frames = []
+    while len(frames) < 3:
+        chunk = next(capped)
+        if chunk.startswith(b'frame'):
+            frames.append(int(chunk.split()[1]))
+    # At most 10 frames per second, skipping the frames captured in between
+    assert time.monotonic() - timer >= 0.2
+    assert frames[2] - frames[0] > 2
+
+    # The camera is closed once the last viewer leaves
+    fast.close()
+    capped.close()
+    assert hub.viewers == 0
+    hub.thread.join(timeout=2)
+    assert not hub.running and camera.closed == 1
+
+
+def test_frame_hub_stop():
+    """Verify stopping the hub ends the streams, and a new viewer opens the camera again."""
+    print("\nTest: test_frame_hub_stop")
+    camera = SyntheticCamera(fps=100)
+    hub = FrameHub('cam', camera.frames, idle_sec=10)
+    chunks = []
+    viewer = threading.Thread(target=lambda: chunks.extend(hub.stream()))
+    viewer.start()
+    while not hub.sequence:
+        time.sleep(0.01)
+    hub.stop()
+    viewer.join(timeout=2)
+    assert not viewer.is_alive() and chunks
+    hub.thread.join(timeout=2)
+    assert camera.closed == 1
+
+    stream = hub.stream()
+    assert next(stream) is FRAME_HEADER
+    assert camera.opened == 2
+    stream.close()
+    hub.stop()
+
+
+def test_frame_hub_reopen_while_stopping(monkeypatch):
+    """Verify a viewer opening just after the capture thread stops for inactivity starts a new thread."""
+    print("\nTest: test_frame_hub_reopen_while_stopping")
+    camera = SyntheticCamera(fps=100)
+    hub = FrameHub('cam', camera.frames, idle_sec=0)
+    messages = []
+    monkeypatch.setattr(base_camera.logger, 'info', messages.append)
+
+    class ReopeningCondition(type(hub.condition)):
+        """Opens the hub once, as soon as the thread stopping for inactivity releases the lock."""
+        def __exit__(self, *args):
+            super().__exit__(*args)
+            if messages and 'inactivity' in messages[-1] and camera.opened == 1:
+                messages.append('reopened')
+                hub.open()
+
+    hub.condition = ReopeningCondition()
+    hub.open()
+    hub.close()
+    first_thread = hub.thread
+    first_thread.join(timeout=2)
+
+    assert 'reopened' in messages
+    assert hub.thread is not first_thread and hub.running
+    assert hub.wait_frame(0, timeout=2)[1] is not None
+    assert camera.opened == 2
+    hub.close()
+    hub.stop()
+    hub.thread.join(timeout=2)
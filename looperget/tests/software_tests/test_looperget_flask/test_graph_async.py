@@ -0,0 +1,32 @@
+# coding=utf-8
+"""Tests for the asynchronous graph data endpoint."""
+import time
+
+from looperget.looperget_flask import routes_general
+
+
+def test_async_data_v2_end_now_outside_utc(app, testapp, monkeypatch):
+    """Verify an end of 0 queries up to now when the server isn't in UTC."""
+    print("\nTest: test_async_data_v2_end_now_outside_utc")
+    monkeypatch.setitem(app.config, 'LOGIN_DISABLED', True)
+    queries = []
+
+    class FakeGraphQuery:
+        def __init__(self, settings, list_series, start, end, width, method='mean'):
+            queries.append(end)
+
+        def open(self):
+            return False
+
+    monkeypatch.setattr(routes_general, 'GraphQuery', FakeGraphQuery)
+    monkeypatch.setattr(routes_general, 'resolve_series', lambda measurement_ids: [])
+    monkeypatch.setenv('TZ', 'Europe/Berlin')
+    time.tzset()
+    try:
+        response = testapp.get('/async_v2/0/0/100?series=meas_1')
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+    assert response.status_code == 204
+    assert abs(queries[0] - time.time()) < 60
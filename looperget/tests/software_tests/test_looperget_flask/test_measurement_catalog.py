@@ -0,0 +1,54 @@
+# coding=utf-8
+"""Tests for the dashboard's cached catalog of measurements and form choices."""
+import os
+
+from looperget.databases.models import PID
+from looperget.databases.models import DeviceMeasurements
+from looperget.databases.models import Input
+from looperget.looperget_flask.utils.utils_measurement_catalog import MeasurementCatalog
+from looperget.looperget_flask.utils.utils_measurement_catalog import get_measurement_catalog
+from looperget.looperget_flask.utils.utils_measurement_catalog import widget_template_files
+
+
+def test_measurement_catalog(db):
+    """Verify the catalog resolves setpoints, is reused, and is rebuilt after a save."""
+    print("\nTest: test_measurement_catalog")
+    db.session.add(Input(unique_id='input_1', name='Sensor', device='DS18B20'))
+    db.session.add(DeviceMeasurements(
+        unique_id='meas_1', device_id='input_1', measurement='temperature', unit='C', channel=0))
+    db.session.add(PID(unique_id='pid_1', name='Heater', measurement='input_1,meas_1'))
+    db.session.add(DeviceMeasurements(
+        unique_id='meas_setpoint', device_id='pid_1', measurement_type='setpoint', channel=0))
+    db.session.commit()
+
+    catalog = MeasurementCatalog()
+    measures = catalog.get()
+    assert measures['dict_measure_units'] == {'meas_1': 'C', 'meas_setpoint': 'C'}
+    assert measures['dict_measure_measurements']['meas_setpoint'] == 'temperature'
+    assert [each['value'] for each in measures['choices_input']] == ['input_1,meas_1']
+    assert measures['use_unit']['input_1'] == {'temperature': {'C': {0: None}}}
+    assert catalog.get() is measures
+    assert catalog.status()['builds'] == 1
+
+    # Saving a measurement rebuilds the shared catalog on the next page load
+    shared = get_measurement_catalog()
+    shared.get()
+    db.session.add(DeviceMeasurements(
+        unique_id='meas_2', device_id='input_1', measurement='humidity', unit='percent', channel=1))
+    db.session.commit()
+    assert shared.catalog is None
+    assert 'meas_2' in shared.get()['dict_measure_units']
+
+
+def test_widget_template_files(tmp_path):
+    """Verify widget templates are found from the listing, which is refreshed after it changes."""
+    print("\nTest: test_widget_template_files")
+    (tmp_path / 'widget_template_graph_body.html').write_text('')
+    templates = widget_template_files(['graph', 'gauge'], path=str(tmp_path))
+    assert templates['body'] == {'graph': 'widget_template_graph_body.html'}
+    assert templates['js'] == {}
+
+    (tmp_path / 'widget_template_gauge_js.html').write_text('')
+    os.utime(tmp_path, ns=(0, os.stat(tmp_path).st_mtime_ns + 1))
+    templates = widget_template_files(['graph', 'gauge'], path=str(tmp_path))
+    assert templates['js'] == {'gauge': 'widget_template_gauge_js.html'}
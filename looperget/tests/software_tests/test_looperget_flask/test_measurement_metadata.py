@@ -0,0 +1,22 @@
+# coding=utf-8
+"""Tests for invalidating cached measurement metadata when it's saved."""
+from looperget.databases.models import DeviceMeasurements
+from looperget.databases.models import Misc
+from looperget.utils.measurement_metadata import get_measurement_metadata
+
+
+def test_measurement_save_invalidates_metadata(db):
+    """Verify committing a device measurement invalidates the metadata cache."""
+    print("\nTest: test_measurement_save_invalidates_metadata")
+    cache = get_measurement_metadata()
+
+    cache.info = {}
+    misc = Misc.query.first()
+    if misc:
+        misc.dismiss_notification = not misc.dismiss_notification
+        db.session.commit()
+    assert cache.info == {}
+
+    db.session.add(DeviceMeasurements(device_id='device', measurement='temperature', unit='C', channel=0))
+    db.session.commit()
+    assert cache.info is None
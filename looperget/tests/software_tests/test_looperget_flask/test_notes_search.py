@@ -0,0 +1,129 @@
+# coding=utf-8
+"""Tests for searching, paging, and exporting notes with the note indexes."""
+import datetime
+import io
+import zipfile
+from types import SimpleNamespace
+
+from looperget.databases.models import NoteTagLink
+from looperget.databases.models import NoteTags
+from looperget.databases.models import Notes
+from looperget.looperget_flask.utils import utils_notes
+
+
+def search_form(**kwargs):
+    """A stand-in for the NotesShow form, with the fields used to search notes."""
+    fields = dict(filter_names='', filter_tags='', filter_files='', filter_notes='',
+                  sort_by='id', sort_direction='desc')
+    fields.update(kwargs)
+    return SimpleNamespace(**{name: SimpleNamespace(data=value) for name, value in fields.items()})
+
+
+def test_notes_search(db, monkeypatch):
+    """Verify tag links and the full-text index follow saved notes, and search pages with cursors."""
+    print("\nTest: test_notes_search")
+    monkeypatch.setattr(utils_notes, 'NOTES_PAGE_SIZE', 2)
+    db.session.add(NoteTags(unique_id='tag_a', name='alpha'))
+    db.session.add(NoteTags(unique_id='tag_b', name='beta'))
+    start = datetime.datetime(2024, 1, 1)
+    for index in range(5):
+        db.session.add(Notes(name='Note {}'.format(index), tags='tag_a' if index % 2 else 'tag_a,tag_b',
+                             note='Temperature {} 온도'.format(index),
+                             date_time=start + datetime.timedelta(hours=index % 3)))
+    db.session.commit()
+    assert utils_notes.notes_fts_exists()
+    assert NoteTagLink.query.filter(NoteTagLink.tag_unique_id == 'tag_b').count() == 3
+
+    # Edits and deletes update the tag links and the full-text index
+    note = Notes.query.filter(Notes.name == 'Note 4').first()
+    note.tags = 'tag_a'
+    note.note = 'Humidity'
+    db.session.commit()
+    db.session.delete(Notes.query.filter(Notes.name == 'Note 0').first())
+    db.session.commit()
+    assert NoteTagLink.query.filter(NoteTagLink.tag_unique_id == 'tag_b').count() == 1
+
+    notes, count, cursor = utils_notes.show_notes(search_form(filter_notes='perat'))
+    assert count == 3 and [n.name for n in notes] == ['Note 3', 'Note 2']
+    notes, count, cursor = utils_notes.show_notes(search_form(filter_notes='perat'), cursor=cursor)
+    assert [n.name for n in notes] == ['Note 1'] and cursor is None
+
+    # Searches shorter than 3 characters aren't in the trigram index
+    notes, count, _ = utils_notes.show_notes(search_form(filter_notes='온도', filter_tags='beta'))
+    assert [n.name for n in notes] == ['Note 2']
+
+    # Pages sorted by a column with repeated values neither skip nor repeat notes
+    form = search_form(sort_by='date', sort_direction='asc')
+    names, cursor = [], None
+    while True:
+        notes, count, cursor = utils_notes.show_notes(form, cursor=cursor)
+        names.extend(n.name for n in notes)
+        if not cursor:
+            break
+    assert names == ['Note 3', 'Note 1', 'Note 4', 'Note 2']
+
+    # Notes without a time are last, sorted either way
+    for name in ('Undated 1', 'Undated 2', 'Undated 3'):
+        db.session.add(Notes(name=name, tags='tag_a', note=''))
+    db.session.commit()
+    # The column default sets the time when the note is added
+    Notes.query.filter(Notes.name.like('Undated%')).update({Notes.date_time: None})
+    db.session.commit()
+    for direction, expected in (('asc', ['Note 3', 'Note 1', 'Note 4', 'Note 2']),
+                                ('desc', ['Note 2', 'Note 4', 'Note 1', 'Note 3'])):
+        names, cursor = [], None
+        while True:
+            notes, count, cursor = utils_notes.show_notes(
+                search_form(sort_by='date', sort_direction=direction), cursor=cursor)
+            names.extend(n.name for n in notes)
+            if not cursor:
+                break
+        undated = ['Undated 1', 'Undated 2', 'Undated 3']
+        assert names == expected + (undated if direction == 'asc' else undated[::-1])
+
+
+def test_tag_overlay(db):
+    """Verify graph annotations are read by tag and time, and dense notes are clustered into counts."""
+    print("\nTest: test_tag_overlay")
+    start = datetime.datetime(2024, 1, 1)
+    for minute in range(50):
+        db.session.add(Notes(name='Note {}'.format(minute), tags='tag_a', note='Body {}'.format(minute),
+                             date_time=start + datetime.timedelta(minutes=minute)))
+    db.session.add(Notes(name='Other', tags='tag_b', note='', date_time=start))
+    db.session.commit()
+    end = start + datetime.timedelta(minutes=50)
+
+    annotations = utils_notes.tag_overlay('tag_a', start, end)
+    assert len(annotations) == 50
+    assert annotations[0] == (start, 'Note 0', 'Body 0')
+
+    # 10 minutes per bucket, each the count of its notes at the time of the first one
+    annotations = utils_notes.tag_overlay('tag_a', start, end, points=5)
+    assert [title for _, title, _ in annotations] == ['10 notes'] * 5
+    assert annotations[1][0] == start + datetime.timedelta(minutes=10)
+    assert annotations[1][2].startswith('Note 10\n')
+
+    # Changing the time of a note moves it in the index
+    note = Notes.query.filter(Notes.name == 'Note 0').first()
+    note.date_time = end + datetime.timedelta(days=1)
+    db.session.commit()
+    assert utils_notes.tag_overlay('tag_a', start, start + datetime.timedelta(minutes=1)) == [
+        (start + datetime.timedelta(minutes=1), 'Note 1', 'Body 1')]
+
+
+def test_notes_export(db):
+    """Verify the exported zip file is streamed with the CSV of the notes found."""
+    print("\nTest: test_notes_export")
+    db.session.add(NoteTags(unique_id='tag_a', name='alpha'))
+    for index in range(3):
+        db.session.add(Notes(unique_id='note_{}'.format(index), name='Note {}'.format(index),
+                             tags='tag_a', note='Note body {}'.format(index)))
+    db.session.commit()
+
+    notes = Notes.query.order_by(Notes.id.asc())
+    chunks = list(utils_notes.export_notes_zip(notes, 'notes_exported.csv', rows_per_chunk=1))
+    assert len(chunks) > 3
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as z:
+        lines = z.read('notes_exported.csv').decode().splitlines()
+    assert lines[0] == 'ID,UUID,Time,Name,Note,Tags,Files'
+    assert len(lines) == 4 and lines[1].endswith('Note 0,Note body 0,"tag_a,alpha",')
@@ -0,0 +1,130 @@
+# coding=utf-8
+"""Tests for requesting remote hosts concurrently, against local HTTPS hosts."""
+import http.server
+import json
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+import time
+import types
+
+import pytest
+
+from looperget.looperget_flask.utils.utils_remote_fleet import RemoteFleet
+
+pytestmark = pytest.mark.skipif(shutil.which('openssl') is None, reason="openssl not installed")
+
+
+class RemoteHandler(http.server.BaseHTTPRequestHandler):
+    """Answers as a remote Looperget: log in, then pages that require the session cookie."""
+    logins = 0
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        RemoteHandler.logins += 1
+        self.reply(200, b"Logged in via Remote Admin", {'Set-Cookie': 'session=abc; Path=/'})
+
+    def do_GET(self):
+        if self.headers.get('Cookie') != 'session=abc; Path=/':
+            self.reply(302, headers={'Location': '/login'})
+        elif self.path == '/auth/':
+            self.reply(200, b"authenticated")
+        elif self.path == '/slow/':
+            time.sleep(0.5)
+            self.reply(200, b"slow")
+        elif self.path == '/remote_get_inputs/':
+            self.reply(200, json.dumps({'1': {'name': 'Input'}}).encode())
+        else:
+            self.reply(404)
+
+
+@pytest.fixture
+def https_host(tmp_path):
+    """A local HTTPS host with a self-signed certificate."""
+    cert, key = str(tmp_path / 'cert.pem'), str(tmp_path / 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=localhost', '-keyout', key, '-out', cert],
+                   check=True, capture_output=True)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RemoteHandler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    RemoteHandler.logins = 0
+    yield cert, f'https://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+
+
+def remote(host):
+    return types.SimpleNamespace(host=host, username='admin', password_hash='hash')
+
+
+def test_remote_fleet_partial_results(https_host):
+    """Verify a host that doesn't respond doesn't hold up the others, and sessions are reused."""
+    print("\nTest: test_remote_fleet_partial_results")
+    cert, base_url = https_host
+    hung = socket.socket()  # Accepts connections but never answers
+    hung.bind(('127.0.0.1', 0))
+    hung.listen(8)
+
+    fleet = RemoteFleet(cache_sec=30)
+    fleet.host('up', 'admin', 'hash', ca_certs=cert, base_url=base_url)
+    fleet.host('hung', 'admin', 'hash', ca_certs=cert,
+               base_url=f'https://127.0.0.1:{hung.getsockname()[1]}')
+
+    timer = time.monotonic()
+    results = fleet.fetch([remote('up'), remote('hung')], 'remote_get_inputs', timeout=1)
+    assert time.monotonic() - timer < 2
+    assert results['hung'] == (1, None)
+    assert json.loads(results['up'][1]) == {'1': {'name': 'Input'}}
+
+    # A different page uses the same session, and cached pages aren't requested again
+    assert fleet.fetch([remote('up')], 'auth', timeout=1) == {'up': (0, 'authenticated')}
+    assert fleet.fetch([remote('up')], 'auth', timeout=1, max_age=0)['up'] == (0, 'authenticated')
+    assert RemoteHandler.logins == 1
+
+    # An expired session logs in again
+    fleet.hosts['up'].headers = {'cookie': 'session=expired'}
+    assert fleet.fetch([remote('up')], 'auth', timeout=1, max_age=0)['up'] == (0, 'authenticated')
+    assert RemoteHandler.logins == 2
+    hung.close()
+
+
+def test_remote_fleet_stale_pages(https_host):
+    """Verify a host that misses its deadline is shown with its last good page."""
+    print("\nTest: test_remote_fleet_stale_pages")
+    cert, base_url = https_host
+    fleet = RemoteFleet(cache_sec=30, stale_sec=600)
+    fleet.host('up', 'admin', 'hash', ca_certs=cert, base_url=base_url)
+    assert fleet.fetch([remote('up')], 'auth', timeout=1) == {'up': (0, 'authenticated')}
+
+    # The host stops answering: its last page is shown until the request completes
+    hung = socket.socket()
+    hung.bind(('127.0.0.1', 0))
+    hung.listen(8)
+    fleet.hosts['up'].base_url = f'https://127.0.0.1:{hung.getsockname()[1]}'
+    assert fleet.fetch([remote('up')], 'auth', timeout=0.3, max_age=0) == {'up': (0, 'authenticated')}
+
+    # Deleted hosts are forgotten along with their pages
+    fleet.forget('up')
+    assert fleet.cache == {} and fleet.last_good == {} and 'up' not in fleet.hosts
+
+    # A request that misses its deadline continues, and its page is cached for the next fetch
+    fleet.host('slow', 'admin', 'hash', ca_certs=cert, base_url=base_url)
+    assert fleet.fetch([remote('slow')], 'slow', timeout=0.2) == {'slow': (1, None)}
+    time.sleep(0.6)
+    assert fleet.fetch([remote('slow')], 'slow', timeout=0.2) == {'slow': (0, 'slow')}
+    hung.close()
@@ -0,0 +1,83 @@
+# coding=utf-8
+"""Tests for retrieving the values of all conditions of a Conditional at once."""
+import datetime
+import types
+
+from looperget.controllers.base_conditional import AbstractConditional
+from looperget.utils import actions
+from looperget.utils import influx
+
+
+class RowsQuery:
+    """Stands in for a ConditionalConditions query, returning the same rows for any filter."""
+    def __init__(self, rows):
+        self.rows = rows
+
+    def filter(self, *criteria):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+def test_read_influxdb_last_many(monkeypatch):
+    """Verify series missing from the latest value cache are read with one union query."""
+    print("\nTest: test_read_influxdb_last_many")
+    queries = []
+    timestamp = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def query(flux):
+        queries.append(flux)
+        return [types.SimpleNamespace(records=[
+            types.SimpleNamespace(values={'series': '1', '_time': timestamp, '_value': 5.0})])]
+
+    client = types.SimpleNamespace(query_api=lambda: types.SimpleNamespace(query=query), close=lambda: None)
+    monkeypatch.setattr(influx, 'db_retrieve_table_daemon', lambda *args, **kwargs: None)
+    monkeypatch.setattr(influx, 'influxdb_client_bucket', lambda settings, timeout: (client, 'bucket'))
+    monkeypatch.setattr(influx, 'get_latest_value_cache', lambda: types.SimpleNamespace(
+        get=lambda unique_id, *args, **kwargs: (1.0, 20.0) if unique_id == 'cached' else None))
+
+    last = influx.read_influxdb_last_many({
+        'a': ('cached', 'C', 0, 'temperature', 60),
+        'b': ('input_1', 'C', 0, 'temperature', 60),
+        'c': ('input_2', '%', 1, 'humidity', None)})
+    assert last == {'a': [1.0, 20.0], 'b': [None, None], 'c': [timestamp.timestamp(), 5.0]}
+    assert len(queries) == 1
+    assert 'union(tables: [t0, t1])' in queries[0]
+    assert 'r["device_id"] == "input_2"' in queries[0] and 'r["device_id"] == "cached"' not in queries[0]
+
+
+def test_conditions_all(monkeypatch):
+    """Verify all conditions are evaluated in one call, and condition() reads them until the next run."""
+    print("\nTest: test_conditions_all")
+    conditions = [
+        types.SimpleNamespace(unique_id='11111111-0000-0000-0000-000000000000', condition_type='measurement',
+                              measurement='input_1,measurement_1', max_age=60),
+        types.SimpleNamespace(unique_id='22222222-0000-0000-0000-000000000000',
+                              condition_type='measurement_and_ts',
+                              measurement='input_2,measurement_2', max_age=60)]
+    series = []
+    monkeypatch.setattr(actions, 'db_retrieve_table_daemon', lambda table: RowsQuery(conditions))
+    monkeypatch.setattr(actions, 'measurement_info', lambda measurement_id: (0, 'C', 'temperature'))
+    monkeypatch.setattr(actions, 'get_last_measurement', lambda *args, **kwargs: 1 / 0)
+    monkeypatch.setattr(actions, 'read_influxdb_last_many', lambda last_series: series.append(last_series) or {
+        each_id: [100.0, index] for index, each_id in enumerate(last_series)})
+
+    values = actions.get_condition_values('conditional_1')
+    assert len(series) == 1
+    assert values == {conditions[0].unique_id: 0, conditions[1].unique_id: {'time': 100.0, 'value': 1}}
+
+    calls = []
+    control = types.SimpleNamespace(
+        get_condition_measurements=lambda conditional_id: calls.append(conditional_id) or values,
+        get_condition_measurement=lambda condition_id: calls.append(condition_id) or 'daemon')
+    conditional = AbstractConditional(None, 'conditional_1', '')
+    conditional.control = control
+    assert conditional.conditions_all() == values
+    assert conditional.condition('{11111111}') == 0
+    assert conditional.condition(conditions[1].unique_id) == {'time': 100.0, 'value': 1}
+    assert calls == ['conditional_1']
+
+    # The next run requests the daemon again
+    conditional.condition_values = {}
+    assert conditional.condition(conditions[0].unique_id) == 'daemon'
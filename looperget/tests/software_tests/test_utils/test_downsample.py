@@ -0,0 +1,45 @@
+# coding=utf-8
+"""Tests for downsampling graph series."""
+import math
+
+from looperget.utils.downsample import downsample
+
+
+def make_series(count, spike_index):
+    series = [(float(i), math.sin(i / 50)) for i in range(count)]
+    series[spike_index] = (float(spike_index), 100.0)
+    return series
+
+
+def test_downsample_lttb():
+    """Verify LTTB keeps the end points, the requested number of points, and a spike."""
+    print("\nTest: test_downsample_lttb")
+    series = make_series(10000, 4321)
+    points = downsample(series, 500, 'lttb')
+    assert len(points) == 500
+    assert points[0] == series[0]
+    assert points[-1] == series[-1]
+    assert (4321.0, 100.0) in points
+    assert [each_point[0] for each_point in points] == sorted(each_point[0] for each_point in points)
+
+
+def test_downsample_min_max():
+    """Verify min/max keeps the extremes of each bucket in time order."""
+    print("\nTest: test_downsample_min_max")
+    series = make_series(10000, 9876)
+    series[10] = (10.0, -50.0)
+    points = downsample(series, 400, 'minmax')
+    assert len(points) <= 400
+    assert (9876.0, 100.0) in points
+    assert (10.0, -50.0) in points
+    assert [each_point[0] for each_point in points] == sorted(each_point[0] for each_point in points)
+
+
+def test_downsample_unchanged():
+    """Verify small series, unknown methods, and missing values are handled."""
+    print("\nTest: test_downsample_unchanged")
+    series = make_series(100, 5)
+    assert downsample(series, 500, 'lttb') is series
+    assert downsample(series, 10, 'none') is series
+    series_missing = series + [(100.0, None), (101.0, float('nan'))]
+    assert len(downsample(series_missing, 50, 'lttb')) == 50
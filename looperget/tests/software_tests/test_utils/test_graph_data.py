@@ -0,0 +1,95 @@
+# coding=utf-8
+"""Tests for querying and encoding downsampled graph data."""
+import json
+import struct
+import types
+
+from looperget.utils import graph_data
+from looperget.utils.graph_data import GraphQuery
+from looperget.utils.graph_data import encode_binary
+from looperget.utils.graph_data import encode_json
+from looperget.utils.graph_data import window_ms
+from looperget.utils.measurement_metadata import MeasurementInfo
+from looperget.utils.rollups import RollupStore
+
+
+def test_window_from_width():
+    """Verify the window gives about one point per pixel."""
+    print("\nTest: test_window_from_width")
+    assert window_ms(0, 86400, 1000) == 86400
+    assert window_ms(0, 1, 4000) == 1
+    assert window_ms(0, 30 * 86400, 0) == 30 * 86400 * 1000
+
+
+def test_graph_query_encodes_series_in_order(tmp_path, monkeypatch):
+    """Verify series are queried with the width's window and encoded in the order requested."""
+    print("\nTest: test_graph_query_encodes_series_in_order")
+    queries = []
+
+    def query_columns(client, query):
+        queries.append(query)
+        if 'device_b' in query:
+            return [1000, 2000, 3000], [1.5, None, 3.5]
+        return [1000], [7.0]
+
+    monkeypatch.setattr(graph_data, 'query_columns', query_columns)
+    monkeypatch.setattr(graph_data, 'influxdb_client_bucket', lambda settings, timeout: (
+        types.SimpleNamespace(close=lambda: None), 'bucket'))
+    monkeypatch.setattr(graph_data, 'get_rollup_store', lambda: RollupStore(str(tmp_path / 'rollups.db')))
+    settings = types.SimpleNamespace(measurement_db_version='2')
+    list_series = [
+        ('id_b', MeasurementInfo('device_b', 0, 'C', 'temperature')),
+        ('id_missing', None),
+        ('id_a', MeasurementInfo('device_a', 1, 'percent', 'humidity'))]
+
+    graph_query = GraphQuery(settings, list_series, 1000, 1000 + 3600, 720)
+    assert graph_query.open()
+    data = json.loads(''.join(encode_json(graph_query, graph_query.results())))
+    assert data['window_ms'] == 5000
+    assert [each_series['id'] for each_series in data['series']] == ['id_b', 'id_missing', 'id_a']
+    assert data['series'][0] == {'id': 'id_b', 't': [1000, 2000, 3000], 'v': [1.5, None, 3.5]}
+    assert data['series'][1] == {'id': 'id_missing', 't': [], 'v': []}
+    assert len(queries) == 2
+    assert all('aggregateWindow(every: 5000ms, fn: mean' in query for query in queries)
+
+    binary = b''.join(encode_binary(graph_query.results()))
+    count, _ = struct.unpack_from('<II', binary, 0)
+    assert count == 3
+    assert struct.unpack_from('<3d', binary, 8) == (1000.0, 2000.0, 3000.0)
+    assert struct.unpack_from('<f', binary, 32)[0] == 1.5
+    # 3 float32 values are padded to 16 bytes, keeping the next series aligned
+    assert struct.unpack_from('<II', binary, 48) == (0, 0)
+    assert struct.unpack_from('<II', binary, 56) == (1, 0)
+
+
+def test_graph_query_from_rollups(tmp_path, monkeypatch):
+    """Verify windows covered by a rollup tier are read from it, and only the rest is queried."""
+    print("\nTest: test_graph_query_from_rollups")
+    hour = 1700002800
+    store = RollupStore(str(tmp_path / 'rollups.db'), tiers=((60, 36500), (900, 36500), (3600, 36500)))
+    store.add_range(hour - 86400, hour, [
+        ('C', 'device_a', 1, 'temperature', epoch, 20.0) for epoch in range(hour - 86400, hour, 30)])
+    queries = []
+
+    def query_columns(client, query):
+        queries.append(query)
+        return [(hour + 1800) * 1000], [21.0]
+
+    monkeypatch.setattr(graph_data, 'query_columns', query_columns)
+    monkeypatch.setattr(graph_data, 'get_rollup_store', lambda: store)
+    monkeypatch.setattr(graph_data, 'influxdb_client_bucket', lambda settings, timeout: (
+        types.SimpleNamespace(close=lambda: None), 'bucket'))
+    settings = types.SimpleNamespace(measurement_db_version='2')
+    info = MeasurementInfo('device_a', 1, 'C', 'temperature')
+
+    graph_query = GraphQuery(settings, [('id_a', info)], hour - 86400, hour + 1800, 50)
+    assert graph_query.open()
+    (_, times, values), = graph_query.results()
+    # 29.4 minute windows, lengthened to a whole number of 15 minute buckets
+    assert graph_query.rollup_tier == 900
+    assert graph_query.window_ms == 1800 * 1000
+    assert times[:2] == [(hour - 86400 + 1800) * 1000, (hour - 86400 + 3600) * 1000]
+    assert values == [20.0] * 48 + [21.0]
+    assert times[-1] == (hour + 1800) * 1000
+    assert len(queries) == 1
+    assert graph_data.flux_time(hour) in queries[0]
@@ -0,0 +1,46 @@
+# coding=utf-8
+"""Tests for the queue between input message callbacks and stored measurements."""
+from looperget.utils import measurement_ingest
+from looperget.utils.measurement_ingest import MeasurementIngestQueue
+
+
+def make_queue(written, **kwargs):
+    ingest = MeasurementIngestQueue(
+        'test-input', lambda message: {0: {'value': message}} if message >= 0 else None,
+        write=written.append, **kwargs)
+    ingest.actions = []  # No actions, without reading the database
+    ingest.actions_timer = float('inf')
+    return ingest
+
+
+def test_ingest_writes_batches():
+    """Verify queued messages are parsed and written in batches, skipping unparsed messages."""
+    print("\nTest: test_ingest_writes_batches")
+    written = []
+    ingest = make_queue(written, batch_size=4)
+    for value in [1, 2, -1, 3, 4, 5]:
+        assert ingest.put(value)
+    ingest.start()
+    ingest.stop()
+
+    assert [len(batch) for batch in written] == [3, 2]
+    assert [measurements[0]['value'] for batch in written for measurements in batch] == [1, 2, 3, 4, 5]
+    status = ingest.status()
+    assert status['received'] == 6
+    assert status['stored'] == 5
+    assert status['batches'] == 2
+
+
+def test_ingest_drops_when_full(monkeypatch):
+    """Verify messages are dropped and counted once the queue stays full."""
+    print("\nTest: test_ingest_drops_when_full")
+    monkeypatch.setattr(measurement_ingest, 'MEASUREMENT_INGEST_PUT_TIMEOUT_SEC', 0.01)
+    ingest = make_queue([], size=2)
+    assert ingest.put(1)
+    assert ingest.put(2)
+    assert not ingest.put(3)
+
+    status = ingest.status()
+    assert status['dropped'] == 1
+    assert status['waited_for_room'] == 1
+    assert status['queue_depth_max'] == 2
@@ -0,0 +1,107 @@
+# coding=utf-8
+"""Tests for compiled method handlers."""
+import datetime
+import types
+
+from looperget.utils import method as method_module
+from looperget.utils.method import MethodHandlerCache
+from looperget.utils.method import create_method_handler
+
+
+class RowsQuery:
+    """Stands in for a MethodData query, returning the same rows for any filter."""
+    def __init__(self, rows):
+        self.rows = rows
+
+    def filter(self, *criteria):
+        return self
+
+    def all(self):
+        return self.rows
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+
+def make_row(**kwargs):
+    row = dict(unique_id='row', time_start=None, time_end=None, duration_sec=None, duration_end=None,
+               setpoint_start=None, setpoint_end=None, linked_method_id=None, amplitude=None,
+               frequency=None, shift_angle=None, shift_y=None)
+    row.update(kwargs)
+    return types.SimpleNamespace(**row)
+
+
+def make_method(method_type, unique_id='method_1'):
+    return types.SimpleNamespace(unique_id=unique_id, method_type=method_type, name=method_type)
+
+
+def test_daily_method_overlapping_rows():
+    """Verify the first row containing a time gives the setpoint, as when rows were scanned in order."""
+    print("\nTest: test_daily_method_overlapping_rows")
+    rows = [make_row(time_start='00:00:00', time_end='02:00:00', setpoint_start=10, setpoint_end=20),
+            make_row(time_start='01:00:00', time_end='03:00:00', setpoint_start=50)]
+    handler = create_method_handler(make_method('Daily'), RowsQuery(rows))
+
+    def setpoint(hour, minute):
+        return handler.calculate_setpoint(datetime.datetime(2024, 5, 1, hour, minute, 0, 500))[0]
+
+    assert setpoint(1, 30) == 17.5
+    assert setpoint(2, 0) == 50
+    assert setpoint(2, 30) == 50
+    assert setpoint(3, 0) is None
+    assert setpoint(0, 0) is None
+
+
+def test_duration_method_repeats():
+    """Verify duration rows are found by their cumulative end and the method repeats."""
+    print("\nTest: test_duration_method_repeats")
+    rows = [make_row(duration_sec=60, setpoint_start=0, setpoint_end=60),
+            make_row(duration_sec=60, setpoint_start=100),
+            make_row(duration_sec=0, duration_end=0)]
+    handler = create_method_handler(make_method('Duration'), RowsQuery(rows))
+    start = datetime.datetime(2024, 5, 1)
+    assert handler.cycle_duration() == 120
+    assert handler.repeat_duration() == 0
+    assert handler.calculate_setpoint(start + datetime.timedelta(seconds=30), start) == (30, False)
+    assert handler.calculate_setpoint(start + datetime.timedelta(seconds=90), start) == (100, False)
+    assert handler.calculate_setpoint(start + datetime.timedelta(seconds=150), start) == (30, False)
+    assert handler.determine_end_time(start) == datetime.datetime.max
+
+
+def test_sine_plot_matches_setpoints():
+    """Verify the plot computed at once matches the setpoint at each point."""
+    print("\nTest: test_sine_plot_matches_setpoints")
+    rows = [make_row(amplitude=10, frequency=1, shift_angle=0, shift_y=50)]
+    handler = create_method_handler(make_method('DailySine'), RowsQuery(rows))
+    plot = handler.get_plot(100)
+    assert len(plot) == 100
+    for x, y in plot[::7]:
+        now = datetime.datetime(1900, 1, 1) + datetime.timedelta(milliseconds=x)
+        assert abs(handler.calculate_setpoint(now)[0] - y) < 1e-9
+
+
+def test_method_cache_compiles_once(monkeypatch):
+    """Verify a method is loaded from the database once, until the cache is invalidated."""
+    print("\nTest: test_method_cache_compiles_once")
+    queries = []
+    rows = [make_row(duration_sec=60, setpoint_start=5)]
+
+    def db_retrieve_table_daemon(table):
+        queries.append(table)
+        if table is method_module.Method:
+            return RowsQuery([make_method('Duration')])
+        return RowsQuery(rows)
+
+    monkeypatch.setattr(method_module, 'db_retrieve_table_daemon', db_retrieve_table_daemon)
+    cache = MethodHandlerCache()
+    logger = types.SimpleNamespace(debug=lambda message: None)
+    first = cache.get('method_1')
+    second = cache.get('method_1', logger)
+    assert len(queries) == 2
+    assert second.logger is logger and first.logger is None
+    assert second.row_ends is first.row_ends
+
+    cache.invalidate()
+    cache.get('method_1')
+    assert len(queries) == 4
+    assert cache.status() == {'methods': 1, 'hits': 1, 'misses': 2}
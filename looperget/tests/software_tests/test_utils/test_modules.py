@@ -0,0 +1,116 @@
+# coding=utf-8
+"""Tests for the module registry, the module information index and the parsed information cache."""
+import os
+
+from looperget.utils import modules
+from looperget.utils.modules import INDEX_MODULE
+from looperget.utils.modules import INDEX_PICKLED
+from looperget.utils.modules import INDEX_VOLATILE
+from looperget.utils.modules import InformationCache
+from looperget.utils.modules import ModuleInformationIndex
+from looperget.utils.modules import ModuleRegistry
+
+
+def write_module(path, source):
+    with open(path, 'w') as module_file:
+        module_file.write(source)
+    # Ensure the edit changes the file signature, even within the mtime resolution
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+
+def test_module_registry_reloads_changed_files(tmp_path):
+    """Verify a module is executed once and reloaded only after its file changes."""
+    print("\nTest: test_module_registry_reloads_changed_files")
+    path = str(tmp_path / 'action_test.py')
+    write_module(path, "VALUE = 1\n")
+    registry = ModuleRegistry()
+
+    module_first, status = registry.get(path, 'actions')
+    module_second, status = registry.get(path, 'actions')
+    assert module_first is module_second
+    assert module_first.VALUE == 1
+
+    write_module(path, "VALUE = 22\n")
+    module_third, status = registry.get(path, 'actions')
+    assert module_third is not module_first
+    assert module_third.VALUE == 22
+
+
+def test_module_information_index(tmp_path, monkeypatch):
+    """Verify information is read from the index without executing unchanged modules."""
+    print("\nTest: test_module_information_index")
+    loads = []
+    load_module_from_file = modules.load_module_from_file
+    monkeypatch.setattr(modules, 'load_module_from_file', lambda path_file, module_type: (
+        loads.append(path_file), load_module_from_file(path_file, module_type))[1])
+    registry = ModuleRegistry()
+    monkeypatch.setattr(modules, 'get_module_registry', lambda: registry)
+    index_path = str(tmp_path / 'index' / 'module_index.db')
+    plain = str(tmp_path / 'plain.py')
+    with_code = str(tmp_path / 'with_code.py')
+    volatile = str(tmp_path / 'volatile.py')
+    write_module(plain, "INPUT_INFORMATION = {'input_name_unique': 'plain', 'options': [1, 2]}\n")
+    write_module(with_code, "def execute():\n    pass\nINPUT_INFORMATION = {'execute_at_creation': execute}\n")
+    write_module(volatile, "import uuid\nINPUT_INFORMATION = {'default': str(uuid.uuid4())}\n")
+
+    index = ModuleInformationIndex(index_path)
+    information = index.get(plain, 'inputs', 'INPUT_INFORMATION')
+    assert information == {'input_name_unique': 'plain', 'options': [1, 2]}
+    # Indexing executes a module once, without keeping it in the registry
+    assert loads == [plain]
+    assert not registry.modules
+    information['options'].append(3)  # Callers get their own copy
+    assert index.get(with_code, 'inputs', 'INPUT_INFORMATION')['execute_at_creation'].__name__ == 'execute'
+    assert index.get(volatile, 'inputs', 'INPUT_INFORMATION') != index.get(volatile, 'inputs', 'INPUT_INFORMATION')
+
+    # A new process reads the stored entries
+    index = ModuleInformationIndex(index_path)
+    assert index.get(plain, 'inputs', 'INPUT_INFORMATION') == {'input_name_unique': 'plain', 'options': [1, 2]}
+    assert [index.entries[path][2] for path in (plain, with_code, volatile)] == [
+        INDEX_PICKLED, INDEX_MODULE, INDEX_VOLATILE]
+
+    write_module(plain, "INPUT_INFORMATION = {'input_name_unique': 'plain', 'options': []}\n")
+    assert index.get(plain, 'inputs', 'INPUT_INFORMATION')['options'] == []
+
+
+def test_information_cache_follows_module_files(tmp_path, monkeypatch):
+    """Verify a scan is reused until a module file is added, edited or removed."""
+    print("\nTest: test_information_cache_follows_module_files")
+    builtin, custom = tmp_path / 'inputs', tmp_path / 'custom_inputs'
+    builtin.mkdir()
+    custom.mkdir()
+    write_module(str(builtin / 'input_a.py'), "INFORMATION = 1\n")
+    cache = InformationCache()
+    monkeypatch.setattr(modules, 'information_cache', cache)
+    scans = []
+
+    @modules.cache_information('inputs', [str(builtin), str(custom)])
+    def parse_information(exclude_custom=False):
+        scans.append(exclude_custom)
+        return {name: {'name': name} for path in ([builtin] if exclude_custom else [builtin, custom])
+                for name in sorted(os.listdir(path)) if name.endswith('.py')}
+
+    assert parse_information() == {'input_a.py': {'name': 'input_a.py'}}
+    parse_information()['input_z.py'] = {}  # Each call gets its own dict
+    assert parse_information() == {'input_a.py': {'name': 'input_a.py'}}
+    assert parse_information(exclude_custom=True) == {'input_a.py': {'name': 'input_a.py'}}
+    assert scans == [False, True]
+
+    # Importing a custom module, editing and deleting it scan the modules again
+    write_module(str(custom / 'input_b.py'), "INFORMATION = 2\n")
+    assert sorted(parse_information()) == ['input_a.py', 'input_b.py']
+    parse_information(exclude_custom=True)
+    write_module(str(custom / 'input_b.py'), "INFORMATION = 3\n")
+    parse_information()
+    os.remove(str(custom / 'input_b.py'))
+    assert sorted(parse_information()) == ['input_a.py']
+    assert scans == [False, True, False, False, False]
+
+    # Compiled modules written to __pycache__ don't
+    (builtin / '__pycache__').mkdir()
+    parse_information()
+    cache.invalidate()
+    parse_information()
+    assert scans == [False, True, False, False, False, False]
+    assert cache.status()['hits'] == 4
@@ -0,0 +1,127 @@
+# coding=utf-8
+"""Tests for measurement rollups and planning aggregates from them."""
+import datetime
+import re
+import types
+
+from looperget.utils import influx
+from looperget.utils.rollups import PIECE_RAW
+from looperget.utils.rollups import RollupJob
+from looperget.utils.rollups import RollupStore
+from looperget.utils.rollups import plan_pieces
+
+HOUR = 1700002800  # A multiple of 3600
+
+
+def make_points(start, end, every=10, channel=0):
+    return [('s', 'output_1', channel, 'duration_time', epoch, float(epoch % 7))
+            for epoch in range(start, end, every)]
+
+
+def test_rollup_tiers_match_raw_points(tmp_path):
+    """Verify buckets rolled up in several ranges give the same aggregates as the raw points."""
+    print("\nTest: test_rollup_tiers_match_raw_points")
+    store = RollupStore(str(tmp_path / 'rollups.db'))
+    points = make_points(HOUR - 3600, HOUR + 3600)
+    # Roll up the second hour a minute at a time, and the first hour in one step (backfill)
+    for start in range(HOUR, HOUR + 3600, 60):
+        store.add_range(start, start + 60, [p for p in points if start <= p[4] < start + 60])
+    store.add_range(HOUR - 3600, HOUR, points)
+    assert store.coverage() == (HOUR - 3600, HOUR + 3600)
+
+    values = [p[5] for p in points]
+    expected = [len(values), sum(values), min(values), max(values)]
+    for bucket_sec in (60, 900, 3600):
+        assert store.aggregate(bucket_sec, HOUR - 3600, HOUR + 3600, 's', 'output_1') == expected
+    assert store.aggregate(3600, HOUR, HOUR + 3600, 's', 'output_1', channel=1)[0] == 0
+
+    # Rolling up a range again replaces its buckets
+    store.add_range(HOUR, HOUR + 60, [])
+    assert store.aggregate(3600, HOUR, HOUR + 3600, 's', 'output_1')[0] == 360 - 6
+
+    times, means = store.windows(60, 1800, HOUR - 3600, HOUR + 3600, 's', 'output_1')
+    assert times == [(HOUR - 1800) * 1000, HOUR * 1000, (HOUR + 1800) * 1000, (HOUR + 3600) * 1000]
+    assert len(means) == 4
+
+
+def test_plan_pieces():
+    """Verify periods use the coarsest covering tiers, with raw points only at the uncovered edges."""
+    print("\nTest: test_plan_pieces")
+    coverage = [(3600, HOUR - 86400, HOUR), (900, HOUR - 86400, HOUR + 900), (60, HOUR - 3600, HOUR + 960)]
+    start = HOUR - 7200 - 930
+    assert plan_pieces(start, HOUR + 1000, coverage) == [
+        (PIECE_RAW, start, HOUR - 8100),
+        (900, HOUR - 8100, HOUR - 7200),
+        (3600, HOUR - 7200, HOUR),
+        (900, HOUR, HOUR + 900),
+        (60, HOUR + 900, HOUR + 960),
+        (PIECE_RAW, HOUR + 960, HOUR + 1000)]
+    assert plan_pieces(HOUR + 10, HOUR + 50, coverage) == [(PIECE_RAW, HOUR + 10, HOUR + 50)]
+    assert plan_pieces(HOUR, HOUR, coverage) == []
+
+
+def test_query_flux_planned_from_rollups(tmp_path, monkeypatch):
+    """Verify a long-range sum is planned from the rollups, querying raw points only for the edges."""
+    print("\nTest: test_query_flux_planned_from_rollups")
+    store = RollupStore(str(tmp_path / 'rollups.db'))
+    points = make_points(HOUR - 86400, HOUR)
+    job = RollupJob(store, lambda start, end: [p for p in points if start <= p[4] < end])
+    job.roll(now=HOUR + 120)  # Backfills 24 steps of an hour
+    assert store.coverage() == (HOUR - 86400, HOUR)
+
+    queries = []
+    edge_points = make_points(HOUR - 86400 - 30, HOUR - 86400) + make_points(HOUR, HOUR + 100)
+
+    def query_stream(query):
+        queries.append(query)
+        start, end = [datetime.datetime.strptime(each_time, '%Y-%m-%dT%H:%M:%S.%fZ').replace(
+            tzinfo=datetime.timezone.utc).timestamp()
+            for each_time in re.search(r'range\(start: (\S+), stop: (\S+)\)', query).groups()]
+        return [types.SimpleNamespace(get_value=lambda value=p[5]: value) for p in edge_points
+                if start <= p[4] < end]
+
+    client = types.SimpleNamespace(query_api=lambda: types.SimpleNamespace(query_stream=query_stream))
+    monkeypatch.setattr(influx, 'get_rollup_store', lambda: store)
+    tables = influx.query_flux_rollups(
+        client, 'bucket', 's', 'output_1', 'SUM', 'duration_time', 0, HOUR - 86400 - 30, HOUR + 100)
+
+    all_points = edge_points + points
+    assert [record.values['_value'] for table in tables for record in table.records] == [
+        sum(p[5] for p in all_points)]
+    assert len(queries) == 2
+    assert all('r["channel"] == "0"' in query for query in queries)
+
+    # Periods mostly outside the rollups are left to influxdb
+    assert influx.query_flux_rollups(
+        client, 'bucket', 's', 'output_1', 'SUM', None, None, HOUR - 3 * 86400, HOUR) is None
+
+
+def test_backdated_points_rolled_up_again(tmp_path, monkeypatch):
+    """Verify a point written after its period was rolled up is included in planned sums."""
+    print("\nTest: test_backdated_points_rolled_up_again")
+    from influxdb_client import Point
+
+    store = RollupStore(str(tmp_path / 'rollups.db'))
+    points = make_points(HOUR - 86400, HOUR)
+    job = RollupJob(store, lambda start, end: [p for p in points if start <= p[4] < end])
+    job.roll(now=HOUR + 120)
+    monkeypatch.setattr(influx, 'get_rollup_store', lambda: store)
+
+    # An output turned on for an hour writes its duration with the time it turned on
+    points.append(('s', 'output_1', 0, 'duration_time', HOUR - 3605, 3600.0))
+    influx.mark_late_points([
+        Point('s').tag('device_id', 'output_1').field('value', 3600.0).time(
+            datetime.datetime.fromtimestamp(HOUR - 3605, datetime.timezone.utc))])
+    assert store.is_dirty(HOUR - 86400, HOUR)
+
+    client = types.SimpleNamespace(query_api=None)
+    assert influx.query_flux_rollups(
+        client, 'bucket', 's', 'output_1', 'SUM', 'duration_time', 0, HOUR - 86400, HOUR) is None
+
+    job.roll(now=HOUR + 180)
+    assert not store.is_dirty(HOUR - 86400, HOUR)
+    assert job.dirty_rolled == 1
+    tables = influx.query_flux_rollups(
+        client, 'bucket', 's', 'output_1', 'SUM', 'duration_time', 0, HOUR - 86400, HOUR)
+    assert [record.values['_value'] for table in tables for record in table.records] == [
+        sum(p[5] for p in points)]
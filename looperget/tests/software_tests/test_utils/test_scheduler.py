@@ -0,0 +1,234 @@
+# coding=utf-8
+"""Tests for the controller scheduler."""
+import datetime
+import threading
+import time
+
+from looperget.controllers.base_controller import AbstractController
+from looperget.controllers.controller_output import OutputController
+from looperget.utils.scheduler import ControllerScheduler
+
+
+class TimerController(AbstractController, threading.Thread):
+    scheduled = True
+
+    def __init__(self, ready, period):
+        threading.Thread.__init__(self)
+        super().__init__(ready, name=__name__)
+        self.period = period
+        self.timer = None
+        self.loops = 0
+        self.finished = False
+
+    def initialize_variables(self):
+        self.timer = time.time()
+        self.ready.set()
+        self.running = True
+
+    def loop(self):
+        if time.time() >= self.timer:
+            self.loops += 1
+            while self.timer <= time.time():
+                self.timer += self.period
+
+    def next_wakeup(self):
+        return self.timer
+
+    def run_finally(self):
+        self.finished = True
+
+
+def test_scheduler_runs_controllers_when_due(monkeypatch):
+    """Verify scheduled controllers loop at their period without threads of their own, and stop promptly."""
+    print("\nTest: test_scheduler_runs_controllers_when_due")
+    scheduler = ControllerScheduler(workers=2)
+    monkeypatch.setattr('looperget.controllers.base_controller.get_controller_scheduler', lambda: scheduler)
+
+    controllers = []
+    for _ in range(20):
+        ready = threading.Event()
+        controller = TimerController(ready, 0.2)
+        controller.daemon = True
+        controller.start()
+        assert ready.wait(5)
+        controllers.append(controller)
+
+    assert not any(each_thread is controller for each_thread in threading.enumerate()
+                   for controller in controllers)
+    time.sleep(1.1)
+
+    for controller in controllers:
+        assert controller.is_running()
+        assert 5 <= controller.loops <= 7
+
+    status = scheduler.status()
+    assert status['controllers'] == 20
+    assert status['workers'] <= 2
+
+    # Stopping wakes the controller, rather than waiting for its next loop
+    controllers[0].period = 60
+    time.sleep(0.3)
+    timer_stop = time.time()
+    controllers[0].stop_controller()
+    controllers[0].join(5)
+    assert time.time() - timer_stop < 0.1
+    assert controllers[0].finished and not controllers[0].is_alive()
+    assert scheduler.status()['controllers'] == 19
+
+    for controller in controllers[1:]:
+        controller.stop_controller()
+        controller.join(5)
+
+
+class FakeOutput:
+    unique_id = 'output'
+
+    def __init__(self):
+        self.output_setup = True
+        self.output_on_duration = {0: False}
+        self.output_on_until = {0: datetime.datetime.now()}
+        self.output_off_triggered = {0: False}
+        self.time_off = None
+
+    def output_on_off(self, state, output_channel=0, amount=0.0, **kwargs):
+        if state == 'on':
+            self.output_on_duration[output_channel] = True
+            self.output_on_until[output_channel] = (
+                datetime.datetime.now() + datetime.timedelta(seconds=amount))
+        else:
+            self.time_off = time.time()
+            self.output_on_duration[output_channel] = False
+            self.output_off_triggered[output_channel] = False
+        return 0, state
+
+    def shutdown(self, shutdown_timer):
+        pass
+
+
+class FakeOutputController(OutputController):
+    def initialize_variables(self):
+        self.sample_rate = 0.05
+        self.ready.set()
+        self.running = True
+
+
+def test_output_turns_off_at_deadline(monkeypatch):
+    """Verify an output on for a duration is turned off at its deadline and its lateness recorded."""
+    print("\nTest: test_output_turns_off_at_deadline")
+    scheduler = ControllerScheduler(workers=2)
+    monkeypatch.setattr('looperget.controllers.base_controller.get_controller_scheduler', lambda: scheduler)
+    monkeypatch.setattr('looperget.controllers.controller_output.DaemonControl', lambda: None)
+
+    ready = threading.Event()
+    controller = FakeOutputController(ready, False)
+    output = FakeOutput()
+    controller.output['output'] = output
+    controller.output_unique_id['output'] = {0: None}
+    controller.start()
+    assert ready.wait(5)
+
+    try:
+        controller.output_on_off('output', 'on', amount=0.3)
+        deadline = output.output_on_until[0].timestamp()
+        # Extending the duration supersedes the first deadline
+        controller.output_on_off('output', 'on', amount=0.5)
+        deadline_extended = output.output_on_until[0].timestamp()
+        # Rescheduling the same deadline (e.g. by the scan) doesn't add it again
+        controller.schedule_output_off('output', 0)
+        assert len(controller.off_deadlines) == 2
+        time.sleep(0.4)
+        assert output.time_off is None
+        time.sleep(0.3)
+        assert deadline_extended <= output.time_off < deadline_extended + 0.05
+        assert output.time_off - deadline > 0.15
+
+        latency = controller.output_off_latency()
+        assert latency['count'] == 1
+        assert latency['max_ms'] < 50
+    finally:
+        controller.stop_controller()
+        controller.join(5)
+
+
+class BlockingController(AbstractController, threading.Thread):
+    scheduled = True
+
+    def __init__(self, ready, release):
+        threading.Thread.__init__(self)
+        super().__init__(ready, name=__name__)
+        self.release = release
+        self.blocked = threading.Event()
+
+    def initialize_variables(self):
+        self.ready.set()
+        self.running = True
+
+    def loop(self):
+        self.blocked.set()
+        self.release.wait(5)
+
+
+def test_output_turns_off_while_workers_blocked(monkeypatch):
+    """Verify an output turns off at its deadline while every scheduler worker is blocked."""
+    print("\nTest: test_output_turns_off_while_workers_blocked")
+    scheduler = ControllerScheduler(workers=2)
+    monkeypatch.setattr('looperget.controllers.base_controller.get_controller_scheduler', lambda: scheduler)
+    monkeypatch.setattr('looperget.controllers.controller_output.DaemonControl', lambda: None)
+
+    ready = threading.Event()
+    controller = FakeOutputController(ready, False)
+    output = FakeOutput()
+    controller.output['output'] = output
+    controller.output_unique_id['output'] = {0: None}
+    controller.start()
+    assert ready.wait(5)
+
+    release = threading.Event()
+    blocking = [BlockingController(threading.Event(), release) for _ in range(2)]
+    try:
+        for each_controller in blocking:
+            each_controller.start()
+        assert all(each_controller.blocked.wait(5) for each_controller in blocking)
+
+        controller.output_on_off('output', 'on', amount=0.2)
+        deadline = output.output_on_until[0].timestamp()
+        time.sleep(0.4)
+        assert output.time_off is not None
+        assert deadline <= output.time_off < deadline + 0.05
+    finally:
+        release.set()
+        for each_controller in blocking + [controller]:
+            each_controller.stop_controller()
+            each_controller.join(5)
+
+
+def test_controllers_run_while_workers_blocked(monkeypatch):
+    """Verify controllers keep looping while a blocking controller holds every worker."""
+    print("\nTest: test_controllers_run_while_workers_blocked")
+    scheduler = ControllerScheduler(workers=2, blocked_sec=0.2)
+    monkeypatch.setattr('looperget.controllers.base_controller.get_controller_scheduler', lambda: scheduler)
+
+    release = threading.Event()
+    blocking = [BlockingController(threading.Event(), release) for _ in range(2)]
+    controllers = [TimerController(threading.Event(), 0.1) for _ in range(3)]
+    try:
+        for each_controller in blocking:
+            each_controller.start()
+        assert all(each_controller.blocked.wait(5) for each_controller in blocking)
+
+        for each_controller in controllers:
+            each_controller.start()
+        time.sleep(1.2)
+        for each_controller in controllers:
+            assert each_controller.loops >= 7
+        # Only one worker is needed for the controllers that don't block
+        assert scheduler.status()['workers'] == 3
+
+        release.set()
+        time.sleep(0.3)
+        assert scheduler.status()['workers'] == 2
+    finally:
+        release.set()
+        for each_controller in blocking + controllers:
+            each_controller.stop_controller()
+            each_controller.join(5)
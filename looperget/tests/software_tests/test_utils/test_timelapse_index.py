@@ -0,0 +1,51 @@
+# coding=utf-8
+"""Tests for the index of time-lapse images."""
+from looperget.utils.timelapse_index import TimelapseIndex
+from looperget.utils.timelapse_index import parse_timelapse_filename
+
+
+def capture(directory, filename, size=10):
+    path_file = directory / filename
+    path_file.write_bytes(b'0' * size)
+    return str(path_file)
+
+
+def test_parse_timelapse_filename():
+    """Verify the set prefix and sequence number are parsed from camera and camera function images."""
+    print("\nTest: test_parse_timelapse_filename")
+    assert parse_timelapse_filename('Timelapse-1-Cam-2024-01-01_00-00-00-img-00012.jpg') == (
+        'Timelapse-1-Cam-2024-01-01_00-00-00-img', 12)
+    assert parse_timelapse_filename('Timelapse-2024-01-01_00-00-00-img-000003.png') == (
+        'Timelapse-2024-01-01_00-00-00-img', 3)
+    assert parse_timelapse_filename('notes.txt') is None
+
+
+def test_timelapse_index(tmp_path):
+    """Verify sets are indexed from disk, updated on capture, and reconciled on rebuild."""
+    print("\nTest: test_timelapse_index")
+    directory = tmp_path / 'timelapse'
+    directory.mkdir()
+    capture(directory, 'Timelapse-A-img-00001.jpg')
+    capture(directory, 'Timelapse-A-img-00002.jpg')
+    capture(directory, 'Timelapse-B-img-00001.jpg', size=5)
+    (directory / 'Timelapse-C-img-00001.jpg').mkdir()  # Not an image
+    index = TimelapseIndex(str(tmp_path / 'timelapse_index.db'))
+
+    # The directory is indexed the first time the sets are read
+    sets = index.sets('cam', str(directory))
+    assert [(s.prefix, s.images, s.size) for s in sets] == [
+        ('Timelapse-A-img', 2, 20), ('Timelapse-B-img', 1, 5)]
+
+    # Captures update the set summaries without listing the directory
+    index.add('cam', capture(directory, 'Timelapse-A-img-00003.jpg'), timestamp=100)
+    index.add('cam', capture(directory, 'Timelapse-A-img-00003.jpg', size=30), timestamp=4e9)
+    set_a = index.sets('cam', str(directory))[0]
+    assert (set_a.images, set_a.last_sequence, set_a.size, set_a.last_timestamp) == (3, 3, 50, 4e9)
+
+    # Deleted images are removed on rebuild
+    (directory / 'Timelapse-B-img-00001.jpg').unlink()
+    assert index.rebuild('cam', str(directory)) == (0, 0, 1)
+    assert [s.prefix for s in index.sets('cam')] == ['Timelapse-A-img']
+
+    index.forget('cam')
+    assert index.sets('cam') == []
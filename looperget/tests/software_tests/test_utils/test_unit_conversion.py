@@ -0,0 +1,40 @@
+# coding=utf-8
+"""Tests for compiled unit conversion equations."""
+from unittest import mock
+
+import pytest
+
+from looperget.utils.unit_conversion import ConversionCache
+from looperget.utils.unit_conversion import compile_equation
+
+
+def test_compiled_equations():
+    """Verify equations are evaluated for values and arrays, and unsafe equations are rejected."""
+    print("\nTest: test_compiled_equations")
+    assert compile_equation('x*1.8+32')(100) == 212
+    assert compile_equation('(x*9/5)−459.67')(0) == -459.67
+    assert compile_equation('math.sqrt(x) + abs(-x)')(4) == 6
+    assert list(compile_equation('x*2').array([1, 2, 3])) == [2, 4, 6]
+    assert compile_equation('x*2') is compile_equation('x*2')
+
+    for equation in ["__import__('os').system('ls')", "x.__class__", "open('f')", "[x]"]:
+        with pytest.raises(ValueError):
+            compile_equation(equation)
+
+
+def test_conversion_cache_invalidation():
+    """Verify conversions are looked up by ID from one query until invalidated."""
+    print("\nTest: test_conversion_cache_invalidation")
+    conversion = mock.Mock(unique_id='conv', convert_unit_from='C', convert_unit_to='F', equation='x*1.8+32')
+    with mock.patch('looperget.utils.unit_conversion.db_retrieve_table_daemon',
+                    return_value=[conversion]) as db_retrieve:
+        cache = ConversionCache()
+        assert cache.get('conv')[1](10) == 50
+        assert cache.get_units('C', 'F')[0] is conversion
+        assert db_retrieve.call_count == 1
+
+        conversion.equation = 'x+1'
+        assert cache.get('conv')[1](10) == 50
+        cache.invalidate()
+        assert cache.get('conv')[1](10) == 11
+        assert db_retrieve.call_count == 2
@@ -11,9 +11,7 @@ from looperget.databases.models import Actions
 from looperget.databases.models import Camera
 from looperget.databases.models import Conditional
 from looperget.databases.models import ConditionalConditions
-from looperget.databases.models import Conversion
 from looperget.databases.models import CustomController
-from looperget.databases.models import DeviceMeasurements
 from looperget.databases.models import Function
 from looperget.databases.models import Input
 from looperget.databases.models import OutputChannel
@@ -25,13 +23,18 @@ from looperget.devices.camera import camera_record
 from looperget.looperget_client import DaemonControl
 from looperget.utils.database import db_retrieve_table_daemon
 from looperget.utils.influx import get_last_measurement
+from looperget.utils.influx import get_past_measurement_stats
 from looperget.utils.influx import get_past_measurements
-from looperget.utils.modules import load_module_from_file
-from looperget.utils.system_pi import return_measurement_info
+from looperget.utils.influx import read_influxdb_last_many
+from looperget.utils.measurement_metadata import measurement_info
+from looperget.utils.modules import cache_information
+from looperget.utils.modules import load_cached_module
+from looperget.utils.modules import load_module_information
 
 logger = logging.getLogger("looperget.actions")
 
 
+@cache_information('actions', [PATH_ACTIONS, PATH_ACTIONS_CUSTOM])
 def parse_action_information(exclude_custom=False):
     """Parses the variables assigned in each Function Action and return a dictionary of IDs and values."""
     def dict_has_value(dict_inp, action, key, force_type=None):
@@ -71,9 +74,9 @@ def parse_action_information(exclude_custom=False):
                 continue
 
             full_path = "{}/{}".format(real_path, each_file)
-            function_action, status = load_module_from_file(full_path, 'actions')
+            function_action = load_module_information(full_path, 'actions', 'ACTION_INFORMATION')
 
-            if not function_action or not hasattr(function_action, 'ACTION_INFORMATION'):
+            if not function_action:
                 continue
 
             # Populate dictionary of function information
@@ -146,20 +149,66 @@ def get_condition_value(condition_id):
         logger.error("Condition ID not found")
         return
 
+    return condition_value(sql_condition)
+
+
+def get_condition_values(conditional_id):
+    """
+    Returns the values of all conditions of a Conditional controller
+
+    The last measurements of the conditions are read together, from the
+    latest value cache or with one influxdb query, instead of one query
+    per condition.
+    :param conditional_id: Conditional controller ID
+    :return: dict of condition ID: value, as get_condition_value() returns
+        (measurement_dict conditions: list of dicts of time and value)
+    """
+    conditions = db_retrieve_table_daemon(ConditionalConditions).filter(
+        ConditionalConditions.conditional_id == conditional_id).all()
+
+    series = {}
+    for each_condition in conditions:
+        if (each_condition.condition_type in ['measurement', 'measurement_and_ts'] and
+                each_condition.measurement and ',' in each_condition.measurement):
+            device_id, measurement_id = each_condition.measurement.split(',')[:2]
+            channel, unit, measurement = measurement_info(measurement_id)
+            if None not in [channel, unit]:
+                series[each_condition.unique_id] = (
+                    device_id, unit, channel, measurement, each_condition.max_age)
+    last_measurements = read_influxdb_last_many(series) if series else {}
+
+    condition_values = {}
+    for each_condition in conditions:
+        try:
+            if each_condition.condition_type == 'measurement_dict':
+                list_times_values = condition_value_dict(each_condition)
+                condition_values[each_condition.unique_id] = None
+                if list_times_values:
+                    condition_values[each_condition.unique_id] = [
+                        {'time': each_time, 'value': float(each_value)}
+                        for each_time, each_value in list_times_values]
+            else:
+                condition_values[each_condition.unique_id] = condition_value(
+                    each_condition, last_measurement=last_measurements.get(each_condition.unique_id))
+        except Exception:
+            logger.exception(f"Condition {each_condition.unique_id}")
+            condition_values[each_condition.unique_id] = None
+    return condition_values
+
+
+def condition_value(sql_condition, last_measurement=None):
+    """
+    Returns the measurement of a condition
+    :param sql_condition: ConditionalConditions entry
+    :param last_measurement: the last measurement ([time, value]) if already read
+    :return: measurement: multiple types
+    """
     # Check Measurement Conditions
     if sql_condition.condition_type == 'measurement_and_ts':
         device_id = sql_condition.measurement.split(',')[0]
         measurement_id = sql_condition.measurement.split(',')[1]
 
-        device_measurement = db_retrieve_table_daemon(
-            DeviceMeasurements, unique_id=measurement_id)
-        if device_measurement:
-            conversion = db_retrieve_table_daemon(
-                Conversion, unique_id=device_measurement.conversion_id)
-        else:
-            conversion = None
-        channel, unit, measurement = return_measurement_info(
-            device_measurement, conversion)
+        channel, unit, measurement = measurement_info(measurement_id)
 
         if None in [channel, unit]:
             logger.error(
@@ -169,7 +218,7 @@ def get_condition_value(condition_id):
 
         max_age = sql_condition.max_age
 
-        influx_return = get_last_measurement(
+        influx_return = last_measurement or get_last_measurement(
             device_id, measurement_id, max_age=max_age)
         if influx_return is not None:
             return_ts = influx_return[0]
@@ -186,15 +235,7 @@ def get_condition_value(condition_id):
         device_id = sql_condition.measurement.split(',')[0]
         measurement_id = sql_condition.measurement.split(',')[1]
 
-        device_measurement = db_retrieve_table_daemon(
-            DeviceMeasurements, unique_id=measurement_id)
-        if device_measurement:
-            conversion = db_retrieve_table_daemon(
-                Conversion, unique_id=device_measurement.conversion_id)
-        else:
-            conversion = None
-        channel, unit, measurement = return_measurement_info(
-            device_measurement, conversion)
+        channel, unit, measurement = measurement_info(measurement_id)
 
         if None in [channel, unit]:
             logger.error(
@@ -205,26 +246,34 @@ def get_condition_value(condition_id):
         max_age = sql_condition.max_age
 
         if sql_condition.condition_type == 'measurement':
-            influx_return = get_last_measurement(
+            influx_return = last_measurement or get_last_measurement(
                 device_id, measurement_id, max_age=max_age)
             if influx_return is not None:
                 return_measurement = influx_return[1]
             else:
                 return_measurement = None
         elif sql_condition.condition_type == 'measurement_past_average':
-            measurement_list = []
-            past_measurements = get_past_measurements(
-                device_id, measurement_id, max_age=max_age)
-            for each_set in past_measurements:
-                measurement_list.append(float(each_set[1]))
-            return_measurement = sum(measurement_list) / len(measurement_list)
+            stats = get_past_measurement_stats(device_id, measurement_id, max_age)
+            if stats:
+                return_measurement = stats['mean']
+            else:
+                measurement_list = []
+                past_measurements = get_past_measurements(
+                    device_id, measurement_id, max_age=max_age)
+                for each_set in past_measurements:
+                    measurement_list.append(float(each_set[1]))
+                return_measurement = sum(measurement_list) / len(measurement_list)
         elif sql_condition.condition_type == 'measurement_past_sum':
-            measurement_list = []
-            past_measurements = get_past_measurements(
-                device_id, measurement_id, max_age=max_age)
-            for each_set in past_measurements:
-                measurement_list.append(float(each_set[1]))
-            return_measurement = sum(measurement_list)
+            stats = get_past_measurement_stats(device_id, measurement_id, max_age)
+            if stats:
+                return_measurement = stats['sum']
+            else:
+                measurement_list = []
+                past_measurements = get_past_measurements(
+                    device_id, measurement_id, max_age=max_age)
+                for each_set in past_measurements:
+                    measurement_list.append(float(each_set[1]))
+                return_measurement = sum(measurement_list)
         else:
             return
 
@@ -283,21 +332,22 @@ def get_condition_value_dict(condition_id):
         logger.error("Condition ID not found")
         return
 
+    return condition_value_dict(sql_condition)
+
+
+def condition_value_dict(sql_condition):
+    """
+    Returns the past measurements of a measurement_dict condition
+    :param sql_condition: ConditionalConditions entry
+    :return: measurement: list of times and values
+    """
     # Check Measurement Conditions
     if sql_condition.condition_type == 'measurement_dict':
         device_id = sql_condition.measurement.split(',')[0]
         measurement_id = sql_condition.measurement.split(',')[1]
         max_age = sql_condition.max_age
 
-        device_measurement = db_retrieve_table_daemon(
-            DeviceMeasurements, unique_id=measurement_id)
-        if device_measurement:
-            conversion = db_retrieve_table_daemon(
-                Conversion, unique_id=device_measurement.conversion_id)
-        else:
-            conversion = None
-        channel, unit, measurement = return_measurement_info(
-            device_measurement, conversion)
+        channel, unit, measurement = measurement_info(measurement_id)
 
         if None in [channel, unit]:
             logger.error(
@@ -371,7 +421,7 @@ def trigger_action(
             id=action.unique_id.split('-')[0],
             name=dict_actions[action.action_type]['name'])
         try:
-            action_loaded, status = load_module_from_file(
+            action_loaded, status = load_cached_module(
                 dict_actions[action.action_type]['file_path'], 'action')
             if action_loaded:
                 run_function_action = action_loaded.ActionModule(action)
@@ -387,10 +437,14 @@ def trigger_action(
     return value
 
 
-def run_input_actions(unique_id, message, measurements_dict, debug=False):
+def run_input_actions(unique_id, message, measurements_dict, debug=False, actions=None):
+    if actions is None:
+        actions = db_retrieve_table_daemon(Actions).filter(
+            Actions.function_id == unique_id).all()
+    if not actions:
+        return message, measurements_dict
+
     control = DaemonControl()
-    actions = db_retrieve_table_daemon(Actions).filter(
-        Actions.function_id == unique_id).all()
 
     for each_action in actions:
         try:
@@ -8,6 +8,7 @@ from looperget.config import PATH_CAMERAS
 from looperget.databases.models import CustomController
 from looperget.looperget_flask.utils.utils_general import bytes2human
 from looperget.utils.database import db_retrieve_table_daemon
+from looperget.utils.timelapse_index import timelapse_sets
 
 logger = logging.getLogger("looperget.camera_functions")
 
@@ -88,16 +89,8 @@ def get_camera_function_image_info(unique_id):
     else:
         latest_img_video = None
 
-    try:
-        # Get list of timelapse filename sets for generating a video from images
-        time_lapse_imgs = []
-        for i in os.listdir(tl_path):
-            if (os.path.isfile(os.path.join(tl_path, i)) and
-                    i[:-10] not in time_lapse_imgs):
-                time_lapse_imgs.append(i[:-10])
-        time_lapse_imgs.sort()
-    except Exception:
-        pass
+    # Timelapse image sets for generating a video from images
+    time_lapse_imgs = timelapse_sets(unique_id, tl_path)
 
     if (('tl_last_file' in custom_options and custom_options['tl_last_file']) and
             ('tl_last_ts' in custom_options and custom_options['tl_last_ts'])):
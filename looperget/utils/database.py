@@ -6,7 +6,7 @@ from sqlite3 import OperationalError
 import sqlalchemy
 
 from looperget.config import LOOPERGET_DB_PATH
-from looperget.databases.utils import session_scope
+from looperget.databases.utils import session_scope, thread_session_scope
 
 logger = logging.getLogger("looperget.database")
 
@@ -49,11 +49,19 @@ def db_retrieve_table_daemon(
     If entry='all', all table entries are returned.
     If device_id is set, the first entry with that device ID is returned.
     Otherwise, the table object is returned.
+
+    The calling thread's pooled session is reused when rows are returned.
+    A query object outlives this call, so it gets its own session.
     """
+    if entry in ['first', 'all'] or device_id or unique_id:
+        scope = thread_session_scope
+    else:
+        scope = session_scope
+
     tries = 5
     while tries > 0:
         try:
-            with session_scope(LOOPERGET_DB_PATH) as new_session:
+            with scope(LOOPERGET_DB_PATH) as new_session:
                 if device_id:
                     return_table = new_session.query(table).filter(
                         table.id == int(device_id))
@@ -72,7 +80,6 @@ def db_retrieve_table_daemon(
                     return_table = return_table.all()
 
                 new_session.expunge_all()
-                new_session.close()
             return return_table
         except OperationalError:
             pass
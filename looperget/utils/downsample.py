@@ -0,0 +1,139 @@
+# coding=utf-8
+"""
+Downsampling of measurement series to the number of points a graph can show
+
+Two methods keep the shape of a series that averaging erases:
+
+- lttb: Largest-Triangle-Three-Buckets, which keeps from each bucket the
+  point forming the largest triangle with the point kept from the previous
+  bucket and the average of the next bucket.
+- minmax: the minimum and maximum of each bucket, so every spike is kept.
+
+numpy is used if installed, otherwise the same algorithms run in Python.
+"""
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+
+def lttb_indexes(times, values, threshold):
+    """
+    Return the indexes of the points kept by Largest-Triangle-Three-Buckets
+
+    :param times: sorted times of the points
+    :param values: values of the points
+    :param threshold: number of points to keep, at least 3
+    :rtype: list
+    """
+    count = len(times)
+    if threshold >= count or threshold < 3:
+        return list(range(count))
+
+    every = (count - 2) / (threshold - 2)
+    a = 0
+    indexes = [0]
+    if np is not None:
+        x = np.asarray(times, dtype=float)
+        y = np.asarray(values, dtype=float)
+        for i in range(threshold - 2):
+            avg_start = int((i + 1) * every) + 1
+            avg_end = min(int((i + 2) * every) + 1, count)
+            avg_x = x[avg_start:avg_end].mean()
+            avg_y = y[avg_start:avg_end].mean()
+
+            range_start = int(i * every) + 1
+            range_end = int((i + 1) * every) + 1
+            areas = np.abs((x[a] - avg_x) * (y[range_start:range_end] - y[a]) -
+                           (x[a] - x[range_start:range_end]) * (avg_y - y[a]))
+            a = range_start + int(areas.argmax())
+            indexes.append(a)
+    else:
+        for i in range(threshold - 2):
+            avg_start = int((i + 1) * every) + 1
+            avg_end = min(int((i + 2) * every) + 1, count)
+            avg_x = math.fsum(times[avg_start:avg_end]) / (avg_end - avg_start)
+            avg_y = math.fsum(values[avg_start:avg_end]) / (avg_end - avg_start)
+
+            range_start = int(i * every) + 1
+            range_end = int((i + 1) * every) + 1
+            x_a = times[a]
+            y_a = values[a]
+            area_max = -1.0
+            for j in range(range_start, range_end):
+                area = abs((x_a - avg_x) * (values[j] - y_a) - (x_a - times[j]) * (avg_y - y_a))
+                if area > area_max:
+                    area_max = area
+                    a = j
+            indexes.append(a)
+    indexes.append(count - 1)
+    return indexes
+
+
+def min_max_indexes(values, threshold):
+    """
+    Return the indexes of the minimum and maximum of each bucket, in time order
+
+    :param values: values of the points
+    :param threshold: number of points to keep (two per bucket)
+    :rtype: list
+    """
+    count = len(values)
+    buckets = threshold // 2
+    if threshold >= count or buckets < 1:
+        return list(range(count))
+
+    every = count / buckets
+    indexes = []
+    y = np.asarray(values, dtype=float) if np is not None else None
+    for i in range(buckets):
+        start = int(i * every)
+        end = int((i + 1) * every)
+        if y is not None:
+            bucket = y[start:end]
+            index_min = start + int(bucket.argmin())
+            index_max = start + int(bucket.argmax())
+        else:
+            bucket = values[start:end]
+            index_min = start + bucket.index(min(bucket))
+            index_max = start + bucket.index(max(bucket))
+        if index_min == index_max:
+            indexes.append(index_min)
+        else:
+            indexes.extend(sorted((index_min, index_max)))
+    return indexes
+
+
+def downsample(list_data, threshold, method='lttb'):
+    """
+    Reduce a list of (time, value) points to about threshold points
+
+    Points with a missing or non-numeric value are left out when downsampling.
+
+    :param list_data: list of (time, value), sorted by time
+    :param threshold: number of points to return
+    :param method: 'lttb' or 'minmax'
+    :return: the points kept, or list_data unchanged if it's already small enough
+    :rtype: list
+    """
+    if (not list_data or method not in DOWNSAMPLE_METHODS or
+            not threshold or len(list_data) <= threshold):
+        return list_data
+
+    points = [each_point for each_point in list_data
+              if isinstance(each_point[1], (int, float)) and not isinstance(each_point[1], bool) and
+              not math.isnan(each_point[1])]
+    if len(points) <= threshold:
+        return points
+    times = [each_point[0] for each_point in points]
+    values = [each_point[1] for each_point in points]
+
+    if method == 'lttb':
+        indexes = lttb_indexes(times, values, threshold)
+    else:
+        indexes = min_max_indexes(values, threshold)
+    return [points[index] for index in indexes]
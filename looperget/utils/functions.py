@@ -25,11 +25,13 @@ import os
 
 from looperget.config import PATH_FUNCTIONS
 from looperget.config import PATH_FUNCTIONS_CUSTOM
-from looperget.utils.modules import load_module_from_file
+from looperget.utils.modules import cache_information
+from looperget.utils.modules import load_module_information
 
 logger = logging.getLogger("looperget.utils.functions")
 
 
+@cache_information('functions', [PATH_FUNCTIONS, PATH_FUNCTIONS_CUSTOM])
 def parse_function_information(exclude_custom=False):
     """Parses the variables assigned in each Function and return a dictionary of IDs and values."""
     def dict_has_value(dict_inp, controller_cus, key):
@@ -61,9 +63,9 @@ def parse_function_information(exclude_custom=False):
                 continue
 
             full_path = "{}/{}".format(real_path, each_file)
-            function_custom, status = load_module_from_file(full_path, 'functions')
+            function_custom = load_module_information(full_path, 'functions', 'FUNCTION_INFORMATION')
 
-            if not function_custom or not hasattr(function_custom, 'FUNCTION_INFORMATION'):
+            if not function_custom:
                 continue
 
             # Populate dictionary of function information
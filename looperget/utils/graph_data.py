@@ -0,0 +1,253 @@
+# coding=utf-8
+"""
+Graph data for many series at once, downsampled by influxdb to the graph width
+
+Each series is queried with one windowed Flux query, with the window chosen
+so there's about one point per pixel of the graph, and the series are
+queried concurrently. Windows are averaged, or reduced to their minimum and
+maximum so spikes remain visible. When windows are at least as long as the
+buckets of a rollup tier that covers the period, they're computed from the
+rollups instead, and only the last few minutes are queried. Results are encoded as compact columnar JSON or as
+binary float arrays, one series at a time, so they can be streamed.
+"""
+import array
+import json
+import logging
+import math
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from looperget.config import GRAPH_QUERY_TIMEOUT_MS
+from looperget.config import GRAPH_QUERY_WORKERS
+from looperget.utils.influx import flux_time
+from looperget.utils.influx import influxdb_client_bucket
+from looperget.utils.measurement_metadata import get_measurement_metadata
+from looperget.utils.rollups import floor_to
+from looperget.utils.rollups import get_rollup_store
+
+logger = logging.getLogger("looperget.graph_data")
+
+
+def window_ms(start, end, width):
+    """
+    Return the aggregation window that gives about one point per pixel
+
+    :param start: start of the graph, epoch seconds
+    :param end: end of the graph, epoch seconds
+    :param width: graph width, in pixels
+    :return: window length, in milliseconds
+    :rtype: int
+    """
+    return max(1, math.ceil((end - start) * 1000 / max(int(width), 1)))
+
+
+def flux_series_predicate(info):
+    """Return a Flux filter predicate matching the points of one measurement."""
+    predicate = f'r["_measurement"] == "{info.unit}" and r["device_id"] == "{info.device_id}"'
+    if info.channel is not None:
+        predicate += f' and r["channel"] == "{info.channel}"'
+    if info.measurement:
+        predicate += f' and r["measure"] == "{info.measurement}"'
+    return predicate
+
+
+def flux_window_query(bucket, info, start, end, every_ms, db_version, method='mean'):
+    """
+    Return the Flux query of one series, aggregated over windows of every_ms
+
+    :param method: 'mean' for the average of each window, or 'minmax' for its minimum and maximum
+    """
+    query = (f'data = from(bucket: "{bucket}")'
+             f' |> range(start: {flux_time(start)}, stop: {flux_time(end)})'
+             f' |> filter(fn: (r) => {flux_series_predicate(info)})\n')
+    if method == 'minmax':
+        return query + (
+            'union(tables: ['
+            f'data |> aggregateWindow(every: {every_ms}ms, fn: min, createEmpty: false), '
+            f'data |> aggregateWindow(every: {every_ms}ms, fn: max, createEmpty: false)])'
+            ' |> sort(columns: ["_time"])')
+    # influxdb 1.8 panics on mean() in aggregateWindow (see query_flux())
+    fn = 'median' if db_version == '1' else 'mean'
+    return query + f'data |> aggregateWindow(every: {every_ms}ms, fn: {fn}, createEmpty: false)'
+
+
+def flux_first_time_query(bucket, infos, end):
+    """Return the Flux query of the earliest point of any of several series."""
+    predicates = ' or '.join(f'({flux_series_predicate(info)})' for info in infos)
+    return (f'from(bucket: "{bucket}")'
+            f' |> range(start: -99999d, stop: {flux_time(end)})'
+            f' |> filter(fn: (r) => {predicates})'
+            ' |> first() |> group() |> sort(columns: ["_time"]) |> limit(n: 1)')
+
+
+def resolve_series(measurement_ids):
+    """
+    Return the MeasurementInfo of each measurement ID, from the measurement metadata cache
+
+    :return: list of (measurement_id, info), with info None if the ID isn't found
+    """
+    metadata = get_measurement_metadata()
+    list_series = []
+    for measurement_id in measurement_ids:
+        info = metadata.get(measurement_id)
+        list_series.append((measurement_id, info if info.unit else None))
+    return list_series
+
+
+def query_columns(client, query):
+    """
+    Stream the records of a Flux query into columns
+
+    :return: times (epoch milliseconds) and values
+    :rtype: (list, list)
+    """
+    times = []
+    values = []
+    for record in client.query_api().query_stream(query):
+        times.append(int(record.get_time().timestamp() * 1000))
+        values.append(record.get_value())
+    return times, values
+
+
+class GraphQuery:
+    """
+    Query the downsampled data of several series over the same period
+
+    :param settings: the Misc settings row
+    :param list_series: list of (measurement_id, MeasurementInfo or None)
+    :param start: start, epoch seconds, or 0 for the earliest point of the series
+    :param end: end, epoch seconds
+    :param width: graph width, in pixels
+    :param method: 'mean' or 'minmax' (see flux_window_query())
+    """
+    def __init__(self, settings, list_series, start, end, width, method='mean'):
+        self.settings = settings
+        self.list_series = list_series
+        self.start = start
+        self.end = end
+        self.width = width
+        self.method = method
+        self.window_ms = None
+        self.rollup_tier = None
+        self.rollup_end = None
+        self.client = None
+        self.bucket = None
+
+    def open(self):
+        """Connect, and find the start of the period if it wasn't given."""
+        self.client, self.bucket = influxdb_client_bucket(self.settings, GRAPH_QUERY_TIMEOUT_MS)
+        if self.client is None:
+            return False
+
+        infos = [info for _, info in self.list_series if info]
+        if not self.start and infos:
+            try:
+                times, _ = query_columns(self.client, flux_first_time_query(self.bucket, infos, self.end))
+                self.start = times[0] / 1000 if times else self.end
+            except Exception as err:
+                logger.error(f"Could not query the first point of the graph series: {err}")
+                self.start = self.end
+        # Windows reduced to their minimum and maximum each return two points
+        self.window_ms = window_ms(
+            self.start, self.end, self.width // 2 if self.method == 'minmax' else self.width)
+        self.plan_rollups()
+        return True
+
+    def plan_rollups(self):
+        """
+        Use the coarsest rollup tier with buckets no longer than a window, if it covers the start
+
+        The window is lengthened to a whole number of buckets, and the
+        windows after the tier's coverage ends are queried from raw points.
+        """
+        try:
+            tier_coverage = get_rollup_store().tier_coverage()
+        except Exception as err:
+            logger.debug(f"Could not read the rollup coverage: {err}")
+            return
+        for bucket_sec, tier_start, tier_end in tier_coverage:
+            if bucket_sec * 1000 <= self.window_ms and tier_start <= self.start < tier_end:
+                window_sec = math.ceil(self.window_ms / (bucket_sec * 1000)) * bucket_sec
+                self.window_ms = window_sec * 1000
+                self.rollup_tier = bucket_sec
+                self.rollup_end = max(self.start, min(self.end, floor_to(tier_end, window_sec)))
+                return
+
+    def close(self):
+        if self.client:
+            self.client.close()
+
+    def query(self, info):
+        if info is None or self.start >= self.end:
+            return [], []
+        try:
+            times = []
+            values = []
+            start = self.start
+            if self.rollup_tier:
+                times, values = get_rollup_store().windows(
+                    self.rollup_tier, self.window_ms // 1000, self.start, self.rollup_end,
+                    info.unit, info.device_id, channel=info.channel, measure=info.measurement,
+                    method=self.method)
+                start = self.rollup_end
+            if start < self.end:
+                raw_times, raw_values = query_columns(
+                    self.client,
+                    flux_window_query(self.bucket, info, start, self.end, self.window_ms,
+                                      self.settings.measurement_db_version, method=self.method))
+                times += raw_times
+                values += raw_values
+            return times, values
+        except Exception as err:
+            logger.error(f"Could not query graph series {info}: {err}")
+            return [], []
+
+    def results(self):
+        """
+        Query the series concurrently, yielding them in the order they were requested
+
+        :return: generator of (measurement_id, times, values)
+        """
+        workers = max(1, min(GRAPH_QUERY_WORKERS, len(self.list_series)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='graph_query') as executor:
+            futures = [(measurement_id, executor.submit(self.query, info))
+                       for measurement_id, info in self.list_series]
+            for measurement_id, future in futures:
+                times, values = future.result()
+                yield measurement_id, times, values
+
+
+def encode_json(graph_query, results):
+    """
+    Encode series as columnar JSON, one chunk per series
+
+    {"start": epoch ms, "end": epoch ms, "window_ms": int, "method": "mean" or "minmax",
+     "series": [{"id": measurement ID, "t": [epoch ms, ...], "v": [value, ...]}, ...]}
+    """
+    yield (f'{{"start":{int(graph_query.start * 1000)},"end":{int(graph_query.end * 1000)},'
+           f'"window_ms":{graph_query.window_ms},"method":"{graph_query.method}","series":[')
+    for index, (measurement_id, times, values) in enumerate(results):
+        yield ((',' if index else '') +
+               f'{{"id":{json.dumps(measurement_id)},'
+               f'"t":{json.dumps(times, separators=(",", ":"))},'
+               f'"v":{json.dumps(values, separators=(",", ":"))}}}')
+    yield ']}'
+
+
+def encode_binary(results):
+    """
+    Encode series as little-endian binary arrays, one chunk per series, in the order requested
+
+    Each series is: uint32 point count, uint32 reserved (0), float64 times
+    (epoch ms) and float32 values (NaN for null), padded to a multiple of 8
+    bytes so every array is aligned for typed array views.
+    """
+    for measurement_id, times, values in results:
+        times_array = array.array('d', times)
+        values_array = array.array('f', [math.nan if value is None else value for value in values])
+        if sys.byteorder == 'big':
+            times_array.byteswap()
+            values_array.byteswap()
+        padding = b'\0' * 4 if len(values) % 2 else b''
+        yield struct.pack('<II', len(times), 0) + times_array.tobytes() + values_array.tobytes() + padding
@@ -1,4 +1,5 @@
 # coding=utf-8
+import collections
 import datetime
 import logging
 import threading
@@ -6,11 +7,25 @@ import time
 
 import requests
 
-from looperget.databases.models import (Conversion, DeviceMeasurements, Misc,
-                                     Output)
+from looperget.config import (INFLUXDB_SETTINGS_CHECK_SEC,
+                              INFLUXDB_SPOOL_RETRY_SEC,
+                              INFLUXDB_WRITE_BACKOFF_SEC,
+                              INFLUXDB_WRITE_BATCH_SIZE,
+                              INFLUXDB_WRITE_FLUSH_SEC,
+                              INFLUXDB_WRITE_QUEUE_SIZE,
+                              INFLUXDB_WRITE_RETRIES,
+                              ROLLUP_LAG_SEC,
+                              ROLLUP_PLANNER_MIN_SEC,
+                              ROLLUP_RAW_EDGE_MAX_SEC)
+from looperget.databases.models import Misc, Output
 from looperget.looperget_client import DaemonControl
 from looperget.utils.database import db_retrieve_table_daemon
-from looperget.utils.system_pi import return_measurement_info
+from looperget.utils.latest_values import get_latest_value_cache, timestamp_to_epoch
+from looperget.utils.measurement_metadata import measurement_info
+from looperget.utils.measurement_spool import MeasurementSpool
+from looperget.utils.rolling_window import get_rolling_windows
+from looperget.utils.rollups import (PIECE_RAW, aggregate_points,
+                                     get_rollup_store, merge_aggregate)
 
 logger = logging.getLogger("looperget.influx")
 
@@ -19,33 +34,15 @@ logger = logging.getLogger("looperget.influx")
 # Influxdb using Flux (influxdb versions 1.8+ and 2.x)
 #
 
-def write_influxdb_value(unique_id, unit, value, measure=None, channel=None, timestamp=None):
+def influxdb_client_bucket(settings, timeout):
     """
-    Write a value into an Influxdb database (flux edition, using influxdb_client)
-
-    example:
-        write_influxdb_value('00000001', 'C', 37.5)
-
-    :return: success (0) or failure (1)
-    :rtype: bool
+    Create an InfluxDBClient from the Misc settings
 
-    :param unique_id: What unique_id tag to enter into the Influxdb database (ex. '00000001')
-    :type unique_id: str
-    :param measure: What type of measurement for the Influxdb
-        database entry (ex. 'temperature')
-    :type measure: str
-    :param value: The value being entered into the Influxdb database
-    :type value: int or float
-    :param unit:
-    :type unit:
-    :param channel:
-    :type channel:
-    :param timestamp: If supplied, this timestamp will be used in the influxdb
-    :type timestamp: datetime object
+    :return: client and bucket name, or (None, None) if the version is unknown
+    :rtype: (InfluxDBClient, str)
     """
-    from influxdb_client import InfluxDBClient, Point
+    from influxdb_client import InfluxDBClient
 
-    settings = db_retrieve_table_daemon(Misc, entry='first')
     influxdb_url = f'http://{settings.measurement_db_host}:{settings.measurement_db_port}'
 
     if settings.measurement_db_version == '1':
@@ -53,7 +50,7 @@ def write_influxdb_value(unique_id, unit, value, measure=None, channel=None, tim
             url=influxdb_url,
             token=f'{settings.measurement_db_user}:{settings.measurement_db_password}',
             org='looperget',
-            timeout=5000)
+            timeout=timeout)
         bucket = f'{settings.measurement_db_dbname}/{settings.measurement_db_retention_policy}'
     elif settings.measurement_db_version == '2':
         client = InfluxDBClient(
@@ -61,127 +58,476 @@ def write_influxdb_value(unique_id, unit, value, measure=None, channel=None, tim
             username=settings.measurement_db_user,
             password=settings.measurement_db_password,
             org='looperget',
-            timeout=5000)
+            timeout=timeout)
         bucket = settings.measurement_db_dbname
     else:
         logger.error(f"Unknown Influxdb version: {settings.measurement_db_version}")
-        return
+        return None, None
 
-    with client.write_api(success_callback=write_success, error_callback=write_fail) as write_api:
-        point = Point(unit).tag("device_id", unique_id)
+    return client, bucket
+
+
+def flux_time(epoch):
+    """Format epoch seconds as an RFC3339 time for Flux."""
+    return datetime.datetime.utcfromtimestamp(epoch).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
 
-        if measure:
-            point = point.tag("measure", measure)
-        if channel is not None:
-            point = point.tag("channel", channel)
-        if timestamp:
-            point = point.time(timestamp)
 
-        point = point.field("value", value)
+def influxdb_settings_key(settings):
+    """The settings that require a new client when changed."""
+    return (settings.measurement_db_name,
+            settings.measurement_db_version,
+            settings.measurement_db_host,
+            settings.measurement_db_port,
+            settings.measurement_db_dbname,
+            settings.measurement_db_retention_policy,
+            settings.measurement_db_user,
+            settings.measurement_db_password)
 
+
+class InfluxDBWriter:
+    """
+    Process-wide InfluxDB client and batching write queue
+
+    Points are queued by put() and written by a background thread in batches,
+    when INFLUXDB_WRITE_BATCH_SIZE points are queued or every
+    INFLUXDB_WRITE_FLUSH_SEC seconds. Failed batches are retried with an
+    increasing delay. When the queue is full, the oldest points are dropped.
+
+    If a spool is enabled, batches that still fail are saved to disk instead of
+    being dropped. While the spool holds points, new batches are appended to it
+    and it's replayed in order once influxdb accepts writes again.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queue_changed = threading.Condition(self.lock)
+        self.queue = collections.deque()
+        self.writing = 0
+        self.flush_requested = False
+
+        self.client_lock = threading.Lock()
+        self.client = None
+        self.write_api = None
+        self.bucket = None
+        self.settings_key = None
+        self.timer_settings_check = 0
+
+        self.thread = None
+
+        self.spool = None
+        self.timer_replay = 0
+
+        self.points_queued = 0
+        self.points_written = 0
+        self.points_dropped = 0
+        self.batches_written = 0
+        self.write_retries = 0
+        self.write_failures = 0
+
+    def enable_spool(self, path, max_bytes):
+        """Save points that fail to be written to an on-disk spool."""
         try:
-            write_api.write(bucket=bucket, record=point)
-            return 0
-        except Exception as except_msg:
-            logger.debug(f"Failed to write measurements to influxdb with ID {unique_id}. Retrying in 5 seconds.")
-            time.sleep(5)
+            self.spool = MeasurementSpool(path, max_bytes)
+            if len(self.spool):
+                logger.info(f"Measurement spool has {len(self.spool)} points to replay")
+                self._start_thread()
+        except Exception:
+            logger.exception(f"Could not open measurement spool {path}")
+
+    def _start_thread(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(
+                target=self._run, name='influxdb_writer', daemon=True)
+            self.thread.start()
+
+    def put(self, points):
+        """Queue points to be written in the next batch."""
+        with self.lock:
+            for each_point in points:
+                if len(self.queue) >= INFLUXDB_WRITE_QUEUE_SIZE:
+                    self.queue.popleft()
+                    self.points_dropped += 1
+                self.queue.append(each_point)
+                self.points_queued += 1
+            if len(self.queue) >= INFLUXDB_WRITE_BATCH_SIZE:
+                self.queue_changed.notify_all()
+            self._start_thread()
+
+    def write(self, points):
+        """
+        Write points now, bypassing the queue
+
+        :return: True if the points were written
+        :rtype: bool
+        """
+        with self.lock:
+            self.points_queued += len(points)
+        return self._write_batch(points)
+
+    def flush(self, timeout=None):
+        """
+        Wait until all queued points have been written or dropped
+
+        :return: True if the queue emptied before the timeout
+        :rtype: bool
+        """
+        with self.lock:
+            if self.queue:
+                self.flush_requested = True
+                self.queue_changed.notify_all()
+            return self.queue_changed.wait_for(
+                lambda: not self.queue and not self.writing, timeout=timeout)
+
+    def invalidate(self):
+        """Close the client so the next write reconnects with the current settings."""
+        with self.client_lock:
+            self._close_client()
+
+    def status(self):
+        """Return counters of the write queue."""
+        with self.lock:
+            return {
+                'queue_depth': len(self.queue),
+                'queue_size': INFLUXDB_WRITE_QUEUE_SIZE,
+                'points_queued': self.points_queued,
+                'points_written': self.points_written,
+                'points_dropped': self.points_dropped,
+                'batches_written': self.batches_written,
+                'write_retries': self.write_retries,
+                'write_failures': self.write_failures,
+                'spool': self.spool.status() if self.spool is not None else None
+            }
+
+    def _close_client(self):
+        if self.client:
+            try:
+                self.client.close()
+            except Exception:
+                logger.exception("Closing influxdb client")
+        self.client = None
+        self.write_api = None
+        self.bucket = None
+        self.settings_key = None
+
+    def _get_write_api(self):
+        """Return the write API and bucket, (re)connecting if the settings changed."""
+        from influxdb_client.client.write_api import SYNCHRONOUS
+
+        with self.client_lock:
+            now = time.time()
+            if self.client is None or now > self.timer_settings_check:
+                self.timer_settings_check = now + INFLUXDB_SETTINGS_CHECK_SEC
+                settings = db_retrieve_table_daemon(Misc, entry='first')
+                if self.client is None or influxdb_settings_key(settings) != self.settings_key:
+                    self._close_client()
+                    client, bucket = influxdb_client_bucket(settings, 5000)
+                    if client is None:
+                        return None, None
+                    self.client = client
+                    self.bucket = bucket
+                    self.write_api = client.write_api(write_options=SYNCHRONOUS)
+                    self.settings_key = influxdb_settings_key(settings)
+            return self.write_api, self.bucket
+
+    def _write_batch(self, points, spool_on_fail=False):
+        backoff = INFLUXDB_WRITE_BACKOFF_SEC
+        for attempt in range(INFLUXDB_WRITE_RETRIES + 1):
             try:
-                write_api.write(bucket=bucket, record=point)
-                return 0
-            except:
-                logger.debug(
-                    f"Failed to write measurement to influxdb (Device ID: {unique_id}): {except_msg}.")
-                return 1
+                write_api, bucket = self._get_write_api()
+                if write_api is None:
+                    break
+                write_api.write(bucket=bucket, record=points)
+                with self.lock:
+                    self.points_written += len(points)
+                    self.batches_written += 1
+                mark_late_points(points)
+                return True
+            except Exception as except_msg:
+                with self.lock:
+                    self.write_failures += 1
+                if attempt == INFLUXDB_WRITE_RETRIES:
+                    logger.debug(f"Failed to write {len(points)} points to influxdb: {except_msg}")
+                    break
+                logger.debug(f"Failed to write {len(points)} points to influxdb. "
+                             f"Retrying in {backoff:.1f} seconds: {except_msg}")
+                with self.lock:
+                    self.write_retries += 1
+                time.sleep(backoff)
+                backoff *= 2
+
+        if spool_on_fail and self.spool is not None:
+            try:
+                self.spool.append([each_point.to_line_protocol() for each_point in points])
+                self.timer_replay = time.time() + INFLUXDB_SPOOL_RETRY_SEC
+                return False
+            except Exception:
+                logger.exception("Could not save points to the measurement spool")
 
+        with self.lock:
+            self.points_dropped += len(points)
+        return False
 
-def add_measurements_influxdb_flux(unique_id, measurements, use_same_timestamp=True, block=False):
+    def _replay_spool(self, max_batches=20):
+        """Write the oldest spooled points, stopping at the first failure."""
+        for _ in range(max_batches):
+            last_id, lines = self.spool.peek(INFLUXDB_WRITE_BATCH_SIZE)
+            if not lines:
+                return
+            try:
+                write_api, bucket = self._get_write_api()
+                if write_api is None:
+                    raise Exception("No influxdb client")
+                write_api.write(bucket=bucket, record=lines)
+            except Exception as except_msg:
+                logger.debug(f"Could not replay measurement spool: {except_msg}")
+                self.timer_replay = time.time() + INFLUXDB_SPOOL_RETRY_SEC
+                return
+            self.spool.remove_through(last_id)
+            with self.lock:
+                self.points_written += len(lines)
+                self.batches_written += 1
+            mark_late_points(lines)
+            if not len(self.spool):
+                logger.info("Finished replaying the measurement spool")
+
+    def _run(self):
+        while True:
+            with self.lock:
+                self.queue_changed.wait_for(
+                    lambda: len(self.queue) >= INFLUXDB_WRITE_BATCH_SIZE or self.flush_requested,
+                    timeout=INFLUXDB_WRITE_FLUSH_SEC)
+                batch = []
+                while self.queue and len(batch) < INFLUXDB_WRITE_BATCH_SIZE:
+                    batch.append(self.queue.popleft())
+                self.writing = len(batch)
+
+            try:
+                if batch:
+                    if self.spool is not None and len(self.spool):
+                        # Keep points in order behind those already spooled
+                        self.spool.append([each_point.to_line_protocol() for each_point in batch])
+                    else:
+                        self._write_batch(batch, spool_on_fail=True)
+
+                if (self.spool is not None and len(self.spool) and
+                        time.time() > self.timer_replay):
+                    self._replay_spool()
+            except Exception:
+                logger.exception("InfluxDB writer")
+
+            with self.lock:
+                self.writing = 0
+                if not self.queue:
+                    self.flush_requested = False
+                    self.queue_changed.notify_all()
+
+
+influxdb_writer_lock = threading.Lock()
+influxdb_writer = None
+
+
+def get_influxdb_writer():
+    """Return the process-wide InfluxDB writer."""
+    global influxdb_writer
+    if influxdb_writer is None:
+        with influxdb_writer_lock:
+            if influxdb_writer is None:
+                influxdb_writer = InfluxDBWriter()
+    return influxdb_writer
+
+
+def write_influxdb_value(unique_id, unit, value, measure=None, channel=None, timestamp=None, block=False):
     """
-    Parse measurement data into list to be input into influxdb (flux edition, using influxdb_client)
-    :param unique_id: Unique ID of device
-    :param measurements: dict of measurements
-    :param use_same_timestamp: Allow influxdb to create the timestamp upon storage
-    :return:
+    Write a value into an Influxdb database (flux edition, using influxdb_client)
+
+    example:
+        write_influxdb_value('00000001', 'C', 37.5)
+
+    :return: success (0) or failure (1)
+    :rtype: bool
+
+    :param unique_id: What unique_id tag to enter into the Influxdb database (ex. '00000001')
+    :type unique_id: str
+    :param measure: What type of measurement for the Influxdb
+        database entry (ex. 'temperature')
+    :type measure: str
+    :param value: The value being entered into the Influxdb database
+    :type value: int or float
+    :param unit:
+    :type unit:
+    :param channel:
+    :type channel:
+    :param timestamp: If supplied, this timestamp will be used in the influxdb
+    :type timestamp: datetime object
+    :param block: wait until the value is written, otherwise queue it and return
+    :type block: bool
     """
-    from influxdb_client import InfluxDBClient, Point
+    from influxdb_client import Point
 
-    settings = db_retrieve_table_daemon(Misc, entry='first')
-    influxdb_url = f'http://{settings.measurement_db_host}:{settings.measurement_db_port}'
+    point = Point(unit).tag("device_id", unique_id)
 
-    if settings.measurement_db_version == '1':
-        client = InfluxDBClient(
-            url=influxdb_url,
-            token=f'{settings.measurement_db_user}:{settings.measurement_db_password}',
-            org='looperget',
-            timeout=5000)
-        bucket = f'{settings.measurement_db_dbname}/{settings.measurement_db_retention_policy}'
-    elif settings.measurement_db_version == '2':
-        client = InfluxDBClient(
-            url=influxdb_url,
-            username=settings.measurement_db_user,
-            password=settings.measurement_db_password,
-            org='looperget',
-            timeout=5000)
-        bucket = settings.measurement_db_dbname
+    if measure:
+        point = point.tag("measure", measure)
+    if channel is not None:
+        point = point.tag("channel", channel)
+    if timestamp:
+        point = point.time(timestamp)
     else:
-        logger.error(f"Unknown Influxdb version: {settings.measurement_db_version}")
-        return
+        # Queued points are timestamped now rather than when they're written
+        point = point.time(datetime.datetime.now(datetime.timezone.utc))
 
-    with client.write_api(success_callback=write_success, error_callback=write_fail) as write_api:
-        for each_channel, each_measurement in measurements.items():
-            if 'value' not in each_measurement or each_measurement['value'] is None:
-                continue  # skip to next measurement to add
+    point = point.field("value", value)
 
-            if use_same_timestamp:
-                # influxdb will create the timestamp when the data is stored
-                timestamp = None
-            else:
-                # Use timestamp stored with each measurement
-                timestamp = each_measurement['timestamp_utc']
+    writer = get_influxdb_writer()
+    if block:
+        if writer.write([point]):
+            update_latest_values([(unique_id, unit, channel, measure, timestamp, value)])
+            get_rolling_windows().add(unique_id, unit, channel, measure, timestamp, value)
+            return 0
+        logger.debug(f"Failed to write measurement to influxdb (Device ID: {unique_id})")
+        return 1
+
+    update_latest_values([(unique_id, unit, channel, measure, timestamp, value)])
+    get_rolling_windows().add(unique_id, unit, channel, measure, timestamp, value)
+    writer.put([point])
+    return 0
+
+
+def measurements_to_points(unique_id, measurements, use_same_timestamp=True):
+    """Convert a dict of measurements into a list of influxdb Points."""
+    from influxdb_client import Point
+
+    points = []
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for each_channel, each_measurement in measurements.items():
+        if 'value' not in each_measurement or each_measurement['value'] is None:
+            continue  # skip to next measurement to add
+
+        if use_same_timestamp:
+            # All measurements share the time they were added
+            timestamp = now
+        else:
+            # Use timestamp stored with each measurement
+            timestamp = each_measurement['timestamp_utc']
+
+        point = Point(each_measurement['unit']).tag("device_id", unique_id)
+
+        if each_measurement['measurement']:
+            point = point.tag("measure", each_measurement['measurement'])
+        if each_channel is not None:
+            point = point.tag("channel", each_channel)
+
+        # Add pub_time and forecast_time tags if available
+        if 'pub_time' in each_measurement and each_measurement['pub_time']:
+            point = point.tag("pub_time", str(each_measurement['pub_time']))
+        if 'forecast_time' in each_measurement and each_measurement['forecast_time']:
+            point = point.tag("forecast_time", str(each_measurement['forecast_time']))
 
-            point = Point(each_measurement['unit']).tag("device_id", unique_id)
+        if timestamp:
+            point = point.time(timestamp)
 
-            if each_measurement['measurement']:
-                point = point.tag("measure", each_measurement['measurement'])
-            if each_channel is not None:
-                point = point.tag("channel", each_channel)
+        point = point.field("value", each_measurement['value'])
+        points.append(point)
+    return points
 
-            # Add pub_time and forecast_time tags if available
-            if 'pub_time' in each_measurement and each_measurement['pub_time']:
-                point = point.tag("pub_time", str(each_measurement['pub_time']))
-            if 'forecast_time' in each_measurement and each_measurement['forecast_time']:
-                point = point.tag("forecast_time", str(each_measurement['forecast_time']))
 
-            if timestamp:
-                point = point.time(timestamp)
+def add_measurements_influxdb_flux(unique_id, measurements, use_same_timestamp=True, block=False):
+    """
+    Parse measurement data into list to be input into influxdb (flux edition, using influxdb_client)
+    :param unique_id: Unique ID of device
+    :param measurements: dict of measurements
+    :param use_same_timestamp: Timestamp the measurements when they're added (before they're written),
+        otherwise with each one's timestamp_utc
+    :return:
+    """
+    points = measurements_to_points(unique_id, measurements, use_same_timestamp)
+    if points and get_influxdb_writer().write(points):
+        cache_latest_measurements(unique_id, measurements, use_same_timestamp)
 
-            point = point.field("value", each_measurement['value'])
-            write_api.write(bucket=bucket, record=point)
 
+def update_latest_values(updates):
+    """
+    Store written values as the latest value of their series
 
-def write_fail(point_data, written_data, err):
-    logger.debug(f"Write point fail: {err}: {written_data}")
+    Only the daemon's cache is enabled, so values written by another process
+    (e.g. through the API) are sent to the daemon, rather than the daemon
+    answering with the value written before them.
 
+    :param updates: (unique_id, unit, channel, measure, timestamp, value) of each value written
+    :type updates: list of tuple
+    """
+    cache = get_latest_value_cache()
+    if cache.enabled:
+        for each_update in updates:
+            cache.update(*each_update)
+        return
 
-def write_success(point_data, written_data):
-    logger.debug(f"Write point success: {written_data}")
+    updates = [(unique_id, unit, channel, measure, timestamp_to_epoch(timestamp), value)
+               for unique_id, unit, channel, measure, timestamp, value in updates
+               if value is not None]
+    if not updates:
+        return
+    try:
+        DaemonControl().latest_measurements_update(updates)
+    except Exception:
+        logger.debug("Could not send the latest values to the daemon. Is it running?")
+
+
+def cache_latest_measurements(unique_id, measurements, use_same_timestamp=True):
+    """Store measurements as the latest value of each series and in its rolling windows."""
+    windows = get_rolling_windows()
+    updates = []
+    for each_channel, each_measurement in measurements.items():
+        if 'value' not in each_measurement or each_measurement['value'] is None:
+            continue
+        timestamp = None
+        if not use_same_timestamp:
+            timestamp = each_measurement['timestamp_utc']
+        update = (unique_id,
+                  each_measurement['unit'],
+                  each_channel,
+                  each_measurement['measurement'],
+                  timestamp,
+                  each_measurement['value'])
+        windows.add(*update)
+        updates.append(update)
+    update_latest_values(updates)
 
 
 def add_measurements_influxdb(unique_id, measurements, use_same_timestamp=True, block=False):
     """
-    Parse measurement data into list to be input into influxdb (threaded so returns fast)
+    Parse measurement data into list to be input into influxdb (queued so returns fast)
     :param unique_id: Unique ID of device
     :param measurements: dict of measurements
-    :param use_same_timestamp: Allow influxdb to create the timestamp upon storage
+    :param use_same_timestamp: Timestamp the measurements when they're queued, otherwise with each one's timestamp_utc
     :param block: wait until measurements are added before returning
     :return:
     """
     if block:
         add_measurements_influxdb_flux(unique_id, measurements, use_same_timestamp)
     else:
-        write_db = threading.Thread(
-            target=add_measurements_influxdb_flux,
-            args=(unique_id, measurements, use_same_timestamp,))
-        write_db.start()
+        points = measurements_to_points(unique_id, measurements, use_same_timestamp)
+        if points:
+            cache_latest_measurements(unique_id, measurements, use_same_timestamp)
+            get_influxdb_writer().put(points)
+
+
+def add_measurements_influxdb_many(unique_id, list_measurements, use_same_timestamp=True):
+    """
+    Queue several dicts of measurements of a device (e.g. one per received message) as one batch
+    :param unique_id: Unique ID of device
+    :param list_measurements: list of dicts of measurements
+    :param use_same_timestamp: Timestamp the measurements when they're queued, otherwise with each one's timestamp_utc
+    :return: the number of points queued
+    """
+    points = []
+    for measurements in list_measurements:
+        measurement_points = measurements_to_points(unique_id, measurements, use_same_timestamp)
+        if measurement_points:
+            cache_latest_measurements(unique_id, measurements, use_same_timestamp)
+            points.extend(measurement_points)
+    if points:
+        get_influxdb_writer().put(points)
+    return len(points)
 
 
 def query_flux(unit, unique_id,
@@ -189,30 +535,21 @@ def query_flux(unit, unique_id,
                start_str=None, end_str=None, min_value=None, max_value=None, past_sec=None, group_sec=None,
                limit=None):
     """Generate influxdb query string (flux edition, using influxdb_client)."""
-    from influxdb_client import InfluxDBClient
-
     settings = db_retrieve_table_daemon(Misc, entry='first')
-    influxdb_url = f'http://{settings.measurement_db_host}:{settings.measurement_db_port}'
-
-    if settings.measurement_db_version == '1':
-        client = InfluxDBClient(
-            url=influxdb_url,
-            token=f'{settings.measurement_db_user}:{settings.measurement_db_password}',
-            org='looperget',
-            timeout=60000)
-        bucket = f'{settings.measurement_db_dbname}/{settings.measurement_db_retention_policy}'
-    elif settings.measurement_db_version == '2':
-        client = InfluxDBClient(
-            url=influxdb_url,
-            username=settings.measurement_db_user,
-            password=settings.measurement_db_password,
-            org='looperget',
-            timeout=60000)
-        bucket = settings.measurement_db_dbname
-    else:
-        logger.error(f"Unknown Influxdb version: {settings.measurement_db_version}")
+    client, bucket = influxdb_client_bucket(settings, 60000)
+    if client is None:
         return
 
+    # Long-range sums, averages and counts are planned from the rollups when they cover the period
+    if value in ('SUM', 'MEAN', 'COUNT') and not (ts_str or min_value or max_value or group_sec or limit):
+        period = rollup_period(past_sec, start_str, end_str)
+        if period and period[1] - period[0] >= ROLLUP_PLANNER_MIN_SEC:
+            tables = query_flux_rollups(
+                client, bucket, unit, unique_id, value, measure, channel, period[0], period[1])
+            if tables is not None:
+                client.close()
+                return tables
+
     query = f'from(bucket: "{bucket}")'
 
     if past_sec:
@@ -296,6 +633,164 @@ def query_flux(unit, unique_id,
     return tables
 
 
+def rollup_period(past_sec, start_str, end_str):
+    """
+    Return the period of a query as epoch seconds
+
+    :return: start and end, or None if the period isn't a past duration or RFC3339 times
+    :rtype: (float, float) or None
+    """
+    now = time.time()
+    try:
+        if past_sec:
+            return now - int(past_sec), now
+        if start_str:
+            start = datetime.datetime.fromisoformat(start_str).timestamp()
+            end = datetime.datetime.fromisoformat(end_str).timestamp() if end_str else now
+            return start, end
+    except (TypeError, ValueError):
+        pass
+
+
+PRECISION_SEC = {'s': 1, 'ms': 1e3, 'us': 1e6, 'ns': 1e9}
+
+
+def point_epoch(point):
+    """
+    Return the time of a point, or of a line of line protocol, in epoch seconds
+
+    :return: epoch seconds, or None if the point has no time
+    """
+    if isinstance(point, str):
+        timestamp = point.rsplit(' ', 1)[-1]
+        return int(timestamp) / 1e9 if timestamp.isdigit() else None
+    timestamp = getattr(point, '_time', None)
+    if isinstance(timestamp, datetime.datetime):
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+        return timestamp.timestamp()
+    if isinstance(timestamp, int):
+        return timestamp / PRECISION_SEC.get(getattr(point, '_write_precision', 'ns'), 1e9)
+    return None
+
+
+def mark_late_points(points):
+    """
+    Mark the rollups of points written after they may have been rolled up
+
+    Output durations are written when the output turns off with the time it
+    turned on, and spooled or imported points are written long after their time.
+    """
+    written_before = time.time() - ROLLUP_LAG_SEC / 2
+    epochs = [epoch for epoch in map(point_epoch, points)
+              if epoch is not None and epoch < written_before]
+    if not epochs:
+        return
+    try:
+        get_rollup_store().mark_dirty(epochs)
+    except Exception:
+        logger.exception("Could not mark late points to be rolled up again")
+
+
+def query_flux_rollups(client, bucket, unit, unique_id, value, measure, channel, start, end):
+    """
+    Return the SUM, MEAN or COUNT of a series, planned from the rollups
+
+    The period is split into the coarsest rollup buckets that fit in it,
+    and the edges the rollups don't cover are aggregated from raw points.
+    The result is a single record, as returned by influxdb.
+
+    :return: list of FluxTable, or None if the rollups don't cover enough of the period
+    """
+    from influxdb_client.client.flux_table import FluxRecord, FluxTable, TableList
+
+    try:
+        store = get_rollup_store()
+        if store.is_dirty(start, end):
+            # Rollups of the period are missing points written late
+            return None
+        pieces = store.plan(start, end)
+        raw_sec = sum(piece_end - piece_start
+                      for bucket_sec, piece_start, piece_end in pieces if bucket_sec == PIECE_RAW)
+        if raw_sec > ROLLUP_RAW_EDGE_MAX_SEC:
+            return None
+
+        aggregate = [0, 0.0, None, None]
+        for bucket_sec, piece_start, piece_end in pieces:
+            if bucket_sec == PIECE_RAW:
+                query = (f'from(bucket: "{bucket}")'
+                         f' |> range(start: {flux_time(piece_start)}, stop: {flux_time(piece_end)})'
+                         f' |> filter(fn: (r) => r["_measurement"] == "{unit}")'
+                         f' |> filter(fn: (r) => r["device_id"] == "{unique_id}")')
+                if channel is not None:
+                    query += f' |> filter(fn: (r) => r["channel"] == "{channel}")'
+                if measure:
+                    query += f' |> filter(fn: (r) => r["measure"] == "{measure}")'
+                merge_aggregate(aggregate, aggregate_points(
+                    record.get_value() for record in client.query_api().query_stream(query)
+                    if isinstance(record.get_value(), (int, float))))
+            else:
+                merge_aggregate(aggregate, store.aggregate(
+                    bucket_sec, piece_start, piece_end, unit, unique_id, channel=channel, measure=measure))
+    except Exception as err:
+        logger.error(f"Could not query the rollups of {unique_id} {unit}, querying raw points: {err}")
+        return None
+
+    count, total = aggregate[0], aggregate[1]
+    if value == 'COUNT':
+        result = count
+    elif not count:
+        return TableList()
+    elif value == 'SUM':
+        result = total
+    else:
+        result = total / count
+
+    table = FluxTable()
+    table.records.append(FluxRecord(table=0, values={
+        'result': '_result',
+        'table': 0,
+        '_start': datetime.datetime.fromtimestamp(start, tz=datetime.timezone.utc),
+        '_stop': datetime.datetime.fromtimestamp(end, tz=datetime.timezone.utc),
+        '_time': datetime.datetime.fromtimestamp(end, tz=datetime.timezone.utc),
+        '_value': result,
+        '_field': 'value',
+        '_measurement': unit,
+        'device_id': unique_id
+    }))
+    logger.debug(f"query_flux() planned {value} of {unique_id} {unit} from rollups: {pieces}")
+    return TableList([table])
+
+
+def read_raw_points(start, end):
+    """
+    Return the points of all series from start up to end (epoch seconds), to be rolled up
+
+    :return: generator of (unit, device_id, channel, measure, epoch, value), or None if
+        the measurement database isn't available
+    """
+    settings = db_retrieve_table_daemon(Misc, entry='first')
+    if settings.measurement_db_name != 'influxdb':
+        return None
+    client, bucket = influxdb_client_bucket(settings, 300000)
+    if client is None:
+        return None
+
+    def points():
+        query = (f'from(bucket: "{bucket}")'
+                 f' |> range(start: {flux_time(start)}, stop: {flux_time(end)})'
+                 ' |> filter(fn: (r) => r["_field"] == "value")')
+        try:
+            for record in client.query_api().query_stream(query):
+                values = record.values
+                yield (values.get('_measurement'), values.get('device_id'), values.get('channel'),
+                       values.get('measure'), record.get_time().timestamp(), record.get_value())
+        finally:
+            client.close()
+
+    return points()
+
+
 def query_string(unit, unique_id,
                  value=None, measure=None, channel=None, ts_str=None,
                  start_str=None, end_str=None, min_value=None, max_value=None,
@@ -315,16 +810,7 @@ def query_string(unit, unique_id,
 
 
 def get_last_measurement(device_id, measurement_id, max_age=None):
-    device_measurement = db_retrieve_table_daemon(
-        DeviceMeasurements).filter(
-        DeviceMeasurements.unique_id == measurement_id).first()
-    if device_measurement:
-        conversion = db_retrieve_table_daemon(
-            Conversion, unique_id=device_measurement.conversion_id)
-    else:
-        conversion = None
-    channel, unit, measurement = return_measurement_info(
-        device_measurement, conversion)
+    channel, unit, measurement = measurement_info(measurement_id)
 
     last_measurement = read_influxdb_single(
         device_id,
@@ -375,6 +861,15 @@ def read_influxdb_single(unique_id, unit, channel,
     :param datetime_obj: return a datetime object as a time
     :type datetime_obj: bool
     """
+    if value == 'LAST' and not start_str and not end_str:
+        # Values written by the daemon are answered without querying influxdb
+        cached = get_latest_value_cache().get(
+            unique_id, unit, channel, measure, max_age=duration_sec)
+        if cached:
+            if datetime_obj:
+                return [datetime.datetime.fromtimestamp(cached[0], tz=datetime.timezone.utc), cached[1]]
+            return list(cached)
+
     try:
         data = query_string(
             unit,
@@ -405,17 +900,75 @@ def read_influxdb_single(unique_id, unit, channel,
     return [None, None]
 
 
+def read_influxdb_last_many(series):
+    """
+    Return the last value of several series, with one influxdb query for those not in the latest value cache
+
+    Each series is queried as its own stream, tagged with its key by set(),
+    and the streams are combined with union() so influxdb is queried once.
+
+    :param series: dict of key: (unique_id, unit, channel, measure, duration_sec)
+    :return: dict of key: [time, value] ([None, None] if not found)
+    :rtype: dict
+    """
+    cache = get_latest_value_cache()
+    last_values = {}
+    query_keys = []
+    for key, (unique_id, unit, channel, measure, duration_sec) in series.items():
+        cached = cache.get(unique_id, unit, channel, measure, max_age=duration_sec)
+        last_values[key] = list(cached) if cached else [None, None]
+        if not cached:
+            query_keys.append(key)
+    if not query_keys:
+        return last_values
+
+    try:
+        settings = db_retrieve_table_daemon(Misc, entry='first')
+        client, bucket = influxdb_client_bucket(settings, 60000)
+        if client is None:
+            return last_values
+
+        streams = []
+        for index, key in enumerate(query_keys):
+            unique_id, unit, channel, measure, duration_sec = series[key]
+            stream = f't{index} = from(bucket: "{bucket}")'
+            if duration_sec:
+                stream += f' |> range(start: -{int(duration_sec)}s)'
+            else:
+                stream += ' |> range(start: -99999d)'
+            stream += f' |> filter(fn: (r) => r["_measurement"] == "{unit}")'
+            stream += f' |> filter(fn: (r) => r["device_id"] == "{unique_id}")'
+            if channel is not None:
+                stream += f' |> filter(fn: (r) => r["channel"] == "{channel}")'
+            if measure:
+                stream += f' |> filter(fn: (r) => r["measure"] == "{measure}")'
+            stream += f' |> last() |> set(key: "series", value: "{index}")'
+            streams.append(stream)
+        if len(streams) == 1:
+            query = f'{streams[0]}\nt0'
+        else:
+            tables = ', '.join(f't{index}' for index in range(len(streams)))
+            query = '\n'.join(streams) + f'\nunion(tables: [{tables}])'
+
+        logger.debug(f"read_influxdb_last_many() query: '{query}'")
+        tables = client.query_api().query(query)
+        client.close()
+
+        for table in tables:
+            for row in table.records:
+                key = query_keys[int(row.values['series'])]
+                if last_values[key][0] is None:
+                    last_values[key] = [row.values['_time'].timestamp(), row.values['_value']]
+    except requests.exceptions.ConnectionError:
+        logger.debug("Failed to establish a new influxdb connection. Ensure influxdb is running.")
+    except Exception:
+        logger.exception("Error querying the last influx measurements")
+
+    return last_values
+
+
 def get_past_measurements(device_id, measurement_id, max_age=None):
-    device_measurement = db_retrieve_table_daemon(
-        DeviceMeasurements).filter(
-        DeviceMeasurements.unique_id == measurement_id).first()
-    if device_measurement:
-        conversion = db_retrieve_table_daemon(
-            Conversion, unique_id=device_measurement.conversion_id)
-    else:
-        conversion = None
-    channel, unit, measurement = return_measurement_info(
-        device_measurement, conversion)
+    channel, unit, measurement = measurement_info(measurement_id)
 
     past_measurements = read_influxdb_list(
         device_id,
@@ -427,6 +980,30 @@ def get_past_measurements(device_id, measurement_id, max_age=None):
     return past_measurements
 
 
+def get_past_measurement_stats(device_id, measurement_id, max_age, median=False):
+    """
+    Return aggregates of the past max_age seconds of a measurement from its rolling window
+
+    :return: dict of count, sum, mean, min, max, stdev, last (and median), or None
+    :rtype: dict or None
+    """
+    if not max_age:
+        return None
+    channel, unit, measurement = measurement_info(measurement_id)
+
+    return past_seconds_stats(
+        device_id, unit, channel, max_age, measure=measurement, median=median)
+
+
+def past_seconds_stats(unique_id, unit, channel, past_seconds, measure=None, median=False):
+    """Return aggregates of a series for the past x seconds from its rolling window, or None."""
+    try:
+        return get_rolling_windows().stats(
+            unique_id, unit, channel, measure, past_seconds, median=median)
+    except Exception:
+        logger.exception("Rolling window stats")
+
+
 def read_influxdb_list(unique_id, unit, channel,
                        measure=None,
                        duration_sec=None,
@@ -26,7 +26,9 @@ import os
 from looperget.config import PATH_INPUTS
 from looperget.config import PATH_INPUTS_CUSTOM
 from looperget.inputs.sensorutils import convert_units
-from looperget.utils.modules import load_module_from_file
+from looperget.utils.modules import cache_information
+from looperget.utils.modules import load_module_information
+from looperget.utils.unit_conversion import compile_equation
 
 logger = logging.getLogger("looperget.utils.inputs")
 
@@ -114,8 +116,7 @@ def rescale_measurements(measurement, measurement_value):
                 rescaled_measurement = converted_units
 
         elif measurement.rescale_method == "equation":
-            replaced_str = measurement.rescale_equation.replace('x', str(measurement_value))
-            rescaled_measurement = eval(replaced_str)
+            rescaled_measurement = compile_equation(measurement.rescale_equation)(measurement_value)
 
         if rescaled_measurement:
             return rescaled_measurement
@@ -160,6 +161,7 @@ def list_analog_to_digital_converters():
     return list_adc
 
 
+@cache_information('inputs', [PATH_INPUTS, PATH_INPUTS_CUSTOM])
 def parse_input_information(exclude_custom=False):
     """Parses the variables assigned in each Input and return a dictionary of IDs and values."""
     def dict_has_value(dict_inp, input_cus, key, force_type=None):
@@ -199,9 +201,9 @@ def parse_input_information(exclude_custom=False):
                 continue
 
             full_path = "{}/{}".format(real_path, each_file)
-            input_custom, status = load_module_from_file(full_path, 'inputs')
+            input_custom = load_module_information(full_path, 'inputs', 'INPUT_INFORMATION')
 
-            if not input_custom or not hasattr(input_custom, 'INPUT_INFORMATION'):
+            if not input_custom:
                 continue
 
             # Populate dictionary of input information
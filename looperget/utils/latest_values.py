@@ -0,0 +1,113 @@
+# coding=utf-8
+"""In-memory store of the most recent value written for each measurement."""
+import datetime
+import threading
+import time
+
+# Points timestamped further than this in the future (e.g. forecasts) aren't the latest value
+FUTURE_TOLERANCE_SEC = 5
+
+
+def timestamp_to_epoch(timestamp):
+    """Convert a datetime (naive datetimes are UTC) or epoch to epoch seconds."""
+    if timestamp is None:
+        return time.time()
+    if isinstance(timestamp, datetime.datetime):
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+        return timestamp.timestamp()
+    return float(timestamp)
+
+
+class LatestValueCache:
+    """
+    The latest value of each series, keyed by (device_id, unit, channel, measure)
+
+    Series are tagged the same way they are in influxdb, so a lookup only hits
+    when it would select the same series as a Flux last() query.
+
+    A disabled cache stores nothing and always misses. Only the process that
+    writes the measurements (the daemon) enables it, since other processes
+    would answer with their own stale or missing writes.
+    """
+    def __init__(self, enabled=True):
+        self.lock = threading.Lock()
+        self.enabled = enabled
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+        self.updates = 0
+
+    @staticmethod
+    def key(device_id, unit, channel, measure):
+        return (device_id,
+                unit,
+                str(channel) if channel is not None else None,
+                measure if measure else None)
+
+    def enable(self):
+        """Store and answer values, in the process that writes the measurements."""
+        self.enabled = True
+
+    def update(self, device_id, unit, channel, measure, timestamp, value):
+        """Store a value if it's newer than the one stored for the series."""
+        if value is None or not self.enabled:
+            return
+        epoch = timestamp_to_epoch(timestamp)
+        if epoch > time.time() + FUTURE_TOLERANCE_SEC:
+            return
+        key = self.key(device_id, unit, channel, measure)
+        with self.lock:
+            stored = self.values.get(key)
+            if stored is None or epoch >= stored[0]:
+                self.values[key] = (epoch, value)
+                self.updates += 1
+
+    def get(self, device_id, unit, channel, measure, max_age=None):
+        """
+        Return the latest (epoch, value) of a series, or None
+
+        :param max_age: only return a value stored within this many seconds
+        :type max_age: int or float or None
+        """
+        if not self.enabled:
+            return None
+        key = self.key(device_id, unit, channel, measure)
+        with self.lock:
+            stored = self.values.get(key)
+            if stored is not None and (not max_age or time.time() - stored[0] <= float(max_age)):
+                self.hits += 1
+                return stored
+            self.misses += 1
+            return None
+
+    def remove_device(self, device_id):
+        """Forget all series of a device."""
+        with self.lock:
+            for key in [key for key in self.values if key[0] == device_id]:
+                del self.values[key]
+
+    def status(self):
+        """Return the number of series cached and the hit/miss counters."""
+        with self.lock:
+            return {
+                'enabled': self.enabled,
+                'series': len(self.values),
+                'hits': self.hits,
+                'misses': self.misses,
+                'updates': self.updates
+            }
+
+
+latest_values_lock = threading.Lock()
+latest_values = None
+
+
+def get_latest_value_cache():
+    """Return the process-wide latest value cache, disabled until the daemon enables it."""
+    global latest_values
+    if latest_values is None:
+        with latest_values_lock:
+            if latest_values is None:
+                latest_values = LatestValueCache(enabled=False)
+    return latest_values
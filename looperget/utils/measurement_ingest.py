@@ -0,0 +1,198 @@
+# coding=utf-8
+"""
+Queue between an input's message callback and the storing of its measurements
+
+Inputs that receive measurements as messages (e.g. MQTT subscriptions) put
+each raw message in a bounded queue from their network callback, which
+returns immediately. A worker thread takes messages from the queue in
+batches, parses each into a dict of measurements, runs the input's actions,
+and queues the measurements of the whole batch to be written at once.
+"""
+import logging
+import queue
+import threading
+import time
+
+from looperget.config import MEASUREMENT_INGEST_ACTIONS_SEC
+from looperget.config import MEASUREMENT_INGEST_BATCH_SIZE
+from looperget.config import MEASUREMENT_INGEST_PUT_TIMEOUT_SEC
+from looperget.config import MEASUREMENT_INGEST_QUEUE_SIZE
+from looperget.databases.models import Actions
+from looperget.utils.actions import run_input_actions
+from looperget.utils.database import db_retrieve_table_daemon
+from looperget.utils.influx import add_measurements_influxdb_many
+
+logger = logging.getLogger("looperget.measurement_ingest")
+
+
+class DepthQueue(queue.Queue):
+    """A queue that records its largest size, under the lock each item is put with."""
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self.depth_max = 0
+
+    def _put(self, item):
+        super()._put(item)
+        self.depth_max = max(self.depth_max, self._qsize())
+
+
+class MeasurementIngestQueue:
+    """
+    Bounded queue of received messages, parsed and stored in batches by a worker thread
+
+    When the queue is full, put() waits up to MEASUREMENT_INGEST_PUT_TIMEOUT_SEC
+    for room, slowing the network callback (and the broker) down, then drops
+    the message.
+
+    :param unique_id: Unique ID of the input
+    :param parse: function returning a dict of measurements from a message, or None to skip it
+    :param input_logger: logger of the input
+    :param use_same_timestamp: passed on to the influxdb write
+    :param debug: log actions at the debug level
+    :param write: function storing a list of measurement dicts, by default queued for influxdb
+    """
+    def __init__(self, unique_id, parse, input_logger=None, use_same_timestamp=False, debug=False,
+                 write=None, size=MEASUREMENT_INGEST_QUEUE_SIZE, batch_size=MEASUREMENT_INGEST_BATCH_SIZE):
+        self.unique_id = unique_id
+        self.parse = parse
+        self.logger = input_logger or logger
+        self.use_same_timestamp = use_same_timestamp
+        self.debug = debug
+        self.write = write or self.write_influxdb
+        self.batch_size = batch_size
+        self.queue = DepthQueue(maxsize=size)
+        self.running = False
+        self.thread = None
+
+        self.actions = None
+        self.actions_timer = 0
+
+        self.lock = threading.Lock()
+        self.received = 0
+        self.dropped = 0
+        self.waited = 0
+        self.failed = 0
+        self.stored = 0
+        self.batches = 0
+        self.time_drop_logged = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(
+            target=self.run, name=f"ingest_{self.unique_id.split('-')[0]}", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the worker after it has stored the messages already queued."""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout)
+
+    def put(self, message):
+        """
+        Queue a received message, waiting for room if the queue is full
+
+        :return: False if the message was dropped
+        :rtype: bool
+        """
+        with self.lock:
+            self.received += 1
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            with self.lock:
+                self.waited += 1
+            try:
+                self.queue.put(message, timeout=MEASUREMENT_INGEST_PUT_TIMEOUT_SEC)
+            except queue.Full:
+                self.message_dropped()
+                return False
+        return True
+
+    def message_dropped(self):
+        with self.lock:
+            self.dropped += 1
+            dropped = self.dropped
+            log = time.time() - self.time_drop_logged > 60
+            if log:
+                self.time_drop_logged = time.time()
+        if log:
+            self.logger.warning(
+                f"Measurement queue is full, dropping messages ({dropped} dropped since the input started)")
+
+    def run(self):
+        while self.running or not self.queue.empty():
+            try:
+                batch = [self.queue.get(timeout=1)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.store_batch(batch)
+
+    def store_batch(self, batch):
+        actions = self.input_actions()
+        list_measurements = []
+        for each_message in batch:
+            try:
+                measurements = self.parse(each_message)
+                if not measurements:
+                    continue
+                if actions:
+                    message, measurements = run_input_actions(
+                        self.unique_id, "", measurements, self.debug, actions=actions)
+                list_measurements.append(measurements)
+            except Exception:
+                with self.lock:
+                    self.failed += 1
+                self.logger.exception("Processing received message")
+
+        try:
+            if list_measurements:
+                self.write(list_measurements)
+        except Exception:
+            with self.lock:
+                self.failed += len(list_measurements)
+            self.logger.exception("Storing received measurements")
+        else:
+            with self.lock:
+                self.stored += len(list_measurements)
+                self.batches += 1
+
+    def write_influxdb(self, list_measurements):
+        add_measurements_influxdb_many(
+            self.unique_id, list_measurements, use_same_timestamp=self.use_same_timestamp)
+
+    def input_actions(self):
+        """Return the actions of the input, read at most every MEASUREMENT_INGEST_ACTIONS_SEC."""
+        if self.actions is None or time.time() - self.actions_timer > MEASUREMENT_INGEST_ACTIONS_SEC:
+            try:
+                self.actions = db_retrieve_table_daemon(Actions).filter(
+                    Actions.function_id == self.unique_id).all()
+            except Exception:
+                self.logger.exception("Reading input actions")
+                self.actions = self.actions or []
+            self.actions_timer = time.time()
+        return self.actions
+
+    def status(self):
+        """
+        Return the counters of the queue
+
+        :rtype: dict
+        """
+        with self.lock:
+            return {
+                'received': self.received,
+                'stored': self.stored,
+                'dropped': self.dropped,
+                'waited_for_room': self.waited,
+                'failed': self.failed,
+                'batches': self.batches,
+                'batch_size_avg': self.stored / self.batches if self.batches else 0.0,
+                'queue_depth': self.queue.qsize(),
+                'queue_depth_max': self.queue.depth_max
+            }
@@ -0,0 +1,116 @@
+# coding=utf-8
+"""Cache of how each device measurement is stored in the measurement database."""
+import collections
+import itertools
+import logging
+import threading
+import time
+
+from looperget.databases.models import Conversion
+from looperget.databases.models import DeviceMeasurements
+from looperget.utils.database import db_retrieve_table_daemon
+from looperget.utils.system_pi import return_measurement_info
+
+logger = logging.getLogger("looperget.measurement_metadata")
+
+# A measurement ID missing from the cache rebuilds it, at most this often
+METADATA_MISS_REBUILD_SEC = 10
+
+MeasurementInfo = collections.namedtuple(
+    'MeasurementInfo', ['device_id', 'channel', 'unit', 'measurement'])
+
+NOT_FOUND = MeasurementInfo(None, None, None, None)
+
+
+class MeasurementMetadataCache:
+    """
+    The (channel, unit, measurement) of every device measurement, keyed by measurement ID
+
+    Built from the DeviceMeasurements and Conversion tables with two queries,
+    and rebuilt on the next lookup after invalidate().
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.info = None
+        self.built = 0
+        self.builds = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, measurement_id):
+        """
+        Return the MeasurementInfo of a measurement ID
+
+        :return: the measurement info, with all fields None if it isn't found
+        :rtype: MeasurementInfo
+        """
+        with self.lock:
+            if self.info is None or (measurement_id not in self.info and
+                                     time.time() - self.built > METADATA_MISS_REBUILD_SEC):
+                self._build()
+            info = self.info.get(measurement_id)
+            if info is None:
+                self.misses += 1
+                return NOT_FOUND
+            self.hits += 1
+            return info
+
+    def invalidate(self):
+        """Rebuild the cache on the next lookup."""
+        with self.lock:
+            self.info = None
+
+    def status(self):
+        with self.lock:
+            return {
+                'measurements': len(self.info) if self.info is not None else 0,
+                'builds': self.builds,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _build(self):
+        conversions = {
+            each_conversion.unique_id: each_conversion
+            for each_conversion in db_retrieve_table_daemon(Conversion, entry='all')}
+        info = {}
+        for each_measurement in db_retrieve_table_daemon(DeviceMeasurements, entry='all'):
+            channel, unit, measurement = return_measurement_info(
+                each_measurement, conversions.get(each_measurement.conversion_id))
+            info[each_measurement.unique_id] = MeasurementInfo(
+                each_measurement.device_id, channel, unit, measurement)
+        self.info = info
+        self.built = time.time()
+        self.builds += 1
+        logger.debug(f"Cached the metadata of {len(info)} measurements")
+
+
+measurement_metadata_lock = threading.Lock()
+measurement_metadata = None
+
+
+def get_measurement_metadata():
+    """Return the process-wide measurement metadata cache."""
+    global measurement_metadata
+    if measurement_metadata is None:
+        with measurement_metadata_lock:
+            if measurement_metadata is None:
+                measurement_metadata = MeasurementMetadataCache()
+    return measurement_metadata
+
+
+def measurement_info(measurement_id):
+    """
+    Return the channel, unit, and measurement a measurement ID is stored with
+
+    :return: channel, unit, measurement (all None if the ID isn't found)
+    :rtype: tuple
+    """
+    info = get_measurement_metadata().get(measurement_id)
+    return info.channel, info.unit, info.measurement
+
+
+def session_changes_metadata(session):
+    """Return True if a session has pending changes to measurements or conversions."""
+    return any(isinstance(each_obj, (DeviceMeasurements, Conversion))
+               for each_obj in itertools.chain(session.new, session.dirty, session.deleted))
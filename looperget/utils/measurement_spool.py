@@ -0,0 +1,126 @@
+# coding=utf-8
+"""On-disk spool for measurements that couldn't be written to the measurement database."""
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger("looperget.measurement_spool")
+
+
+class MeasurementSpool:
+    """
+    Append-only queue of influxdb line protocol, stored in a SQLite file
+
+    Lines are read back in the order they were appended. When the file grows
+    past max_bytes, the oldest lines are discarded to make room.
+    """
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        self.lines_spooled = 0
+        self.lines_replayed = 0
+        self.lines_discarded = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # auto_vacuum must be set before the table is created to take effect
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "line TEXT NOT NULL)")
+        self.count = self.conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def __len__(self):
+        return self.count
+
+    def append(self, lines):
+        """Append lines of line protocol to the end of the spool."""
+        if not lines:
+            return
+        with self.lock:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO spool (line) VALUES (?)", [(line,) for line in lines])
+            self.count += len(lines)
+            self.lines_spooled += len(lines)
+            if self.size_bytes() > self.max_bytes:
+                self._discard_oldest()
+
+    def peek(self, number):
+        """
+        Return the oldest lines without removing them
+
+        :return: the ID of the last line returned and the lines
+        :rtype: (int, list)
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, line FROM spool ORDER BY id LIMIT ?", (number,)).fetchall()
+        if not rows:
+            return None, []
+        return rows[-1][0], [row[1] for row in rows]
+
+    def remove_through(self, last_id):
+        """Remove all lines up to and including last_id, after they've been replayed."""
+        with self.lock:
+            with self.conn:
+                removed = self.conn.execute(
+                    "DELETE FROM spool WHERE id <= ?", (last_id,)).rowcount
+            self.count -= removed
+            self.lines_replayed += removed
+            if not self.count:
+                self._compact()
+
+    def size_bytes(self):
+        """Return the bytes used by the spool (excluding free pages)."""
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist_count = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return (page_count - freelist_count) * page_size
+
+    def status(self):
+        """Return the spool size and counters."""
+        with self.lock:
+            return {
+                'path': self.path,
+                'lines': self.count,
+                'size_bytes': self.size_bytes(),
+                'max_bytes': self.max_bytes,
+                'lines_spooled': self.lines_spooled,
+                'lines_replayed': self.lines_replayed,
+                'lines_discarded': self.lines_discarded
+            }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _discard_oldest(self):
+        """Discard the oldest lines until the spool fits, and release the space."""
+        discarded = 0
+        while self.count and self.size_bytes() > self.max_bytes:
+            number = max(self.count // 10, 1)
+            with self.conn:
+                removed = self.conn.execute(
+                    "DELETE FROM spool WHERE id IN (SELECT id FROM spool ORDER BY id LIMIT ?)",
+                    (number,)).rowcount
+            self.count -= removed
+            discarded += removed
+        self.lines_discarded += discarded
+        logger.error(f"Measurement spool exceeded {self.max_bytes} bytes. "
+                     f"Discarded the {discarded} oldest measurements.")
+        self._compact()
+
+    def _compact(self):
+        """Return free pages to the file system."""
+        try:
+            self.conn.execute("PRAGMA incremental_vacuum").fetchall()
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except Exception:
+            logger.exception("Compacting measurement spool")
@@ -1,6 +1,10 @@
 # coding=utf-8
+import bisect
+import copy
 import datetime
+import itertools
 import logging
+import threading
 import time
 from math import sin, radians
 
@@ -9,8 +13,15 @@ from looperget.databases.models import MethodData
 from looperget.utils.database import db_retrieve_table_daemon
 from looperget.utils.system_pi import get_sec
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 logger = logging.getLogger(__name__)
 
+EPOCH_NAIVE = datetime.datetime(1970, 1, 1)
+
 
 def parse_db_time(time_string, default=None):
     try:
@@ -19,12 +30,49 @@ def parse_db_time(time_string, default=None):
         return default
 
 
+def naive_seconds(date_time):
+    """Return a naive datetime as seconds since 1970-01-01, for comparing times as numbers."""
+    return (date_time - EPOCH_NAIVE).total_seconds()
+
+
+class SegmentTable:
+    """
+    Segments (start, end) sorted into boundaries, to find the segment containing a time with bisect
+
+    A time belongs to the first segment in list order with start < time < end,
+    as if the segments were scanned in order. Overlaps are resolved when the
+    table is built, so each lookup is a single bisect.
+    """
+    def __init__(self, spans):
+        self.boundaries = sorted(set(itertools.chain.from_iterable(spans)))
+        # Segment index at each boundary, and between each boundary and the next
+        self.owner_at = [self._owner(spans, time_at, time_at) for time_at in self.boundaries]
+        self.owner_between = [self._owner(spans, start, end)
+                              for start, end in zip(self.boundaries, self.boundaries[1:])]
+
+    @staticmethod
+    def _owner(spans, start, end):
+        for index, (span_start, span_end) in enumerate(spans):
+            if span_start <= start and end <= span_end and span_start < end and start < span_end:
+                return index
+
+    def find(self, time_at):
+        """Return the index of the segment containing time_at, or None."""
+        index = bisect.bisect_left(self.boundaries, time_at)
+        if index < len(self.boundaries) and self.boundaries[index] == time_at:
+            return self.owner_at[index]
+        if 0 < index < len(self.boundaries):
+            return self.owner_between[index - 1]
+        return None
+
+
 class AbstractMethod(object):
     """
     Basic class for methods. A method is called by controller (trigger, pid) to determine an analogue
     value. A trigger can use this as condition or forward into a pwm output. Pid can use these values
     to allow setpoint tracking functionality.
     The config frontend also displays plots of the method. This class also calculates the necessary values.
+    The method data is compiled once when the class is initialized, so handlers can be cached and reused.
     """
 
     def __init__(self, method, method_data, logger=None):
@@ -47,6 +95,14 @@ class AbstractMethod(object):
         self.method_data_first = self.method_data.filter(MethodData.output_id.is_(None)).first()
         self.method_data_repeat = self.method_data.filter(MethodData.duration_sec == 0).first()
 
+        self.compile()
+
+    def compile(self):
+        """
+        Called once to prepare the method data for calculating setpoints
+        """
+        pass
+
     def determine_end_time(self, method_start_time):
         """
         Called to determine desired end time of this method
@@ -84,74 +140,73 @@ class DateMethod(AbstractMethod):
         """
         return False
 
+    def compile(self):
+        # Parse the start and end of each row once, and sort them for lookup
+        time_format = '%H:%M:%S' if self.ignore_date() else '%Y-%m-%d %H:%M:%S'
+        self.segments = []
+        for each_method in self.method_data_all:
+            try:
+                start_time = datetime.datetime.strptime(each_method.time_start, time_format)
+                end_time = datetime.datetime.strptime(each_method.time_end, time_format)
+            except (TypeError, ValueError):
+                if self.logger:
+                    self.logger.error(f"Method {self.unique_id}: invalid time in row {each_method.unique_id}")
+                continue
+            if each_method.setpoint_end is not None:
+                setpoint_end = each_method.setpoint_end
+            else:
+                setpoint_end = each_method.setpoint_start
+            self.segments.append((start_time, end_time, each_method.setpoint_start, setpoint_end))
+
+        self.segment_table = SegmentTable(
+            [(naive_seconds(start_time), naive_seconds(end_time)) for start_time, end_time, _, _ in self.segments])
+
     def calculate_setpoint(self, now, method_start_time=None):
         # Calculate where the current time/date is within the time/date method
 
         if self.ignore_date():
-            now = datetime.datetime.strptime(str(now.strftime('%H:%M:%S')), '%H:%M:%S')
-
-        for each_method in self.method_data_all:
-            if self.ignore_date():
-                start_time = datetime.datetime.strptime(each_method.time_start, '%H:%M:%S')
-                end_time = datetime.datetime.strptime(each_method.time_end, '%H:%M:%S')
+            now = datetime.datetime(1900, 1, 1, now.hour, now.minute, now.second)
+
+        index = self.segment_table.find(naive_seconds(now))
+        if index is not None:
+            start_time, end_time, setpoint_start, setpoint_end = self.segments[index]
+            setpoint_diff = abs(setpoint_end - setpoint_start)
+            total_seconds = (end_time - start_time).total_seconds()
+            part_seconds = (now - start_time).total_seconds()
+            percent_total = part_seconds / total_seconds
+
+            if setpoint_start < setpoint_end:
+                new_setpoint = setpoint_start + (setpoint_diff * percent_total)
             else:
-                start_time = datetime.datetime.strptime(each_method.time_start, '%Y-%m-%d %H:%M:%S')
-                end_time = datetime.datetime.strptime(each_method.time_end, '%Y-%m-%d %H:%M:%S')
-
-            if start_time < now < end_time:
-                setpoint_start = each_method.setpoint_start
-                if each_method.setpoint_end is not None:
-                    setpoint_end = each_method.setpoint_end
-                else:
-                    setpoint_end = each_method.setpoint_start
-
-                setpoint_diff = abs(setpoint_end - setpoint_start)
-                total_seconds = (end_time - start_time).total_seconds()
-                part_seconds = (now - start_time).total_seconds()
-                percent_total = part_seconds / total_seconds
+                new_setpoint = setpoint_start - (setpoint_diff * percent_total)
 
-                if setpoint_start < setpoint_end:
-                    new_setpoint = setpoint_start + (setpoint_diff * percent_total)
+            if self.logger:
+                if self.ignore_date():
+                    self.logger.debug("[Method] Start: {start} End: {end}".format(
+                        start=start_time.strftime('%H:%M:%S'),
+                        end=end_time.strftime('%H:%M:%S')))
                 else:
-                    new_setpoint = setpoint_start - (setpoint_diff * percent_total)
-
-                if self.logger:
-                    if self.ignore_date():
-                        self.logger.debug("[Method] Start: {start} End: {end}".format(
-                            start=start_time.strftime('%H:%M:%S'),
-                            end=end_time.strftime('%H:%M:%S')))
-                    else:
-                        self.logger.debug("[Method] Start: {start} End: {end}".format(
-                            start=start_time, end=end_time))
                     self.logger.debug("[Method] Start: {start} End: {end}".format(
-                        start=setpoint_start, end=setpoint_end))
-                    self.logger.debug("[Method] Total: {tot} Part total: {par} ({per}%)".format(
-                        tot=total_seconds, par=part_seconds, per=percent_total))
-                    self.logger.debug("[Method] New Setpoint: {sp}".format(
-                        sp=new_setpoint))
-                return new_setpoint, False
+                        start=start_time, end=end_time))
+                self.logger.debug("[Method] Start: {start} End: {end}".format(
+                    start=setpoint_start, end=setpoint_end))
+                self.logger.debug("[Method] Total: {tot} Part total: {par} ({per}%)".format(
+                    tot=total_seconds, par=part_seconds, per=percent_total))
+                self.logger.debug("[Method] New Setpoint: {sp}".format(
+                    sp=new_setpoint))
+            return new_setpoint, False
 
         # Setpoint not needing to be calculated, use default setpoint
         return None, False
 
     def get_plot(self, max_points_x=None):
         result = []
-        for each_method in self.method_data_all:
-            if each_method.setpoint_end is None:
-                setpoint_end = each_method.setpoint_start
-            else:
-                setpoint_end = each_method.setpoint_end
-
-            start_time = datetime.datetime.strptime(
-                each_method.time_start, '%Y-%m-%d %H:%M:%S')
-            end_time = datetime.datetime.strptime(
-                each_method.time_end, '%Y-%m-%d %H:%M:%S')
-
-            is_dst = time.daylight and time.localtime().tm_isdst > 0
-            utc_offset_ms = (time.altzone if is_dst else time.timezone)
+        is_dst = time.daylight and time.localtime().tm_isdst > 0
+        utc_offset_ms = (time.altzone if is_dst else time.timezone)
+        for start_time, end_time, setpoint_start, setpoint_end in self.segments:
             result.append(
                 [(int(start_time.strftime("%s")) - utc_offset_ms) * 1000,
-                 each_method.setpoint_start])
+                 setpoint_start])
             result.append(
                 [(int(end_time.strftime("%s")) - utc_offset_ms) * 1000,
                  setpoint_end])
@@ -199,22 +254,33 @@ class DailyMethod(DateMethod):
 class AbstractDailyFormulaMethod(AbstractMethod):
     """
     Abstract base for mathematical function based methods. It offers shared functionality to generate the frontend
-    plot by iterating through the x axis and calling the calculate_setpoint function to get the corresponding y values.
+    plot by calculating the y values of all points of the x axis (seconds of the day) at once.
     """
 
-    def get_plot(self, max_points_x=700):
-        result = []
+    def setpoint_of_day(self, second_of_day):
+        """
+        Returns the setpoint at a second of the day
+        :param second_of_day: whole seconds since midnight
+        """
+        return None
 
-        seconds_in_day = 60 * 60 * 24
-        today = datetime.datetime(1900, 1, 1)
-        for n in range(max_points_x):
-            percent = n / float(max_points_x)
-            now = today + datetime.timedelta(seconds=percent * seconds_in_day)
-            y, ended = self.calculate_setpoint(now)
-            if not ended:
-                result.append([percent * seconds_in_day * 1000, y])
+    def setpoints_of_day(self, seconds_of_day):
+        """
+        Returns the setpoints at several seconds of the day. Overridden to calculate them all at once.
+        :param seconds_of_day: list of whole seconds since midnight
+        :return: list of setpoints
+        """
+        return [self.setpoint_of_day(second) for second in seconds_of_day]
 
-        return result
+    def calculate_setpoint(self, now, method_start_time=None):
+        return self.setpoint_of_day(now.hour * 3600 + now.minute * 60 + now.second), False
+
+    def get_plot(self, max_points_x=700):
+        seconds_in_day = 60 * 60 * 24
+        percents = [n / float(max_points_x) for n in range(max_points_x)]
+        setpoints = self.setpoints_of_day(
+            [int(round(percent * seconds_in_day, 6)) for percent in percents])
+        return [[percent * seconds_in_day * 1000, y] for percent, y in zip(percents, setpoints)]
 
 
 class DailySineMethod(AbstractDailyFormulaMethod):
@@ -224,38 +290,45 @@ class DailySineMethod(AbstractDailyFormulaMethod):
     C is the angle shift, and D is the y-axis shift. This method will repeat daily.
     """
 
-    def calculate_setpoint(self, now, method_start_time=None):
+    def compile(self):
+        self.wave = None
+        if self.method_data_first:
+            self.wave = (self.method_data_first.amplitude,
+                         self.method_data_first.frequency,
+                         self.method_data_first.shift_angle,
+                         self.method_data_first.shift_y)
+
+    def setpoint_of_day(self, second_of_day):
         # Calculate sine y-axis value from the x-axis (seconds of the day)
-        dt = datetime.timedelta(hours=now.hour,
-                                minutes=now.minute,
-                                seconds=now.second)
+        if not self.wave:
+            return None
         secs_per_day = 24 * 60 * 60
-        angle = dt.total_seconds() / secs_per_day * 360
-        new_setpoint = sine_wave_y_out(self.method_data_first.amplitude,
-                                       self.method_data_first.frequency,
-                                       self.method_data_first.shift_angle,
-                                       self.method_data_first.shift_y,
-                                       angle)
-        return new_setpoint, False
+        angle = second_of_day / secs_per_day * 360
+        return sine_wave_y_out(*self.wave, angle)
+
+    def setpoints_of_day(self, seconds_of_day):
+        if not self.wave or np is None:
+            return super().setpoints_of_day(seconds_of_day)
+        amplitude, frequency, shift_angle, shift_y = self.wave
+        angles = np.asarray(seconds_of_day, dtype=float) / (24 * 60 * 60) * 360
+        return (amplitude * np.sin(np.radians(frequency * (angles - shift_angle))) + shift_y).tolist()
 
 
 class DailyBezierMethod(AbstractDailyFormulaMethod):
-    def calculate_setpoint(self, now, method_start_time=None):
+    def compile(self):
+        self.curve = None
+        if self.method_data_first:
+            self.curve = (self.method_data_first.shift_angle,
+                          (self.method_data_first.x0, self.method_data_first.y0),
+                          (self.method_data_first.x1, self.method_data_first.y1),
+                          (self.method_data_first.x2, self.method_data_first.y2),
+                          (self.method_data_first.x3, self.method_data_first.y3))
+
+    def setpoint_of_day(self, second_of_day):
         # Calculate Bezier curve y-axis value from the x-axis (seconds of the day)
-
-        dt = datetime.timedelta(hours=now.hour,
-                                minutes=now.minute,
-                                seconds=now.second)
-
-        new_setpoint = bezier_curve_y_out(
-            self.method_data_first.shift_angle,
-            (self.method_data_first.x0, self.method_data_first.y0),
-            (self.method_data_first.x1, self.method_data_first.y1),
-            (self.method_data_first.x2, self.method_data_first.y2),
-            (self.method_data_first.x3, self.method_data_first.y3),
-            dt.total_seconds())
-
-        return new_setpoint, False
+        if not self.curve:
+            return None
+        return bezier_curve_y_out(*self.curve, second_of_day)
 
 
 class DurationMethod(AbstractMethod):
@@ -265,6 +338,24 @@ class DurationMethod(AbstractMethod):
     24-hour period and this method will repeat daily.
     """
 
+    def compile(self):
+        # Cumulative end of each row within a cycle, to find the row of a time with bisect
+        self.rows = []
+        self.row_ends = []
+        self.repeat_sec = None
+        total_sec = 0
+        for each_method in self.method_data_all:
+            if each_method.duration_sec == 0 and self.repeat_sec is None:
+                self.repeat_sec = each_method.duration_end or 0
+            total_sec += each_method.duration_sec
+            if each_method.setpoint_end is not None:
+                setpoint_end = each_method.setpoint_end
+            else:
+                setpoint_end = each_method.setpoint_start
+            self.rows.append((each_method.duration_sec, each_method.setpoint_start, setpoint_end))
+            self.row_ends.append(total_sec)
+        self.total_sec = total_sec
+
     def calculate_setpoint(self, now, method_start_time=None):
         # Calculate the duration in the method based on self.method_start_time
 
@@ -285,54 +376,39 @@ class DurationMethod(AbstractMethod):
                 # still repeated
                 seconds_from_start = seconds_from_start % duration_in_seconds
 
-        total_sec = 0
-        previous_total_sec = 0
-        for each_method in self.method_data_all:
-            total_sec += each_method.duration_sec
-            if previous_total_sec <= seconds_from_start < total_sec:
-                row_since_start_sec = seconds_from_start - previous_total_sec
-                percent_row = row_since_start_sec / each_method.duration_sec
-
-                setpoint_start = each_method.setpoint_start
-                if each_method.setpoint_end is not None:
-                    setpoint_end = each_method.setpoint_end
-                else:
-                    setpoint_end = each_method.setpoint_start
-                setpoint_diff = abs(setpoint_end - setpoint_start)
-                if setpoint_start < setpoint_end:
-                    new_setpoint = setpoint_start + (setpoint_diff * percent_row)
-                else:
-                    new_setpoint = setpoint_start - (setpoint_diff * percent_row)
-
-                if self.logger:
-                    self.logger.debug(
-                        "[Method] {sec_method:.1f}s/{sec_cycle:.1f}s/{sec_row:.1f}s "
-                        "since start of method/cycle/row".format(
-                            sec_method=(now - start_time).total_seconds(),
-                            sec_cycle=seconds_from_start,
-                            sec_row=row_since_start_sec))
-                    self.logger.debug(
-                        "[Method] Percent of row: {per:.2f}, new Setpoint {sp:.2f}".format(
-                            per=percent_row, sp=new_setpoint))
-                return new_setpoint, False
-
-            previous_total_sec = total_sec
+        # The first row ending after this time, if it starts at or before it
+        index = bisect.bisect_right(self.row_ends, seconds_from_start)
+        previous_total_sec = self.row_ends[index - 1] if index else 0
+        if index < len(self.rows) and previous_total_sec <= seconds_from_start:
+            duration_sec, setpoint_start, setpoint_end = self.rows[index]
+            row_since_start_sec = seconds_from_start - previous_total_sec
+            percent_row = row_since_start_sec / duration_sec
+
+            setpoint_diff = abs(setpoint_end - setpoint_start)
+            if setpoint_start < setpoint_end:
+                new_setpoint = setpoint_start + (setpoint_diff * percent_row)
+            else:
+                new_setpoint = setpoint_start - (setpoint_diff * percent_row)
 
-        return previous_total_sec, False
+            if self.logger:
+                self.logger.debug(
+                    "[Method] {sec_method:.1f}s/{sec_cycle:.1f}s/{sec_row:.1f}s "
+                    "since start of method/cycle/row".format(
+                        sec_method=(now - start_time).total_seconds(),
+                        sec_cycle=seconds_from_start,
+                        sec_row=row_since_start_sec))
+                self.logger.debug(
+                    "[Method] Percent of row: {per:.2f}, new Setpoint {sp:.2f}".format(
+                        per=percent_row, sp=new_setpoint))
+            return new_setpoint, False
+
+        return self.total_sec, False
 
     def cycle_duration(self):
-        total_sec = 0
-        for each_method in self.method_data_all:
-            total_sec += each_method.duration_sec
-
-        return total_sec
+        return self.total_sec
 
     def repeat_duration(self):
-        for each_method in self.method_data_all:
-            if each_method.duration_sec == 0:
-                return each_method.duration_end or 0
-
-        return None
+        return self.repeat_sec
 
     def determine_end_time(self, method_start_time):
         method_start_time = parse_db_time(method_start_time, datetime.datetime.min)
@@ -352,34 +428,32 @@ class DurationMethod(AbstractMethod):
         result = []
         first_entry = True
         start_duration = 0
-        for each_method in self.method_data_all:
-            if each_method.setpoint_end is None:
-                setpoint_end = each_method.setpoint_start
-            else:
-                setpoint_end = each_method.setpoint_end
-
-            if each_method.duration_sec == 0:
+        for duration_sec, setpoint_start, setpoint_end in self.rows:
+            if duration_sec == 0:
                 pass  # Method line is repeat command, don't add to method_list
             elif first_entry:
-                result.append([0, each_method.setpoint_start])
-                result.append([each_method.duration_sec, setpoint_end])
-                start_duration += each_method.duration_sec
+                result.append([0, setpoint_start])
+                result.append([duration_sec, setpoint_end])
+                start_duration += duration_sec
                 first_entry = False
             else:
-                end_duration = start_duration + each_method.duration_sec
+                end_duration = start_duration + duration_sec
 
                 result.append(
-                    [start_duration, each_method.setpoint_start])
+                    [start_duration, setpoint_start])
                 result.append(
                     [end_duration, setpoint_end])
 
-                start_duration += each_method.duration_sec
+                start_duration += duration_sec
 
         return result
 
 
 class CascadeMethod(AbstractMethod):
 
+    def compile(self):
+        self.linked_method_ids = [each_method.linked_method_id for each_method in self.method_data_all]
+
     def calculate_setpoint(self, now, method_start_time=None, blacklist=None):
         setpoint = 1.
         # blacklist is passed into cascaded cascade methods to avoid endless loops
@@ -393,17 +467,17 @@ class CascadeMethod(AbstractMethod):
 
         blacklist.add(self.unique_id)
 
-        for each_method in self.method_data_all:
-            if not each_method.linked_method_id:
+        for linked_method_id in self.linked_method_ids:
+            if not linked_method_id:
                 if self.logger:
                     self.logger.warning("Method data does not contain linked_method_id")
                 continue
 
-            linked_method = load_method_handler(each_method.linked_method_id, self.logger)
+            linked_method = load_method_handler(linked_method_id, self.logger)
 
             if not linked_method:
                 if self.logger:
-                    self.logger.warning("Linked method {} not found".format(each_method.linked_method_id))
+                    self.logger.warning("Linked method {} not found".format(linked_method_id))
                 continue
 
             if isinstance(linked_method, CascadeMethod):
@@ -420,7 +494,7 @@ class CascadeMethod(AbstractMethod):
 
             if self.logger:
                 self.logger.debug("Linked method: {} {} returned {}, {}; current product is {}".format(
-                    each_method.linked_method_id, linked_method.method_name,
+                    linked_method_id, linked_method.method_name,
                     linked_method_setpoint, linked_method_ended,
                     setpoint * 100.))
 
@@ -441,18 +515,92 @@ def create_method_handler(method, method_data, logger=None):
     return method_class(method, method_data, logger)
 
 
-def load_method_handler(method_id, logger=None):
+class MethodHandlerCache:
     """
-    Loads method type and data from database for the given method_id. Then uses method_by_type to create an instance.
+    Method handlers compiled from the Method and MethodData tables, keyed by method ID
+
+    Each handler is compiled on its first use and kept until invalidate(),
+    which is called when methods are saved, so controllers evaluating a
+    method every loop don't query the database.
     """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.handlers = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, method_id, logger=None):
+        """
+        Return a handler of a method, using logger
 
-    method = db_retrieve_table_daemon(Method).filter(Method.unique_id == method_id).first()
-    if not method:
-        return None
+        :return: a copy of the compiled handler (sharing its compiled data), or None if the method isn't found
+        """
+        with self.lock:
+            handler = self.handlers.get(method_id)
+            generation = self.generation
+            if handler:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if handler is None:
+            method = db_retrieve_table_daemon(Method).filter(Method.unique_id == method_id).first()
+            if not method:
+                return None
+            method_data = db_retrieve_table_daemon(MethodData).filter(MethodData.method_id == method_id)
+            handler = create_method_handler(method, method_data, logger)
+            handler.method_data = None  # Don't hold on to the query
+            with self.lock:
+                # Not cached if the methods were saved while it was compiled
+                if generation == self.generation:
+                    self.handlers[method_id] = handler
+
+        handler = copy.copy(handler)
+        handler.logger = logger
+        return handler
+
+    def invalidate(self):
+        """Compile each method again on its next use."""
+        with self.lock:
+            self.handlers = {}
+            self.generation += 1
+
+    def status(self):
+        with self.lock:
+            return {
+                'methods': len(self.handlers),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+method_cache_lock = threading.Lock()
+method_cache = None
+
+
+def get_method_cache():
+    """Return the process-wide cache of compiled method handlers."""
+    global method_cache
+    if method_cache is None:
+        with method_cache_lock:
+            if method_cache is None:
+                method_cache = MethodHandlerCache()
+    return method_cache
 
-    method_data = db_retrieve_table_daemon(MethodData).filter(MethodData.method_id == method_id)
 
-    return create_method_handler(method, method_data, logger)
+def load_method_handler(method_id, logger=None):
+    """
+    Returns the handler of the given method_id, compiled from the database on first use and cached until
+    methods are saved (see MethodHandlerCache).
+    """
+    return get_method_cache().get(method_id, logger)
+
+
+def session_changes_methods(session):
+    """Return True if a session has pending changes to methods."""
+    return any(isinstance(each_obj, (Method, MethodData))
+               for each_obj in itertools.chain(session.new, session.dirty, session.deleted))
 
 
 def sine_wave_y_out(amplitude, frequency, shift_angle,
@@ -474,11 +622,6 @@ def bezier_curve_y_out(shift_angle, P0, P1, P2, P3, second_of_day):
     Ex: getYfromXforBezSegment((10,0), (5,-5), (5,5), (0,0), 3.2)
     """
 
-    try:
-        import numpy as np
-    except ImportError:
-        np = None
-
     if not np:
         return 0
 
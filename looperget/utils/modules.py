@@ -1,8 +1,18 @@
 # coding=utf-8
+import copy
+import functools
 import importlib.util
 import logging
 import os
+import pickle
+import sqlite3
+import sys
+import threading
 import traceback
+import types
+
+from looperget.config import LOOPERGET_VERSION
+from looperget.config import MODULE_INDEX_PATH
 
 logger = logging.getLogger("looperget.modules")
 
@@ -19,3 +29,342 @@ def load_module_from_file(path_file, module_type):
         logger.error(f"Path: {path_file}, Type: {module_type}")
         logger.error(f"Could not load module: {traceback.format_exc()}")
         return None, traceback.format_exc()
+
+
+def file_signature(path_file):
+    """Return the (mtime, size) of a file, which changes when the file is edited."""
+    stat = os.stat(path_file)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ModuleRegistry:
+    """
+    Modules loaded from files, keyed by path
+
+    A module is executed once and the same module object is returned until
+    its file's mtime or size changes.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.modules = {}
+
+    def get(self, path_file, module_type):
+        try:
+            signature = file_signature(path_file)
+        except OSError:
+            return load_module_from_file(path_file, module_type)
+
+        with self.lock:
+            entry = self.modules.get(path_file)
+            if entry and entry[0] == signature:
+                return entry[1], "success"
+
+        module_custom, status = load_module_from_file(path_file, module_type)
+        if module_custom:
+            with self.lock:
+                self.modules[path_file] = (signature, module_custom)
+        return module_custom, status
+
+
+class ModuleInformation:
+    """Stands in for a module in the parse_*_information() scanners, holding only its information dict."""
+    def __init__(self, attribute, information):
+        setattr(self, attribute, information)
+
+
+def contains_module_code(obj, module_name):
+    """
+    Return True if an information dict holds functions or classes defined in its own module
+
+    Those can only be restored by executing the module. Functions from
+    importable modules (e.g. constraints_pass) are pickled by reference.
+    """
+    if isinstance(obj, (types.FunctionType, types.BuiltinFunctionType, types.MethodType, type)):
+        return getattr(obj, '__module__', None) in (module_name, None) or obj.__module__ not in sys.modules
+    if isinstance(obj, dict):
+        return any(contains_module_code(key, module_name) or contains_module_code(value, module_name)
+                   for key, value in obj.items())
+    if isinstance(obj, (list, tuple, set)):
+        return any(contains_module_code(each_obj, module_name) for each_obj in obj)
+    return False
+
+
+RANDOM_MODULES = ('random', 'secrets', 'uuid')
+FUNCTION_TYPES = (types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def generates_random_values(module_custom):
+    """
+    Return True if a module uses a random value generator
+
+    Its information may hold values that differ each time the module is
+    executed (e.g. random defaults), so it isn't stored.
+    """
+    for value in vars(module_custom).values():
+        # Check the type itself, since proxies (e.g. flask's request) can't be inspected outside a request
+        value_type = type(value)
+        if value_type is types.ModuleType:
+            if value.__name__ in RANDOM_MODULES:
+                return True
+        elif value_type in FUNCTION_TYPES or issubclass(value_type, type):
+            if value.__module__ in RANDOM_MODULES or value.__name__ == 'random_alphanumeric':
+                return True
+    return False
+
+
+# How the information of an indexed module is returned
+INDEX_PICKLED = 'pickled'  # Unpickled from the index, without executing the module
+INDEX_MODULE = 'module'  # Copied from the module loaded once by the ModuleRegistry
+INDEX_VOLATILE = 'volatile'  # Uses random values (e.g. random defaults), so it's executed on every call
+
+
+class ModuleInformationIndex:
+    """
+    The *_INFORMATION dict of each module file, pickled in a SQLite file
+
+    Entries are keyed by path and file signature, and the index is discarded
+    when the Looperget version changes. Indexing executes a module once, and
+    only its information is kept. Modules whose information holds their own
+    functions (e.g. execute_at_modification) are served from the
+    ModuleRegistry on later calls, and modules that use random values are
+    still executed on every call.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = None
+        self.conn = None
+        self.pid = None
+
+    def get(self, path_file, module_type, attribute):
+        """
+        Return a copy of a module's information dict
+
+        :return: the information dict, or None if the module can't be loaded or doesn't have it
+        :rtype: dict or None
+        """
+        try:
+            signature = file_signature(path_file)
+        except OSError:
+            return None
+
+        with self.lock:
+            if self.entries is None:
+                self.entries = self._read()
+            entry = self.entries.get(path_file)
+
+        if not entry or entry[0] != signature or entry[1] != attribute:
+            return self._index(path_file, module_type, attribute, signature)
+
+        kind, data = entry[2], entry[3]
+        if kind == INDEX_PICKLED:
+            return pickle.loads(data)
+        if kind == INDEX_MODULE:
+            module_custom, status = get_module_registry().get(path_file, module_type)
+        else:
+            module_custom, status = load_module_from_file(path_file, module_type)
+        if module_custom:
+            return copy.deepcopy(getattr(module_custom, attribute, None))
+
+    def _index(self, path_file, module_type, attribute, signature):
+        """Execute a module, store how its information can be returned, and return the information."""
+        module_custom, status = load_module_from_file(path_file, module_type)
+        if not module_custom:
+            return None
+        information = getattr(module_custom, attribute, None)
+
+        kind = INDEX_MODULE
+        data = None
+        if generates_random_values(module_custom):
+            kind = INDEX_VOLATILE
+        elif not contains_module_code(information, module_custom.__name__):
+            try:
+                data = pickle.dumps(information, protocol=pickle.HIGHEST_PROTOCOL)
+                kind = INDEX_PICKLED
+            except Exception:
+                logger.debug(f"Could not pickle {attribute} of {path_file}: {traceback.format_exc()}")
+
+        entry = (signature, attribute, kind, data)
+        with self.lock:
+            self.entries[path_file] = entry
+            self._write(path_file, entry)
+        return information
+
+    def _connect(self):
+        if self.conn is None or self.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS module_information ("
+                "path TEXT PRIMARY KEY, "
+                "mtime_ns INTEGER NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "version TEXT NOT NULL, "
+                "attribute TEXT NOT NULL, "
+                "kind TEXT NOT NULL, "
+                "data BLOB)")
+            self.pid = os.getpid()
+        return self.conn
+
+    def _read(self):
+        entries = {}
+        try:
+            rows = self._connect().execute(
+                "SELECT path, mtime_ns, size, attribute, kind, data FROM module_information "
+                "WHERE version = ?", (LOOPERGET_VERSION,)).fetchall()
+            for path_file, mtime_ns, size, attribute, kind, data in rows:
+                entries[path_file] = ((mtime_ns, size), attribute, kind, data)
+        except Exception as err:
+            logger.debug(f"Could not read module index {self.path}: {err}")
+        return entries
+
+    def _write(self, path_file, entry):
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO module_information "
+                "(path, mtime_ns, size, version, attribute, kind, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path_file, entry[0][0], entry[0][1], LOOPERGET_VERSION, entry[1], entry[2], entry[3]))
+        except Exception as err:
+            logger.debug(f"Could not write module index {self.path}: {err}")
+
+
+def directory_signature(paths):
+    """
+    Return the files in directories with their signatures, which change when a file is added, removed or edited
+
+    Subdirectories (e.g. __pycache__, which changes when a module is imported) aren't included.
+    """
+    signature = []
+    for each_path in paths:
+        real_path = os.path.realpath(each_path)
+        try:
+            with os.scandir(real_path) as entries:
+                files = []
+                for each_entry in entries:
+                    if each_entry.is_dir():
+                        continue
+                    stat = each_entry.stat()
+                    files.append((each_entry.name, stat.st_mtime_ns, stat.st_size, stat.st_ino))
+        except OSError:
+            files = None
+        signature.append((real_path, tuple(sorted(files)) if files is not None else None))
+    return tuple(signature)
+
+
+class InformationCache:
+    """
+    Dicts built by the parse_*_information() scanners, keyed by the signature of their module directories
+
+    A scan is reused until a module is added, removed or edited. Each call
+    gets its own copy of the top-level dict; the dicts of each module are
+    shared, so they must not be modified.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, paths, build):
+        """
+        Return the cached dict for key, calling build() if the directories in paths changed
+
+        :rtype: dict
+        """
+        signature = directory_signature(paths)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] == signature:
+                self.hits += 1
+                return dict(entry[1])
+            self.misses += 1
+
+        information = build()
+        with self.lock:
+            self.entries[key] = (signature, information)
+        return dict(information)
+
+    def invalidate(self):
+        """Scan the modules again on the next call, after modules are imported or deleted."""
+        with self.lock:
+            self.entries = {}
+
+    def status(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+module_registry_lock = threading.Lock()
+module_registry = None
+module_index = None
+information_cache = None
+
+
+def get_module_registry():
+    """Return the process-wide registry of loaded modules."""
+    global module_registry
+    if module_registry is None:
+        with module_registry_lock:
+            if module_registry is None:
+                module_registry = ModuleRegistry()
+    return module_registry
+
+
+def get_module_index():
+    """Return the process-wide index of module information."""
+    global module_index
+    if module_index is None:
+        with module_registry_lock:
+            if module_index is None:
+                module_index = ModuleInformationIndex(MODULE_INDEX_PATH)
+    return module_index
+
+
+def get_information_cache():
+    """Return the process-wide cache of parsed module information."""
+    global information_cache
+    if information_cache is None:
+        with module_registry_lock:
+            if information_cache is None:
+                information_cache = InformationCache()
+    return information_cache
+
+
+def cache_information(module_type, paths):
+    """
+    Cache a parse_*_information(exclude_custom) scanner until its module directories change
+
+    :param module_type: name the scans are cached under (e.g. 'inputs')
+    :param paths: the built-in and custom module directories
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(exclude_custom=False):
+            scan_paths = paths[:1] if exclude_custom else paths
+            return get_information_cache().get(
+                (module_type, bool(exclude_custom)), scan_paths,
+                lambda: function(exclude_custom=exclude_custom))
+        return wrapper
+    return decorator
+
+
+def load_cached_module(path_file, module_type):
+    """Load a module from a file, reusing the loaded module until the file changes."""
+    return get_module_registry().get(path_file, module_type)
+
+
+def load_module_information(path_file, module_type, attribute):
+    """
+    Return an object with a module's information dict as its only attribute
+
+    The dict is read from the on-disk index when the file hasn't changed,
+    so the module isn't executed.
+    """
+    information = get_module_index().get(path_file, module_type, attribute)
+    if information is not None:
+        return ModuleInformation(attribute, information)
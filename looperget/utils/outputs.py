@@ -25,11 +25,13 @@ import os
 
 from looperget.config import PATH_OUTPUTS
 from looperget.config import PATH_OUTPUTS_CUSTOM
-from looperget.utils.modules import load_module_from_file
+from looperget.utils.modules import cache_information
+from looperget.utils.modules import load_module_information
 
 logger = logging.getLogger("looperget.utils.outputs")
 
 
+@cache_information('outputs', [PATH_OUTPUTS, PATH_OUTPUTS_CUSTOM])
 def parse_output_information(exclude_custom=False):
     """Parses the variables assigned in each Output and return a dictionary of IDs and values."""
     def dict_has_value(dict_inp, output_cus, key, force_type=None):
@@ -68,9 +70,9 @@ def parse_output_information(exclude_custom=False):
                 continue
 
             full_path = "{}/{}".format(real_path, each_file)
-            output_custom, status = load_module_from_file(full_path, 'outputs')
+            output_custom = load_module_information(full_path, 'outputs', 'OUTPUT_INFORMATION')
 
-            if not output_custom or not hasattr(output_custom, 'OUTPUT_INFORMATION'):
+            if not output_custom:
                 continue
 
             # Populate dictionary of output information
@@ -0,0 +1,340 @@
+# coding=utf-8
+"""
+Rolling windows of recent measurements, kept in memory by the process that writes them
+
+Each tracked series keeps its points in a ring buffer long enough for the
+longest window requested of it. Each requested window length keeps a running
+count, sum, sum of squares and monotonic min/max queues, so past average, sum
+and statistics lookups don't need to query influxdb on every loop.
+"""
+import array
+import collections
+import logging
+import math
+import statistics
+import threading
+import time
+
+from looperget.config import ROLLING_WINDOW_IDLE_SEC
+from looperget.config import ROLLING_WINDOW_RESUM_EVICTIONS
+from looperget.config import ROLLING_WINDOW_RESYNC_SEC
+from looperget.utils.latest_values import FUTURE_TOLERANCE_SEC
+from looperget.utils.latest_values import timestamp_to_epoch
+
+logger = logging.getLogger("looperget.rolling_window")
+
+
+class RingBuffer:
+    """Timestamps and values as float64 arrays, addressed by an ever-increasing sequence number."""
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.times = array.array('d', bytes(8 * capacity))
+        self.values = array.array('d', bytes(8 * capacity))
+        self.first_seq = 0  # Oldest point retained
+        self.next_seq = 0  # Sequence number of the next point appended
+
+    def __len__(self):
+        return self.next_seq - self.first_seq
+
+    def append(self, epoch, value):
+        if len(self) == self.capacity:
+            self._grow()
+        index = self.next_seq % self.capacity
+        self.times[index] = epoch
+        self.values[index] = value
+        self.next_seq += 1
+
+    def time(self, seq):
+        return self.times[seq % self.capacity]
+
+    def value(self, seq):
+        return self.values[seq % self.capacity]
+
+    def values_since(self, seq):
+        return [self.values[i % self.capacity] for i in range(max(seq, self.first_seq), self.next_seq)]
+
+    def discard_before(self, epoch):
+        while self.first_seq < self.next_seq and self.time(self.first_seq) < epoch:
+            self.first_seq += 1
+
+    def _grow(self):
+        old_times = [self.time(i) for i in range(self.first_seq, self.next_seq)]
+        old_values = [self.value(i) for i in range(self.first_seq, self.next_seq)]
+        self.capacity *= 2
+        self.times = array.array('d', bytes(8 * self.capacity))
+        self.values = array.array('d', bytes(8 * self.capacity))
+        for seq, epoch, value in zip(range(self.first_seq, self.next_seq), old_times, old_values):
+            self.times[seq % self.capacity] = epoch
+            self.values[seq % self.capacity] = value
+
+
+class WindowAggregate:
+    """Running aggregates of the points of a buffer within the last window_sec seconds."""
+    def __init__(self, buffer, window_sec):
+        self.buffer = buffer
+        self.window_sec = window_sec
+        self.start_seq = buffer.first_seq
+        self.count = 0
+        self.sum = 0.0
+        self.sum_squares = 0.0
+        self.evictions = 0
+        self.min_queue = collections.deque()  # (seq, value), values increasing
+        self.max_queue = collections.deque()  # (seq, value), values decreasing
+        # Start with the points already buffered, evict() trims them to the window
+        for seq in range(buffer.first_seq, buffer.next_seq):
+            self.add(seq, buffer.value(seq))
+
+    def add(self, seq, value):
+        self.count += 1
+        self.sum += value
+        self.sum_squares += value * value
+        while self.min_queue and self.min_queue[-1][1] >= value:
+            self.min_queue.pop()
+        self.min_queue.append((seq, value))
+        while self.max_queue and self.max_queue[-1][1] <= value:
+            self.max_queue.pop()
+        self.max_queue.append((seq, value))
+
+    def evict(self, now):
+        oldest = now - self.window_sec
+        while self.start_seq < self.buffer.next_seq and self.buffer.time(self.start_seq) < oldest:
+            value = self.buffer.value(self.start_seq)
+            self.count -= 1
+            self.sum -= value
+            self.sum_squares -= value * value
+            if self.min_queue and self.min_queue[0][0] == self.start_seq:
+                self.min_queue.popleft()
+            if self.max_queue and self.max_queue[0][0] == self.start_seq:
+                self.max_queue.popleft()
+            self.start_seq += 1
+            self.evictions += 1
+
+        if self.evictions > ROLLING_WINDOW_RESUM_EVICTIONS:
+            values = self.buffer.values_since(self.start_seq)
+            self.sum = math.fsum(values)
+            self.sum_squares = math.fsum(v * v for v in values)
+            self.evictions = 0
+
+    def stats(self):
+        """Return the aggregates of the window, or None if it has no points."""
+        if not self.count:
+            return None
+        mean = self.sum / self.count
+        stdev = None
+        if self.count > 1:
+            variance = (self.sum_squares - self.count * mean * mean) / (self.count - 1)
+            stdev = math.sqrt(max(variance, 0.0))
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': mean,
+            'min': self.min_queue[0][1],
+            'max': self.max_queue[0][1],
+            'stdev': stdev,
+            'last': self.buffer.value(self.buffer.next_seq - 1)
+        }
+
+    def median(self):
+        values = self.buffer.values_since(self.start_seq)
+        if values:
+            return statistics.median(values)
+
+
+class SeriesWindows:
+    """A ring buffer of one series and the windows requested of it."""
+    def __init__(self):
+        self.buffer = RingBuffer()
+        self.windows = {}
+        self.last_synced = 0
+        self.synced_sec = 0  # Length of the window last read from influxdb
+        self.warming = False
+        self.last_used = time.time()
+        self.last_time = None
+
+    def longest_window(self):
+        return max(self.windows) if self.windows else 0
+
+    def points(self):
+        return [(self.buffer.time(seq), self.buffer.value(seq))
+                for seq in range(self.buffer.first_seq, self.buffer.next_seq)]
+
+    def add(self, epoch, value):
+        if self.last_time is not None and epoch < self.last_time:
+            return  # Points must be appended in time order
+        self.last_time = epoch
+        seq = self.buffer.next_seq
+        self.buffer.append(epoch, value)
+        for each_window in self.windows.values():
+            each_window.add(seq, value)
+
+    def evict(self, now):
+        for each_window in self.windows.values():
+            each_window.evict(now)
+        self.buffer.discard_before(now - self.longest_window())
+
+    def load(self, points):
+        """Replace the contents with (epoch, value) points, sorted by time."""
+        window_lengths = list(self.windows)
+        self.buffer = RingBuffer()
+        self.windows = {}
+        self.last_time = None
+        for each_window in window_lengths:
+            self.windows[each_window] = WindowAggregate(self.buffer, each_window)
+        for epoch, value in points:
+            self.add(epoch, value)
+
+
+class RollingWindows:
+    """Registry of tracked series, keyed like LatestValueCache."""
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.warmed = threading.Condition(self.lock)
+        self.series = {}
+        self.hits = 0
+        self.warms = 0
+
+    @staticmethod
+    def key(device_id, unit, channel, measure):
+        return (device_id,
+                unit,
+                str(channel) if channel is not None else None,
+                measure if measure else None)
+
+    def add(self, device_id, unit, channel, measure, timestamp, value):
+        """Append a newly written point to its series, if the series is tracked."""
+        key = self.key(device_id, unit, channel, measure)
+        if key not in self.series:
+            return
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+        epoch = timestamp_to_epoch(timestamp)
+        if epoch > time.time() + FUTURE_TOLERANCE_SEC:
+            return  # Forecasts aren't part of a past window
+        with self.lock:
+            series = self.series.get(key)
+            if series is not None:
+                series.add(epoch, value)
+
+    def window(self, device_id, unit, channel, measure, window_sec, now=None):
+        """
+        Return the WindowAggregate of the last window_sec seconds of a series
+
+        The first request for a series, a longer window, or a series not
+        resynced for ROLLING_WINDOW_RESYNC_SEC reads the window from influxdb
+        with a single range query. The query runs without holding the lock,
+        so writes to other series aren't blocked, and other requests for the
+        series wait for it.
+        """
+        if now is None:
+            now = time.time()
+        window_sec = float(window_sec)
+        key = self.key(device_id, unit, channel, measure)
+
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = SeriesWindows()
+            if window_sec not in series.windows:
+                series.windows[window_sec] = WindowAggregate(series.buffer, window_sec)
+            series.last_used = now
+            self.warmed.wait_for(lambda: not series.warming)
+            needs_warm = (window_sec > series.synced_sec or
+                          now - series.last_synced > ROLLING_WINDOW_RESYNC_SEC)
+            if needs_warm:
+                series.warming = True
+                duration_sec = series.longest_window()
+            else:
+                self.hits += 1
+
+        if needs_warm:
+            points = None
+            try:
+                points = self._read(device_id, unit, channel, measure, duration_sec, now)
+            finally:
+                with self.lock:
+                    series.warming = False
+                    if points is not None:
+                        self._merge(series, points, duration_sec, now)
+                    self.warmed.notify_all()
+
+        with self.lock:
+            series.evict(now)
+            self._prune(now)
+            return series.windows[window_sec]
+
+    def stats(self, device_id, unit, channel, measure, window_sec, median=False):
+        """
+        Return the aggregates of the last window_sec seconds of a series, or None
+
+        :param median: also return the median, which is O(n) rather than O(1)
+        :type median: bool
+        """
+        window = self.window(device_id, unit, channel, measure, window_sec)
+        with self.lock:
+            stats = window.stats()
+            if stats and median:
+                stats['median'] = window.median()
+            return stats
+
+    def status(self):
+        with self.lock:
+            return {
+                'series': len(self.series),
+                'points': sum(len(s.buffer) for s in self.series.values()),
+                'hits': self.hits,
+                'warms': self.warms
+            }
+
+    @staticmethod
+    def _read(device_id, unit, channel, measure, duration_sec, now):
+        """Return the numeric (epoch, value) points of a window from influxdb sorted by time, or None."""
+        from looperget.utils.influx import read_influxdb_list
+
+        points = read_influxdb_list(
+            device_id, unit, channel,
+            measure=measure,
+            duration_sec=int(math.ceil(duration_sec)))
+        if points is None:
+            logger.debug(f"Could not warm rolling window for {device_id}, {unit}, {channel}, {measure}")
+            return None
+        numeric = []
+        for epoch, value in points:
+            if epoch > now + FUTURE_TOLERANCE_SEC:
+                continue
+            try:
+                numeric.append((epoch, float(value)))
+            except (TypeError, ValueError):
+                pass
+        numeric.sort()
+        return numeric
+
+    def _merge(self, series, points, duration_sec, now):
+        """Load points read from influxdb, keeping buffered points newer than them (e.g. not written yet)."""
+        if points:
+            points += [p for p in series.points() if p[0] > points[-1][0]]
+        else:
+            points = series.points()
+        series.load(points)
+        series.last_synced = now
+        series.synced_sec = duration_sec
+        self.warms += 1
+
+    def _prune(self, now):
+        for key in [k for k, s in self.series.items() if now - s.last_used > ROLLING_WINDOW_IDLE_SEC]:
+            del self.series[key]
+
+
+rolling_windows_lock = threading.Lock()
+rolling_windows = None
+
+
+def get_rolling_windows():
+    """Return the process-wide rolling window registry."""
+    global rolling_windows
+    if rolling_windows is None:
+        with rolling_windows_lock:
+            if rolling_windows is None:
+                rolling_windows = RollingWindows()
+    return rolling_windows
@@ -0,0 +1,559 @@
+# coding=utf-8
+"""
+Rollups of all measurements into 1 minute, 15 minute and 1 hour buckets
+
+A background job in the daemon reads the raw points of every series from
+influxdb shortly after they're written, and stores the count, sum, minimum,
+maximum and last value of each bucket of each tier (ROLLUP_TIERS) in a
+SQLite file. After the rollups are first created, older history is rolled up
+in the background, most recent first.
+
+Points written after their period was rolled up (output durations written
+when the output turns off, points replayed from the spool after an outage,
+imported history) mark their buckets dirty, and the job rolls up each hour
+with dirty buckets again.
+
+Long-range aggregates (e.g. a year of output on durations) are then planned
+from the coarsest buckets that fit within the period, finer buckets at its
+edges, and raw points only where no tier covers the period (the partial
+minutes at its ends and the last few minutes not yet rolled up).
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from looperget.config import ROLLUP_BACKFILL_DAYS
+from looperget.config import ROLLUP_INTERVAL_SEC
+from looperget.config import ROLLUP_LAG_SEC
+from looperget.config import ROLLUP_PATH
+from looperget.config import ROLLUP_STEP_SEC
+from looperget.config import ROLLUP_STEPS
+from looperget.config import ROLLUP_TIERS
+
+logger = logging.getLogger("looperget.rollups")
+
+PIECE_RAW = 'raw'
+
+
+def floor_to(epoch, bucket_sec):
+    return int(epoch // bucket_sec * bucket_sec)
+
+
+def ceil_to(epoch, bucket_sec):
+    return int(math.ceil(epoch / bucket_sec) * bucket_sec)
+
+
+def aggregate_points(points):
+    """
+    Return the count, sum, minimum and maximum of an iterable of values
+
+    :rtype: list
+    """
+    aggregate = [0, 0.0, None, None]
+    for value in points:
+        merge_aggregate(aggregate, (1, value, value, value))
+    return aggregate
+
+
+def merge_aggregate(aggregate, other):
+    """Add the count, sum, minimum and maximum of other into aggregate (a list)."""
+    count, total, minimum, maximum = other
+    if not count:
+        return aggregate
+    aggregate[0] += count
+    aggregate[1] += total
+    if aggregate[2] is None or minimum < aggregate[2]:
+        aggregate[2] = minimum
+    if aggregate[3] is None or maximum > aggregate[3]:
+        aggregate[3] = maximum
+    return aggregate
+
+
+class RollupStore:
+    """
+    Buckets of each tier of each series, stored in a SQLite file
+
+    The store covers one period for all series, from covered_from to
+    covered_to: every raw point in it has been rolled up. A tier covers the
+    part of that period within the days it's kept.
+
+    :param path: SQLite file
+    :param tiers: (bucket seconds, days kept) of each tier, finest first. Each
+        bucket length is a multiple of the previous one.
+    """
+    def __init__(self, path, tiers=ROLLUP_TIERS):
+        self.path = path
+        self.tiers = tiers
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pid = None
+        self.series_ids = {}
+
+    def _connect(self):
+        if self.conn is None or self.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS series ("
+                "id INTEGER PRIMARY KEY, "
+                "unit TEXT NOT NULL, "
+                "device_id TEXT NOT NULL, "
+                "channel TEXT NOT NULL, "
+                "measure TEXT NOT NULL, "
+                "UNIQUE (unit, device_id, channel, measure))")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS rollup ("
+                "series_id INTEGER NOT NULL, "
+                "tier INTEGER NOT NULL, "
+                "bucket INTEGER NOT NULL, "
+                "count INTEGER NOT NULL, "
+                "sum REAL NOT NULL, "
+                "min REAL NOT NULL, "
+                "max REAL NOT NULL, "
+                "last REAL NOT NULL, "
+                "last_time REAL NOT NULL, "
+                "PRIMARY KEY (series_id, tier, bucket)) WITHOUT ROWID")
+            # Buckets are replaced and pruned by period, for all series at once
+            self.conn.execute("CREATE INDEX IF NOT EXISTS rollup_tier_bucket ON rollup (tier, bucket)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                "key TEXT PRIMARY KEY, "
+                "value REAL NOT NULL)")
+            # Finest buckets with points written after they may have been rolled up
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS dirty ("
+                "bucket INTEGER PRIMARY KEY, "
+                "marked REAL NOT NULL)")
+            self.pid = os.getpid()
+            self.series_ids = {}
+        return self.conn
+
+    def coverage(self):
+        """
+        Return the period rolled up
+
+        :return: covered_from and covered_to (epoch seconds), or (None, None) if nothing's rolled up
+        :rtype: (int, int)
+        """
+        with self.lock:
+            state = dict(self._connect().execute("SELECT key, value FROM state").fetchall())
+        if 'covered_from' not in state:
+            return None, None
+        return int(state['covered_from']), int(state['covered_to'])
+
+    def tier_coverage(self, now=None):
+        """
+        Return the period each tier covers, coarsest first
+
+        :return: list of (bucket seconds, start, end), or [] if nothing's rolled up
+        """
+        covered_from, covered_to = self.coverage()
+        if covered_from is None:
+            return []
+        now = now or time.time()
+        list_tiers = []
+        for bucket_sec, keep_days in reversed(self.tiers):
+            start = ceil_to(max(covered_from, now - keep_days * 86400), bucket_sec)
+            end = floor_to(covered_to, bucket_sec)
+            list_tiers.append((bucket_sec, start, end))
+        return list_tiers
+
+    def add_range(self, start, end, points):
+        """
+        Roll up all raw points from start up to end, replacing the buckets of that period
+
+        start and end are multiples of the finest bucket, and the period
+        extends the covered period (or starts it).
+
+        :param points: iterable of (unit, device_id, channel, measure, epoch, value)
+        :return: number of points rolled up
+        """
+        finest_sec = self.tiers[0][0]
+        buckets = {}
+        number_points = 0
+        for unit, device_id, channel, measure, epoch, value in points:
+            if (not isinstance(value, (int, float)) or isinstance(value, bool) or
+                    math.isnan(value) or not start <= epoch < end):
+                continue
+            key = (unit or '', device_id or '', '' if channel is None else str(channel), measure or '',
+                   floor_to(epoch, finest_sec))
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [1, value, value, value, value, epoch]
+            else:
+                bucket[0] += 1
+                bucket[1] += value
+                if value < bucket[2]:
+                    bucket[2] = value
+                if value > bucket[3]:
+                    bucket[3] = value
+                if epoch >= bucket[5]:
+                    bucket[4] = value
+                    bucket[5] = epoch
+            number_points += 1
+
+        with self.lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                conn.execute("DELETE FROM rollup WHERE tier = ? AND bucket >= ? AND bucket < ?",
+                             (finest_sec, start, end))
+                conn.executemany(
+                    "INSERT INTO rollup VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(self._series_id(key[:4]), finest_sec, key[4]) + tuple(bucket)
+                     for key, bucket in buckets.items()])
+                for (finer_sec, _), (bucket_sec, _) in zip(self.tiers, self.tiers[1:]):
+                    self._recompute_tier(conn, finer_sec, bucket_sec, start, end)
+                self._extend_coverage(conn, start, end)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                self.series_ids = {}
+                raise
+        return number_points
+
+    def prune(self, now=None):
+        """Delete the buckets of each tier older than the days it's kept."""
+        now = now or time.time()
+        covered_from, _ = self.coverage()
+        with self.lock:
+            conn = self._connect()
+            for bucket_sec, keep_days in self.tiers:
+                conn.execute("DELETE FROM rollup WHERE tier = ? AND bucket < ?",
+                             (bucket_sec, floor_to(now - keep_days * 86400, bucket_sec)))
+            if covered_from is not None:
+                # Points before the covered period are read when history is backfilled
+                conn.execute("DELETE FROM dirty WHERE bucket < ?", (covered_from,))
+
+    def mark_dirty(self, epochs, now=None):
+        """
+        Mark the finest buckets of points written after they may have been rolled up
+
+        :param epochs: times (epoch seconds) of the points
+        :return: number of buckets marked
+        """
+        now = now or time.time()
+        finest_sec = self.tiers[0][0]
+        buckets = set(floor_to(epoch, finest_sec) for epoch in epochs)
+        if buckets:
+            with self.lock:
+                self._connect().executemany(
+                    "INSERT OR REPLACE INTO dirty (bucket, marked) VALUES (?, ?)",
+                    [(bucket, now) for bucket in buckets])
+        return len(buckets)
+
+    def dirty_range(self, bucket_sec, covered_from, covered_to):
+        """
+        Return the first bucket of a tier with dirty buckets within the covered period
+
+        :return: start and end of the bucket, limited to the covered period, or None
+        :rtype: (int, int) or None
+        """
+        with self.lock:
+            row = self._connect().execute(
+                "SELECT MIN(bucket) FROM dirty WHERE bucket >= ? AND bucket < ?",
+                (covered_from, covered_to)).fetchone()
+        if row[0] is None:
+            return None
+        start = floor_to(row[0], bucket_sec)
+        return max(start, covered_from), min(start + bucket_sec, covered_to)
+
+    def clear_dirty(self, start, end, marked_before):
+        """Unmark the dirty buckets from start up to end that were marked before they were rolled up again."""
+        with self.lock:
+            self._connect().execute(
+                "DELETE FROM dirty WHERE bucket >= ? AND bucket < ? AND marked <= ?",
+                (start, end, marked_before))
+
+    def is_dirty(self, start, end):
+        """Return whether buckets from start up to end are waiting to be rolled up again."""
+        with self.lock:
+            return self._connect().execute(
+                "SELECT 1 FROM dirty WHERE bucket >= ? AND bucket < ? LIMIT 1",
+                (floor_to(start, self.tiers[0][0]), end)).fetchone() is not None
+
+    def plan(self, start, end, now=None):
+        """
+        Split a period into pieces covered by the coarsest tiers possible
+
+        :return: list of (bucket seconds or PIECE_RAW, start, end), in time order
+        """
+        return plan_pieces(start, end, self.tier_coverage(now))
+
+    def aggregate(self, bucket_sec, start, end, unit, device_id, channel=None, measure=None):
+        """
+        Return the count, sum, minimum and maximum of the buckets of one tier from start up to end
+
+        If channel or measure is None, the buckets of all matching series are included.
+
+        :rtype: list
+        """
+        where, args = self._series_filter(unit, device_id, channel, measure)
+        with self.lock:
+            row = self._connect().execute(
+                "SELECT SUM(r.count), SUM(r.sum), MIN(r.min), MAX(r.max) FROM rollup r "
+                f"JOIN series s ON r.series_id = s.id WHERE {where} "
+                "AND r.tier = ? AND r.bucket >= ? AND r.bucket < ?",
+                args + [bucket_sec, start, end]).fetchone()
+        return [row[0] or 0, row[1] or 0.0, row[2], row[3]]
+
+    def windows(self, bucket_sec, window_sec, start, end, unit, device_id, channel=None, measure=None,
+                method='mean'):
+        """
+        Return the mean (or minimum and maximum) of windows of the buckets of one tier
+
+        Windows are aligned to multiples of window_sec (a multiple of
+        bucket_sec) and timed at their end, as influxdb's aggregateWindow().
+
+        :param method: 'mean', or 'minmax' for two points per window
+        :return: times (epoch milliseconds) and values
+        :rtype: (list, list)
+        """
+        where, args = self._series_filter(unit, device_id, channel, measure)
+        with self.lock:
+            rows = self._connect().execute(
+                "SELECT r.bucket / ? * ? AS window, SUM(r.sum) / SUM(r.count), MIN(r.min), MAX(r.max) "
+                f"FROM rollup r JOIN series s ON r.series_id = s.id WHERE {where} "
+                "AND r.tier = ? AND r.bucket >= ? AND r.bucket < ? GROUP BY window ORDER BY window",
+                [window_sec, window_sec] + args + [bucket_sec, start, end]).fetchall()
+        times = []
+        values = []
+        for window, mean, minimum, maximum in rows:
+            window_end = (window + window_sec) * 1000
+            if method == 'minmax':
+                times.extend((window_end, window_end))
+                values.extend((minimum, maximum))
+            else:
+                times.append(window_end)
+                values.append(mean)
+        return times, values
+
+    def status(self):
+        covered_from, covered_to = self.coverage()
+        with self.lock:
+            number_series = self._connect().execute("SELECT COUNT(*) FROM series").fetchone()[0]
+        return {
+            'path': self.path,
+            'covered_from': covered_from,
+            'covered_to': covered_to,
+            'series': number_series,
+            'size_bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        }
+
+    def _series_id(self, key):
+        """Return the ID of a series, keyed by (unit, device_id, channel, measure), '' for None."""
+        series_id = self.series_ids.get(key)
+        if series_id is None:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO series (unit, device_id, channel, measure) VALUES (?, ?, ?, ?)", key)
+            series_id = self.conn.execute(
+                "SELECT id FROM series WHERE unit = ? AND device_id = ? AND channel = ? AND measure = ?",
+                key).fetchone()[0]
+            self.series_ids[key] = series_id
+        return series_id
+
+    @staticmethod
+    def _series_filter(unit, device_id, channel, measure):
+        where = "s.unit = ? AND s.device_id = ?"
+        args = [unit, device_id]
+        if channel is not None:
+            where += " AND s.channel = ?"
+            args.append(str(channel))
+        if measure:
+            where += " AND s.measure = ?"
+            args.append(measure)
+        return where, args
+
+    @staticmethod
+    def _recompute_tier(conn, finer_sec, bucket_sec, start, end):
+        """Recompute the buckets of a tier overlapping start to end from the buckets of the finer tier."""
+        first = floor_to(start, bucket_sec)
+        last = ceil_to(end, bucket_sec)
+        rows = conn.execute(
+            "SELECT series_id, bucket, count, sum, min, max, last, last_time FROM rollup "
+            "WHERE tier = ? AND bucket >= ? AND bucket < ?", (finer_sec, first, last)).fetchall()
+        buckets = {}
+        for series_id, bucket_start, count, total, minimum, maximum, last_value, last_time in rows:
+            key = (series_id, floor_to(bucket_start, bucket_sec))
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [count, total, minimum, maximum, last_value, last_time]
+            else:
+                bucket[0] += count
+                bucket[1] += total
+                bucket[2] = min(bucket[2], minimum)
+                bucket[3] = max(bucket[3], maximum)
+                if last_time >= bucket[5]:
+                    bucket[4] = last_value
+                    bucket[5] = last_time
+        conn.execute("DELETE FROM rollup WHERE tier = ? AND bucket >= ? AND bucket < ?",
+                     (bucket_sec, first, last))
+        conn.executemany(
+            "INSERT INTO rollup VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(series_id, bucket_sec, bucket_start) + tuple(bucket)
+             for (series_id, bucket_start), bucket in buckets.items()])
+
+    @staticmethod
+    def _extend_coverage(conn, start, end):
+        state = dict(conn.execute("SELECT key, value FROM state").fetchall())
+        covered_from = min(state.get('covered_from', start), start)
+        covered_to = max(state.get('covered_to', end), end)
+        conn.executemany("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                         [('covered_from', covered_from), ('covered_to', covered_to)])
+
+
+def plan_pieces(start, end, tier_coverage):
+    """
+    Split start to end into the pieces covered by the coarsest tiers
+
+    Each tier covers the whole buckets of the period it covers that fit in
+    the remaining piece, and the edges left over are split by the finer tiers.
+    What no tier covers is left for raw points.
+
+    :param tier_coverage: list of (bucket seconds, start, end) of each tier, coarsest first
+    :return: list of (bucket seconds or PIECE_RAW, start, end), in time order
+    """
+    if end <= start:
+        return []
+    if not tier_coverage:
+        return [(PIECE_RAW, start, end)]
+    bucket_sec, tier_start, tier_end = tier_coverage[0]
+    covered_start = ceil_to(max(start, tier_start), bucket_sec)
+    covered_end = floor_to(min(end, tier_end), bucket_sec)
+    if covered_end <= covered_start:
+        return plan_pieces(start, end, tier_coverage[1:])
+    return (plan_pieces(start, covered_start, tier_coverage[1:]) +
+            [(bucket_sec, covered_start, covered_end)] +
+            plan_pieces(covered_end, end, tier_coverage[1:]))
+
+
+class RollupJob:
+    """
+    Roll up new points every ROLLUP_INTERVAL_SEC, and backfill history
+
+    :param store: RollupStore
+    :param fetch: function(start, end) returning an iterable of
+        (unit, device_id, channel, measure, epoch, value) of all series, or
+        None if the measurement database isn't available
+    """
+    def __init__(self, store, fetch):
+        self.store = store
+        self.fetch = fetch
+        self.running = threading.Event()
+        self.thread = None
+        self.timer_prune = 0
+
+        self.points_rolled = 0
+        self.ranges_rolled = 0
+        self.dirty_rolled = 0
+        self.roll_failures = 0
+        self.last_roll_sec = None
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.running.set()
+            self.thread = threading.Thread(target=self.run, name='rollups', daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=10):
+        self.running.clear()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def run(self):
+        while self.running.is_set():
+            try:
+                self.roll()
+            except Exception:
+                self.roll_failures += 1
+                logger.exception("Rollups")
+            # Wait for the next interval, returning early when stopped
+            for _ in range(ROLLUP_INTERVAL_SEC):
+                if not self.running.is_set():
+                    break
+                time.sleep(1)
+
+    def roll(self, now=None):
+        """Roll up the points since the last roll, the hours with points written late, then older history."""
+        now = now or time.time()
+        timer = time.time()
+        finest_sec = self.store.tiers[0][0]
+        coarsest_sec = self.store.tiers[-1][0]
+        target = floor_to(now - ROLLUP_LAG_SEC, finest_sec)
+        backfill_limit = floor_to(now - ROLLUP_BACKFILL_DAYS * 86400, coarsest_sec)
+
+        covered_from, covered_to = self.store.coverage()
+        if covered_from is None:
+            # Start at the beginning of the current coarsest bucket, so backfill steps stay aligned
+            covered_from = covered_to = floor_to(target, coarsest_sec)
+
+        steps = 0
+        while covered_to < target and steps < ROLLUP_STEPS:
+            end = min(target, covered_to + ROLLUP_STEP_SEC)
+            if not self._roll_range(covered_to, end):
+                return
+            covered_to = end
+            steps += 1
+
+        while steps < ROLLUP_STEPS:
+            dirty = self.store.dirty_range(coarsest_sec, covered_from, covered_to)
+            if dirty is None:
+                break
+            marked_before = time.time()
+            if not self._roll_range(*dirty):
+                return
+            self.store.clear_dirty(dirty[0], dirty[1], marked_before)
+            self.dirty_rolled += 1
+            steps += 1
+
+        while covered_from > backfill_limit and steps < ROLLUP_STEPS:
+            start = max(backfill_limit, floor_to(covered_from - 1, ROLLUP_STEP_SEC))
+            if not self._roll_range(start, covered_from):
+                return
+            covered_from = start
+            steps += 1
+
+        if now > self.timer_prune:
+            self.timer_prune = now + 3600
+            self.store.prune(now)
+        if steps:
+            self.last_roll_sec = time.time() - timer
+
+    def _roll_range(self, start, end):
+        points = self.fetch(start, end)
+        if points is None:
+            return False
+        self.points_rolled += self.store.add_range(start, end, points)
+        self.ranges_rolled += 1
+        return True
+
+    def status(self):
+        status = self.store.status()
+        status.update({
+            'running': bool(self.thread and self.thread.is_alive()),
+            'points_rolled': self.points_rolled,
+            'ranges_rolled': self.ranges_rolled,
+            'dirty_rolled': self.dirty_rolled,
+            'roll_failures': self.roll_failures,
+            'last_roll_sec': self.last_roll_sec
+        })
+        return status
+
+
+rollup_store_lock = threading.Lock()
+rollup_store = None
+
+
+def get_rollup_store():
+    """Return the process-wide rollup store."""
+    global rollup_store
+    if rollup_store is None:
+        with rollup_store_lock:
+            if rollup_store is None:
+                rollup_store = RollupStore(ROLLUP_PATH)
+    return rollup_store
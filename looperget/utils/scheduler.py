@@ -0,0 +1,239 @@
+# coding=utf-8
+"""
+Central scheduler that runs the loop() of controllers when they're due
+
+Instead of each controller thread waking every sample_rate seconds to check
+its timers, controllers report the time their loop() next needs to run
+(their next_wakeup()), and a single timer thread dispatches them to a small
+pool of worker threads at that time. While all workers are blocked (e.g. by
+a slow sensor read), another is started, so one controller can't hold up
+the others.
+"""
+import collections
+import heapq
+import logging
+import threading
+import time
+
+from looperget.config import CONTROLLER_SCHEDULER_BLOCKED_SEC
+from looperget.config import CONTROLLER_SCHEDULER_MAX_WAIT_SEC
+from looperget.config import CONTROLLER_SCHEDULER_WORKERS
+
+logger = logging.getLogger("looperget.scheduler")
+
+WORKER_THREAD_PREFIX = 'controller_scheduler'
+
+
+class LatencyHistogram:
+    """Counts of how late events happened after their scheduled time, in millisecond buckets."""
+    bounds_ms = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(self.bounds_ms) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, late_sec):
+        late_ms = max(late_sec, 0.0) * 1000
+        index = len(self.bounds_ms)
+        for i, bound in enumerate(self.bounds_ms):
+            if late_ms <= bound:
+                index = i
+                break
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += late_ms
+            self.max = max(self.max, late_ms)
+
+    def status(self):
+        with self.lock:
+            buckets = {f'<={bound}ms': count for bound, count in zip(self.bounds_ms, self.counts)}
+            buckets[f'>{self.bounds_ms[-1]}ms'] = self.counts[-1]
+            return {
+                'count': self.count,
+                'avg_ms': self.total / self.count if self.count else 0.0,
+                'max_ms': self.max,
+                'buckets': buckets
+            }
+
+
+class ControllerScheduler:
+    """
+    A heap of controller deadlines, dispatched to a worker pool when due
+
+    A controller is only in the heap while it's idle, so its loop() never
+    runs in two workers at once. Entries are replaced rather than removed:
+    each controller's current entry is tracked by a sequence number, and
+    stale entries are skipped when popped.
+
+    Due controllers wait in a ready queue for an idle worker. When one has
+    waited blocked_sec, every worker is busy with a controller that blocks,
+    so another worker is started. Workers beyond the number requested exit
+    once another worker is idle, and as a controller never runs in two
+    workers, there are never more workers than controllers.
+    """
+    def __init__(self, workers=CONTROLLER_SCHEDULER_WORKERS, blocked_sec=CONTROLLER_SCHEDULER_BLOCKED_SEC):
+        self.workers = workers
+        self.blocked_sec = blocked_sec
+        self.lock = threading.RLock()
+        self.condition = threading.Condition(self.lock)
+        self.work_ready = threading.Condition(self.lock)
+        self.heap = []
+        self.entries = {}  # controller: sequence number of its heap entry
+        self.ready = collections.deque()  # (time queued, controller) waiting for a worker
+        self.busy = set()
+        self.woken = set()
+        self.sequence = 0
+        self.worker_count = 0
+        self.worker_idle = 0
+        self.worker_number = 0
+        self.timer_thread = None
+        self.time_started = time.time()
+        self.wakeups = 0
+        self.dispatches = 0
+        self.late = LatencyHistogram()
+
+    def add(self, controller, deadline=None):
+        """Schedule a controller's first step, now unless a deadline is given."""
+        with self.condition:
+            self._start()
+            self._push(controller, time.time() if deadline is None else deadline)
+
+    def wake(self, controller):
+        """Run a controller's next step now, e.g. after it's been stopped or its settings changed."""
+        with self.condition:
+            if controller in self.busy:
+                self.woken.add(controller)
+            elif controller in self.entries:
+                self._push(controller, time.time())
+
+    def status(self):
+        """Return counters of the scheduler and the number of threads in the process."""
+        with self.condition:
+            elapsed = max(time.time() - self.time_started, 1e-9)
+            late = self.late.status()
+            return {
+                'controllers': len(self.entries) + len(self.busy),
+                'busy': len(self.busy),
+                'workers': self.worker_count,
+                'threads': threading.active_count(),
+                'wakeups': self.wakeups,
+                'wakeups_per_sec': self.wakeups / elapsed,
+                'dispatches': self.dispatches,
+                'dispatches_per_sec': self.dispatches / elapsed,
+                'late_avg_ms': late['avg_ms'],
+                'late_max_ms': late['max_ms'],
+                'late': late['buckets']
+            }
+
+    def _start(self):
+        if self.timer_thread is None:
+            self.timer_thread = threading.Thread(
+                target=self._run_timer, name='controller_timer', daemon=True)
+            self.timer_thread.start()
+
+    def _push(self, controller, deadline):
+        self.sequence += 1
+        self.entries[controller] = self.sequence
+        heapq.heappush(self.heap, (deadline, self.sequence, controller))
+        if self.heap[0][1] == self.sequence:
+            self.condition.notify()
+
+    def _run_timer(self):
+        while True:
+            due = []
+            with self.condition:
+                now = time.time()
+                while self.heap and (self.heap[0][0] <= now or
+                                     self.entries.get(self.heap[0][2]) != self.heap[0][1]):
+                    deadline, sequence, controller = heapq.heappop(self.heap)
+                    if self.entries.get(controller) != sequence:
+                        continue  # Replaced by a newer entry
+                    del self.entries[controller]
+                    self.busy.add(controller)
+                    due.append((deadline, controller))
+                for deadline, controller in due:
+                    self.late.add(now - deadline)
+                    self.dispatches += 1
+                    self.ready.append((now, controller))
+                self._start_workers(now)
+                if due:
+                    self.work_ready.notify(len(due))
+                    continue
+
+                timeout = CONTROLLER_SCHEDULER_MAX_WAIT_SEC
+                if self.heap:
+                    timeout = min(self.heap[0][0] - now, timeout)
+                if len(self.ready) > self.worker_idle:
+                    # Check again whether the workers are blocked
+                    timeout = min(self.ready[0][0] + self.blocked_sec - now, timeout)
+                self.condition.wait(timeout)
+                self.wakeups += 1
+
+    def _start_workers(self, now):
+        """Start workers for queued controllers, beyond the number requested only if the workers are blocked."""
+        waiting = len(self.ready) - self.worker_idle
+        while waiting > 0 and self.worker_count < self.workers:
+            self._start_worker()
+            waiting -= 1
+        if waiting > 0 and now - self.ready[0][0] >= self.blocked_sec:
+            logger.debug(f"All {self.worker_count} workers blocked, starting another")
+            self._start_worker()
+
+    def _start_worker(self):
+        self.worker_count += 1
+        self.worker_idle += 1  # Until it takes a controller from the queue
+        self.worker_number += 1
+        threading.Thread(
+            target=self._run_worker, name=f'{WORKER_THREAD_PREFIX}_{self.worker_number}', daemon=True).start()
+
+    def _run_worker(self):
+        while True:
+            with self.lock:
+                while not self.ready:
+                    if self.worker_count > self.workers and self.worker_idle > 1:
+                        # Another worker is idle, so the workers are no longer blocked
+                        self.worker_count -= 1
+                        self.worker_idle -= 1
+                        return
+                    self.work_ready.wait()
+                self.worker_idle -= 1
+                controller = self.ready.popleft()[1]
+
+            self._step(controller)
+
+            with self.lock:
+                self.worker_idle += 1
+
+    def _step(self, controller):
+        deadline = None
+        try:
+            deadline = controller.scheduler_step()
+        except Exception:
+            logger.exception(f"Scheduled step of {controller} failed")
+
+        with self.condition:
+            self.busy.discard(controller)
+            if controller in self.woken:
+                self.woken.discard(controller)
+                if deadline is not None:
+                    deadline = time.time()
+            if deadline is not None:
+                self._push(controller, deadline)
+
+
+controller_scheduler_lock = threading.Lock()
+controller_scheduler = None
+
+
+def get_controller_scheduler():
+    """Return the process-wide controller scheduler."""
+    global controller_scheduler
+    if controller_scheduler is None:
+        with controller_scheduler_lock:
+            if controller_scheduler is None:
+                controller_scheduler = ControllerScheduler()
+    return controller_scheduler
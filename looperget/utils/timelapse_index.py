@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Index of the time-lapse images of each camera
+
+Time-lapse images are named {set prefix}-{sequence number}.{extension}, and
+a time-lapse can have hundreds of thousands of them. Each image is added to
+the index as it's captured, along with a summary of its set (image count,
+sequence numbers, size, and first and last capture times), so pages list the
+sets of a camera without listing its time-lapse directory. rebuild()
+reconciles the index with the images on disk, after images are copied,
+deleted, or captured before the index existed.
+"""
+import collections
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from looperget.config import TIMELAPSE_INDEX_PATH
+
+logger = logging.getLogger("looperget.timelapse_index")
+
+TIMELAPSE_FILENAME = re.compile(r'^(?P<prefix>.+)-(?P<sequence>\d+)\.[A-Za-z0-9]+$')
+
+TimelapseSet = collections.namedtuple(
+    'TimelapseSet', ['prefix', 'images', 'first_sequence', 'last_sequence', 'size',
+                     'first_timestamp', 'last_timestamp'])
+
+
+def parse_timelapse_filename(filename):
+    """
+    Return the set prefix and sequence number of a time-lapse image
+
+    :return: (prefix, sequence), or None if the file isn't named as a time-lapse image
+    :rtype: tuple
+    """
+    match = TIMELAPSE_FILENAME.match(filename)
+    if not match:
+        return None
+    return match.group('prefix'), int(match.group('sequence'))
+
+
+class TimelapseIndex:
+    """
+    Time-lapse images and the summary of each set, of each camera, stored in a SQLite file
+
+    :param path: SQLite file
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pid = None
+
+    def _connect(self):
+        if self.conn is None or self.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS image ("
+                "camera_id TEXT NOT NULL, "
+                "filename TEXT NOT NULL, "
+                "prefix TEXT NOT NULL, "
+                "sequence INTEGER NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "timestamp REAL NOT NULL, "
+                "PRIMARY KEY (camera_id, filename)) WITHOUT ROWID")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS image_set ("
+                "camera_id TEXT NOT NULL, "
+                "prefix TEXT NOT NULL, "
+                "images INTEGER NOT NULL, "
+                "first_sequence INTEGER NOT NULL, "
+                "last_sequence INTEGER NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "first_timestamp REAL NOT NULL, "
+                "last_timestamp REAL NOT NULL, "
+                "PRIMARY KEY (camera_id, prefix)) WITHOUT ROWID")
+            # The directory each camera's images were last reconciled with
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS camera ("
+                "camera_id TEXT PRIMARY KEY, "
+                "directory TEXT NOT NULL, "
+                "rebuilt REAL NOT NULL)")
+            self.pid = os.getpid()
+        return self.conn
+
+    def add(self, camera_id, path_file, timestamp=None):
+        """
+        Add a captured image to the index
+
+        :param camera_id: unique ID of the camera (or camera function)
+        :param path_file: full path of the image
+        :param timestamp: epoch time of the capture (default: the file's modification time)
+        :return: False if the file isn't named as a time-lapse image
+        :rtype: bool
+        """
+        filename = os.path.basename(path_file)
+        parsed = parse_timelapse_filename(filename)
+        if not parsed:
+            logger.error(f"Not a time-lapse image name, not indexed: {filename}")
+            return False
+        prefix, sequence = parsed
+        stat = os.stat(path_file)
+        timestamp = stat.st_mtime if timestamp is None else timestamp
+
+        with self.lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                inserted = conn.execute(
+                    "INSERT OR IGNORE INTO image (camera_id, filename, prefix, sequence, size, timestamp) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (camera_id, filename, prefix, sequence, stat.st_size, timestamp)).rowcount
+                if inserted:
+                    conn.execute(
+                        "INSERT INTO image_set (camera_id, prefix, images, first_sequence, last_sequence, "
+                        "size, first_timestamp, last_timestamp) VALUES (?, ?, 1, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (camera_id, prefix) DO UPDATE SET "
+                        "images = images + 1, "
+                        "first_sequence = MIN(first_sequence, excluded.first_sequence), "
+                        "last_sequence = MAX(last_sequence, excluded.last_sequence), "
+                        "size = size + excluded.size, "
+                        "first_timestamp = MIN(first_timestamp, excluded.first_timestamp), "
+                        "last_timestamp = MAX(last_timestamp, excluded.last_timestamp)",
+                        (camera_id, prefix, sequence, sequence, stat.st_size, timestamp, timestamp))
+                else:
+                    # The image was captured again under the same name
+                    conn.execute(
+                        "UPDATE image SET size = ?, timestamp = ? WHERE camera_id = ? AND filename = ?",
+                        (stat.st_size, timestamp, camera_id, filename))
+                    self._summarize(conn, camera_id, prefix)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def sets(self, camera_id, directory=None):
+        """
+        Return the summary of each image set of a camera, ordered by set prefix
+
+        :param camera_id: unique ID of the camera (or camera function)
+        :param directory: time-lapse directory of the camera. If the camera's
+            images haven't been indexed from it yet, they're indexed first.
+        :rtype: list of TimelapseSet
+        """
+        if directory is not None and self.directory(camera_id) != directory:
+            self.rebuild(camera_id, directory)
+        with self.lock:
+            rows = self._connect().execute(
+                "SELECT prefix, images, first_sequence, last_sequence, size, first_timestamp, last_timestamp "
+                "FROM image_set WHERE camera_id = ? ORDER BY prefix", (camera_id,)).fetchall()
+        return [TimelapseSet(*row) for row in rows]
+
+    def directory(self, camera_id):
+        """Return the directory a camera's images were last indexed from, or None."""
+        with self.lock:
+            row = self._connect().execute(
+                "SELECT directory FROM camera WHERE camera_id = ?", (camera_id,)).fetchone()
+        return row[0] if row else None
+
+    def rebuild(self, camera_id, directory):
+        """
+        Reconcile the index of a camera with the images in its time-lapse directory
+
+        Images captured after the directory is listed are kept.
+
+        :return: the number of images added, updated, and removed
+        :rtype: (int, int, int)
+        """
+        started = time.time()
+        on_disk = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    parsed = parse_timelapse_filename(entry.name)
+                    if parsed and entry.is_file():
+                        stat = entry.stat()
+                        on_disk[entry.name] = parsed + (stat.st_size, stat.st_mtime)
+        except FileNotFoundError:
+            pass
+
+        with self.lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                indexed = {
+                    filename: (size, timestamp) for filename, size, timestamp in conn.execute(
+                        "SELECT filename, size, timestamp FROM image WHERE camera_id = ?", (camera_id,))}
+                added = [(camera_id, filename) + info for filename, info in on_disk.items()
+                         if filename not in indexed]
+                updated = [(info[2], camera_id, filename) for filename, info in on_disk.items()
+                           if filename in indexed and indexed[filename][0] != info[2]]
+                removed = [(camera_id, filename) for filename in indexed
+                           if filename not in on_disk and
+                           not os.path.exists(os.path.join(directory, filename))]
+                conn.executemany(
+                    "INSERT INTO image (camera_id, filename, prefix, sequence, size, timestamp) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", added)
+                conn.executemany(
+                    "UPDATE image SET size = ? WHERE camera_id = ? AND filename = ?", updated)
+                conn.executemany(
+                    "DELETE FROM image WHERE camera_id = ? AND filename = ?", removed)
+                self._summarize(conn, camera_id)
+                conn.execute(
+                    "INSERT OR REPLACE INTO camera (camera_id, directory, rebuilt) VALUES (?, ?, ?)",
+                    (camera_id, directory, started))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        logger.info(f"Time-lapse index of camera {camera_id} rebuilt from {directory} "
+                    f"in {time.time() - started:.1f} s: {len(on_disk)} images, {len(added)} added, "
+                    f"{len(updated)} updated, {len(removed)} removed")
+        return len(added), len(updated), len(removed)
+
+    def forget(self, camera_id):
+        """Remove a camera from the index, after it's deleted."""
+        with self.lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            for table in ('image', 'image_set', 'camera'):
+                conn.execute(f"DELETE FROM {table} WHERE camera_id = ?", (camera_id,))
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _summarize(conn, camera_id, prefix=None):
+        """Recalculate the summary of one or all sets of a camera from its images."""
+        where = "camera_id = ?" + (" AND prefix = ?" if prefix is not None else "")
+        args = (camera_id,) + ((prefix,) if prefix is not None else ())
+        conn.execute(f"DELETE FROM image_set WHERE {where}", args)
+        conn.execute(
+            "INSERT INTO image_set (camera_id, prefix, images, first_sequence, last_sequence, "
+            "size, first_timestamp, last_timestamp) "
+            "SELECT camera_id, prefix, COUNT(*), MIN(sequence), MAX(sequence), SUM(size), "
+            f"MIN(timestamp), MAX(timestamp) FROM image WHERE {where} GROUP BY prefix", args)
+
+
+timelapse_index_lock = threading.Lock()
+timelapse_index = None
+
+
+def get_timelapse_index():
+    """Return the process-wide time-lapse index."""
+    global timelapse_index
+    if timelapse_index is None:
+        with timelapse_index_lock:
+            if timelapse_index is None:
+                timelapse_index = TimelapseIndex(TIMELAPSE_INDEX_PATH)
+    return timelapse_index
+
+
+def timelapse_sets(camera_id, directory):
+    """
+    Return the image sets of a camera's time-lapse directory, for generating a video
+
+    :return: list of TimelapseSet, or [] if the index can't be read
+    """
+    try:
+        return get_timelapse_index().sets(camera_id, directory)
+    except Exception:
+        logger.exception(f"Could not read the time-lapse index of camera {camera_id}")
+        return []
@@ -0,0 +1,221 @@
+# coding=utf-8
+"""
+Compiled unit conversion and rescale equations
+
+Equations such as 'x*1.8+32' are parsed once into a code object that only
+allows arithmetic on x, numbers, and math functions, rather than being
+string-replaced and passed to eval() for every value. Each compiled
+equation can convert a single value or, when numpy is installed, a whole
+array at once.
+"""
+import ast
+import functools
+import logging
+import math
+import threading
+import time
+import types
+
+from looperget.databases.models import Conversion
+from looperget.utils.database import db_retrieve_table_daemon
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger("looperget.unit_conversion")
+
+# A conversion ID missing from the cache rebuilds it, at most this often
+CONVERSION_MISS_REBUILD_SEC = 10
+
+SCALAR_FUNCTIONS = {
+    'abs': abs, 'round': round, 'min': min, 'max': max, 'float': float, 'int': int,
+    'sqrt': math.sqrt, 'log': math.log, 'log10': math.log10, 'log2': math.log2, 'exp': math.exp,
+    'pow': math.pow, 'fabs': math.fabs, 'floor': math.floor, 'ceil': math.ceil,
+    'sin': math.sin, 'cos': math.cos, 'tan': math.tan,
+    'asin': math.asin, 'acos': math.acos, 'atan': math.atan, 'atan2': math.atan2,
+    'sinh': math.sinh, 'cosh': math.cosh, 'tanh': math.tanh, 'hypot': math.hypot,
+    'degrees': math.degrees, 'radians': math.radians
+}
+CONSTANTS = {'pi': math.pi, 'e': math.e}
+
+if np is not None:
+    ARRAY_FUNCTIONS = {
+        'abs': np.abs, 'round': np.round, 'min': np.minimum, 'max': np.maximum,
+        'float': lambda a: np.asarray(a, dtype=float), 'int': np.trunc,
+        'sqrt': np.sqrt, 'log': lambda a, base=None: np.log(a) if base is None else np.log(a) / np.log(base),
+        'log10': np.log10, 'log2': np.log2, 'exp': np.exp,
+        'pow': np.power, 'fabs': np.fabs, 'floor': np.floor, 'ceil': np.ceil,
+        'sin': np.sin, 'cos': np.cos, 'tan': np.tan,
+        'asin': np.arcsin, 'acos': np.arccos, 'atan': np.arctan, 'atan2': np.arctan2,
+        'sinh': np.sinh, 'cosh': np.cosh, 'tanh': np.tanh, 'hypot': np.hypot,
+        'degrees': np.degrees, 'radians': np.radians
+    }
+else:
+    ARRAY_FUNCTIONS = None
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load,
+    ast.Call, ast.Attribute, ast.keyword,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.UAdd, ast.USub)
+
+
+def validate_equation(tree):
+    """Raise ValueError if an equation uses anything other than x, numbers, operators and math functions."""
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ValueError(f"'{type(node).__name__}' is not allowed in an equation")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError(f"Constant {node.value!r} is not allowed in an equation")
+        if isinstance(node, ast.Name) and node.id not in SCALAR_FUNCTIONS and node.id not in CONSTANTS and node.id not in ('x', 'X', 'math'):
+            raise ValueError(f"Name '{node.id}' is not allowed in an equation")
+        if isinstance(node, ast.Attribute) and (
+                not isinstance(node.value, ast.Name) or node.value.id != 'math' or
+                (node.attr not in SCALAR_FUNCTIONS and node.attr not in CONSTANTS)):
+            raise ValueError("Only math functions may be used as attributes in an equation")
+
+
+class CompiledEquation:
+    """An equation of x, compiled once and evaluated for single values or arrays."""
+    def __init__(self, equation):
+        self.equation = equation
+        # Accept the unicode minus sign, which is easily pasted into an equation
+        tree = ast.parse(equation.strip().replace('\u2212', '-'), mode='eval')
+        validate_equation(tree)
+        self.code = compile(tree, '<equation>', 'eval')
+
+        self.scalar_namespace = {'__builtins__': {}, 'math': types.SimpleNamespace(**SCALAR_FUNCTIONS, **CONSTANTS)}
+        self.scalar_namespace.update(SCALAR_FUNCTIONS)
+        self.scalar_namespace.update(CONSTANTS)
+        if ARRAY_FUNCTIONS:
+            self.array_namespace = {'__builtins__': {}, 'math': types.SimpleNamespace(**ARRAY_FUNCTIONS, **CONSTANTS)}
+            self.array_namespace.update(ARRAY_FUNCTIONS)
+            self.array_namespace.update(CONSTANTS)
+
+    def __call__(self, value):
+        return eval(self.code, self.scalar_namespace, {'x': value, 'X': value})
+
+    def array(self, values):
+        """
+        Evaluate the equation for each of a sequence of values
+
+        :return: an array of results if numpy is installed, otherwise a list
+        """
+        if np is None:
+            return [self(each_value) for each_value in values]
+        values = np.asarray(values, dtype=float)
+        try:
+            return np.broadcast_to(
+                np.asarray(eval(self.code, self.array_namespace, {'x': values, 'X': values}), dtype=float),
+                values.shape)
+        except (TypeError, ValueError):
+            # e.g. min()/max() with a single argument, which numpy can't broadcast
+            return np.array([self(each_value) for each_value in values.tolist()], dtype=float)
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_equation(equation):
+    """
+    Return the compiled equation, cached by its text so an edited equation is compiled again
+
+    :raises ValueError: if the equation isn't a valid, allowed expression of x
+    """
+    try:
+        return CompiledEquation(equation)
+    except SyntaxError as err:
+        raise ValueError(f"Invalid equation '{equation}': {err}")
+
+
+def round_converted(value):
+    """Round a converted value (or array of values) to 5 decimal places."""
+    if np is not None and isinstance(value, np.ndarray):
+        return np.round(value, 5)
+    if isinstance(value, list):
+        return [float(f'{each_value:.5f}') for each_value in value]
+    return float(f'{value:.5f}')
+
+
+class ConversionCache:
+    """
+    The compiled equation of every Conversion, keyed by conversion ID and by units
+
+    Built from the Conversion table with one query, and rebuilt on the next
+    lookup after invalidate().
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_id = None
+        self.by_units = None
+        self.built = 0
+
+    def get(self, conversion_id):
+        """
+        Return the Conversion row and compiled equation of a conversion ID
+
+        :return: (conversion, compiled equation), or (None, None) if not found
+        """
+        with self.lock:
+            if self.by_id is None or (conversion_id not in self.by_id and
+                                      time.time() - self.built > CONVERSION_MISS_REBUILD_SEC):
+                self._build()
+            return self.by_id.get(conversion_id, (None, None))
+
+    def get_units(self, unit_from, unit_to):
+        """Return the Conversion row and compiled equation converting between two units."""
+        with self.lock:
+            if self.by_units is None or ((unit_from, unit_to) not in self.by_units and
+                                         time.time() - self.built > CONVERSION_MISS_REBUILD_SEC):
+                self._build()
+            return self.by_units.get((unit_from, unit_to), (None, None))
+
+    def invalidate(self):
+        """Rebuild the cache on the next lookup."""
+        with self.lock:
+            self.by_id = None
+            self.by_units = None
+
+    def _build(self):
+        by_id = {}
+        by_units = {}
+        for each_conversion in db_retrieve_table_daemon(Conversion, entry='all'):
+            try:
+                compiled = compile_equation(each_conversion.equation)
+            except ValueError as err:
+                logger.error(f"Conversion {each_conversion.unique_id} can't be used: {err}")
+                compiled = None
+            by_id[each_conversion.unique_id] = (each_conversion, compiled)
+            by_units.setdefault(
+                (each_conversion.convert_unit_from, each_conversion.convert_unit_to), (each_conversion, compiled))
+        self.by_id = by_id
+        self.by_units = by_units
+        self.built = time.time()
+
+
+conversion_cache_lock = threading.Lock()
+conversion_cache = None
+
+
+def get_conversion_cache():
+    """Return the process-wide cache of compiled conversions."""
+    global conversion_cache
+    if conversion_cache is None:
+        with conversion_cache_lock:
+            if conversion_cache is None:
+                conversion_cache = ConversionCache()
+    return conversion_cache
+
+
+def convert_value(conversion_id, value):
+    """
+    Convert a value, or an array of values, with a Conversion
+
+    :return: the converted value(s) rounded to 5 decimal places, or the value unchanged if the conversion isn't found
+    """
+    conversion, compiled = get_conversion_cache().get(conversion_id)
+    if compiled is None:
+        logger.error("Conversion not found, not converting.")
+        return value
+    if isinstance(value, (list, tuple)) or (np is not None and isinstance(value, np.ndarray)):
+        return round_converted(compiled.array(value))
+    return round_converted(compiled(float(value)))
@@ -25,11 +25,13 @@ import os
 
 from looperget.config import PATH_WIDGETS
 from looperget.config import PATH_WIDGETS_CUSTOM
-from looperget.utils.modules import load_module_from_file
+from looperget.utils.modules import cache_information
+from looperget.utils.modules import load_module_information
 
 logger = logging.getLogger("looperget.utils.widgets")
 
 
+@cache_information('widgets', [PATH_WIDGETS, PATH_WIDGETS_CUSTOM])
 def parse_widget_information(exclude_custom=False):
     """Parses the variables assigned in each Widget and return a dictionary of IDs and values."""
     def dict_has_value(dict_inp, widget_cus, key, force_type=None):
@@ -69,9 +71,9 @@ def parse_widget_information(exclude_custom=False):
                 continue
 
             full_path = f"{real_path}/{each_file}"
-            widget_custom, status = load_module_from_file(full_path, 'widgets')
+            widget_custom = load_module_information(full_path, 'widgets', 'WIDGET_INFORMATION')
 
-            if not widget_custom or not hasattr(widget_custom, 'WIDGET_INFORMATION'):
+            if not widget_custom:
                 continue
 
             # Populate dictionary of widget information
@@ -29,10 +29,12 @@ import re
 import flask_login
 from flask import flash
 from flask import jsonify
+from flask import request
 from flask_babel import lazy_gettext
 from flask_login import current_user
 from pytz import timezone
 
+from looperget.config import GRAPH_WIDTH_MAX
 from looperget.config import THEMES_DARK
 from looperget.databases.models import Conversion
 from looperget.databases.models import CustomController
@@ -40,11 +42,12 @@ from looperget.databases.models import DeviceMeasurements
 from looperget.databases.models import Input
 from looperget.databases.models import Measurement
 from looperget.databases.models import NoteTags
-from looperget.databases.models import Notes
 from looperget.databases.models import Output
 from looperget.databases.models import PID
 from looperget.looperget_flask.utils.utils_general import use_unit_generate
+from looperget.looperget_flask.utils.utils_notes import tag_overlay
 from looperget.utils.constraints_pass import constraints_pass_positive_value
+from looperget.utils.downsample import downsample
 from looperget.utils.influx import read_influxdb_list
 from looperget.utils.system_pi import add_custom_measurements
 from looperget.utils.system_pi import return_measurement_info
@@ -54,23 +57,24 @@ logger = logging.getLogger(__name__)
 
 
 def past_data(unique_id, measure_type, measurement_id, past_seconds):
-    """Return data from past_seconds until present from influxdb."""
+    """
+    Return data from past_seconds until present from influxdb.
+    With ?points=<n>&downsample=<lttb|minmax>, series of more than n points are downsampled to n.
+    With ?points=<n>, the notes of a tag are clustered into at most n annotations.
+    """
     if not current_user.is_authenticated:
         return "You are not logged in and cannot access this endpoint"
     if not str_is_float(past_seconds):
         return '', 204
 
     if measure_type == 'tag':
-        notes_list = []
-
-        tag = NoteTags.query.filter(NoteTags.unique_id == unique_id).first()
-        notes = Notes.query.filter(
-            Notes.date_time >= (datetime.datetime.utcnow() - datetime.timedelta(seconds=int(past_seconds)))).all()
-
-        for each_note in notes:
-            if tag.unique_id in each_note.tags.split(','):
-                notes_list.append(
-                    [each_note.date_time.replace(tzinfo=timezone('UTC')).timestamp(), each_note.name, each_note.note])
+        # Notes of the tag, clustered into counts if there are more than ?points=<n>
+        notes_list = [
+            [date_time.replace(tzinfo=timezone('UTC')).timestamp(), title, text]
+            for date_time, title, text in tag_overlay(
+                unique_id,
+                datetime.datetime.utcnow() - datetime.timedelta(seconds=int(past_seconds)),
+                points=request.args.get('points', type=int))]
 
         if notes_list:
             return jsonify(notes_list)
@@ -117,6 +121,11 @@ def past_data(unique_id, measure_type, measurement_id, past_seconds):
             if not list_data:
                 return '', 204
 
+            points = request.args.get('points', type=int)
+            if points:
+                list_data = downsample(
+                    list_data, min(points, GRAPH_WIDTH_MAX), request.args.get('downsample', 'lttb'))
+
             return jsonify(list_data)
         except Exception as err:
             logger.debug(f"URL for 'past_data' raised and error: {err}")
@@ -324,6 +333,18 @@ WIDGET_INFORMATION = {
             'name': 'Enable Graph Legend',
             'phrase': 'Enable the Graph Legend that is displayed below the graph.'
         },
+        {
+            'id': 'downsample',
+            'type': 'select',
+            'default_value': 'lttb',
+            'options_select': [
+                ('lttb', 'Largest-Triangle-Three-Buckets'),
+                ('minmax', 'Minimum and Maximum'),
+                ('none', 'None')
+            ],
+            'name': 'Downsampling',
+            'phrase': 'How series with more points than the graph is wide are reduced before being sent to the graph'
+        },
         {
             'id': 'graph_font_size_em_axes',
             'type': 'float',
@@ -582,6 +603,7 @@ WIDGET_INFORMATION = {
 
   let note_timestamps = {};
   let last_output_time_mil = {};  // Store the time (epoch) of the last data point received
+  let graph_downsample = {};  // Downsampling method of each graph
 
   function graphMenuFunction(widget_id) {
     var x = document.getElementById("widget-graph-responsive-controls-" + widget_id);
@@ -624,7 +646,17 @@ WIDGET_INFORMATION = {
                        measurement_id,
                        past_seconds) {
     const epoch_mil = new Date().getTime();
-    const url = '/past/' + unique_id + '/' + measure_type + '/' + measurement_id + '/' + past_seconds;
+    let url = '/past/' + unique_id + '/' + measure_type + '/' + measurement_id + '/' + past_seconds;
+    if (measure_type !== 'tag' && graph_downsample[widget_id] && graph_downsample[widget_id] !== 'none') {
+      // Reduce the series to one point per pixel of the graph width
+      const width = document.getElementById('container-synchronous-graph-' + widget_id).offsetWidth;
+      url += '?points=' + Math.max(Math.round(width), 100) + '&downsample=' + graph_downsample[widget_id];
+    }
+    else if (measure_type === 'tag') {
+      // Cluster dense notes into counts, about one note annotation per 10 pixels of the graph width
+      const width = document.getElementById('container-synchronous-graph-' + widget_id).offsetWidth;
+      url += '?points=' + Math.max(Math.round(width / 10), 10);
+    }
     const update_id = widget_id + "-" + series + "-" + unique_id + "-" + measure_type + '-' + measurement_id;
 
     $.getJSON(url,
@@ -780,6 +812,7 @@ WIDGET_INFORMATION = {
 {% set graph_pid_ids = widget_options['measurements_pid'] %}
 {% set graph_note_tag_ids = widget_options['measurements_note_tag'] %}
 
+  graph_downsample['{{each_widget.unique_id}}'] = '{{widget_options['downsample']|default('lttb', true)}}';
   widget['{{each_widget.unique_id}}'] = new Highcharts.StockChart({
     chart : {
       renderTo: 'container-synchronous-graph-{{each_widget.unique_id}}',